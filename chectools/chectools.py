@@ -1,14 +1,16 @@
 import click
 
-from chectools import DyadPosition
+from robtools.cli.LazyGroup import LazyGroup
 
+COMMANDS = {
+    'dyadposition': 'chectools.DyadPosition.dyadposition',
+}
 
-@click.group()
+
+@click.group(cls=LazyGroup, lazy_commands=COMMANDS)
 def chectools():
     pass
 
 
-chectools.add_command(DyadPosition.dyadposition)
-
 if __name__ == '__main__':
    chectools()
@@ -3,16 +3,19 @@ import math
 import os
 
 import click
-from numpy import mean
 
-import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 import pyBigWig as pbw
+from mnasetools.plot import Plot
 import robtools.Split as sb
+from robtools.jobs import Jobs
 from robtools.txt import Parser
 
 POSITIVE_STRAND = '+'
 NEGATIVE_STRAND = '-'
+CLUSTER_GAP = 100000
+CLUSTER_MAX_LENGTH = 10000000
 
 
 @click.command()
@@ -34,13 +37,15 @@ NEGATIVE_STRAND = '-'
               help='Suffix to append to sample name. Suffix is ignore for input if file does not exists - suffix is still applied to output.')
 @click.option('--index', '-i', type=int, default=None,
               help='Index of sample to process in samples file.')
-def dyadcov(samples, genes, selection, absolute, minp, maxp, smoothing, suffix, index):
+@Jobs.jobs_option
+@Plot.plots_option
+def dyadcov(samples, genes, selection, absolute, minp, maxp, smoothing, suffix, index, jobs, plots):
     '''Finds the distribution of ditances between fragments and dyad.'''
     logging.basicConfig(filename='robtools.log', level=logging.DEBUG, format='%(asctime)s %(levelname)-8s %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
-    dyad_coverage(samples, genes, selection, absolute, minp, maxp, smoothing, suffix, index)
+    dyad_coverage(samples, genes, selection, absolute, minp, maxp, smoothing, suffix, index, jobs, plots)
 
 
-def dyad_coverage(samples, genes='genes.txt', selection=None, absolute=False, minp=-75, maxp=75, smoothing=None, suffix=None, index=None):
+def dyad_coverage(samples, genes='genes.txt', selection=None, absolute=False, minp=-75, maxp=75, smoothing=None, suffix=None, index=None, jobs=None, plots=Plot.INLINE):
     '''Finds the distribution of ditances between fragments and dyad.'''
     genes_info = pd.read_csv(genes, sep='\t', comment='#')
     genes_info = genes_info.loc[genes_info[genes_info.columns[6]] != -1]
@@ -50,14 +55,18 @@ def dyad_coverage(samples, genes='genes.txt', selection=None, absolute=False, mi
     sample_names = Parser.first(samples)
     if index != None:
         sample_names = [sample_names[index]]
-    for sample in sample_names:
-        dyad_coverage_sample(sample, genes_info, absolute, minp, maxp, suffix, smoothing)
-        splits = sb.splits(sample)
-        for split in splits:
-            dyad_coverage_sample(split, genes_info, absolute, minp, maxp, suffix, smoothing)
+    with Plot.rendering():
+        if jobs is not None and jobs > 1:
+            Jobs.run(dyad_coverage_sample, [(name, genes_info, absolute, minp, maxp, suffix, smoothing, plots) for name in Jobs.with_splits(sample_names)], jobs)
+        else:
+            for sample in sample_names:
+                dyad_coverage_sample(sample, genes_info, absolute, minp, maxp, suffix, smoothing, plots)
+                splits = sb.splits(sample)
+                for split in splits:
+                    dyad_coverage_sample(split, genes_info, absolute, minp, maxp, suffix, smoothing, plots)
 
 
-def dyad_coverage_sample(sample, genes, absolute, minp, maxp, suffix=None, smoothing=None):
+def dyad_coverage_sample(sample, genes, absolute, minp, maxp, suffix=None, smoothing=None, plots=Plot.INLINE):
     '''Finds the distribution of ditances between fragments and dyad for a single sample.'''
     print ('Finds the distribution of ditances between fragments and dyad of sample {}'.format(sample))
     if not smoothing:
@@ -67,58 +76,82 @@ def dyad_coverage_sample(sample, genes, absolute, minp, maxp, suffix=None, smoot
     if suffix and os.path.exists(sample + suffix + '-cov.bw'):
         coverage_bw = sample + suffix + '-cov.bw'
     bw = pbw.open(coverage_bw)
-    distances = [[] for i in range(0, maxp - minp + smoothing * 2 + 1)]
-    for index, columns in genes.iterrows():
-        chromosome = columns[1]
-        max_end = bw.chroms(chromosome)
-        if not max_end:
-            max_end = 0
-        negative = columns[4] == NEGATIVE_STRAND
-        theo_start = int(columns[6]) + minp - smoothing
-        start = max(theo_start, 0)
-        end = min(int(columns[6]) + maxp + smoothing + 1, max_end)
-        distance = signal(bw, chromosome, start, end) if end > start else []
-        if negative:
-            distance.reverse()
-        for i in range(0, maxp - minp + smoothing * 2 + 1):
-            distance_index = i - (start - theo_start)
-            value = distance[distance_index] if distance_index in range(0, len(distance)) else 0
-            distances[i].append(value if value and not math.isnan(value) else 0)
-    for i in range(0, maxp - minp + smoothing * 2 + 1):
-        genes['dyad position ' + str(i + minp - smoothing)] = distances[i]
+    distances = dyad_matrix(bw, genes, minp - smoothing, maxp + smoothing)
+    bw.close()
+    positions = list(range(minp - smoothing, maxp + smoothing + 1))
+    distances = pd.DataFrame(distances, index=genes.index, columns=['dyad position ' + str(i) for i in positions])
+    genes = pd.concat([genes.drop(columns=distances.columns, errors='ignore'), distances], axis=1)
     genes_output = sample + (suffix if suffix else '') + '-genes.txt'
     genes.to_csv(genes_output, sep='\t', index=False)
-    sums = pd.DataFrame(index=list(range(minp - smoothing, maxp + smoothing + 1)))
-    sums['Frequency'] = [genes['dyad position ' + str(i)].sum() for i in range(minp - smoothing, maxp + smoothing + 1)]
-    dyads = pd.DataFrame(index=list(range(minp, maxp + 1)), columns=['Frequency', 'Relative Frequency'])
-    for i in range(minp, maxp + 1):
-        dyads.at[i, 'Frequency'] = mean([sums.at[j, 'Frequency'] for j in range(i - smoothing, i + smoothing + 1)])
-    frequency_sum = dyads['Frequency'].sum()
-    for i in range(minp, maxp + 1):
-        dyads.at[i, 'Relative Frequency'] = dyads.at[i, 'Frequency'] / frequency_sum
+    sums = distances.to_numpy().sum(axis=0)
+    frequencies = np.convolve(sums, np.ones(smoothing * 2 + 1), mode='valid') / (smoothing * 2 + 1)
+    dyads = pd.DataFrame({'Frequency': frequencies, 'Relative Frequency': frequencies / frequencies.sum()},
+                         index=list(range(minp, maxp + 1)))
     dyad_output = sample + (suffix if suffix else '') + '-dyad.txt'
     dyads.to_csv(dyad_output, sep='\t')
-    plot_dyad_coverage(sample, dyads, absolute, suffix)
+    plot_dyad_coverage(sample, dyads, absolute, suffix, plots)
 
 
-def plot_dyad_coverage(sample, dyads, absolute, suffix=None):
+def dyad_matrix(bw, genes, minp, maxp):
+    '''Returns signal around dyad of genes as a matrix with one row per gene and one column per position.
+
+    Signal of genes on the negative strand is reversed, missing signal is replaced by 0.'''
+    theo_starts = genes[genes.columns[6]].to_numpy(dtype=int) + minp
+    matrix = np.zeros((len(genes), maxp - minp + 1))
+    chromosomes = bw.chroms()
+    windows = pd.DataFrame({'chromosome': genes[genes.columns[1]].to_numpy(), 'theo_start': theo_starts})
+    windows['start'] = windows['theo_start'].clip(lower=0)
+    windows['end'] = np.minimum(theo_starts + maxp - minp + 1,
+                                windows['chromosome'].map(chromosomes).fillna(0).to_numpy(dtype=int))
+    windows = windows[windows['end'] > windows['start']]
+    for chromosome, chromosome_windows in windows.groupby('chromosome', sort=False):
+        chromosome_windows = chromosome_windows.sort_values('start')
+        for cluster in window_clusters(chromosome_windows['start'].to_numpy(), chromosome_windows['end'].to_numpy()):
+            cluster_windows = chromosome_windows.iloc[cluster]
+            cluster_start = cluster_windows['start'].iloc[0]
+            values = signal(bw, chromosome, cluster_start, cluster_windows['end'].max())
+            for row, theo_start, start, end in zip(cluster_windows.index, cluster_windows['theo_start'],
+                                                   cluster_windows['start'], cluster_windows['end']):
+                matrix[row, start - theo_start:end - theo_start] = values[start - cluster_start:end - cluster_start]
+    np.nan_to_num(matrix, copy=False, nan=0.0)
+    negative = (genes[genes.columns[4]] == NEGATIVE_STRAND).to_numpy()
+    matrix[negative] = matrix[negative, ::-1]
+    return matrix
+
+
+def window_clusters(starts, ends):
+    '''Returns slices of windows sorted by start that can be read together from bigWig.
+
+    Windows are grouped when they are separated by less than CLUSTER_GAP and the group does not exceed
+    CLUSTER_MAX_LENGTH.'''
+    clusters = []
+    first = 0
+    cluster_end = ends[0] if len(ends) else 0
+    for i in range(1, len(starts)):
+        if starts[i] - cluster_end > CLUSTER_GAP or max(cluster_end, ends[i]) - starts[first] > CLUSTER_MAX_LENGTH:
+            clusters.append(slice(first, i))
+            first = i
+            cluster_end = ends[i]
+        else:
+            cluster_end = max(cluster_end, ends[i])
+    if len(starts):
+        clusters.append(slice(first, len(starts)))
+    return clusters
+
+
+def plot_dyad_coverage(sample, dyads, absolute, suffix=None, plots=Plot.INLINE):
     x = dyads.index.values
     yheader = 'Frequency' if absolute else 'Relative Frequency'
-    plt.figure()
-    plt.title(sample)
-    plt.xlabel('Position relative to dyad (bp)')
-    plt.ylabel('Frequency' if absolute else 'Relative Frequency')
-    plt.xlim(x[0], x[len(x) - 1])
-    plt.xticks(list(range(x[0], x[len(x) - 1] + 1, 25)))
-    plt.plot(dyads.index.values, dyads[yheader].values, color='red')
+    spec = Plot.figure(sample, 'Position relative to dyad (bp)', yheader, x)
+    Plot.plot(spec, x, dyads[yheader].values, color='red')
     plot_output = sample + (suffix if suffix else '') + '-dyad.png'
-    plt.savefig(plot_output)
-    plt.clf()
+    Plot.savefig(spec, plot_output)
+    Plot.render(spec, plots)
 
 
 def signal(bw, chromosome, start, end):
     '''Returns signal from bigWig'''
-    return bw.values(chromosome, start, end)
+    return bw.values(chromosome, start, end, numpy=True)
 
 
 if __name__ == '__main__':
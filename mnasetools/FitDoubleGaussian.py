@@ -1,12 +1,13 @@
+import functools
 import logging
 
 import click
-from lmfit.models import GaussianModel, ConstantModel
 
-import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
+from mnasetools.fit import Fit
+from mnasetools.plot import Plot
 import robtools.Split as sb
+from robtools.jobs import Jobs
 from robtools.txt import Parser
 
 
@@ -55,93 +56,111 @@ from robtools.txt import Parser
               help='Suffix to append to sample name.')
 @click.option('--index', '-i', type=int, default=None,
               help='Index of sample to process in samples file.')
-def fitdoublegaussian(samples, absolute, components, gaussian, svg, verbose, center1, cmin1, cmax1, amp1, amin1, sigma1, smin1, center2, cmin2, cmax2, amp2, amin2, sigma2, smin2, suffix, index):
+@Jobs.jobs_option
+@click.option('--batch/--no-batch', default=False, show_default=True,
+              help='Fit sample and its splits together, starting the fit of each split from the parameters of the previous split. '
+                   'Values of --center1, --amp1, --sigma1, --center2, --amp2 and --sigma2 are kept. Fitted parameters are saved in a single table per sample.')
+@Plot.plots_option
+def fitdoublegaussian(samples, absolute, components, gaussian, svg, verbose, center1, cmin1, cmax1, amp1, amin1, sigma1, smin1, center2, cmin2, cmax2, amp2, amin2, sigma2, smin2, suffix, index, jobs, batch, plots):
     '''Fits double gaussian curve to dyad coverage.'''
     logging.basicConfig(filename='robtools.log', level=logging.DEBUG, format='%(asctime)s %(levelname)-8s %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
-    fit_double_gaussian(samples, absolute, components, gaussian, svg, verbose, center1, cmin1, cmax1, amp1, amin1, sigma1, smin1, center2, cmin2, cmax2, amp2, amin2, sigma2, smin2, suffix, index)
+    fit_double_gaussian(samples, absolute, components, gaussian, svg, verbose, center1, cmin1, cmax1, amp1, amin1, sigma1, smin1, center2, cmin2, cmax2, amp2, amin2, sigma2, smin2, suffix, index, jobs, batch, plots)
 
 
-def fit_double_gaussian(samples='samples.txt', absolute=False, components=False, gaussian=False, svg=False, verbose=False, center1=None, cmin1=None, cmax1=None, amp1=None, amin1=None, sigma1=None, smin1=None, center2=None, cmin2=None, cmax2=None, amp2=None, amin2=None, sigma2=None, smin2=None, suffix=None, index=None):
+def fit_double_gaussian(samples='samples.txt', absolute=False, components=False, gaussian=False, svg=False, verbose=False, center1=None, cmin1=None, cmax1=None, amp1=None, amin1=None, sigma1=None, smin1=None, center2=None, cmin2=None, cmax2=None, amp2=None, amin2=None, sigma2=None, smin2=None, suffix=None, index=None, jobs=None, batch=False, plots=Plot.INLINE):
     '''Fits double gaussian curve to dyad coverage.'''
     sample_names = Parser.first(samples)
     if index != None:
         sample_names = [sample_names[index]]
-    for sample in sample_names:
-        fit_double_gaussian_sample(sample, absolute, components, gaussian, svg, verbose, center1, cmin1, cmax1, amp1, amin1, sigma1, smin1, center2, cmin2, cmax2, amp2, amin2, sigma2, smin2, suffix)
-        splits = sb.splits(sample)
-        for split in splits:
-            fit_double_gaussian_sample(split, absolute, components, gaussian, svg, verbose, center1, cmin1, cmax1, amp1, amin1, sigma1, smin1, center2, cmin2, cmax2, amp2, amin2, sigma2, smin2, suffix)
+    with Plot.rendering():
+        if batch:
+            for sample in sample_names:
+                fit_double_gaussian_batch(sample, absolute, components, gaussian, svg, verbose, center1, cmin1, cmax1, amp1, amin1, sigma1, smin1, center2, cmin2, cmax2, amp2, amin2, sigma2, smin2, suffix, jobs, plots)
+        elif jobs is not None and jobs > 1:
+            Jobs.run(fit_double_gaussian_sample, [(name, absolute, components, gaussian, svg, verbose, center1, cmin1, cmax1, amp1, amin1, sigma1, smin1, center2, cmin2, cmax2, amp2, amin2, sigma2, smin2, suffix, plots) for name in Jobs.with_splits(sample_names)], jobs)
+        else:
+            for sample in sample_names:
+                fit_double_gaussian_sample(sample, absolute, components, gaussian, svg, verbose, center1, cmin1, cmax1, amp1, amin1, sigma1, smin1, center2, cmin2, cmax2, amp2, amin2, sigma2, smin2, suffix, plots)
+                splits = sb.splits(sample)
+                for split in splits:
+                    fit_double_gaussian_sample(split, absolute, components, gaussian, svg, verbose, center1, cmin1, cmax1, amp1, amin1, sigma1, smin1, center2, cmin2, cmax2, amp2, amin2, sigma2, smin2, suffix, plots)
            
 
-def fit_double_gaussian_sample(sample, absolute=False, components=False, gaussian=False, svg=False, verbose=False, center1=None, cmin1=None, cmax1=None, amp1=None, amin1=None, sigma1=None, smin1=None, center2=None, cmin2=None, cmax2=None, amp2=None, amin2=None, sigma2=None, smin2=None, suffix=None):
+def fit_double_gaussian_sample(sample, absolute=False, components=False, gaussian=False, svg=False, verbose=False, center1=None, cmin1=None, cmax1=None, amp1=None, amin1=None, sigma1=None, smin1=None, center2=None, cmin2=None, cmax2=None, amp2=None, amin2=None, sigma2=None, smin2=None, suffix=None, plots=Plot.INLINE):
     '''Fits double gaussian curve to dyad coverage for a single sample.'''
     print ('Fits double gaussian curve to dyad coverage of sample {}'.format(sample))
-    input = sample + (suffix if suffix else '') + '-dyad.txt'
-    dyads = pd.read_csv(input, sep='\t', index_col=0, comment='#')
-    x = dyads.index.values
-    yheader = 'Frequency' if absolute else 'Relative Frequency'
-    y = dyads[yheader].values
-    if not amp1:
-        amp1 = dyads[yheader].max() * 50
-    if not center1:
-        center1 = -dyads.index.max() / 4
-    if not sigma1:
-        sigma1 = dyads.index.max() / 5
-    if not amp2:
-        amp2 = dyads[yheader].max() * 50
-    if not center2:
-        center2 = dyads.index.max() / 4
-    if not sigma2:
-        sigma2 = dyads.index.max() / 5
-    plt.figure()
-    plt.title(sample)
-    plt.xlabel('Position relative to dyad (bp)')
-    plt.ylabel('Frequency' if absolute else 'Relative Frequency')
-    plt.xlim(x[0], x[len(x) - 1])
-    plt.xticks(list(range(x[0], x[len(x) - 1] + 1, 25)))
-    plt.plot(x, y, color='red')
+    x, y = Fit.read_dyads(sample, absolute, suffix)
+    fit = fit_dyads(sample, x, y, initial_values(x, y, center1, amp1, sigma1, center2, amp2, sigma2), bounds(cmin1, cmax1, amin1, smin1, cmin2, cmax2, amin2, smin2))
+    if verbose and fit:
+        print(fit['report'])
+    plot_double_gaussian(sample, x, y, fit, absolute, components, gaussian, svg, suffix, plots)
+
+
+def fit_double_gaussian_batch(sample, absolute=False, components=False, gaussian=False, svg=False, verbose=False, center1=None, cmin1=None, cmax1=None, amp1=None, amin1=None, sigma1=None, smin1=None, center2=None, cmin2=None, cmax2=None, amp2=None, amin2=None, sigma2=None, smin2=None, suffix=None, jobs=None, plots=Plot.INLINE):
+    '''Fits double gaussian curve to dyad coverage for a sample and its splits, and saves fitted parameters in a single table.
+
+    The fit of each split starts from the parameters of the previous split. When jobs is greater than 1,
+    splits are fitted in parallel starting from the parameters of the sample.'''
+    Fit.fit_batch(sample, 'double gaussian', fit_dyads, functools.partial(initial_values, center1=center1, amp1=amp1, sigma1=sigma1, center2=center2, amp2=amp2, sigma2=sigma2),
+                  bounds(cmin1, cmax1, amin1, smin1, cmin2, cmax2, amin2, smin2),
+                  functools.partial(plot_double_gaussian, absolute=absolute, components=components, gaussian=gaussian, svg=svg, suffix=suffix, plots=plots), absolute, verbose, suffix, jobs,
+                  {'g1_center': center1, 'g1_amplitude': amp1, 'g1_sigma': sigma1, 'g2_center': center2, 'g2_amplitude': amp2, 'g2_sigma': sigma2})
+
+
+def initial_values(x, y, center1=None, amp1=None, sigma1=None, center2=None, amp2=None, sigma2=None):
+    '''Returns initial values of parameters, using defaults based on dyad coverage for missing values.'''
+    return {'c_c': y.min(),
+            'g1_center': center1 if center1 else -x.max() / 4, 'g1_sigma': sigma1 if sigma1 else x.max() / 5,
+            'g1_amplitude': amp1 if amp1 else y.max() * 50,
+            'g2_center': center2 if center2 else x.max() / 4, 'g2_sigma': sigma2 if sigma2 else x.max() / 5,
+            'g2_amplitude': amp2 if amp2 else y.max() * 50}
+
+
+def bounds(cmin1=None, cmax1=None, amin1=None, smin1=None, cmin2=None, cmax2=None, amin2=None, smin2=None):
+    '''Returns minimum and maximum values of parameters.'''
+    return {'g1_center': (cmin1, cmax1), 'g1_sigma': (smin1, None), 'g1_amplitude': (amin1, None),
+            'g2_center': (cmin2, cmax2), 'g2_sigma': (smin2, None), 'g2_amplitude': (amin2, None)}
+
+
+@functools.lru_cache(maxsize=None)
+def double_gaussian_model():
+    '''Returns double gaussian model with a constant, the model is created once per process.'''
+    from lmfit.models import GaussianModel, ConstantModel  # lmfit imports matplotlib
+    return ConstantModel(prefix='c_') + GaussianModel(prefix='g1_') + GaussianModel(prefix='g2_')
+
+
+def fit_dyads(sample, x, y, values, bounds):
+    '''Fits double gaussian curve to dyad coverage starting from values.
+
+    Returns fitted values, curves and fit report, or None if fit failed.'''
+    return Fit.fit_model(sample, x, y, values, bounds, double_gaussian_model(), 'double gaussian')
+
+
+def plot_double_gaussian(sample, x, y, fit, absolute=False, components=False, gaussian=False, svg=False, suffix=None, plots=Plot.INLINE):
+    '''Saves plot of dyad coverage and fitted double gaussian curve.'''
+    spec = Plot.figure(sample, 'Position relative to dyad (bp)', 'Frequency' if absolute else 'Relative Frequency', x)
+    Plot.plot(spec, x, y, color='red')
     plot_output = sample + (suffix if suffix else '') + '-dyad-double-gaussian.png'
-    try:
-        constant = ConstantModel(prefix='c_')
-        pars = constant.make_params()
-        pars['c_c'].set(value=dyads[yheader].min(), min=0.0, max=dyads[yheader].max())
-        gauss1 = GaussianModel(prefix='g1_')
-        pars.update(gauss1.make_params())
-        pars['g1_center'].set(value=center1, min=cmin1, max=cmax1)
-        pars['g1_sigma'].set(value=sigma1, min=smin1)
-        pars['g1_amplitude'].set(value=amp1, min=amin1)
-        gauss2 = GaussianModel(prefix='g2_')
-        pars.update(gauss2.make_params())
-        pars['g2_center'].set(value=center2, min=cmin2, max=cmax2)
-        pars['g2_sigma'].set(value=sigma2, min=smin2)
-        pars['g2_amplitude'].set(value=amp2, min=amin2)
-        mod = constant + gauss1 + gauss2
-        init = mod.eval(pars, x=x)
-        out = mod.fit(y, pars, x=x)
+    if fit:
         if components:
-            plt.plot(x, init, 'b--', label='Initial fit')
-        if verbose:
-            print(out.fit_report(min_correl=0.5))
-        plt.plot(x, out.best_fit, 'b-', label='Best fit')
+            Plot.plot(spec, x, fit['init'], 'b--', label='Initial fit')
+        Plot.plot(spec, x, fit['best_fit'], 'b-', label='Best fit')
+        comps = fit['components']
         if gaussian:
-            comps = out.eval_components(x=x)
             constant_y = comps['c_']
-            plt.plot(x, [yv + constant_y for yv in comps['g1_']], 'm--', label='Gaussian 1')
-            plt.plot(x, [yv + constant_y for yv in comps['g2_']], 'y--', label='Gaussian 2')
+            Plot.plot(spec, x, comps['g1_'] + constant_y, 'm--', label='Gaussian 1')
+            Plot.plot(spec, x, comps['g2_'] + constant_y, 'y--', label='Gaussian 2')
         if components:
-            comps = out.eval_components(x=x)
-            plt.plot(x, np.repeat(comps['c_'], len(x)), 'g--', label='Constant component')
-            plt.plot(x, comps['g1_'], 'm--', label='Gaussian component 1')
-            plt.plot(x, comps['g2_'], 'k--', label='Gaussian component 2')
-    except Exception as e:
-        logging.warning('could not fit double gaussian curve to sample {}'.format(sample), e)
+            Plot.plot(spec, x, np.broadcast_to(comps['c_'], np.shape(x)), 'g--', label='Constant component')
+            Plot.plot(spec, x, comps['g1_'], 'm--', label='Gaussian component 1')
+            Plot.plot(spec, x, comps['g2_'], 'k--', label='Gaussian component 2')
     if components:
-        plt.legend(loc='lower right')
-    plt.savefig(plot_output)
+        Plot.legend(spec, 'lower right')
+    Plot.savefig(spec, plot_output)
     if svg:
         plot_svg_output = sample + (suffix if suffix else '') + '-dyad-double-gaussian.svg'
-        plt.savefig(plot_svg_output, transparent=True)
-    plt.close()
+        Plot.savefig(spec, plot_svg_output, transparent=True)
+    Plot.render(spec, plots)
 
 
 if __name__ == '__main__':
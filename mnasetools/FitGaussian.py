@@ -1,12 +1,13 @@
+import functools
 import logging
 
 import click
-from lmfit.models import GaussianModel, ConstantModel
 
-import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
+from mnasetools.fit import Fit
+from mnasetools.plot import Plot
 import robtools.Split as sb
+from robtools.jobs import Jobs
 from robtools.txt import Parser
 
 
@@ -39,76 +40,101 @@ from robtools.txt import Parser
               help='Suffix to append to sample name.')
 @click.option('--index', '-i', type=int, default=None,
               help='Index of sample to process in samples file.')
-def fitgaussian(samples, absolute, components, svg, verbose, center, cmin, cmax, amp, amin, sigma, smin, suffix, index):
+@Jobs.jobs_option
+@click.option('--batch/--no-batch', default=False, show_default=True,
+              help='Fit sample and its splits together, starting the fit of each split from the parameters of the previous split. '
+                   'Values of --center, --amp and --sigma are kept. Fitted parameters are saved in a single table per sample.')
+@Plot.plots_option
+def fitgaussian(samples, absolute, components, svg, verbose, center, cmin, cmax, amp, amin, sigma, smin, suffix, index, jobs, batch, plots):
     '''Fits gaussian curve to dyad coverage.'''
     logging.basicConfig(filename='robtools.log', level=logging.DEBUG, format='%(asctime)s %(levelname)-8s %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
-    fit_gaussian(samples, absolute, components, svg, verbose, center, cmin, cmax, amp, amin, sigma, smin, suffix, index)
+    fit_gaussian(samples, absolute, components, svg, verbose, center, cmin, cmax, amp, amin, sigma, smin, suffix, index, jobs, batch, plots)
 
 
-def fit_gaussian(samples='samples.txt', absolute=False, components=False, svg=False, verbose=False, center=None, cmin=None, cmax=None, amp=None, amin=None, sigma=None, smin=None, suffix=None, index=None):
+def fit_gaussian(samples='samples.txt', absolute=False, components=False, svg=False, verbose=False, center=None, cmin=None, cmax=None, amp=None, amin=None, sigma=None, smin=None, suffix=None, index=None, jobs=None, batch=False, plots=Plot.INLINE):
     '''Fits gaussian curve to dyad coverage.'''
     sample_names = Parser.first(samples)
     if index != None:
         sample_names = [sample_names[index]]
-    for sample in sample_names:
-        fit_gaussian_sample(sample, absolute, components, svg, verbose, center, cmin, cmax, amp, amin, sigma, smin, suffix)
-        splits = sb.splits(sample)
-        for split in splits:
-            fit_gaussian_sample(split, absolute, components, svg, verbose, center, cmin, cmax, amp, amin, sigma, smin, suffix)
+    with Plot.rendering():
+        if batch:
+            for sample in sample_names:
+                fit_gaussian_batch(sample, absolute, components, svg, verbose, center, cmin, cmax, amp, amin, sigma, smin, suffix, jobs, plots)
+        elif jobs is not None and jobs > 1:
+            Jobs.run(fit_gaussian_sample, [(name, absolute, components, svg, verbose, center, cmin, cmax, amp, amin, sigma, smin, suffix, plots) for name in Jobs.with_splits(sample_names)], jobs)
+        else:
+            for sample in sample_names:
+                fit_gaussian_sample(sample, absolute, components, svg, verbose, center, cmin, cmax, amp, amin, sigma, smin, suffix, plots)
+                splits = sb.splits(sample)
+                for split in splits:
+                    fit_gaussian_sample(split, absolute, components, svg, verbose, center, cmin, cmax, amp, amin, sigma, smin, suffix, plots)
 
 
-def fit_gaussian_sample(sample, absolute=False, components=False, svg=False, verbose=False, center=None, cmin=None, cmax=None, amp=None, amin=None, sigma=None, smin=None, suffix=None):
+def fit_gaussian_sample(sample, absolute=False, components=False, svg=False, verbose=False, center=None, cmin=None, cmax=None, amp=None, amin=None, sigma=None, smin=None, suffix=None, plots=Plot.INLINE):
     '''Fits gaussian curve to dyad coverage for a single sample.'''
     print ('Fits gaussian curve to dyad coverage of sample {}'.format(sample))
-    input = sample + (suffix if suffix else '') + '-dyad.txt'
-    dyads = pd.read_csv(input, sep='\t', index_col=0, comment='#')
-    x = dyads.index.values
-    yheader = 'Frequency' if absolute else 'Relative Frequency'
-    y = dyads[yheader].values
-    if not amp:
-        amp = dyads[yheader].max() * 100
-    if not center:
-        center = 0.0
-    if not sigma:
-        sigma = dyads.index.max() / 2
-    plt.figure()
-    plt.title(sample)
-    plt.xlabel('Position relative to dyad (bp)')
-    plt.ylabel('Frequency' if absolute else 'Relative Frequency')
-    plt.xlim(x[0], x[len(x) - 1])
-    plt.xticks(list(range(x[0], x[len(x) - 1] + 1, 25)))
-    plt.plot(x, y, color='red')
+    x, y = Fit.read_dyads(sample, absolute, suffix)
+    fit = fit_dyads(sample, x, y, initial_values(x, y, center, amp, sigma), bounds(cmin, cmax, amin, smin))
+    if verbose and fit:
+        print(fit['report'])
+    plot_gaussian(sample, x, y, fit, absolute, components, svg, suffix, plots)
+
+
+def fit_gaussian_batch(sample, absolute=False, components=False, svg=False, verbose=False, center=None, cmin=None, cmax=None, amp=None, amin=None, sigma=None, smin=None, suffix=None, jobs=None, plots=Plot.INLINE):
+    '''Fits gaussian curve to dyad coverage for a sample and its splits, and saves fitted parameters in a single table.
+
+    The fit of each split starts from the parameters of the previous split. When jobs is greater than 1,
+    splits are fitted in parallel starting from the parameters of the sample.'''
+    Fit.fit_batch(sample, 'gaussian', fit_dyads, functools.partial(initial_values, center=center, amp=amp, sigma=sigma), bounds(cmin, cmax, amin, smin),
+                  functools.partial(plot_gaussian, absolute=absolute, components=components, svg=svg, suffix=suffix, plots=plots), absolute, verbose, suffix, jobs,
+                  {'g_center': center, 'g_amplitude': amp, 'g_sigma': sigma})
+
+
+def initial_values(x, y, center=None, amp=None, sigma=None):
+    '''Returns initial values of parameters, using defaults based on dyad coverage for missing values.'''
+    return {'c_c': y.min(), 'g_center': center if center else 0.0, 'g_sigma': sigma if sigma else x.max() / 2,
+            'g_amplitude': amp if amp else y.max() * 100}
+
+
+def bounds(cmin=None, cmax=None, amin=None, smin=None):
+    '''Returns minimum and maximum values of parameters.'''
+    return {'g_center': (cmin, cmax), 'g_sigma': (smin, None), 'g_amplitude': (amin, None)}
+
+
+@functools.lru_cache(maxsize=None)
+def gaussian_model():
+    '''Returns gaussian model with a constant, the model is created once per process.'''
+    from lmfit.models import GaussianModel, ConstantModel  # lmfit imports matplotlib
+    return ConstantModel(prefix='c_') + GaussianModel(prefix='g_')
+
+
+def fit_dyads(sample, x, y, values, bounds):
+    '''Fits gaussian curve to dyad coverage starting from values.
+
+    Returns fitted values, curves and fit report, or None if fit failed.'''
+    return Fit.fit_model(sample, x, y, values, bounds, gaussian_model(), 'gaussian')
+
+
+def plot_gaussian(sample, x, y, fit, absolute=False, components=False, svg=False, suffix=None, plots=Plot.INLINE):
+    '''Saves plot of dyad coverage and fitted gaussian curve.'''
+    spec = Plot.figure(sample, 'Position relative to dyad (bp)', 'Frequency' if absolute else 'Relative Frequency', x)
+    Plot.plot(spec, x, y, color='red')
     plot_output = sample + (suffix if suffix else '') + '-dyad-gaussian.png'
-    try:
-        constant = ConstantModel(prefix='c_')
-        pars = constant.make_params()
-        pars['c_c'].set(value=dyads[yheader].min(), min=0.0, max=dyads[yheader].max())
-        gauss = GaussianModel(prefix='g_')
-        pars.update(gauss.make_params())
-        pars['g_center'].set(value=center, min=cmin, max=cmax)
-        pars['g_sigma'].set(value=sigma, min=smin)
-        pars['g_amplitude'].set(value=amp, min=amin)
-        mod = constant + gauss
-        init = mod.eval(pars, x=x)
-        out = mod.fit(y, pars, x=x)
+    if fit:
         if components:
-            plt.plot(x, init, 'b--', label='Initial fit')
-        if verbose:
-            print(out.fit_report(min_correl=0.5))
-        plt.plot(x, out.best_fit, 'b-', label='Best fit')
+            Plot.plot(spec, x, fit['init'], 'b--', label='Initial fit')
+        Plot.plot(spec, x, fit['best_fit'], 'b-', label='Best fit')
         if components:
-            comps = out.eval_components(x=x)
-            plt.plot(x, np.repeat(comps['c_'], len(x)), 'g--', label='Constant component')
-            plt.plot(x, comps['g_'], 'm--', label='Gaussian component')
-    except Exception as e:
-        logging.warning('could not fit gaussian curve to sample {}'.format(sample), e)
+            comps = fit['components']
+            Plot.plot(spec, x, np.broadcast_to(comps['c_'], np.shape(x)), 'g--', label='Constant component')
+            Plot.plot(spec, x, comps['g_'], 'm--', label='Gaussian component')
     if components:
-        plt.legend(loc='lower right')
-    plt.savefig(plot_output)
+        Plot.legend(spec, 'lower right')
+    Plot.savefig(spec, plot_output)
     if svg:
         plot_svg_output = sample + (suffix if suffix else '') + '-dyad-gaussian.svg'
-        plt.savefig(plot_svg_output, transparent=True)
-    plt.close()
+        Plot.savefig(spec, plot_svg_output, transparent=True)
+    Plot.render(spec, plots)
 
 
 if __name__ == '__main__':
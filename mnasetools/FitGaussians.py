@@ -1,12 +1,10 @@
 import logging
 
 import click
-from lmfit.models import GaussianModel, ConstantModel
 
-import matplotlib.pyplot as plt
-import matplotlib.cm as cm
 import numpy as np
 import pandas as pd
+from mnasetools.plot import Plot
 from robtools.txt import Parser
 
 
@@ -37,23 +35,26 @@ from robtools.txt import Parser
               help='Suffix to append to sample name.')
 @click.option('--index', '-i', type=int, default=None,
               help='Index of sample to process in samples file.')
-def fitgaussians(samples, components, gaussian, svg, verbose, curves, count, amin, amax, smin, smax, suffix, index):
+@Plot.plots_option
+def fitgaussians(samples, components, gaussian, svg, verbose, curves, count, amin, amax, smin, smax, suffix, index, plots):
     """Fits multiple gaussian curves to dyad coverage."""
     logging.basicConfig(filename='robtools.log', level=logging.DEBUG, format='%(asctime)s %(levelname)-8s %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
-    fit_gaussians(samples, components, gaussian, svg, verbose, curves, count, amin, amax, smin, smax, suffix, index)
+    fit_gaussians(samples, components, gaussian, svg, verbose, curves, count, amin, amax, smin, smax, suffix, index, plots)
 
 
-def fit_gaussians(samples='samples.txt', components=False, gaussian=False, svg=False, verbose=False, curves=False, count=1, amin=None, amax=None, smin=None, smax=None, suffix=None, index=None):
+def fit_gaussians(samples='samples.txt', components=False, gaussian=False, svg=False, verbose=False, curves=False, count=1, amin=None, amax=None, smin=None, smax=None, suffix=None, index=None, plots=Plot.INLINE):
     """Fits multiple gaussian curves to dyad coverage."""
     sample_names = Parser.first(samples)
     if index is not None:
         sample_names = [sample_names[index]]
-    for sample in sample_names:
-        fit_gaussians_sample(sample, components, gaussian, svg, verbose, curves, count, amin, amax, smin, smax, suffix)
+    with Plot.rendering():
+        for sample in sample_names:
+            fit_gaussians_sample(sample, components, gaussian, svg, verbose, curves, count, amin, amax, smin, smax, suffix, plots)
 
 
-def fit_gaussians_sample(sample, components=False, gaussian=False, svg=False, verbose=False, curves=False, count=1, amin=None, amax=None, smin=None, smax=None, suffix=None):
+def fit_gaussians_sample(sample, components=False, gaussian=False, svg=False, verbose=False, curves=False, count=1, amin=None, amax=None, smin=None, smax=None, suffix=None, plots=Plot.INLINE):
     """Fits multiple gaussian curves to dyad coverage for a single sample."""
+    from lmfit.models import GaussianModel, ConstantModel  # lmfit imports matplotlib
     print('Fits {} gaussian curves to dyad coverage of sample {}'.format(count, sample))
     input = sample + (suffix if suffix else '') + '.txt'
     data = pd.read_csv(input, sep='\t', index_col=0, comment='#')
@@ -62,13 +63,8 @@ def fit_gaussians_sample(sample, components=False, gaussian=False, svg=False, ve
     y = data[yheader].values
     amp = data[yheader].max() * 100 / count
     sigma = (data.index.max() - data.index.min()) / 2 / count
-    plt.figure()
-    plt.title(sample)
-    plt.xlabel('Position relative to dyad (bp)')
-    plt.ylabel('Frequency')
-    plt.xlim(x[0], x[len(x) - 1])
-    plt.xticks(list(range(x[0], x[len(x) - 1] + 1, 25)))
-    plt.plot(x, y, color='red')
+    spec = Plot.figure(sample, 'Position relative to dyad (bp)', 'Frequency', x)
+    Plot.plot(spec, x, y, color='red')
     plot_output = sample + (suffix if suffix else '') + '-' + str(count) + 'gaussians.png'
     try:
         constant = ConstantModel(prefix='c_')
@@ -117,34 +113,32 @@ def fit_gaussians_sample(sample, components=False, gaussian=False, svg=False, ve
                     cxyo.write('\t'.join([str(e) for e in columns]))
                     cxyo.write('\n')
         if components:
-            plt.plot(x, init, 'b--', label='Initial fit')
+            Plot.plot(spec, x, init, 'b--', label='Initial fit')
         if verbose:
             print(out.fit_report(min_correl=0.5))
-        plt.plot(x, out.best_fit, 'b-', label='Best fit')
+        Plot.plot(spec, x, out.best_fit, 'b-', label='Best fit')
         if gaussian:
             comps = out.eval_components(x=x)
             constant_y = comps['c_']
-            colors = cm.get_cmap('hsv', count+1)(np.linspace(0, 1.0, count+1))
             for i in range(0, count):
                 prefix = 'g' + str(i) + '_'
-                plt.plot(x, [yv + constant_y for yv in comps[prefix]], color=colors[i], linestyle='dashed',
-                         label='Gaussian ' + str(i))
+                Plot.plot(spec, x, comps[prefix] + constant_y, cmap=('hsv', count+1, i), linestyle='dashed',
+                          label='Gaussian ' + str(i))
         if components:
             comps = out.eval_components(x=x)
-            plt.plot(x, np.repeat(comps['c_'], len(x)), 'k--', label='Constant component')
-            colors = cm.get_cmap('hsv', count+1)(np.linspace(0, 1.0, count+1))
+            Plot.plot(spec, x, np.broadcast_to(comps['c_'], np.shape(x)), 'k--', label='Constant component')
             for i in range(0, count):
                 prefix = 'g' + str(i) + '_'
-                plt.plot(x, comps[prefix], color=colors[i], linestyle='dashed', label='Gaussian component ' + str(i))
+                Plot.plot(spec, x, comps[prefix], cmap=('hsv', count+1, i), linestyle='dashed', label='Gaussian component ' + str(i))
     except Exception as e:
         logging.warning('could not fit gaussian curves to sample {}'.format(sample), e)
     if components:
-        plt.legend(loc='lower right')
-    plt.savefig(plot_output)
+        Plot.legend(spec, 'lower right')
+    Plot.savefig(spec, plot_output)
     if svg:
         plot_svg_output = sample + (suffix if suffix else '') + '-dyad-gaussian.svg'
-        plt.savefig(plot_svg_output, transparent=True)
-    plt.close()
+        Plot.savefig(spec, plot_svg_output, transparent=True)
+    Plot.render(spec, plots)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,90 @@
+import logging
+
+import pandas as pd
+import robtools.Split as sb
+from robtools.jobs import Jobs
+
+
+def read_dyads(sample, absolute=False, suffix=None):
+    '''Returns positions and frequencies of dyad coverage.'''
+    input = sample + (suffix if suffix else '') + '-dyad.txt'
+    dyads = pd.read_csv(input, sep='\t', index_col=0, comment='#')
+    yheader = 'Frequency' if absolute else 'Relative Frequency'
+    return dyads.index.values, dyads[yheader].values
+
+
+def fit_model(sample, x, y, values, bounds, model, curve):
+    '''Fits model to dyad coverage starting from values, model must have a constant component with prefix c_.
+
+    Returns fitted values, curves and fit report, or None if fit failed.'''
+    try:
+        pars = model.make_params()
+        pars['c_c'].set(value=values['c_c'], min=0.0, max=y.max())
+        for name, (minimum, maximum) in bounds.items():
+            pars[name].set(value=values[name], min=minimum, max=maximum)
+        init = model.eval(pars, x=x)
+        out = model.fit(y, pars, x=x)
+        return {'values': out.params.valuesdict(), 'init': init, 'best_fit': out.best_fit,
+                'components': out.eval_components(x=x), 'report': out.fit_report(min_correl=0.5), 'redchi': out.redchi}
+    except Exception as e:
+        logging.warning('could not fit {} curve to sample {}: {}'.format(curve, sample, e))
+        return None
+
+
+def fit_row(sample, fit):
+    '''Returns row of fitted parameters table.'''
+    row = {'Sample': sample}
+    if fit:
+        row.update(fit['values'])
+        row['Reduced chi-square'] = fit['redchi']
+    return row
+
+
+def fit_batch(sample, curve, fit, initial, bounds, plot, absolute=False, verbose=False, suffix=None, jobs=None, explicit=None):
+    '''Fits curve to dyad coverage for a sample and its splits, and saves fitted parameters in a single table.
+
+    fit is called with the name, positions, frequencies, initial values and bounds and returns the fit.
+    initial is called with positions and frequencies and returns default initial values.
+    plot is called with the name, positions, frequencies and fit.
+    explicit contains the initial values given by the user, None values are ignored.
+    The fit of each split starts from the parameters of the previous split. When jobs is greater than 1,
+    splits are fitted in parallel starting from the parameters of the sample. Explicit values are always kept.'''
+    print ('Fits {} curve to dyad coverage of sample {} and its splits'.format(curve, sample))
+    explicit = {name: value for name, value in (explicit or {}).items() if value is not None}
+    names = [sample] + sb.splits(sample)
+    dyads = [read_dyads(name, absolute, suffix) for name in names]
+    x, y = dyads[0]
+    fits = [fit(sample, x, y, initial(x, y), bounds)]
+    if jobs is not None and jobs > 1:
+        fits.extend(Jobs.run(fit, [(name, sx, sy, warm_start(sx, sy, fits[0], y, initial, explicit, absolute), bounds) for name, (sx, sy) in zip(names[1:], dyads[1:])], jobs))
+    else:
+        previous, previous_y = fits[0], y
+        for name, (x, y) in zip(names[1:], dyads[1:]):
+            result = fit(name, x, y, warm_start(x, y, previous, previous_y, initial, explicit, absolute), bounds)
+            if result:
+                previous, previous_y = result, y
+            fits.append(result)
+    rows = []
+    for name, (x, y), result in zip(names, dyads, fits):
+        if verbose and result:
+            print(result['report'])
+        plot(name, x, y, result)
+        rows.append(fit_row(name, result))
+    table_output = sample + (suffix if suffix else '') + '-dyad-' + curve.replace(' ', '-') + '.txt'
+    pd.DataFrame(rows).to_csv(table_output, sep='\t', index=False)
+
+
+def warm_start(x, y, previous, previous_y, initial, explicit, absolute=False):
+    '''Returns initial values seeded with the values of previous fit, or default initial values if previous fit is None.
+
+    Only parameters missing from explicit are seeded. With absolute frequencies, the constant and amplitudes of
+    previous fit are scaled by the ratio of total frequencies.'''
+    values = dict(initial(x, y))
+    if previous:
+        scale = y.sum() / previous_y.sum() if absolute and previous_y.sum() else 1.0
+        for name in values:
+            if name in explicit or name not in previous['values']:
+                continue
+            value = previous['values'][name]
+            values[name] = value * scale if name == 'c_c' or name.endswith('amplitude') else value
+    return values
@@ -1,19 +1,21 @@
 import click
 
-from mnasetools import DyadCoverage, DyadStatistics, FitDoubleGaussian, FitGaussian, FitGaussians, FirstDyadPosition
+from robtools.cli.LazyGroup import LazyGroup
 
+COMMANDS = {
+    'dyadcov': 'mnasetools.DyadCoverage.dyadcov',
+    'dyadstatistics': 'mnasetools.DyadStatistics.dyadstatistics',
+    'fitdoublegaussian': 'mnasetools.FitDoubleGaussian.fitdoublegaussian',
+    'fitgaussian': 'mnasetools.FitGaussian.fitgaussian',
+    'fitgaussians': 'mnasetools.FitGaussians.fitgaussians',
+    'firstdyadposition': 'mnasetools.FirstDyadPosition.firstdyadposition',
+}
 
-@click.group()
+
+@click.group(cls=LazyGroup, lazy_commands=COMMANDS)
 def mnasetools():
     pass
 
 
-mnasetools.add_command(DyadCoverage.dyadcov)
-mnasetools.add_command(DyadStatistics.dyadstatistics)
-mnasetools.add_command(FitDoubleGaussian.fitdoublegaussian)
-mnasetools.add_command(FitGaussian.fitgaussian)
-mnasetools.add_command(FitGaussians.fitgaussians)
-mnasetools.add_command(FirstDyadPosition.firstdyadposition)
-
 if __name__ == '__main__':
    mnasetools()
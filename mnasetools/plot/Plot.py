@@ -0,0 +1,132 @@
+import functools
+import multiprocessing
+from contextlib import contextmanager
+
+import click
+
+INLINE = 'inline'
+DEFERRED = 'deferred'
+NONE = 'none'
+XTICKS_STEP = 25
+
+plots_option = click.option('--plots', type=click.Choice([INLINE, DEFERRED, NONE]), default=INLINE, show_default=True,
+                            help='Render plots while processing samples (inline), in separate processes (deferred) or not at all (none).')
+
+pending = []
+pool = None
+
+
+def figure(title, xlabel, ylabel, x):
+    '''Returns specification of a figure that shows values along positions x.'''
+    return {'title': title, 'xlabel': xlabel, 'ylabel': ylabel, 'xlim': (x[0], x[len(x) - 1]),
+            'xticks': list(range(x[0], x[len(x) - 1] + 1, XTICKS_STEP)), 'lines': [], 'legend': None, 'outputs': []}
+
+
+def plot(spec, x, y, fmt=None, cmap=None, **kwargs):
+    '''Adds line to figure specification.
+
+    cmap is a tuple (colormap name, number of colors, color index) used to pick the color of the line.'''
+    spec['lines'].append((x, y, fmt, cmap, kwargs))
+
+
+def legend(spec, loc):
+    '''Adds legend to figure specification.'''
+    spec['legend'] = loc
+
+
+def savefig(spec, output, **kwargs):
+    '''Adds output file to figure specification.'''
+    spec['outputs'].append((output, kwargs))
+
+
+def render(spec, plots=INLINE):
+    '''Renders figure now, queues it for rendering in separate processes or skips it, depending on plots.'''
+    global pool
+    if plots == NONE:
+        return
+    if plots == DEFERRED and not multiprocessing.current_process().daemon:
+        if pool is None:
+            pool = multiprocessing.Pool(initializer=canvas.cache_clear)
+        pending.append(pool.apply_async(draw, (spec,)))
+    else:
+        draw(spec)
+
+
+def finish():
+    '''Waits for queued figures to be rendered.
+
+    The error of the first figure that failed, if any, is raised once all figures are rendered.'''
+    global pool
+    if pool is None:
+        return
+    results = list(pending)
+    pending.clear()
+    pool.close()
+    pool.join()
+    pool = None
+    for result in results:
+        result.get()
+
+
+def abort():
+    '''Discards queued figures and stops the processes rendering them.'''
+    global pool
+    pending.clear()
+    if pool is None:
+        return
+    pool.terminate()
+    pool.join()
+    pool = None
+
+
+@contextmanager
+def rendering():
+    '''Waits for figures queued in the block to be rendered once the block completes.
+
+    If the block raises an error, queued figures are discarded instead.'''
+    try:
+        yield
+    except BaseException:
+        abort()
+        raise
+    finish()
+
+
+@functools.lru_cache(maxsize=None)
+def canvas():
+    '''Returns figure used to draw plots, the figure is created once per process.
+
+    matplotlib is only imported when the first plot is drawn and always uses the Agg backend.'''
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib.figure import Figure
+    return Figure()
+
+
+def colormap(name, count):
+    '''Returns colormap with count colors.'''
+    import matplotlib
+    return matplotlib.colormaps[name].resampled(count)
+
+
+def draw(spec):
+    '''Draws figure from specification and saves it to output files.'''
+    fig = canvas()
+    fig.clear()
+    ax = fig.add_subplot()
+    ax.set_title(spec['title'])
+    ax.set_xlabel(spec['xlabel'])
+    ax.set_ylabel(spec['ylabel'])
+    ax.set_xlim(*spec['xlim'])
+    ax.set_xticks(spec['xticks'])
+    for x, y, fmt, cmap, kwargs in spec['lines']:
+        if cmap:
+            kwargs = dict(kwargs, color=colormap(cmap[0], cmap[1])(cmap[2]))
+        if fmt:
+            ax.plot(x, y, fmt, **kwargs)
+        else:
+            ax.plot(x, y, **kwargs)
+    if spec['legend']:
+        ax.legend(loc=spec['legend'])
+    for output, kwargs in spec['outputs']:
+        fig.savefig(output, **kwargs)
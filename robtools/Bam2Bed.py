@@ -1,11 +1,13 @@
+import heapq
 import logging
+import multiprocessing
 import os
 import subprocess
 import tempfile
 
 import click
+import pysam
 
-from robtools.bam import Bam
 from robtools.bed import Bed
 from robtools.txt import Parser
 
@@ -14,7 +16,7 @@ from robtools.txt import Parser
 @click.option('--samples', '-s', type=click.Path(exists=True), default='samples.txt', show_default=True,
               help='Sample names listed one sample name by line.')
 @click.option('--paired/--unpaired', '-p/-u', default=True, show_default=True,
-              help='Sample reads are paired')
+              help='Sample reads are paired, pairs with mates on different chromosomes are dropped.')
 @click.option('--threads', '-t', default=1, show_default=True,
               help='Number of threads used to process data per sample.')
 @click.option('--input-suffix', '-is', default='-dedup', show_default=True,
@@ -23,34 +25,36 @@ from robtools.txt import Parser
               help='Suffix added to sample name in BED filename for output.')
 @click.option('--index', '-i', type=int, default=None,
               help='Index of sample to process in samples file.')
-def bam2bed(samples, paired, threads, input_suffix, output_suffix, index):
+@click.option('--cache/--no-cache', default=False, show_default=True,
+              help='Write binary cache of BED next to BED to skip parsing BED in later steps.')
+def bam2bed(samples, paired, threads, input_suffix, output_suffix, index, cache):
     '''Converts BAM file to BED for samples.'''
     logging.basicConfig(filename='robtools.log', level=logging.DEBUG, format='%(asctime)s %(levelname)-8s %(message)s',
                         datefmt='%Y-%m-%d %H:%M:%S')
-    bam2bed_samples(samples, paired, threads, input_suffix, output_suffix, index)
+    bam2bed_samples(samples, paired, threads, input_suffix, output_suffix, index, cache)
 
 
-def bam2bed_samples(samples='samples.txt', paired=True, threads=None, input_suffix='', output_suffix='', index=None):
+def bam2bed_samples(samples='samples.txt', paired=True, threads=None, input_suffix='', output_suffix='', index=None,
+                    cache=False):
     '''Converts BAM file to BED for samples.'''
     sample_names = Parser.first(samples)
     if index != None:
         sample_names = [sample_names[index]]
     for sample in sample_names:
-        bam2bed_sample(sample, paired, threads, input_suffix, output_suffix)
+        bam2bed_sample(sample, paired, threads, input_suffix, output_suffix, cache)
 
 
-def bam2bed_sample(sample, paired, threads=None, input_suffix='', output_suffix=''):
+def bam2bed_sample(sample, paired, threads=None, input_suffix='', output_suffix='', cache=False):
     '''Converts BAM file to BED for a single sample.'''
     print('Converting BAM to BED for sample {}'.format(sample))
     bam = sample + input_suffix + '.bam'
     bed = sample + output_suffix + '.bed'
     if paired:
-        bedpe_o, bedpe = tempfile.mkstemp(suffix='.bedpe')
-        bam2bedpe(bam, bedpe, threads)
-        bedpe2bed(bedpe, bed)
-        os.remove(bedpe)
+        bam2fragments(bam, bed, threads)
     else:
         bam2bed_unpaired(bam, bed)
+    if cache:
+        Bed.write_cache(bed)
 
 
 def bam2bed_unpaired(bam, bed):
@@ -64,49 +68,82 @@ def bam2bed_unpaired(bam, bed):
     os.remove(conversion_output)
 
 
-def bam2bedpe(bam, bedpe, threads=None):
-    '''Converts BAM file to BEDPE.'''
-    print('Converting BAM {} to BEDPE {}'.format(bam, bedpe))
-    sort_output_o, sort_output = tempfile.mkstemp(suffix='.bam')
-    Bam.sort_by_readname(bam, sort_output, threads)
-    cmd = ['bedtools', 'bamtobed', '-bedpe', '-mate1', '-i', sort_output]
-    logging.debug('Running {}'.format(cmd))
-    with open(bedpe, 'w') as outfile:
-        subprocess.run(cmd, stdout=outfile, check=True)
-    os.remove(sort_output)
-
-
-def bedpe2bed(bedpe, bed):
-    '''Converts BEDPE file to BED by merging the paired reads.'''
-    print('Converting BAM BEDPE {} to BED {} by merging the paired reads'.format(bedpe, bed))
-    merge_output_o, merge_output = tempfile.mkstemp(suffix='.bed')
-    with open(bedpe, 'r') as infile:
-        with open(merge_output_o, 'w') as outfile:
-            for line in infile:
-                if line.startswith('track') or line.startswith('browser') or line.startswith('#'):
-                    outfile.write(line)
-                    continue
-                columns = line.rstrip('\r\n').split('\t')
-                start1 = int(columns[1])
-                end1 = int(columns[2])
-                start2 = int(columns[4])
-                end2 = int(columns[5])
-                start = min(start1, start2)
-                end = max(end1, end2)
-                outfile.write(columns[0])
-                outfile.write('\t')
-                outfile.write(str(start))
-                outfile.write('\t')
-                outfile.write(str(end))
-                for i in range(6, 9):
-                    outfile.write('\t')
-                    outfile.write(columns[i])
-                for i in range(10, len(columns)):
-                    outfile.write('\t')
-                    outfile.write(columns[i])
-                outfile.write('\n')
-    Bed.sort(merge_output, bed)
-    os.remove(merge_output)
+def bam2fragments(bam, bed, threads=None):
+    '''Converts coordinate sorted BAM file to BED by merging the paired reads, BED is sorted.
+
+    Pairs with mates mapped on different chromosomes are dropped, their number is logged for each chromosome.'''
+    print('Converting BAM {} to BED {} by merging the paired reads'.format(bam, bed))
+    with pysam.AlignmentFile(bam, 'rb') as inbam:
+        has_index = inbam.has_index()
+        references = sorted(inbam.references)
+    if not has_index:
+        logging.debug('Indexing BAM {}'.format(bam))
+        pysam.index(bam)
+    if threads is None or threads <= 1:
+        with open(bed, 'w') as outfile:
+            for reference in references:
+                outfile.writelines(reference_fragments(bam, reference))
+        return
+    with tempfile.TemporaryDirectory() as folder:
+        reference_beds = [os.path.join(folder, str(i) + '.bed') for i in range(0, len(references))]
+        with multiprocessing.Pool(processes=threads) as pool:
+            pool.starmap(reference_fragments_bed, zip([bam] * len(references), references, reference_beds))
+        with open(bed, 'w') as outfile:
+            for reference_bed in reference_beds:
+                with open(reference_bed, 'r') as infile:
+                    outfile.writelines(infile)
+
+
+def reference_fragments_bed(bam, reference, bed):
+    '''Writes fragments of paired reads located on reference to BED.'''
+    with open(bed, 'w') as outfile:
+        outfile.writelines(reference_fragments(bam, reference))
+
+
+def reference_fragments(bam, reference):
+    '''Yields BED lines of fragments of paired reads located on reference, sorted by start and end.
+
+    Pairs with mates mapped on different chromosomes are dropped.'''
+    pending = {}
+    fragments = []
+    interchromosomal = 0
+    with pysam.AlignmentFile(bam, 'rb') as inbam:
+        for aln in inbam.fetch(reference):
+            if (not aln.is_paired or aln.is_unmapped or aln.mate_is_unmapped or aln.is_secondary
+                    or aln.is_supplementary):
+                continue
+            if aln.next_reference_id != aln.reference_id:
+                interchromosomal += aln.is_read1
+                continue
+            read = (aln.reference_start, aln.reference_end, aln.mapping_quality, aln.is_read1, aln.is_reverse,
+                    aln.next_reference_start)
+            mate = pending.pop(aln.query_name, None)
+            if mate is None:
+                pending[aln.query_name] = read
+            else:
+                heapq.heappush(fragments, fragment(reference, aln.query_name, read, mate))
+            position = aln.reference_start
+            # Reads with a mate that should already have been seen are missing their mate.
+            while pending and next(iter(pending.values()))[5] < position:
+                del pending[next(iter(pending))]
+            threshold = next(iter(pending.values()))[0] if pending else position
+            while fragments and fragments[0][0] < threshold:
+                yield heapq.heappop(fragments)[2]
+    while fragments:
+        yield heapq.heappop(fragments)[2]
+    if interchromosomal:
+        logging.warning('Dropped {} inter-chromosomal pairs with read 1 on {} in BAM {}'.format(interchromosomal, reference,
+                                                                                             bam))
+
+
+def fragment(reference, name, read, mate):
+    '''Returns start, end and BED line of fragment of paired reads.'''
+    start = min(read[0], mate[0])
+    end = max(read[1], mate[1])
+    mate1 = read if read[3] else mate
+    score = min(read[2], mate[2])
+    strand = '-' if mate1[4] else '+'
+    return (start, end, '{}\t{}\t{}\t{}\t{}\t{}\n'.format(reference, start, end, name, score, strand))
 
 
 if __name__ == '__main__':
@@ -23,24 +23,32 @@ from robtools.txt import Parser
               help='Suffix added to sample name in BAM filename for output.')
 @click.option('--index', type=int, default=None,
               help='Index of sample to process in samples file.')
+@click.option('--stream/--no-stream', default=False, show_default=True,
+              help='Pipe bowtie2 output directly into samtools sort instead of writing a temporary SAM file.')
+@click.option('--sort-memory', default=None,
+              help='Maximum memory per thread used by samtools sort in streaming mode, like 768M or 2G.')
+@click.option('--sort-threads', type=int, default=None,
+              help='Number of threads used by samtools sort in streaming mode.  [default: --threads]')
 @click.argument('bowtie_args', nargs=-1, type=click.UNPROCESSED)
-def bowtie2(samples, threads, input_suffix, output_suffix, index, bowtie_args):
+def bowtie2(samples, threads, input_suffix, output_suffix, index, stream, sort_memory, sort_threads, bowtie_args):
     '''Align samples using bowtie2 program.'''
     logging.basicConfig(filename='robtools.log', level=logging.DEBUG, format='%(asctime)s %(levelname)-8s %(message)s',
                         datefmt='%Y-%m-%d %H:%M:%S')
-    bowtie_samples(samples, threads, input_suffix, output_suffix, index, bowtie_args)
+    bowtie_samples(samples, threads, input_suffix, output_suffix, index, bowtie_args, stream, sort_memory, sort_threads)
 
 
-def bowtie_samples(samples='samples.txt', threads=None, input_suffix='', output_suffix='', index=None, bowtie_args=()):
+def bowtie_samples(samples='samples.txt', threads=None, input_suffix='', output_suffix='', index=None, bowtie_args=(),
+                   stream=False, sort_memory=None, sort_threads=None):
     '''Align samples using bowtie2 program.'''
     sample_names = Parser.first(samples)
     if index != None:
         sample_names = [sample_names[index]]
     for sample in sample_names:
-        bowtie_sample(sample, threads, input_suffix, output_suffix, bowtie_args)
+        bowtie_sample(sample, threads, input_suffix, output_suffix, bowtie_args, stream, sort_memory, sort_threads)
 
 
-def bowtie_sample(sample, threads=None, input_suffix='', output_suffix='', bowtie_args=()):
+def bowtie_sample(sample, threads=None, input_suffix='', output_suffix='', bowtie_args=(), stream=False,
+                  sort_memory=None, sort_threads=None):
     '''Align one sample using bowtie2 program.'''
     print('Running bowtie2 on sample {}'.format(sample))
     fastq1 = Fastq.fastq(sample + input_suffix, 1)
@@ -49,20 +57,17 @@ def bowtie_sample(sample, threads=None, input_suffix='', output_suffix='', bowti
     fastq2 = Fastq.fastq(sample + input_suffix, 2)
     paired = fastq2 is not None and os.path.isfile(fastq2)
     bam = sample + output_suffix + '.bam'
-    run_bowtie(fastq1, fastq2, bam, threads, bowtie_args)
+    run_bowtie(fastq1, fastq2, bam, threads, bowtie_args, stream, sort_memory, sort_threads)
 
 
-def run_bowtie(fastq1, fastq2, bam_output, threads=None, bowtie_args=()):
+def run_bowtie(fastq1, fastq2, bam_output, threads=None, bowtie_args=(), stream=False, sort_memory=None,
+               sort_threads=None):
     '''Run bowtie2 on FASTQ files.'''
+    if stream:
+        run_bowtie_stream(fastq1, fastq2, bam_output, threads, bowtie_args, sort_memory, sort_threads)
+        return
     sam_output_o, sam_output = tempfile.mkstemp(suffix='.sam')
-    cmd = ['bowtie2'] + list(bowtie_args)
-    if not threads is None and threads > 1:
-        cmd.extend(['-p', str(threads)])
-    cmd.extend(['-S', sam_output])
-    if fastq2 is not None and os.path.isfile(fastq2):
-        cmd.extend(['-1', fastq1, '-2', fastq2])
-    else:
-        cmd.extend(['-U', fastq1])
+    cmd = bowtie_command(fastq1, fastq2, threads, bowtie_args, sam_output)
     logging.debug('Running {}'.format(cmd))
     subprocess.run(cmd, check=True)
     view_bam_o, view_bam = tempfile.mkstemp(suffix='.bam')
@@ -74,6 +79,27 @@ def run_bowtie(fastq1, fastq2, bam_output, threads=None, bowtie_args=()):
     subprocess.run(cmd, check=True)
     os.remove(sam_output)
     Bam.sort(view_bam, bam_output, threads)
+    os.remove(view_bam)
+
+
+def run_bowtie_stream(fastq1, fastq2, bam_output, threads=None, bowtie_args=(), sort_memory=None, sort_threads=None):
+    '''Run bowtie2 on FASTQ files and sort alignments as they are produced, without temporary SAM file.'''
+    cmd = bowtie_command(fastq1, fastq2, threads, bowtie_args)
+    Bam.sort_stream(cmd, bam_output, threads if sort_threads is None else sort_threads, sort_memory)
+
+
+def bowtie_command(fastq1, fastq2, threads=None, bowtie_args=(), sam_output=None):
+    '''Returns bowtie2 command, alignments are written to standard output if sam_output is None.'''
+    cmd = ['bowtie2'] + list(bowtie_args)
+    if not threads is None and threads > 1:
+        cmd.extend(['-p', str(threads)])
+    if sam_output is not None:
+        cmd.extend(['-S', sam_output])
+    if fastq2 is not None and os.path.isfile(fastq2):
+        cmd.extend(['-1', fastq1, '-2', fastq2])
+    else:
+        cmd.extend(['-U', fastq1])
+    return cmd
 
 
 if __name__ == '__main__':
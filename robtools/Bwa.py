@@ -25,25 +25,33 @@ from robtools.txt import Parser
               help='Suffix added to sample name in BAM filename for output.')
 @click.option('--index', type=int, default=None,
               help='Index of sample to process in samples file.')
+@click.option('--stream/--no-stream', default=False, show_default=True,
+              help='Pipe bwa output directly into samtools sort instead of writing a temporary SAM file.')
+@click.option('--sort-memory', default=None,
+              help='Maximum memory per thread used by samtools sort in streaming mode, like 768M or 2G.')
+@click.option('--sort-threads', type=int, default=None,
+              help='Number of threads used by samtools sort in streaming mode.  [default: --threads]')
 @click.argument('bwa_args', nargs=-1, type=click.UNPROCESSED)
-def bwa(samples, fasta, threads, input_suffix, output_suffix, index, bwa_args):
+def bwa(samples, fasta, threads, input_suffix, output_suffix, index, stream, sort_memory, sort_threads, bwa_args):
     '''Align samples using bwa program.'''
     logging.basicConfig(filename='robtools.log', level=logging.DEBUG, format='%(asctime)s %(levelname)-8s %(message)s',
                         datefmt='%Y-%m-%d %H:%M:%S')
-    bwa_samples(samples, fasta, threads, input_suffix, output_suffix, index, bwa_args)
+    bwa_samples(samples, fasta, threads, input_suffix, output_suffix, index, bwa_args, stream, sort_memory,
+                sort_threads)
 
 
 def bwa_samples(samples='samples.txt', fasta='sacCer3.fa', threads=None, input_suffix='', output_suffix='', index=None,
-                bwa_args=()):
+                bwa_args=(), stream=False, sort_memory=None, sort_threads=None):
     '''Align samples using bwa program.'''
     sample_names = Parser.first(samples)
     if index != None:
         sample_names = [sample_names[index]]
     for sample in sample_names:
-        bwa_sample(sample, fasta, threads, input_suffix, output_suffix, bwa_args)
+        bwa_sample(sample, fasta, threads, input_suffix, output_suffix, bwa_args, stream, sort_memory, sort_threads)
 
 
-def bwa_sample(sample, fasta, threads=None, input_suffix='', output_suffix='', bwa_args=()):
+def bwa_sample(sample, fasta, threads=None, input_suffix='', output_suffix='', bwa_args=(), stream=False,
+               sort_memory=None, sort_threads=None):
     '''Align one sample using bwa program.'''
     print('Running BWA on sample {}'.format(sample))
     fastq1 = Fastq.fastq(sample + input_suffix, 1)
@@ -52,7 +60,7 @@ def bwa_sample(sample, fasta, threads=None, input_suffix='', output_suffix='', b
     fastq2 = Fastq.fastq(sample + input_suffix, 2)
     paired = fastq2 is not None and os.path.isfile(fastq2)
     bam = sample + output_suffix + '.bam'
-    run_bwa(fastq1, fastq2, fasta, bam, threads, bwa_args)
+    run_bwa(fastq1, fastq2, fasta, bam, threads, bwa_args, stream, sort_memory, sort_threads)
 
 
 def bwa_index(fasta):
@@ -62,15 +70,14 @@ def bwa_index(fasta):
     subprocess.run(bwa_index_cmd, check=True)
 
 
-def run_bwa(fastq1, fastq2, fasta, bam_output, threads=None, bwa_args=()):
+def run_bwa(fastq1, fastq2, fasta, bam_output, threads=None, bwa_args=(), stream=False, sort_memory=None,
+            sort_threads=None):
     '''Run BWA on FASTQ files.'''
+    if stream:
+        run_bwa_stream(fastq1, fastq2, fasta, bam_output, threads, bwa_args, sort_memory, sort_threads)
+        return
     sam_output_o, sam_output = tempfile.mkstemp(suffix='.sam')
-    cmd = ['bwa', 'mem'] + list(bwa_args)
-    if not threads is None and threads > 1:
-        cmd.extend(['-t', str(threads)])
-    cmd.extend(['-o', sam_output, fasta, fastq1])
-    if fastq2 is not None and os.path.isfile(fastq2):
-        cmd.append(fastq2)
+    cmd = bwa_command(fastq1, fastq2, fasta, threads, bwa_args, sam_output)
     logging.debug('Running {}'.format(cmd))
     subprocess.run(cmd, check=True)
     view_bam_o, view_bam = tempfile.mkstemp(suffix='.bam')
@@ -85,5 +92,24 @@ def run_bwa(fastq1, fastq2, fasta, bam_output, threads=None, bwa_args=()):
     os.remove(view_bam)
 
 
+def run_bwa_stream(fastq1, fastq2, fasta, bam_output, threads=None, bwa_args=(), sort_memory=None, sort_threads=None):
+    '''Run BWA on FASTQ files and sort alignments as they are produced, without temporary SAM file.'''
+    cmd = bwa_command(fastq1, fastq2, fasta, threads, bwa_args)
+    Bam.sort_stream(cmd, bam_output, threads if sort_threads is None else sort_threads, sort_memory)
+
+
+def bwa_command(fastq1, fastq2, fasta, threads=None, bwa_args=(), sam_output=None):
+    '''Returns BWA command, alignments are written to standard output if sam_output is None.'''
+    cmd = ['bwa', 'mem'] + list(bwa_args)
+    if not threads is None and threads > 1:
+        cmd.extend(['-t', str(threads)])
+    if sam_output is not None:
+        cmd.extend(['-o', sam_output])
+    cmd.extend([fasta, fastq1])
+    if fastq2 is not None and os.path.isfile(fastq2):
+        cmd.append(fastq2)
+    return cmd
+
+
 if __name__ == '__main__':
     bwa()
@@ -4,7 +4,10 @@ import subprocess
 
 import click
 
+import numpy as np
 import robtools.Split as sb
+from robtools.bed import Bed
+from robtools.jobs import Jobs
 from robtools.txt import Parser
 
 
@@ -26,17 +29,21 @@ def validate_output_suffix(ctx, param, value):
               help='Suffix added to sample name in BED filename for output.')
 @click.option('--index', '-i', type=int, default=None,
               help='Index of sample to process in samples file.')
-def centerannotations(samples, input_suffix, output_suffix, index):
+@Jobs.jobs_option
+def centerannotations(samples, input_suffix, output_suffix, index, jobs):
     '''Prepare BED file used for genome coverage on samples.'''
     logging.basicConfig(filename='robtools.log', level=logging.DEBUG, format='%(asctime)s %(levelname)-8s %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
-    center_annotations_samples(samples, input_suffix, output_suffix, index)
+    center_annotations_samples(samples, input_suffix, output_suffix, index, jobs)
 
 
-def center_annotations_samples(samples='samples.txt', input_suffix='', output_suffix='-forcov', index=None):
+def center_annotations_samples(samples='samples.txt', input_suffix='', output_suffix='-forcov', index=None, jobs=None):
     '''Prepare BED file used for genome coverage on samples.'''
     sample_names = Parser.first(samples)
     if index != None:
         sample_names = [sample_names[index]]
+    if jobs is not None and jobs > 1:
+        Jobs.run(center_annotations_sample, [(name, input_suffix, output_suffix) for name in Jobs.with_splits(sample_names)], jobs)
+        return
     for sample in sample_names:
         center_annotations_sample_splits(sample, input_suffix, output_suffix)
 
@@ -58,28 +65,14 @@ def center_annotations_sample(sample, input_suffix='', output_suffix='-forcov'):
 
 def center_annotations(bed, output):
     '''Resize annotations to 1 positioned at the center.'''
-    with open(bed, 'r') as infile:
-        with open(output, 'w') as outfile:
-            for line in infile:
-                if line.startswith('track') or line.startswith('browser') or line.startswith('#'):
-                    outfile.write(line)
-                    continue
-                columns = line.rstrip('\r\n').split('\t')
-                if len(columns) >= 3:
-                    start = int(columns[1])
-                    end = int(columns[2])
-                    length = end - start
-                    start = start + int(length / 2)
-                    end = start + 1
-                    outfile.write(columns[0])
-                    outfile.write('\t')
-                    outfile.write(str(start))
-                    outfile.write('\t')
-                    outfile.write(str(end))
-                    for i in range(3, len(columns)):
-                        outfile.write('\t')
-                        outfile.write(columns[i])
-                    outfile.write('\n')
+    Bed.write_chunks(output, (item if isinstance(item, bytes) else center_chunk(item) for item in Bed.chunks(bed)))
+
+
+def center_chunk(chunk):
+    '''Resize annotations of chunk to 1 positioned at the center.'''
+    length = chunk['ends'] - chunk['starts']
+    starts = chunk['starts'] + np.sign(length) * (np.abs(length) // 2)
+    return dict(chunk, starts=starts, ends=starts + 1)
 
 
 if __name__ == '__main__':
@@ -26,31 +26,37 @@ from robtools.txt import Parser
               help='Suffix added to sample name in BAM filename for output.')
 @click.option('--index', '-i', type=int, default=None,
               help='Index of sample to process in samples file.')
-def filterbam(samples, paired, dedup, quality, threads, input_suffix, output_suffix, index):
+@click.option('--fused/--no-fused', default=False, show_default=True,
+              help='Stream filtering, fixmate and sorting through pipes without intermediate BAM files.')
+def filterbam(samples, paired, dedup, quality, threads, input_suffix, output_suffix, index, fused):
     '''Filter BAM file to keep only properly paired reads and remove supplementary alignments and duplicates.'''
     logging.basicConfig(filename='robtools.log', level=logging.DEBUG, format='%(asctime)s %(levelname)-8s %(message)s',
                         datefmt='%Y-%m-%d %H:%M:%S')
-    filter_bam(samples, paired, dedup, quality, threads, input_suffix, output_suffix, index)
+    filter_bam(samples, paired, dedup, quality, threads, input_suffix, output_suffix, index, fused)
 
 
 def filter_bam(samples='samples.txt', paired=True, dedup=True, quality=None, threads=None, input_suffix='',
-               output_suffix='', index=None):
+               output_suffix='', index=None, fused=False):
     '''Filter BAM file to keep only properly paired reads and remove supplementary alignments and duplicates.'''
     sample_names = Parser.first(samples)
     if index != None:
         sample_names = [sample_names[index]]
     for sample in sample_names:
-        filter_bam_sample(sample, paired, dedup, quality, threads, input_suffix, output_suffix)
+        filter_bam_sample(sample, paired, dedup, quality, threads, input_suffix, output_suffix, fused)
 
 
-def filter_bam_sample(sample, paired, dedup, quality=None, threads=None, input_suffix='', output_suffix=''):
+def filter_bam_sample(sample, paired, dedup, quality=None, threads=None, input_suffix='', output_suffix='',
+                      fused=False):
     '''Filter BAM file to keep only properly paired reads and remove supplementary alignments and duplicates.'''
     print('Filtering BAM for sample {}'.format(sample))
     bam = sample + input_suffix + '.bam'
     bam_filtered = sample + output_suffix + '-filtered.bam'
+    bam_dedup = sample + output_suffix + '-dedup.bam'
+    if fused:
+        filter_fused(bam, bam_filtered, bam_dedup if dedup else None, paired, quality, threads)
+        return
     filter_mapped(bam, bam_filtered, paired, quality, threads)
     if dedup:
-        bam_dedup = sample + output_suffix + '-dedup.bam'
         remove_duplicates(bam_filtered, bam_dedup, threads)
 
 
@@ -58,7 +64,51 @@ def filter_mapped(bam_input, bam_output, paired, quality=None, threads=None):
     '''Filter BAM file to remove poorly mapped sequences.'''
     print('Filtering BAM {} to remove poorly mapped sequences'.format(bam_input))
     temp_o, temp = tempfile.mkstemp(suffix='.bam')
-    cmd = ['samtools', 'view', '-b', '-F', '2048', '-F', '256']
+    cmd = view_command(paired, quality, threads)
+    cmd.extend(['-o', temp, bam_input])
+    logging.debug('Running {}'.format(cmd))
+    subprocess.run(cmd, check=True)
+    Bam.sort(temp, bam_output, threads)
+    os.remove(temp)
+
+
+def filter_fused(bam_input, bam_filtered, bam_dedup=None, paired=True, quality=None, threads=None):
+    '''Filter BAM file and remove duplicates by streaming samtools commands through pipes.
+
+    Filtered BAM is coordinate sorted and, when bam_dedup is not None, contains the tags added by samtools fixmate.'''
+    print('Filtering BAM {} to remove poorly mapped sequences and duplicates'.format(bam_input))
+    threads_args = ['--threads', str(threads - 1)] if not threads is None and threads > 1 else []
+    view = view_command(paired, quality, threads, uncompressed=True) + [bam_input]
+    try:
+        if bam_dedup is None:
+            Bam.run_pipeline([view, ['samtools', 'sort'] + threads_args + ['-o', bam_filtered, '-']])
+            return
+        Bam.run_pipeline([view,
+                          ['samtools', 'sort', '-n', '-u'] + threads_args + ['-'],
+                          ['samtools', 'fixmate', '-m', '-u'] + threads_args + ['-', '-'],
+                          ['samtools', 'sort'] + threads_args + ['-o', bam_filtered, '-']])
+    except BaseException:
+        remove_outputs(bam_filtered, bam_filtered + '.bai')
+        raise
+    cmd = ['samtools', 'markdup', '-r'] + threads_args + [bam_filtered, bam_dedup]
+    logging.debug('Running {}'.format(cmd))
+    try:
+        subprocess.run(cmd, check=True)
+    except BaseException:
+        remove_outputs(bam_dedup, bam_dedup + '.bai')
+        raise
+
+
+def remove_outputs(*outputs):
+    '''Removes outputs of a failed command that exist.'''
+    for output in outputs:
+        if os.path.exists(output):
+            os.remove(output)
+
+
+def view_command(paired, quality=None, threads=None, uncompressed=False):
+    '''Returns samtools view command that removes poorly mapped sequences, without input and output.'''
+    cmd = ['samtools', 'view', '-u' if uncompressed else '-b', '-F', '2048', '-F', '256']
     if bool(paired):
         cmd.extend(['-f', '2'])
     else:
@@ -67,11 +117,7 @@ def filter_mapped(bam_input, bam_output, paired, quality=None, threads=None):
         cmd.extend(['-q', str(quality)])
     if not threads is None and threads > 1:
         cmd.extend(['--threads', str(threads - 1)])
-    cmd.extend(['-o', temp, bam_input])
-    logging.debug('Running {}'.format(cmd))
-    subprocess.run(cmd, check=True)
-    Bam.sort(temp, bam_output, threads)
-    os.remove(temp)
+    return cmd
 
 
 def remove_duplicates(bam_input, bam_output, threads=None):
@@ -90,16 +136,13 @@ def remove_duplicates(bam_input, bam_output, threads=None):
     sort_fix_o, sort_fix = tempfile.mkstemp(suffix='.bam')
     Bam.sort(fixmate, sort_fix, threads)
     os.remove(fixmate)
-    markdup_o, markdup = tempfile.mkstemp(suffix='.bam')
     cmd = ['samtools', 'markdup', '-r']
     if not threads is None and threads > 1:
         cmd.extend(['--threads', str(threads - 1)])
-    cmd.extend([sort_fix, markdup])
+    cmd.extend([sort_fix, bam_output])
     logging.debug('Running {}'.format(cmd))
     subprocess.run(cmd, check=True)
     os.remove(sort_fix)
-    Bam.sort(markdup, bam_output, threads)
-    os.remove(markdup)
 
 
 if __name__ == '__main__':
@@ -1,15 +1,22 @@
 import logging
+import math
 import os
 import subprocess
 import tempfile
 
 import click
+import numpy as np
+import pandas as pd
+import pyBigWig as pbw
 
 from robtools import Split
 from robtools.bed import Bed
+from robtools.jobs import Jobs
 from robtools.txt import Parser
 
 BASE_SCALE = 1000000
+NATIVE_ARGS = {'-5', '-3'}
+CHUNK_SIZE = 1000000
 
 
 def validate_output_suffix(ctx, param, value):
@@ -71,9 +78,13 @@ def validate_spike_control_suffix(ctx, param, value):
 @click.option('--spike-control-suffix', callback=validate_spike_control_suffix, default=None,
               help='Suffix added to sample name of BED file containing control(input) spiked reads.')
 @click.option('--index', '-i', type=int, default=None, help='Index of sample to process in samples file.')
+@click.option('--single-pass/--no-single-pass', default=False, show_default=True,
+              help='Compute coverage of sample and all its splits while reading sample\'s BED only once. '
+                   'Ignored when --input-suffix is used.')
+@Jobs.jobs_option
 @click.argument('genomecov_args', nargs=-1, type=click.UNPROCESSED)
 def genomecov(samples, genome, scale, strand, input_suffix, output_suffix, spike_suffix, control_suffix,
-              spike_control_suffix, index, genomecov_args):
+              spike_control_suffix, index, single_pass, jobs, genomecov_args):
     '''
     Compute genome coverage on samples.
 
@@ -86,32 +97,54 @@ def genomecov(samples, genome, scale, strand, input_suffix, output_suffix, spike
           1000000 / spiked reads.
         - If --spike-suffix, --control-suffix and --spike-control-suffix are present, scaling becomes
           1000000 * control spiked reads / (spiked reads * control reads).
+    \b
+    - Single pass:
+        \b
+        - Splits are computed from the length of reads in the sample's BED
+          instead of reading the BED of each split.
     '''
     logging.basicConfig(filename='robtools.log', level=logging.DEBUG, format='%(asctime)s %(levelname)-8s %(message)s',
                         datefmt='%Y-%m-%d %H:%M:%S')
     genome_coverage_samples(samples, genome, scale, strand, input_suffix, output_suffix, spike_suffix, control_suffix,
-                            spike_control_suffix, index, genomecov_args)
+                            spike_control_suffix, index, genomecov_args, single_pass, jobs)
 
 
 def genome_coverage_samples(samples='samples.txt', genome='sacCer3.chrom.sizes', scale=None, strand=None,
                             input_suffix='', output_suffix='-cov', spike_suffix=None, control_suffix=None,
-                            spike_control_suffix=None, index=None, genomecov_args=()):
+                            spike_control_suffix=None, index=None, genomecov_args=(), single_pass=False, jobs=None):
     '''Compute genome coverage on samples.'''
     sample_names = Parser.first(samples)
     if index != None:
         sample_names = [sample_names[index]]
+    if jobs is not None and jobs > 1 and single_pass and single_pass_supported(input_suffix, genomecov_args):
+        Jobs.run(sample_splits_genome_coverage,
+                 [(sample, genome, scale, strand, input_suffix, output_suffix, spike_suffix, control_suffix,
+                   spike_control_suffix, genomecov_args, single_pass) for sample in sample_names], jobs)
+        return
+    if jobs is not None and jobs > 1:
+        Jobs.run(genome_coverage,
+                 [(name, genome, scale, strand, input_suffix, output_suffix, spike_suffix, control_suffix,
+                   spike_control_suffix, genomecov_args) for name in Jobs.with_splits(sample_names)], jobs)
+        return
     for sample in sample_names:
         sample_splits_genome_coverage(sample, genome, scale, strand, input_suffix, output_suffix, spike_suffix,
-                                      control_suffix, spike_control_suffix, genomecov_args)
+                                      control_suffix, spike_control_suffix, genomecov_args, single_pass)
 
 
 def sample_splits_genome_coverage(sample, genome, scale=None, strand=None, input_suffix='', output_suffix='-cov',
-                                  spike_suffix=None, control_suffix=None, spike_control_suffix=None, genomecov_args=()):
+                                  spike_suffix=None, control_suffix=None, spike_control_suffix=None, genomecov_args=(),
+                                  single_pass=False):
     '''Compute genome coverage on a single sample.'''
     print('Computing genome coverage on sample {}'.format(sample))
+    splits = Split.splits(sample)
+    if single_pass and input_suffix:
+        print('Single pass ignored for sample {} because split BEDs with input suffix {} are read'.format(sample, input_suffix))
+    if single_pass and single_pass_supported(input_suffix, genomecov_args):
+        splits_genome_coverage(sample, splits, genome, scale, strand, input_suffix, output_suffix, spike_suffix,
+                               control_suffix, spike_control_suffix, genomecov_args)
+        return
     genome_coverage(sample, genome, scale, strand, input_suffix, output_suffix, spike_suffix, control_suffix,
                     spike_control_suffix, genomecov_args)
-    splits = Split.splits(sample)
     for split in splits:
         genome_coverage(split, genome, scale, strand, input_suffix, output_suffix, spike_suffix, control_suffix,
                         spike_control_suffix, genomecov_args)
@@ -122,23 +155,69 @@ def genome_coverage(sample, genome, scale=None, strand=None, input_suffix='', ou
     bed_source = sample + input_suffix + '.bed'
     if not scale:
         if spike_suffix:
-            spiked_count = Bed.count_bed(sample + spike_suffix + '.bed')
-            scale = BASE_SCALE / max(spiked_count, 1)
-            if control_suffix and spike_control_suffix:
-                control_count = Bed.count_bed(sample + control_suffix + '.bed')
-                spike_control_count = Bed.count_bed(sample + spike_control_suffix + '.bed')
-                scale = scale * spike_control_count / max(control_count, 1)
+            scale = spike_scale(sample, spike_suffix, control_suffix, spike_control_suffix)
         else:
             count = Bed.count_bed(bed_source)
             scale = BASE_SCALE / max(count, 1)
     print('Computing genome coverage on BED {} with scale {}'.format(bed_source, scale))
-    bed = sample + output_suffix + '.bed'
-    bigwig = sample + output_suffix + '.bw'
+    bed, bigwig = coverage_outputs(sample, output_suffix, strand)
+    if native_supported(genomecov_args):
+        native_coverage(bed_source, bed, bigwig, genome, sample, scale, strand, genomecov_args)
+    else:
+        coverage(bed_source, bed, genome, sample, scale, strand, genomecov_args)
+        Bed.bedgraph_to_bigwig(bed, bigwig, genome)
+
+
+def splits_genome_coverage(sample, splits, genome, scale=None, strand=None, input_suffix='', output_suffix='-cov',
+                           spike_suffix=None, control_suffix=None, spike_control_suffix=None, genomecov_args=()):
+    '''Compute genome coverage on a single sample and its splits while reading sample's BED only once.'''
+    bed_source = sample + input_suffix + '.bed'
+    print('Computing genome coverage on BED {} and splits {}'.format(bed_source, splits))
+    bins = [(-math.inf, math.inf)] + [Split.splitbin(split) for split in splits]
+    sizes = {columns[0]: int(columns[1]) for columns in Parser.columns(genome)}
+    positions, counts = read_positions(bed_source, sizes, strand, genomecov_args, bins)
+    for name, bin_positions, count in zip([sample] + splits, positions, counts):
+        bin_scale = scale
+        if not bin_scale:
+            if spike_suffix:
+                bin_scale = spike_scale(name, spike_suffix, control_suffix, spike_control_suffix)
+            else:
+                bin_scale = BASE_SCALE / max(count, 1)
+        bed, bigwig = coverage_outputs(name, output_suffix, strand)
+        print('Writing genome coverage of {} with scale {}'.format(name, bin_scale))
+        write_coverage(bin_positions, sizes, bed, bigwig, name, bin_scale, strand)
+
+
+def spike_scale(sample, spike_suffix, control_suffix=None, spike_control_suffix=None):
+    '''Returns scale of sample based on spiked reads.'''
+    spiked_count = Bed.count_bed(sample + spike_suffix + '.bed')
+    scale = BASE_SCALE / max(spiked_count, 1)
+    if control_suffix and spike_control_suffix:
+        control_count = Bed.count_bed(sample + control_suffix + '.bed')
+        spike_control_count = Bed.count_bed(sample + spike_control_suffix + '.bed')
+        scale = scale * spike_control_count / max(control_count, 1)
+    return scale
+
+
+def coverage_outputs(sample, output_suffix='-cov', strand=None):
+    '''Returns bedGraph and bigWig filenames of sample's coverage.'''
+    output = sample + output_suffix
     if strand:
-        bed = sample + output_suffix + ('-neg' if strand == '-' else '-pos') + '.bed'
-        bigwig = sample + output_suffix + ('-neg' if strand == '-' else '-pos') + '.bw'
-    coverage(bed_source, bed, genome, sample, scale, strand, genomecov_args)
-    Bed.bedgraph_to_bigwig(bed, bigwig, genome)
+        output += '-neg' if strand == '-' else '-pos'
+    return (output + '.bed', output + '.bw')
+
+
+def single_pass_supported(input_suffix='', genomecov_args=()):
+    '''Returns True if coverage of splits can be computed from the sample's BED.
+
+    Splits are assigned by the length of annotations in the sample's BED, which is only valid without input suffix,
+    for example annotations of '-forcov' BED files are 1 bp long.'''
+    return not input_suffix and native_supported(genomecov_args)
+
+
+def native_supported(genomecov_args=()):
+    '''Returns True if native coverage engine supports bedtools arguments.'''
+    return set(genomecov_args) <= NATIVE_ARGS
 
 
 def coverage(bed_input, bed_output, genome, sample, scale=None, strand=None, genomecov_args=()):
@@ -165,5 +244,108 @@ def coverage(bed_input, bed_output, genome, sample, scale=None, strand=None, gen
     os.remove(sort_output)
 
 
+def native_coverage(bed_input, bed_output, bigwig_output, genome, sample, scale=None, strand=None, genomecov_args=()):
+    '''Compute genome coverage without bedtools, writes bedGraph and bigWig directly.'''
+    logging.debug('Computing native coverage of {} into {} and {}'.format(bed_input, bed_output, bigwig_output))
+    sizes = {columns[0]: int(columns[1]) for columns in Parser.columns(genome)}
+    positions, counts = read_positions(bed_input, sizes, strand, genomecov_args)
+    write_coverage(positions[0], sizes, bed_output, bigwig_output, sample, scale, strand)
+
+
+def write_coverage(positions, sizes, bed_output, bigwig_output, sample, scale=None, strand=None):
+    '''Writes coverage of positions returned by read_positions to bedGraph and bigWig.
+
+    Values are rounded to 6 significant digits in both files, like bedtools does for bedGraph.'''
+    track = 'track type=bedGraph name="' + sample
+    if strand:
+        track += ' Minus' if strand == '-' else ' Plus'
+    track += '"'
+    chromosomes = sorted(sizes)
+    with open(bed_output, 'w') as outfile, pbw.open(bigwig_output, 'w') as bw:
+        outfile.write(track + '\n')
+        bw.addHeader([(chromosome, sizes[chromosome]) for chromosome in chromosomes])
+        for chromosome in chromosomes:
+            if not chromosome in positions:
+                continue
+            starts, ends = positions.pop(chromosome)
+            starts, ends, depths = coverage_intervals(np.concatenate(starts), np.concatenate(ends))
+            if len(starts) == 0:
+                continue
+            values = ['{:g}'.format(value) for value in (depths * (scale if scale else 1.0)).tolist()]
+            outfile.writelines(['{}\t{}\t{}\t{}\n'.format(chromosome, start, end, value)
+                                for start, end, value in zip(starts.tolist(), ends.tolist(), values)])
+            bw.addEntries([chromosome] * len(starts), starts.tolist(), ends=ends.tolist(),
+                          values=[float(value) for value in values])
+
+
+def read_positions(bed, sizes, strand=None, genomecov_args=(), bins=((-math.inf, math.inf),)):
+    '''Reads start and end positions of intervals in BED file, grouped by bins of length and by chromosome.
+
+    Returns a list containing positions of each bin and a list containing number of annotations in each bin.'''
+    header_count = 0
+    column_count = 0
+    with open(bed, 'r') as infile:
+        for line in infile:
+            if line.startswith('track') or line.startswith('browser') or line.startswith('#'):
+                header_count += 1
+                continue
+            column_count = len(line.rstrip('\r\n').split('\t'))
+            break
+    positions = [{} for bin in bins]
+    counts = [0] * len(bins)
+    if column_count < 3:
+        return positions, counts
+    stranded = column_count >= 6
+    if strand and not stranded:
+        raise AssertionError('BED {} must have a strand column to compute coverage of a single strand'.format(bed))
+    usecols = [0, 1, 2, 5] if stranded else [0, 1, 2]
+    chunks = pd.read_csv(bed, sep='\t', header=None, skiprows=header_count, usecols=usecols,
+                         dtype={0: str, 1: np.int64, 2: np.int64, 5: str}, keep_default_na=False,
+                         chunksize=CHUNK_SIZE)
+    for chunk in chunks:
+        lengths = (chunk[2] - chunk[1]).to_numpy()
+        in_bins = [(lengths >= min_length) & (lengths < max_length) for min_length, max_length in bins]
+        counts = [count + np.count_nonzero(in_bin) for count, in_bin in zip(counts, in_bins)]
+        if strand:
+            selected = (chunk[5] == strand).to_numpy()
+            chunk = chunk[selected]
+            in_bins = [in_bin[selected] for in_bin in in_bins]
+        starts = chunk[1].to_numpy()
+        ends = chunk[2].to_numpy()
+        if '-5' in genomecov_args or '-3' in genomecov_args:
+            strands = chunk[5].to_numpy() if stranded else np.full(len(chunk), '')
+            start_end = strands != '-' if '-5' in genomecov_args else strands == '-'
+            starts = np.where(start_end, starts, ends - 1)
+            ends = starts + 1
+        for chromosome, indexes in chunk.groupby(0, sort=False).indices.items():
+            if not chromosome in sizes:
+                logging.warning('Chromosome {} not found in genome file, skipping'.format(chromosome))
+                continue
+            chromosome_starts = starts[indexes]
+            chromosome_ends = np.minimum(ends[indexes], sizes[chromosome])
+            valid = (chromosome_starts < chromosome_ends) & (chromosome_starts >= 0)
+            for bin_positions, in_bin in zip(positions, in_bins):
+                selected = valid & in_bin[indexes]
+                chromosome_positions = bin_positions.setdefault(chromosome, ([], []))
+                chromosome_positions[0].append(chromosome_starts[selected])
+                chromosome_positions[1].append(chromosome_ends[selected])
+    return positions, counts
+
+
+def coverage_intervals(starts, ends):
+    '''Returns intervals of identical non-zero coverage from start and end positions of annotations.'''
+    breakpoints, inverse = np.unique(np.concatenate((starts, ends)), return_inverse=True)
+    differences = np.zeros(len(breakpoints), dtype=np.int64)
+    np.add.at(differences, inverse[:len(starts)], 1)
+    np.add.at(differences, inverse[len(starts):], -1)
+    depths = np.cumsum(differences)[:-1] if len(breakpoints) else differences
+    changes = np.flatnonzero(np.diff(depths, prepend=0, append=0))
+    interval_starts = breakpoints[changes[:-1]]
+    interval_ends = breakpoints[changes[1:]]
+    interval_depths = depths[changes[:-1]]
+    covered = interval_depths != 0
+    return interval_starts[covered], interval_ends[covered], interval_depths[covered]
+
+
 if __name__ == '__main__':
     genomecov()
@@ -4,7 +4,10 @@ import subprocess
 
 import click
 
+import numpy as np
 import robtools.Split as sb
+from robtools.bed import Bed
+from robtools.jobs import Jobs
 from robtools.txt import Parser
 
 
@@ -26,17 +29,21 @@ def validate_output_suffix(ctx, param, value):
               help='Suffix added to sample name in BED filename for output.')
 @click.option('--index', '-i', type=int, default=None,
               help='Index of sample to process in samples file.')
-def ignorestrand(samples, input_suffix, output_suffix, index):
+@Jobs.jobs_option
+def ignorestrand(samples, input_suffix, output_suffix, index, jobs):
     '''Prepare BED file used for genome coverage on samples.'''
     logging.basicConfig(filename='robtools.log', level=logging.DEBUG, format='%(asctime)s %(levelname)-8s %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
-    ignore_strand_samples(samples, input_suffix, output_suffix, index)
+    ignore_strand_samples(samples, input_suffix, output_suffix, index, jobs)
 
 
-def ignore_strand_samples(samples='samples.txt', input_suffix='', output_suffix='-forcov', index=None):
+def ignore_strand_samples(samples='samples.txt', input_suffix='', output_suffix='-forcov', index=None, jobs=None):
     '''Prepare BED file used for genome coverage on samples.'''
     sample_names = Parser.first(samples)
     if index != None:
         sample_names = [sample_names[index]]
+    if jobs is not None and jobs > 1:
+        Jobs.run(ignore_strand_sample, [(name, input_suffix, output_suffix) for name in Jobs.with_splits(sample_names)], jobs)
+        return
     for sample in sample_names:
         ignore_strand_sample_splits(sample, input_suffix, output_suffix)
 
@@ -58,18 +65,17 @@ def ignore_strand_sample(sample, input_suffix='', output_suffix='-forcov'):
 
 def ignore_strand(bed, output):
     '''Duplicate all annotations with opposed strand.'''
-    with open(bed, 'r') as infile, open(output, 'w') as outfile:
-        for line in infile:
-            if line.startswith('track') or line.startswith('browser') or line.startswith('#'):
-                outfile.write(line)
-                continue
-            columns = line.rstrip('\r\n').split('\t')
-            if len(columns) >= 6:
-                outfile.write('\t'.join(columns))
-                outfile.write("\n")
-                columns[5] = '+' if columns[5] == '-' else '-'
-                outfile.write('\t'.join(columns))
-                outfile.write("\n")
+    Bed.write_chunks(output, (item if isinstance(item, bytes) else ignore_strand_chunk(item) for item in Bed.chunks(bed, 6)))
+
+
+def ignore_strand_chunk(chunk):
+    '''Duplicate annotations of chunk with opposed strand, each annotation is followed by its duplicate.'''
+    chunk = Bed.select(chunk, np.repeat(np.arange(len(chunk['starts'])), 2))
+    strands = Bed.strands(chunk).copy()
+    strands[1::2] = np.where(strands[1::2] == b'-', b'+', b'-')
+    columns = list(chunk['columns'])
+    columns[2] = strands
+    return dict(chunk, columns=columns)
 
 
 if __name__ == '__main__':
@@ -1,10 +1,13 @@
-import gzip
 import logging
+import math
 import random
 import re
+import sys
+from itertools import islice, zip_longest
 
 import click
 
+from robtools.seq import Fastq
 from robtools.txt import Parser
 
 
@@ -18,60 +21,148 @@ from robtools.txt import Parser
 @click.option('--output-suffix', default='-random', show_default=True,
               help='Suffix added to sample name in output FASTQ filename.')
 @click.option('--index', type=int, default=None, help='Index of sample to process in samples file.')
-def keeprandomreads(samples, count, paired, input_suffix, output_suffix, index):
+@click.option('--single-pass/--no-single-pass', default=False, show_default=True,
+              help='Select reads using reservoir sampling while FASTQ files are read, instead of counting reads first. '
+                   'Only the indexes of selected reads are kept in memory, selected reads are then copied.')
+@click.option('--seed', type=int, default=None, help='Seed of random number generator, for reproducible results.')
+@click.option('--threads', '-t', default=1, show_default=True,
+              help='Number of threads used to compress output FASTQ files, requires pigz.')
+def keeprandomreads(samples, count, paired, input_suffix, output_suffix, index, single_pass, seed, threads):
     """Keep count number of reads from FASTQ files."""
     logging.basicConfig(filename='robtools.log', level=logging.DEBUG, format='%(asctime)s %(levelname)-8s %(message)s',
                         datefmt='%Y-%m-%d %H:%M:%S')
-    keeprandomreads_samples(samples, count, paired, input_suffix, output_suffix, index)
+    keeprandomreads_samples(samples, count, paired, input_suffix, output_suffix, index, single_pass, seed, threads)
 
 
-def keeprandomreads_samples(samples, count=10000000, paired=True, input_suffix='', output_suffix='-random', index=None):
+def keeprandomreads_samples(samples, count=10000000, paired=True, input_suffix='', output_suffix='-random', index=None,
+                            single_pass=False, seed=None, threads=None):
     """Keep count number of reads from FASTQ files."""
     sample_names = Parser.first(samples)
     if index is not None:
         sample_names = [sample_names[index]]
     for sample in sample_names:
-        keeprandomreads_sample(sample, count, paired, input_suffix, output_suffix)
+        keeprandomreads_sample(sample, count, paired, input_suffix, output_suffix, single_pass, seed, threads)
 
 
-def keeprandomreads_sample(sample, count=10000000, paired=True, input_suffix='', output_suffix='-random'):
+def keeprandomreads_sample(sample, count=10000000, paired=True, input_suffix='', output_suffix='-random',
+                           single_pass=False, seed=None, threads=None):
     """Keep count number of reads from FASTQ files for a single sample."""
     print('Keep {} of unpaired or paired reads from FASTQ files for sample {}'.format(count, sample))
     fastq1 = sample + input_suffix + '_R1.fastq.gz'
     fastq2 = sample + input_suffix + '_R2.fastq.gz'
+    output1 = sample + output_suffix + '_R1.fastq.gz'
+    output2 = sample + output_suffix + '_R2.fastq.gz'
+    rng = random.Random(seed)
+    if single_pass:
+        keeprandomreads_single_pass(fastq1, fastq2 if paired else None, output1, output2, count, rng, threads)
+        return
     in_count = 0
-    with gzip.open(fastq1, 'rt') as fastq1_in:
+    with Fastq.gzip_open(fastq1) as fastq1_in:
         for line in fastq1_in:
-            if line.startswith('@'):
+            if line.startswith(b'@'):
                 in_count = in_count + 1
-    indexes = set(random.sample(range(0, in_count), min(count, in_count)))
-    output1 = sample + output_suffix + '_R1.fastq.gz'
-    output2 = sample + output_suffix + '_R2.fastq.gz'
+    indexes = set(rng.sample(range(0, in_count), min(count, in_count)))
     in_count = -1
     if paired:
-        with gzip.open(fastq1, 'rt') as fastq1_in, gzip.open(output1, 'wt') as output1_out:
-            with gzip.open(fastq2, 'rt') as fastq2_in, gzip.open(output2, 'wt') as output2_out:
+        with Fastq.gzip_open(fastq1) as fastq1_in, Fastq.gzip_open(output1, 'wb', threads) as output1_out:
+            with Fastq.gzip_open(fastq2) as fastq2_in, Fastq.gzip_open(output2, 'wb', threads) as output2_out:
                 for line1 in fastq1_in:
                     line2 = fastq2_in.readline()
-                    if line1.startswith('@'):
+                    if line1.startswith(b'@'):
                         in_count = in_count + 1
-                        read_name1 = re.split('\\s', line1)[0]
-                        read_name2 = re.split('\\s', line2)[0]
+                        read_name1 = re.split('\\s', line1.decode())[0]
+                        read_name2 = re.split('\\s', line2.decode())[0]
                         assert line2.startswith(
-                            '@'), f"Format of FASTQ file {fastq2} does not seem right at read {read_name2}"
+                            b'@'), f"Format of FASTQ file {fastq2} does not seem right at read {read_name2}"
                         assert read_name1 == read_name2, f"Read {read_name1} from file {fastq1} does not match read " \
                                                          f"{read_name2} from file {fastq2}"
                     if in_count in indexes:
                         output1_out.write(line1)
                         output2_out.write(line2)
     else:
-        with gzip.open(fastq1, 'rt') as fastq1_in, gzip.open(output1, 'wt') as output1_out:
+        with Fastq.gzip_open(fastq1) as fastq1_in, Fastq.gzip_open(output1, 'wb', threads) as output1_out:
             for line1 in fastq1_in:
-                if line1.startswith('@'):
+                if line1.startswith(b'@'):
                     in_count = in_count + 1
                 if in_count in indexes:
                     output1_out.write(line1)
 
 
+def keeprandomreads_single_pass(fastq1, fastq2, output1, output2, count, rng=random, threads=None):
+    """Keep count number of reads from FASTQ files using reservoir sampling, fastq2 is None for unpaired reads.
+
+    Indexes of reads are selected while reading input files, read names of all paired reads are checked at the same time.
+    Selected reads are then copied in the same order as in input files."""
+    if fastq2 is None:
+        with Fastq.gzip_open(fastq1) as fastq1_in:
+            indexes = reservoir_sample(fastq_records(fastq1_in), count, rng)
+        copy_records(fastq1, output1, indexes, threads)
+        return
+    with Fastq.gzip_open(fastq1) as fastq1_in, Fastq.gzip_open(fastq2) as fastq2_in:
+        records = zip_longest(fastq_records(fastq1_in), fastq_records(fastq2_in))
+        indexes = reservoir_sample((check_paired_records(record1, record2, fastq1, fastq2)
+                                    for record1, record2 in records), count, rng)
+    copy_records(fastq1, output1, indexes, threads)
+    copy_records(fastq2, output2, indexes, threads)
+
+
+def fastq_records(fastq_in):
+    """Returns iterator over FASTQ records as tuples of 4 lines, lines are not decoded."""
+    return zip(fastq_in, fastq_in, fastq_in, fastq_in)
+
+
+def copy_records(fastq, output, indexes, threads=None):
+    """Copies FASTQ records located at sorted indexes from fastq to output."""
+    indexes = iter(indexes)
+    index = next(indexes, None)
+    with Fastq.gzip_open(fastq) as fastq_in, Fastq.gzip_open(output, 'wb', threads) as output_out:
+        for record_index, record in enumerate(fastq_records(fastq_in)):
+            if index is None:
+                break
+            if record_index == index:
+                output_out.writelines(record)
+                index = next(indexes, None)
+
+
+def check_paired_records(record1, record2, fastq1='', fastq2=''):
+    """Checks that both FASTQ records are present and that their read names match, read names are compared as bytes."""
+    assert record1 is not None and record2 is not None, f"FASTQ files {fastq1} and {fastq2} do not contain the same " \
+                                                        f"number of reads"
+    if record1[0].split(None, 1)[:1] == record2[0].split(None, 1)[:1] and record2[0].startswith(b'@'):
+        return
+    read_name1 = re.split('\\s', record1[0].decode())[0]
+    read_name2 = re.split('\\s', record2[0].decode())[0]
+    assert record2[0].startswith(b'@'), f"Format of FASTQ file {fastq2} does not seem right at read {read_name2}"
+    assert read_name1 == read_name2, f"Read {read_name1} from file {fastq1} does not match read " \
+                                     f"{read_name2} from file {fastq2}"
+
+
+def reservoir_sample(items, count, rng=random):
+    """Returns sorted indexes of count items selected randomly from iterable, using algorithm L.
+
+    Only indexes are kept in memory."""
+    items = enumerate(items)
+    reservoir = [index for index, item in islice(items, count)]
+    if count > 0 and len(reservoir) == count:
+        weight = math.exp(math.log(uniform(rng)) / count)
+        while True:
+            skip = min(math.floor(math.log(uniform(rng)) / math.log1p(-weight)), sys.maxsize - 1)
+            item = next(islice(items, skip, skip + 1), None)
+            if item is None:
+                break
+            reservoir[rng.randrange(count)] = item[0]
+            weight = weight * math.exp(math.log(uniform(rng)) / count)
+    reservoir.sort()
+    return reservoir
+
+
+def uniform(rng=random):
+    """Returns random number in the open interval (0, 1)."""
+    value = rng.random()
+    while value == 0.0:
+        value = rng.random()
+    return value
+
+
 if __name__ == '__main__':
     keeprandomreads()
@@ -1,13 +1,21 @@
+import hashlib
 import logging
+import math
+import multiprocessing
+import os
 import random
 import tempfile
 
 import click
+import numpy as np
 import pysam
 
 from robtools.bam import Bam
 from robtools.txt import Parser
 
+HASH_MAX = 2 ** 64
+OVERSAMPLING = 1.05
+
 
 @click.command()
 @click.option('--samples', type=click.Path(exists=True), default='samples.txt', show_default=True,
@@ -21,27 +29,36 @@ from robtools.txt import Parser
 @click.option('--output-suffix', default='-random', show_default=True,
               help='Suffix added to sample name in output BAM filename.')
 @click.option('--index', type=int, default=None, help='Index of sample to process in samples file.')
-def keeprandomreadsbam(samples, count, paired, threads, input_suffix, output_suffix, index):
+@click.option('--hash/--no-hash', 'hash_names', default=False, show_default=True,
+              help='Select reads using a hash of read names on coordinate sorted BAM, without sorting BAM files. '
+                   'Threads are used to process reference sequences in parallel.')
+@click.option('--seed', type=int, default=None, help='Seed of random number generator or of hash function.')
+def keeprandomreadsbam(samples, count, paired, threads, input_suffix, output_suffix, index, hash_names, seed):
     """Keep count number of reads from BAM file."""
     logging.basicConfig(filename='robtools.log', level=logging.DEBUG, format='%(asctime)s %(levelname)-8s %(message)s',
                         datefmt='%Y-%m-%d %H:%M:%S')
-    keeprandomreads_samples(samples, count, paired, threads, input_suffix, output_suffix, index)
+    keeprandomreads_samples(samples, count, paired, threads, input_suffix, output_suffix, index, hash_names, seed)
 
 
 def keeprandomreads_samples(samples, count=10000000, paired=True, threads=None, input_suffix='',
-                            output_suffix='-random', index=None):
+                            output_suffix='-random', index=None, hash_names=False, seed=None):
     """Keep count number of reads from BAM file."""
     sample_names = Parser.first(samples)
     if index is not None:
         sample_names = [sample_names[index]]
     for sample in sample_names:
-        keeprandomreads_sample(sample, count, paired, threads, input_suffix, output_suffix)
+        keeprandomreads_sample(sample, count, paired, threads, input_suffix, output_suffix, hash_names, seed)
 
 
-def keeprandomreads_sample(sample, count=10000000, paired=True, threads=None, input_suffix='', output_suffix='-random'):
+def keeprandomreads_sample(sample, count=10000000, paired=True, threads=None, input_suffix='', output_suffix='-random',
+                           hash_names=False, seed=None):
     """Keep count number of reads from BAM file for a single sample."""
     print('Keep {} of unpaired or paired reads from BAM file for sample {}'.format(count, sample))
     bam_input = sample + input_suffix + '.bam'
+    if hash_names:
+        keeprandomreads_hash(bam_input, sample + output_suffix + '.bam', count, paired, threads, seed)
+        return
+    rng = random.Random(seed)
     sort_bam_o, sort_bam = tempfile.mkstemp(suffix='.bam')
     Bam.sort_by_readname(bam_input, sort_bam, threads)
     is_primary = (lambda r: (not r.is_secondary and not r.is_supplementary))
@@ -49,7 +66,7 @@ def keeprandomreads_sample(sample, count=10000000, paired=True, threads=None, in
     with pysam.AlignmentFile(sort_bam, 'rb') as inbam:
         header = inbam.header
         in_count = inbam.count(until_eof=True, read_callback=count_read_callback)
-    indexes = set(random.sample(range(0, in_count), min(count, in_count)))
+    indexes = set(rng.sample(range(0, in_count), min(count, in_count)))
     filter_bam_o, filter_bam = tempfile.mkstemp(suffix='.bam')
     with pysam.AlignmentFile(sort_bam, 'rb') as inbam, pysam.AlignmentFile(filter_bam, 'wb', header=header) as outbam:
         i = 0
@@ -74,5 +91,81 @@ def keeprandomreads_sample(sample, count=10000000, paired=True, threads=None, in
     Bam.sort(filter_bam, output, threads)
 
 
+def keeprandomreads_hash(bam_input, bam_output, count=10000000, paired=True, threads=None, seed=None):
+    """Keep count number of reads from coordinate sorted BAM file based on a hash of read names.
+
+    Reads are first sampled using a fraction slightly higher than needed, then the reads having the lowest hashes
+    are kept to obtain exactly count reads. Mates have the same name, so they are kept together."""
+    with pysam.AlignmentFile(bam_input, 'rb') as inbam:
+        has_index = inbam.has_index()
+    if not has_index:
+        logging.debug('Indexing BAM {}'.format(bam_input))
+        pysam.index(bam_input)
+    with pysam.AlignmentFile(bam_input, 'rb') as inbam:
+        total = sum([stats.total for stats in inbam.get_index_statistics()]) + inbam.nocoordinate
+    templates = total / 2 if paired else total
+    fraction = min(1.0, (count + 10 * math.sqrt(count)) * OVERSAMPLING / max(templates, 1))
+    with tempfile.TemporaryDirectory() as folder:
+        sampled = os.path.join(folder, 'sampled.bam')
+        while True:
+            threshold = HASH_MAX if fraction >= 1 else int(fraction * HASH_MAX)
+            hashes = hash_filter(bam_input, sampled, threshold, paired, threads, seed, folder)
+            logging.debug(f"bam = {bam_input}, count = {count}, fraction = {fraction}, sampled = {len(hashes)}")
+            if len(hashes) >= count or fraction >= 1:
+                break
+            fraction = min(1.0, fraction * 2)
+        threshold = HASH_MAX if len(hashes) <= count else int(np.partition(hashes, count)[count])
+        hash_filter(sampled, bam_output, threshold, paired, 1, seed, folder)
+
+
+def hash_filter(bam_input, bam_output, threshold, paired=True, threads=None, seed=None, folder=None):
+    """Writes primary alignments of reads having a name hash lower than threshold.
+
+    Returns hashes of kept reads, counting pairs only once."""
+    if threads is None or threads <= 1:
+        return hash_filter_reference(bam_input, bam_output, threshold, paired, seed)
+    with pysam.AlignmentFile(bam_input, 'rb') as inbam:
+        references = list(inbam.references) + ['*']
+    reference_bams = [os.path.join(folder, 'reference-' + str(i) + '.bam') for i in range(0, len(references))]
+    with multiprocessing.Pool(processes=threads) as pool:
+        hashes = pool.starmap(hash_filter_reference,
+                              [(bam_input, reference_bam, threshold, paired, seed, reference) for reference, reference_bam
+                               in zip(references, reference_bams)])
+    pysam.cat('-o', bam_output, *reference_bams)
+    for reference_bam in reference_bams:
+        os.remove(reference_bam)
+    return np.concatenate(hashes)
+
+
+def hash_filter_reference(bam_input, bam_output, threshold, paired=True, seed=None, reference=None):
+    """Writes primary alignments of reads on reference having a name hash lower than threshold.
+
+    All alignments are processed when reference is None."""
+    salt = read_salt(seed)
+    hashes = []
+    with pysam.AlignmentFile(bam_input, 'rb') as inbam, \
+            pysam.AlignmentFile(bam_output, 'wb', template=inbam) as outbam:
+        alignments = inbam.fetch(until_eof=True) if reference is None else inbam.fetch(reference)
+        for aln in alignments:
+            if aln.is_secondary or aln.is_supplementary:
+                continue
+            read_hash = name_hash(aln.query_name, salt)
+            if read_hash < threshold:
+                outbam.write(aln)
+                if aln.is_read1 or not paired:
+                    hashes.append(read_hash)
+    return np.array(hashes, dtype=np.uint64)
+
+
+def read_salt(seed=None):
+    """Returns salt of hash function for seed."""
+    return hashlib.blake2b(str(0 if seed is None else seed).encode(), digest_size=16).digest()
+
+
+def name_hash(name, salt):
+    """Returns hash of read name, between 0 and HASH_MAX."""
+    return int.from_bytes(hashlib.blake2b(name.encode(), digest_size=8, salt=salt).digest(), 'little')
+
+
 if __name__ == '__main__':
     keeprandomreadsbam()
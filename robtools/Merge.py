@@ -1,3 +1,5 @@
+from contextlib import ExitStack
+import heapq
 import logging
 from multiprocessing import Pool
 import os
@@ -8,6 +10,8 @@ import click
 from robtools.bed import Bed
 from robtools.txt import Parser
 
+BUFFER_SIZE = 1048576
+
 
 @click.command()
 @click.option('--datasets', '-d', type=click.Path(exists=True), default='dataset.txt', show_default=True,
@@ -34,6 +38,44 @@ def merge_datasets(datasets='dataset.txt', index=None):
 def merge_dataset(name, samples):
     '''Merge BED files related to samples.'''
     print ('Merging samples {} into a single sample {}'.format(samples, name))
+    merged_bed = name + '.bed'
+    try:
+        merge_sorted([sample + '.bed' for sample in samples], merged_bed)
+    except ValueError as error:
+        logging.debug('Could not merge sorted BED files, merging and sorting instead: {}'.format(error))
+        merge_unsorted(samples, merged_bed)
+
+
+def merge_sorted(beds, output):
+    '''Merge BED files sorted by chromosome and start into a single sorted BED file.'''
+    with ExitStack() as stack:
+        infiles = [stack.enter_context(open(bed, 'r', buffering=BUFFER_SIZE)) for bed in beds]
+        outfile = stack.enter_context(open(output, 'w', buffering=BUFFER_SIZE))
+        outfile.writelines(line for key, line in heapq.merge(*[sorted_annotations(infile) for infile in infiles]))
+
+
+def sorted_annotations(infile):
+    '''Yields sort key and line of annotations in BED file, empty lines are skipped.
+
+    Raises ValueError if BED file is not sorted or if a line has less than 3 columns.'''
+    previous_key = None
+    for line in infile:
+        if line.startswith('browser') or line.startswith('track') or line.startswith('#') or not line.strip():
+            continue
+        if not line.endswith('\n'):
+            line += '\n'
+        columns = line.split('\t', 3)
+        if len(columns) < 3:
+            raise ValueError('BED {} has less than 3 columns at line {}'.format(infile.name, line.rstrip('\r\n')))
+        key = (columns[0], int(columns[1]), int(columns[2]), line)
+        if previous_key is not None and key < previous_key:
+            raise ValueError('BED {} is not sorted at line {}'.format(infile.name, line.rstrip('\r\n')))
+        previous_key = key
+        yield key, line
+
+
+def merge_unsorted(samples, output):
+    '''Merge BED files related to samples by concatenating and sorting them.'''
     merge_temp_o, merge_temp = tempfile.mkstemp(suffix='.bed')
     with open(merge_temp_o, 'w') as outfile:
         for sample in samples:
@@ -43,8 +85,7 @@ def merge_dataset(name, samples):
                     if line.startswith('browser') or line.startswith('track'):
                         continue
                     outfile.write(line)
-    merged_bed = name + '.bed'
-    Bed.sort(merge_temp, merged_bed)
+    Bed.sort(merge_temp, output)
     os.remove(merge_temp)
 
 
@@ -1,12 +1,9 @@
 import logging
-import math
-import os
-import tempfile
 
 import click
+import numpy as np
 
 import pyBigWig as pbw
-from robtools.bed import Bed
 from robtools.txt import Parser
 
 
@@ -38,35 +35,34 @@ def merge_dataset(name, samples, sizes):
     '''Merge bigWig files related to samples.'''
     print ('Merging samples {} into dataset {}'.format(samples, name))
     sizes_columns = Parser.columns(sizes)
+    chromosomes = sorted([(size_columns[0], int(size_columns[1])) for size_columns in sizes_columns])
     bws = [pbw.open(sample + '.bw') for sample in samples]
-    merge_temp_o, merge_temp = tempfile.mkstemp(suffix='.bed')
-    with open(merge_temp_o, 'w') as output:
-        output.write('track type=bedGraph name="' + name + '"\n')
-        for size_columns in sizes_columns:
-            chromosome = size_columns[0]
-            size = int(size_columns[1])
-            sums = [0] * size
+    merged_bw = name + '.bw'
+    with pbw.open(merged_bw, 'w') as output:
+        output.addHeader(chromosomes)
+        for chromosome, size in chromosomes:
+            sums = np.zeros(size)
             for bw in bws:
                 bw_size = bw.chroms(chromosome) if bw.chroms(chromosome) else 0
                 if bw_size == 0:
                     continue
-                values = bw.values(chromosome, 0, min(size, bw_size))
-                sums = [sums[i] + (values[i] if not math.isnan(values[i]) else 0) for i in range(0, min(size, bw_size))]
-            for i in range(0, len(sums)):
-                output.write(chromosome)
-                output.write('\t')
-                output.write(str(i))
-                output.write('\t')
-                output.write(str(i + 1))
-                output.write('\t')
-                output.write(str(sums[i]))
-                output.write('\n')
-    sort_temp_o, sort_temp = tempfile.mkstemp(suffix='.bed')
-    Bed.sort(merge_temp, sort_temp)
-    merged_bw = name + '.bw'
-    Bed.bedgraph_to_bigwig(sort_temp, merged_bw, sizes)
-    os.remove(sort_temp)
-    os.remove(merge_temp)
+                length = min(size, bw_size)
+                values = bw.values(chromosome, 0, length, numpy=True)
+                sums[:length] += np.nan_to_num(values, copy=False, nan=0.0, posinf=np.inf, neginf=-np.inf)
+            starts, ends, values = run_lengths(sums)
+            output.addEntries([chromosome] * len(starts), starts.tolist(), ends=ends.tolist(), values=values.tolist())
+    for bw in bws:
+        bw.close()
+
+
+def run_lengths(values):
+    '''Returns start, end and value of runs of equal neighbouring values.'''
+    boundaries = np.flatnonzero(values[1:] != values[:-1]) + 1
+    if len(values) == 0:
+        return boundaries, boundaries, values
+    starts = np.insert(boundaries, 0, 0)
+    ends = np.append(boundaries, len(values))
+    return starts, ends, values[starts]
 
 
 if __name__ == '__main__':
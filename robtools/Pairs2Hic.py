@@ -1,15 +1,31 @@
+import errno
 import glob
 import gzip
+import heapq
 import logging
 import os.path
+import shutil
 import subprocess
 import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager, ExitStack
+from functools import partial
+from operator import itemgetter
 
 import click
+import numpy as np
 import sys
 import yaml
 
+from robtools.bed import Bed
+
 SBATCH_JAVA_MEM_ENV = 'SLURM_MEM_PER_NODE'
+CHUNK_SIZE = 16777216
+PAIRS_COLUMNS = 10
+JUICERS = set()
+JUICERS_LOCK = threading.Lock()
 
 
 @click.command(context_settings=dict(ignore_unknown_options=True, ))
@@ -23,16 +39,29 @@ SBATCH_JAVA_MEM_ENV = 'SLURM_MEM_PER_NODE'
               help="Suffix added to sample/group name in HIC filename for output.")
 @click.option('--output-folder', '-o', type=click.Path(exists=True), default=None,
               help="Output folder.  Defaults to current folder.")
+@click.option('--merged-pairs/--no-merged-pairs', default=False, show_default=True,
+              help="Also write merged pairs file of each group to output folder.")
+@click.option('--threads', '-t', type=int, default=1, show_default=True,
+              help="Number of threads used to compress merged pairs files.")
+@click.option('--jobs', type=int, default=1, show_default=True,
+              help="Number of conversions and juicer processes running in parallel, juicer memory is split between them.")
+@click.option('--temp-folder', type=click.Path(exists=True), default=None,
+              help="Folder for temporary medium files.  Defaults to output folder.")
+@click.option('--stream/--no-stream', default=False, show_default=True,
+              help="Stream medium format to juicer through a named pipe instead of a temporary medium file.  "
+                   "Only use with juicer versions that read their input once.")
 @click.argument('juicer_args', nargs=-1, type=click.UNPROCESSED)
-def pairs2hic(project, juicer, input_suffix, output_suffix, output_folder, juicer_args):
+def pairs2hic(project, juicer, input_suffix, output_suffix, output_folder, merged_pairs, threads, jobs, temp_folder,
+              stream, juicer_args):
     """Converts distiller-nf's pairs file to HIC format"""
     logging.basicConfig(filename='robtools.log', level=logging.DEBUG, format='%(asctime)s %(levelname)-8s %(message)s',
                         datefmt='%Y-%m-%d %H:%M:%S')
-    pairs2hic_(project, juicer, input_suffix, output_suffix, output_folder, juicer_args)
+    pairs2hic_(project, juicer, input_suffix, output_suffix, output_folder, juicer_args, merged_pairs, threads, jobs,
+               temp_folder, stream)
 
 
 def pairs2hic_(project, juicer="juicer_tools.jar", input_suffix="*.nodups", output_suffix=None, output_folder=None,
-               juicer_args=()):
+               juicer_args=(), merged_pairs=False, threads=1, jobs=1, temp_folder=None, stream=False):
     with open(project) as project_in:
         config = yaml.safe_load(project_in)
     samples = list(config['input']['raw_reads_paths'].keys())
@@ -51,6 +80,7 @@ def pairs2hic_(project, juicer="juicer_tools.jar", input_suffix="*.nodups", outp
     if not chromosome_sizes:
         print(f"Could not find genome file {os.path.basename(chrom_sizes_path)}", file=sys.stderr)
         exit(1)
+    samples_pairs = {}
     for sample in samples:
         pairs = resolve(f"{sample}{input_suffix}.pairs.gz", folders)
         if not pairs:
@@ -58,7 +88,9 @@ def pairs2hic_(project, juicer="juicer_tools.jar", input_suffix="*.nodups", outp
             continue
         hic = os.path.join(output_folder, f"{sample}{output_suffix if output_suffix else ''}.hic")
         print(f"\n\nConverting pairs file {os.path.basename(pairs)} to HIC {os.path.basename(hic)}")
-        pairs_to_hic(pairs, hic, resolutions, chromosome_sizes, juicer, juicer_args)
+        samples_pairs[hic] = pairs
+    groups_pairs = {}
+    merges = {}
     for group in groups:
         pairs = [resolve(f"{sample}{input_suffix}.pairs.gz", folders) for sample in groups[group]]
         if None in pairs:
@@ -67,31 +99,206 @@ def pairs2hic_(project, juicer="juicer_tools.jar", input_suffix="*.nodups", outp
             continue
         hic = os.path.join(output_folder, f"{group}{output_suffix if output_suffix else ''}.hic")
         print(f"\n\nConverting pairs of group {group} to HIC {os.path.basename(hic)}")
-        merged_pairs_o, merged_pairs = tempfile.mkstemp(suffix='.pairs.gz')
-        logging.debug(f"before merge_pairs")
-        merge_pairs(pairs, merged_pairs)
-        logging.debug(f"after merge_pairs")
-        pairs_to_hic(merged_pairs, hic, resolutions, chromosome_sizes, juicer, juicer_args)
-        logging.debug(f"after pairs_to_hic")
-        os.remove(merged_pairs)
+        groups_pairs[hic] = pairs
+        if merged_pairs:
+            merges[os.path.join(output_folder, f"{group}{output_suffix if output_suffix else ''}.pairs.gz")] = pairs
+    with tempfile.TemporaryDirectory(dir=temp_folder if temp_folder else output_folder) as folder:
+        convert_all(samples_pairs, groups_pairs, merges, folder, resolutions, chromosome_sizes, juicer, juicer_args,
+                    threads, jobs, stream)
     logging.debug(f"finished")
 
 
-def pairs_to_hic(pairs, hic, resolutions, chromosome_sizes, juicer="juicer_tools.jar", juicer_args=()):
-    """Converts pairs file to HIC file"""
-    medium_o, medium = tempfile.mkstemp(suffix=".tsv")
-    pairs_to_medium(pairs, medium)
+def convert_all(samples_pairs, groups_pairs, merges, folder, resolutions, chromosome_sizes, juicer="juicer_tools.jar",
+                juicer_args=(), threads=1, jobs=1, stream=False):
+    """Converts pairs files of samples and groups to HIC files, running up to jobs conversions in parallel
+
+    samples_pairs maps HIC files of samples to their pairs file and groups_pairs maps HIC files of groups to the
+    pairs files of their samples. merges maps merged pairs files to write to the pairs files to merge.
+    When jobs is 1, pairs files are converted to HIC one HIC file after the other, using a medium file in folder,
+    or a named pipe when stream is True.
+    Otherwise, groups are converted one after the other: the pairs files of the group are converted to medium files
+    in folder that are used for the HIC files of the samples not converted yet and merged for the HIC file of the
+    group. Medium files of a group are removed before converting the next group.
+    Running juicer processes are terminated when a conversion fails."""
+    if jobs <= 1:
+        for hic, pairs in samples_pairs.items():
+            pairs_to_hic(pairs, hic, resolutions, chromosome_sizes, juicer, juicer_args, 1, stream, folder)
+        for hic, pairs in groups_pairs.items():
+            pairs_to_hic(pairs, hic, resolutions, chromosome_sizes, juicer, juicer_args, 1, stream, folder)
+        for merged, pairs in merges.items():
+            merge_pairs(pairs, merged, threads)
+        return
+    grouped = set([pairs for group_pairs in groups_pairs.values() for pairs in group_pairs])
+    waiting_samples = {hic: pairs for hic, pairs in samples_pairs.items() if pairs in grouped}
+    waiting_groups = [(hic, group_pairs) for hic, group_pairs in groups_pairs.items() if group_pairs]
+    executor = ThreadPoolExecutor(max_workers=jobs)
+    running = set()
+    try:
+        for hic, pairs in samples_pairs.items():
+            if hic not in waiting_samples:
+                running.add(executor.submit(pairs_to_hic, pairs, hic, resolutions, chromosome_sizes, juicer,
+                                            juicer_args, jobs, stream, folder))
+        for merged, pairs in merges.items():
+            running.add(executor.submit(merge_pairs, pairs, merged, threads))
+        mediums = {}
+        conversions = {}
+        group_tasks = set()
+        while running or waiting_groups:
+            if not mediums and waiting_groups:
+                group_hic, group_pairs = waiting_groups.pop(0)
+                mediums = {pairs: os.path.join(folder, f"{index}.medium.tsv") for index, pairs in
+                           enumerate(dict.fromkeys(group_pairs))}
+                conversions = {executor.submit(pairs_to_medium, pairs, mediums[pairs]): pairs for pairs in mediums}
+                group_tasks = set(conversions)
+                running.update(conversions)
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                future.result()
+                group_tasks.discard(future)
+                if future not in conversions:
+                    continue
+                pairs = conversions.pop(future)
+                juicers = []
+                for hic, sample_pairs in list(waiting_samples.items()):
+                    if sample_pairs == pairs:
+                        del waiting_samples[hic]
+                        juicers.append(executor.submit(medium_to_hic, mediums[pairs], hic, resolutions,
+                                                       chromosome_sizes, juicer, juicer_args, jobs))
+                if not conversions:
+                    juicers.append(executor.submit(medium_to_hic, [mediums[pairs] for pairs in group_pairs],
+                                                   group_hic, resolutions, chromosome_sizes, juicer, juicer_args,
+                                                   jobs, stream, folder))
+                group_tasks.update(juicers)
+                running.update(juicers)
+            if mediums and not group_tasks:
+                for medium in mediums.values():
+                    os.remove(medium)
+                mediums = {}
+    except BaseException:
+        executor.shutdown(wait=False, cancel_futures=True)
+        running = set([future for future in running if not future.cancelled()])
+        while running:
+            terminate_juicers()
+            done, running = wait(running, timeout=1)
+        raise
+    finally:
+        executor.shutdown()
+
+
+def start_juicer(cmd):
+    """Starts juicer process, it is terminated by terminate_juicers until it is waited by wait_juicer"""
+    logging.debug(f'Running {cmd}')
+    process = subprocess.Popen(cmd)
+    with JUICERS_LOCK:
+        JUICERS.add(process)
+    return process
+
+
+def wait_juicer(process):
+    """Waits for juicer process to complete and returns its return code"""
+    try:
+        return process.wait()
+    finally:
+        with JUICERS_LOCK:
+            JUICERS.discard(process)
+
+
+def terminate_juicers():
+    """Terminates running juicer processes"""
+    with JUICERS_LOCK:
+        for process in JUICERS:
+            process.terminate()
+
+
+def pairs_to_hic(pairs, hic, resolutions, chromosome_sizes, juicer="juicer_tools.jar", juicer_args=(), jobs=1,
+                 stream=False, folder=None):
+    """Converts pairs file to HIC file, pairs can also be a list of sorted pairs files to merge
+
+    See stream_to_hic for stream and folder.
+    Juicer's memory is the memory of the SLURM job divided by jobs."""
+    stream_to_hic(partial(write_medium, pairs), hic, resolutions, chromosome_sizes, juicer, juicer_args, jobs, stream,
+                  folder)
+
+
+def medium_to_hic(medium, hic, resolutions, chromosome_sizes, juicer="juicer_tools.jar", juicer_args=(), jobs=1,
+                  stream=False, folder=None):
+    """Converts medium file to HIC file, medium can also be a list of sorted medium files to merge
+
+    See stream_to_hic for stream and folder.
+    Juicer's memory is the memory of the SLURM job divided by jobs."""
+    if not isinstance(medium, str):
+        stream_to_hic(partial(write_merged_medium, medium), hic, resolutions, chromosome_sizes, juicer, juicer_args,
+                      jobs, stream, folder)
+        return
     logging.debug(f'Converting medium format {medium} to HIC {hic}')
+    cmd = juicer_command(medium, hic, resolutions, chromosome_sizes, juicer, juicer_args, jobs)
+    returncode = wait_juicer(start_juicer(cmd))
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd)
+
+
+def stream_to_hic(write, hic, resolutions, chromosome_sizes, juicer="juicer_tools.jar", juicer_args=(), jobs=1,
+                  stream=False, folder=None):
+    """Converts medium format written by write function to HIC file
+
+    The medium format is written to a temporary file in folder before juicer starts.
+    When stream is True and the system supports named pipes, the medium format is streamed to juicer through a named
+    pipe instead, juicer must then read its input only once.
+    If writing the medium format fails or juicer stops reading the named pipe, juicer is killed and the incomplete
+    HIC file is removed."""
+    with tempfile.TemporaryDirectory(dir=folder) as temp_folder:
+        medium = os.path.join(temp_folder, 'medium.tsv')
+        logging.debug(f'Converting medium format {medium} to HIC {hic}')
+        cmd = juicer_command(medium, hic, resolutions, chromosome_sizes, juicer, juicer_args, jobs)
+        if not stream or not hasattr(os, 'mkfifo'):
+            with open(medium, 'wb') as medium_out:
+                write(medium_out)
+            returncode = wait_juicer(start_juicer(cmd))
+            if returncode != 0:
+                raise subprocess.CalledProcessError(returncode, cmd)
+            return
+        os.mkfifo(medium)
+        process = start_juicer(cmd)
+        try:
+            with open_pipe(medium, process) as medium_out:
+                write(medium_out)
+        except BaseException:
+            process.kill()
+            wait_juicer(process)
+            if os.path.exists(hic):
+                os.remove(hic)
+            raise
+        returncode = wait_juicer(process)
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, cmd)
+
+
+def juicer_command(medium, hic, resolutions, chromosome_sizes, juicer="juicer_tools.jar", juicer_args=(), jobs=1):
+    """Returns juicer command converting medium file to HIC file, using the memory of the SLURM job divided by jobs"""
     mem = sbatch_memory(os.getenv(SBATCH_JAVA_MEM_ENV, None))
     cmd = ['java']
     if mem:
-        cmd.extend(['-Xmx' + str(mem) + 'M'])
+        cmd.extend(['-Xmx' + str(max(int(mem / max(jobs, 1)), 1)) + 'M'])
     cmd.extend(["-jar", juicer, "pre"] + list(juicer_args))
     cmd.extend(["-r", ','.join([str(resolution) for resolution in resolutions])])
     cmd.extend([medium, hic, chromosome_sizes])
-    logging.debug(f'Running {cmd}')
-    subprocess.run(cmd, check=True)
-    os.remove(medium)
+    return cmd
+
+
+def open_pipe(pipe, process):
+    """Opens named pipe for writing once process opened it for reading, fails if process exits before"""
+    while True:
+        try:
+            fd = os.open(pipe, os.O_WRONLY | os.O_NONBLOCK)
+            break
+        except OSError as e:
+            if e.errno != errno.ENXIO:
+                raise
+        if process.poll() is not None:
+            raise subprocess.CalledProcessError(process.returncode, process.args)
+        time.sleep(0.1)
+    os.set_blocking(fd, True)
+    return os.fdopen(fd, 'wb')
 
 
 def sbatch_memory(mem_string):
@@ -108,19 +315,103 @@ def sbatch_memory(mem_string):
 
 
 def pairs_to_medium(pairs, medium):
-    """Converts pairs file to medium format for juicer"""
+    """Converts pairs file, or list of sorted pairs files to merge, to medium format for juicer"""
     logging.debug(f'Converting pairs {pairs} to medium format {medium}')
-    with gzip.open(pairs, 'rt') as pairs_in, open(medium, 'w') as medium_out:
-        for line in pairs_in:
-            if line.startswith('#'):
-                continue
-            columns = line.strip('\r\n').split('\t')
-            out_columns = [columns[0]]
-            out_columns.extend(['0' if columns[5] == '+' else '1', columns[1], columns[2], '0'])
-            out_columns.extend(['0' if columns[6] == '+' else '1', columns[3], columns[4], '1'])
-            out_columns.extend([columns[8], columns[9]])
-            medium_out.write('\t'.join(out_columns))
-            medium_out.write('\n')
+    with open(medium, 'wb') as medium_out:
+        write_medium(pairs, medium_out)
+
+
+def write_medium(pairs, medium_out):
+    """Writes pairs file, or list of sorted pairs files to merge, converted to medium format for juicer to a binary file"""
+    if not isinstance(pairs, str) and len(pairs) == 1:
+        pairs = pairs[0]
+    if not isinstance(pairs, str):
+        for block in line_blocks(merged_lines(pairs)):
+            medium_out.write(medium_block(block))
+        return
+    with open_pairs(pairs) as pairs_in:
+        for block in blocks(pairs_in):
+            medium_out.write(medium_block(block))
+
+
+@contextmanager
+def open_pairs(pairs):
+    """Opens pairs file for reading as binary, gzip files are decompressed by pigz when it is available"""
+    pigz = shutil.which('pigz')
+    if not pairs.endswith('.gz'):
+        with open(pairs, 'rb') as pairs_in:
+            yield pairs_in
+    elif pigz:
+        cmd = [pigz, '-d', '-c', pairs]
+        logging.debug(f'Running {cmd}')
+        with subprocess.Popen(cmd, stdout=subprocess.PIPE) as process:
+            yield process.stdout
+            process.stdout.close()
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, cmd)
+    else:
+        with gzip.open(pairs, 'rb') as pairs_in:
+            yield pairs_in
+
+
+def blocks(pairs_in, chunk_size=CHUNK_SIZE):
+    """Yields blocks of about chunk_size bytes of complete lines"""
+    remaining = b''
+    while True:
+        block = pairs_in.read(chunk_size)
+        if not block:
+            break
+        block = remaining + block
+        last = block.rfind(b'\n') + 1
+        remaining = block[last:]
+        if last > 0:
+            yield block[:last]
+    if remaining:
+        yield remaining
+
+
+def medium_block(block):
+    """Converts a block of complete lines of pairs file to medium format for juicer
+
+    Each output line is:
+      readID strand1 chrom1 pos1 0 strand2 chrom2 pos2 1 mapq1 mapq2
+    where strands are 0 for + and 1 for -."""
+    data = np.frombuffer(block, dtype=np.uint8)
+    ends = np.flatnonzero(data == Bed.NEWLINE)
+    if len(ends) == 0 or ends[-1] != len(data) - 1:
+        ends = np.append(ends, len(data))
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    stops = ends - ((ends > starts) & (data[np.maximum(ends - 1, 0)] == Bed.CARRIAGE_RETURN))
+    keep = (stops > starts) & (data[np.minimum(starts, len(data) - 1)] != ord('#'))
+    starts, stops = starts[keep], stops[keep]
+    if len(starts) == 0:
+        return b''
+    tabs = np.flatnonzero(data == Bed.TAB)
+    first_tabs = np.searchsorted(tabs, starts)
+    counts = np.searchsorted(tabs, stops) - first_tabs + 1
+    if counts.min() < PAIRS_COLUMNS:
+        raise ValueError(f'Pairs lines must have at least {PAIRS_COLUMNS} columns')
+    line_tabs = tabs[first_tabs[:, None] + np.arange(PAIRS_COLUMNS - 1)]
+    last_stops = np.where(counts > PAIRS_COLUMNS, tabs[np.minimum(first_tabs + PAIRS_COLUMNS - 1, len(tabs) - 1)],
+                          stops)
+    field_starts = np.column_stack((starts, line_tabs + 1))
+    field_stops = np.column_stack((line_tabs, last_stops))
+
+    def field(i):
+        return Bed.as_matrix(Bed.field_bytes(data, field_starts[:, i], field_stops[:, i]))
+
+    def constant(value):
+        return np.full((len(starts), 1), ord(value), dtype=np.uint8)
+
+    def strand(i):
+        return np.where(data[field_starts[:, i]] == ord('+'), ord('0'), ord('1')).astype(np.uint8)[:, None]
+
+    tab = constant('\t')
+    parts = [field(0), tab, strand(5), tab, field(1), tab, field(2), tab, constant('0'), tab,
+             strand(6), tab, field(3), tab, field(4), tab, constant('1'), tab, field(8), tab, field(9),
+             constant('\n')]
+    lines = np.hstack(parts)
+    return lines[lines != 0].tobytes()
 
 
 def resolve(pathname, folders):
@@ -132,28 +423,117 @@ def resolve(pathname, folders):
     return None
 
 
-def merge_pairs(pairs, outfile):
-    """Merge files"""
-    merge_o, merge = tempfile.mkstemp(suffix=".tsv")
-    logging.debug(f'Merging pairs {pairs} to {merge}')
-    with open(merge_o, 'w') as merge_out:
-        for file in pairs:
-            with gzip.open(file, 'rt') as file_in:
-                for line in file_in:
-                    if line.startswith('#'):
-                        continue
-                    merge_out.write(line)
-    sort_o, sort = tempfile.mkstemp(suffix=".tsv")
-    logging.debug(f'Sorting pairs {merge} to {sort}')
-    cmd = ["sort", "-k", "2,2", "-k", "4,4", "-k", "3,3n", "-k", "5,5n", "-o", sort, merge]
+def merge_pairs(pairs, outfile, threads=1):
+    """Merge sorted pairs files, compressed with pigz when it is available
+
+    If a pairs file is not sorted, the pairs files are merged using a full sort instead."""
+    logging.debug(f'Merging pairs {pairs} to {outfile}')
+    try:
+        with open_compressed(outfile, threads) as outfile_out:
+            for block in line_blocks(merged_lines(pairs)):
+                outfile_out.write(block)
+    except ValueError as e:
+        logging.warning(f'{e}, merging pairs {pairs} to {outfile} using a full sort')
+        sort_pairs(pairs, outfile, threads)
+
+
+def sort_pairs(pairs, outfile, threads=1):
+    """Merge pairs files using sort in the order of chrom1, chrom2, pos1 and pos2, headers are skipped"""
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(outfile))) as temp_folder:
+        merge = os.path.join(temp_folder, 'merge.pairs')
+        logging.debug(f'Merging pairs {pairs} to {merge}')
+        with open(merge, 'wb') as merge_out:
+            for file in pairs:
+                with open_pairs(file) as pairs_in:
+                    for block in line_blocks(pairs_lines(pairs_in)):
+                        merge_out.write(block)
+        cmd = ['sort', '-s', '-t', '\t', '-k', '2,2', '-k', '4,4', '-k', '3,3n', '-k', '5,5n', '-T', temp_folder, merge]
+        logging.debug(f'Running {cmd}')
+        with open_compressed(outfile, threads) as outfile_out, \
+                subprocess.Popen(cmd, stdout=subprocess.PIPE, env=dict(os.environ, LC_ALL='C')) as process:
+            shutil.copyfileobj(process.stdout, outfile_out, CHUNK_SIZE)
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, cmd)
+
+
+def merged_lines(pairs, key=None):
+    """Yields lines of sorted pairs files merged in the order of chrom1, chrom2, pos1 and pos2, headers are skipped
+
+    Raises ValueError when a file is not sorted."""
+    key = key if key else pairs_key
+    with ExitStack() as stack:
+        lines = [keyed_lines(pairs_lines(stack.enter_context(open_pairs(file))), key, file) for file in pairs]
+        for line_key, line in heapq.merge(*lines, key=itemgetter(0)):
+            yield line
+
+
+def keyed_lines(lines, key, file):
+    """Yields key and line for lines, raises ValueError when lines are not sorted by key"""
+    previous = None
+    for line in lines:
+        line_key = key(line)
+        if previous is not None and line_key < previous:
+            raise ValueError(f'{file} is not sorted by chrom1, chrom2, pos1 and pos2')
+        previous = line_key
+        yield line_key, line
+
+
+def pairs_lines(pairs_in):
+    """Yields lines of pairs file that are not headers or empty, all ending with a new line"""
+    for line in pairs_in:
+        if line.startswith(b'#') or not line.strip():
+            continue
+        yield line if line.endswith(b'\n') else line + b'\n'
+
+
+def pairs_key(line):
+    """Returns sort key of pairs line: chrom1, chrom2, pos1 and pos2"""
+    columns = line.split(b'\t', 5)
+    return columns[1], columns[3], int(columns[2]), int(columns[4])
+
+
+def medium_key(line):
+    """Returns sort key of medium format line: chrom1, chrom2, pos1 and pos2"""
+    columns = line.split(b'\t', 8)
+    return columns[2], columns[6], int(columns[3]), int(columns[7])
+
+
+def write_merged_medium(mediums, medium_out):
+    """Writes sorted medium files merged in the order of chrom1, chrom2, pos1 and pos2 to a binary file"""
+    for block in line_blocks(merged_lines(mediums, medium_key)):
+        medium_out.write(block)
+
+
+def line_blocks(lines, chunk_size=CHUNK_SIZE):
+    """Yields blocks of about chunk_size bytes made of lines"""
+    block = []
+    size = 0
+    for line in lines:
+        block.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield b''.join(block)
+            block = []
+            size = 0
+    if block:
+        yield b''.join(block)
+
+
+@contextmanager
+def open_compressed(output, threads=1):
+    """Opens gzip file for writing as binary, data is compressed by pigz using threads when it is available"""
+    pigz = shutil.which('pigz')
+    if not pigz:
+        with gzip.open(output, 'wb') as output_out:
+            yield output_out
+        return
+    cmd = [pigz, '-p', str(max(threads, 1)), '-c']
     logging.debug(f'Running {cmd}')
-    subprocess.run(cmd, check=True)
-    os.remove(merge)
-    logging.debug(f'Gzip pairs {sort} to {outfile}')
-    with gzip.open(outfile, 'wt') as outfile_out, open(sort_o) as sort_in:
-        for line in sort_in:
-            outfile_out.write(line)
-    os.remove(sort)
+    with open(output, 'wb') as output_out, subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=output_out) as process:
+        yield process.stdin
+        process.stdin.close()
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, cmd)
 
 
 if __name__ == '__main__':
@@ -4,6 +4,7 @@ import os
 import re
 import subprocess
 import tempfile
+from contextlib import ExitStack
 from shutil import copyfile
 
 import click
@@ -29,26 +30,31 @@ from robtools.txt import Parser
 @click.option('--threads', '-p', default=1, show_default=True,
               help='Number of threads used to process data per sample.')
 @click.option('--index', type=int, default=None, help='Index of sample to process in samples file.')
-def siqchip(samples, chromosomes, resolution, input_suffix, ip_suffix, params_suffix, output_suffix, threads, index):
+@click.option('--bed-index/--no-bed-index', default=False, show_default=True,
+              help='Write index of chromosomes next to input and IP BED files to skip parsing them in later runs.')
+def siqchip(samples, chromosomes, resolution, input_suffix, ip_suffix, params_suffix, output_suffix, threads, index,
+            bed_index):
     '''Runs siQ-ChIP for samples.'''
     logging.basicConfig(filename='robtools.log', level=logging.DEBUG, format='%(asctime)s %(levelname)-8s %(message)s',
                         datefmt='%Y-%m-%d %H:%M:%S')
     siqchip_samples(samples, chromosomes, resolution, input_suffix, ip_suffix, params_suffix, output_suffix, threads,
-                    index)
+                    index, bed_index)
 
 
 def siqchip_samples(samples, chromosomes='sacCer3.chrom.sizes', resolution='resi', input_suffix='-input-reads',
-                    ip_suffix='-reads', params_suffix='-params', output_suffix='-siqchip', threads=1, index=None):
+                    ip_suffix='-reads', params_suffix='-params', output_suffix='-siqchip', threads=1, index=None,
+                    bed_index=False):
     '''Runs siQ-ChIP for samples.'''
     sample_names = Parser.first(samples)
     if index != None:
         sample_names = [sample_names[index]]
     for sample in sample_names:
-        siqchip_sample(sample, chromosomes, resolution, input_suffix, ip_suffix, params_suffix, output_suffix, threads)
+        siqchip_sample(sample, chromosomes, resolution, input_suffix, ip_suffix, params_suffix, output_suffix, threads,
+                       bed_index)
 
 
 def siqchip_sample(sample, chromosomes='sacCer3.chrom.sizes', resolution='resi', input_suffix='-input-reads',
-                   ip_suffix='-reads', params_suffix='-params', output_suffix='-siqchip', threads=1):
+                   ip_suffix='-reads', params_suffix='-params', output_suffix='-siqchip', threads=1, bed_index=False):
     '''Runs siQ-ChIP for sample.'''
     print('Running siQ-ChIP for sample {}'.format(sample))
     input = sample + input_suffix + '.bed'
@@ -59,65 +65,84 @@ def siqchip_sample(sample, chromosomes='sacCer3.chrom.sizes', resolution='resi',
     bigwig = sample + output_suffix + '.bw'
     params = sample + params_suffix + '.in'
     chromosome_names = Parser.first(chromosomes)
-    input_chromosomes = read_chromosomes(input, 2)
-    ip_chromosomes = read_chromosomes(ip, 2)
-    chromosome_names = [chromosome for chromosome in chromosome_names if
-                        chromosome in input_chromosomes and chromosome in ip_chromosomes]
     chromosome_pattern = re.compile('chr(.*)')
-    cmds = [['bash', 'Slave.sh', chromosome_pattern.match(chromosome).group(1), input, ip] for chromosome in
-            chromosome_names]
     with tempfile.TemporaryDirectory() as folder:
-        prepare_parameters(folder, input, ip, params, resolution)
+        prepare_parameters(folder, params, resolution)
+        input_files, input_index = partition_bed(input, folder, chromosome_names, bed_index)
+        ip_files, ip_index = partition_bed(ip, folder, chromosome_names, bed_index)
+        chromosome_names = [chromosome for chromosome in chromosome_names if
+                            chromosome_count(input_index, chromosome) >= 2 and chromosome_count(ip_index, chromosome) >= 2]
+        cmds = [['bash', 'Slave.sh', chromosome_pattern.match(chromosome).group(1), input_files[chromosome],
+                 ip_files[chromosome]] for chromosome in chromosome_names]
         with multiprocessing.Pool(processes=threads) as pool:
             pool.starmap(run_siqchip, [(cmd, folder) for cmd in cmds])
-        with open(ce_output, 'w') as wfd:
-            for chromosome in chromosome_names:
-                siqchip_output = folder + '/' + chromosome + '.ce'
-                with open(siqchip_output, 'r') as fd:
-                    for line in fd:
-                        wfd.write(chromosome)
-                        wfd.write('\t')
-                        wfd.write('\t'.join(line.lstrip().split()[1:]))
-                        wfd.write('\n')
-        sort_output = folder + '/' + bed_output
-        Bed.sort(ce_output, sort_output)
-        with open(sort_output, 'r') as infile, open(bed_output, 'w') as outfile:
-            outfile.write(track)
-            outfile.write('\n')
-            for line in infile:
-                columns = line.rstrip('\n\r').split('\t')
-                outfile.write(columns[0])
-                outfile.write('\t')
-                outfile.write(columns[1])
-                outfile.write('\t')
-                outfile.write(columns[2])
-                outfile.write('\t')
-                outfile.write(columns[3])
-                outfile.write('\n')
+        merge_ce(folder, chromosome_names, ce_output, bed_output, track)
         Bed.bedgraph_to_bigwig(bed_output, bigwig, chromosomes)
 
 
-def read_chromosomes(bed, minimum_count=1):
-    chromosomes = dict()
-    with open(bed, 'r') as infile:
-        for line in infile:
-            if line.startswith('track') or line.startswith('browser') or line.startswith('#'):
+def partition_bed(bed, folder, chromosomes, bed_index=False):
+    '''Copies annotations of BED into one file per chromosome in folder, reading BED only once.
+
+    Returns filenames of copies, relative to folder, by chromosome and the index of chromosomes of BED,
+    see Bed.index_chunk. Annotations located on other chromosomes are skipped.
+    When the index of chromosomes of BED is available, only the byte ranges of each chromosome are read,
+    otherwise the index is built while copying and written next to BED if bed_index is True.
+    In both cases, annotations are parsed and formatted the same way.'''
+    files = {chromosome: chromosome + '-' + os.path.basename(bed) for chromosome in chromosomes}
+    index = Bed.read_chromosome_index(bed)
+    if index is not None and all(index[chromosome]['ranges'] is not None for chromosome in chromosomes
+                                 if chromosome in index):
+        for chromosome in chromosomes:
+            ranges = index[chromosome]['ranges'] if chromosome in index else []
+            Bed.write_chunks(os.path.join(folder, files[chromosome]), Bed.range_chunks(bed, ranges))
+        return files, index
+    index = {}
+    with ExitStack() as stack:
+        outfiles = {chromosome: stack.enter_context(open(os.path.join(folder, files[chromosome]), 'wb'))
+                    for chromosome in chromosomes}
+        for chunk in Bed.chunks(bed):
+            if isinstance(chunk, bytes):
                 continue
-            columns = line.rstrip('\r\n').split('\t')
-            if not columns[0] in chromosomes:
-                chromosomes[columns[0]] = 0
-            chromosomes[columns[0]] = chromosomes[columns[0]] + 1
-    return set([chromosome for chromosome in chromosomes if chromosomes[chromosome] >= minimum_count])
-
-
-def prepare_parameters(folder, input, ip, params, resolution):
+            Bed.index_chunk(index, chunk)
+            for code, chromosome in enumerate(chunk['names']):
+                if chromosome in outfiles:
+                    outfiles[chromosome].write(Bed.format_chunk(Bed.select(chunk, chunk['chromosomes'] == code)))
+    if bed_index:
+        Bed.write_chromosome_index(bed, index)
+    return files, index
+
+
+def chromosome_count(index, chromosome):
+    '''Returns number of annotations on chromosome in index of chromosomes.'''
+    return index[chromosome]['count'] if chromosome in index else 0
+
+
+def merge_ce(folder, chromosomes, ce_output, bed_output, track):
+    '''Merges siQ-ChIP outputs of chromosomes into a CE file and a bedGraph file, sorted by chromosome and start.'''
+    with open(ce_output, 'w') as ce_outfile, open(bed_output, 'w') as bed_outfile:
+        bed_outfile.write(track)
+        bed_outfile.write('\n')
+        for chromosome in sorted(chromosomes):
+            with open(folder + '/' + chromosome + '.ce', 'r') as infile:
+                rows = [line.lstrip().split()[1:] for line in infile]
+            rows.sort(key=lambda columns: (float(columns[0]), float(columns[1])))
+            for columns in rows:
+                ce_outfile.write(chromosome)
+                ce_outfile.write('\t')
+                ce_outfile.write('\t'.join(columns))
+                ce_outfile.write('\n')
+                bed_outfile.write(chromosome)
+                bed_outfile.write('\t')
+                bed_outfile.write('\t'.join(columns[:3]))
+                bed_outfile.write('\n')
+
+
+def prepare_parameters(folder, params, resolution):
     siqchip_base = os.getenv('SIQ_CHIP_BASE', '')
     siqchip_source = (siqchip_base + '/' if siqchip_base else '') + '2Dlow-mem.f'
     siqchip_exec = (siqchip_base + '/' if siqchip_base else '') + 'Slave.sh'
     copyfile(siqchip_source, folder + '/2Dlow-mem.f')
     copyfile(siqchip_exec, folder + '/Slave.sh')
-    copyfile(input, folder + '/' + input)
-    copyfile(ip, folder + '/' + ip)
     copyfile(params, folder + '/params.in')
     copyfile(resolution, folder + '/resi')
 
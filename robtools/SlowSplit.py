@@ -1,8 +1,7 @@
 import logging
-import os
-import re
 
 import click
+from robtools import Split
 from robtools.txt import Parser
 
 
@@ -18,7 +17,9 @@ from robtools.txt import Parser
 @click.option('--binMaxLength', '-L', type=int, default=500, show_default=True,
               help='Last bin maximum length.')
 def slowsplit(samples, index, binlength, binminlength, binmaxlength):
-    '''Split BED files from samples based on lenght of annotations.'''
+    '''Split BED files from samples based on lenght of annotations.
+
+    Same as split, kept for compatibility. Header lines are not copied to splits.'''
     logging.basicConfig(filename='robtools.log', level=logging.DEBUG, format='%(asctime)s %(levelname)-8s %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
     split_samples(samples, index, binlength, binminlength, binmaxlength)
 
@@ -34,31 +35,7 @@ def split_samples(samples='samples.txt', index=None, binlength=10, binminlength=
 
 def split_sample(sample, binlength, binminlength, binmaxlength):
     '''Split BED file from a single sample based on lenght of annotations.'''
-    print ('Split BED file of sample {}'.format(sample))
-    if binlength is not None:
-        bed = sample + '.bed'
-        for bin_start in range(binminlength, binmaxlength, binlength):
-            bin_end = min(bin_start + binlength, binmaxlength)
-            sample_bin = '{}-{}-{}'.format(sample, bin_start, bin_end)
-            bed_bin = sample_bin + '.bed'
-            print ('Splitting BED {} to BIN {}'.format(bed, bed_bin))
-            filter_bed_by_length(bed, bed_bin, bin_start, bin_end)
-
-
-def filter_bed_by_length(bed, output, minLength, maxLength):
-    '''Filter BED file and keep only annotations that have specified size. Minimum size is included but max size is excluded.'''
-    with open(bed, 'r') as infile, open(output, 'w') as outfile:
-        for line in infile:
-            if line.startswith('track') or line.startswith('browser') or line.startswith('#'):
-                outfile.write(line)
-                continue
-            columns = line.rstrip('\r\n').split('\t')
-            if len(columns) >= 3:
-                start = int(columns[1])
-                end = int(columns[2])
-                length = end - start
-                if length >= minLength and length < maxLength:
-                    outfile.write(line)
+    Split.split_sample(sample, binlength, binminlength, binmaxlength)
 
 
 if __name__ == '__main__':
@@ -1,14 +1,16 @@
-import datetime
+from contextlib import ExitStack
 import logging
 import os
 import re
-import subprocess
+import shutil
 import tempfile
 
 import click
 from robtools.bed import Bed
 from robtools.txt import Parser
 
+BUFFER_SIZE = 1048576
+
 
 @click.command()
 @click.option('--samples', '-s', type=click.Path(exists=True), default='samples.txt', show_default=True,
@@ -41,33 +43,43 @@ def split_sample(sample, binlength, binminlength, binmaxlength):
     print ('Split BED file of sample {}'.format(sample))
     if binlength is not None:
         bed = sample + '.bed'
-        bed_sort_o, bed_sort = tempfile.mkstemp(suffix='.bed')
-        Bed.sort_bysize(bed, bed_sort)
-        with open(bed_sort, 'r') as infile:
-            line = infile.readline()
-            length = annotation_length(line)
-            for bin_start in range(binminlength, binmaxlength, binlength):
-                bin_end = min(bin_start + binlength, binmaxlength)
-                bin_temp_o, bin_temp = tempfile.mkstemp(suffix='.bed')
-                bin_file = '{}-{}-{}.bed'.format(sample, bin_start, bin_end)
-                print ('Splitting BED {} to BIN {}'.format(bed_sort, bin_file))
-                with open(bin_temp_o, 'w') as outfile:
-                    while line != '' and length < bin_end:
-                        if length >= bin_start:
-                            outfile.write(line)
-                        line = infile.readline()
-                        length = annotation_length(line)
-                Bed.sort(bin_temp, bin_file)
-                os.remove(bin_temp)
-        os.remove(bed_sort)
-
-
-def annotation_length(line):
-    columns = line.rstrip('\r\n').split('\t')
-    length = -1
-    if len(columns) >= 3:
-        length = int(columns[2]) - int(columns[1])
-    return length
+        bin_files = ['{}-{}-{}.bed'.format(sample, bin_start, min(bin_start + binlength, binmaxlength)) for bin_start in range(binminlength, binmaxlength, binlength)]
+        print ('Splitting BED {} to BINs {}'.format(bed, bin_files))
+        unsorted_files = split_bed_by_length(bed, bin_files, binlength, binminlength, binmaxlength)
+        for bin_file in unsorted_files:
+            logging.debug('BIN {} is not sorted, sorting it'.format(bin_file))
+            bin_temp_o, bin_temp = tempfile.mkstemp(suffix='.bed')
+            os.close(bin_temp_o)
+            Bed.sort(bin_file, bin_temp)
+            shutil.move(bin_temp, bin_file)
+
+
+def split_bed_by_length(bed, outputs, binlength, binminlength, binmaxlength):
+    '''Split BED file in bins based on length of annotations in a single pass, returns bins that are not sorted.'''
+    bin_lookup = [(length - binminlength) // binlength for length in range(binminlength, binmaxlength)]
+    last_annotations = [None] * len(outputs)
+    unsorted = [False] * len(outputs)
+    with ExitStack() as stack:
+        outfiles = [stack.enter_context(open(output, 'w', buffering=BUFFER_SIZE)) for output in outputs]
+        with open(bed, 'r', buffering=BUFFER_SIZE) as infile:
+            for line in infile:
+                if line.startswith('track') or line.startswith('browser') or line.startswith('#'):
+                    continue
+                columns = line.split('\t', 3)
+                if len(columns) < 3:
+                    continue
+                start = int(columns[1])
+                end = int(columns[2])
+                length = end - start
+                if length < binminlength or length >= binmaxlength:
+                    continue
+                bin_index = bin_lookup[length - binminlength]
+                annotation = (columns[0], start, end)
+                if not unsorted[bin_index] and last_annotations[bin_index] is not None and annotation < last_annotations[bin_index]:
+                    unsorted[bin_index] = True
+                last_annotations[bin_index] = annotation
+                outfiles[bin_index].write(line)
+    return [output for output, bin_unsorted in zip(outputs, unsorted) if bin_unsorted]
 
 
 def splits(sample):
@@ -84,5 +96,11 @@ def splitkey(split):
     return int(re.search('(\\d+)-\\d+$', split).group(1))
 
 
+def splitbin(split):
+    '''Returns minimum and maximum length of annotations in split.'''
+    match = re.search('(\\d+)-(\\d+)$', split)
+    return (int(match.group(1)), int(match.group(2)))
+
+
 if __name__ == '__main__':
     split()
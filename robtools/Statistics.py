@@ -6,10 +6,14 @@ import subprocess
 
 import click
 
+import numpy as np
 from robtools import Split
 from robtools.bed import Bed
+from robtools.jobs import Jobs
 from robtools.txt import Parser
 
+FLAGSTAT_COUNTS = {'in total': 'total', 'mapped (': 'mapped', 'duplicates': 'duplicates'}
+
 
 @click.command()
 @click.option('--samples', '-s', type=click.Path(exists=True), default='samples.txt', show_default=True,
@@ -26,32 +30,30 @@ from robtools.txt import Parser
               help='Compute fragments statistics.')
 @click.option('--output', '-o', type=click.Path(), default='statistics.txt', show_default=True,
               help='Output file were statistics are written.')
-def statistics(samples, datasets, bam_suffix, filtered_suffix, fragment_suffix, fragments, output):
+@click.option('--threads', '-t', default=1, show_default=True,
+              help='Number of threads used by samtools to process BAM.')
+@Jobs.jobs_option
+def statistics(samples, datasets, bam_suffix, filtered_suffix, fragment_suffix, fragments, output, threads, jobs):
     '''Creates statistics file for samples.'''
     logging.basicConfig(filename='robtools.log', level=logging.DEBUG, format='%(asctime)s %(levelname)-8s %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
-    statistics_samples(samples, datasets, bam_suffix, filtered_suffix, fragment_suffix, fragments, output)
+    statistics_samples(samples, datasets, bam_suffix, filtered_suffix, fragment_suffix, fragments, output, threads, jobs)
 
 
-def statistics_samples(samples='samples.txt', datasets='dataset.txt', bam_suffix='', filtered_suffix='-filtered', fragment_suffix='', fragments=False, output='statistics.txt'):
+def statistics_samples(samples='samples.txt', datasets='dataset.txt', bam_suffix='', filtered_suffix='-filtered', fragment_suffix='', fragments=False, output='statistics.txt', threads=None, jobs=None):
     '''Creates statistics file for samples.'''
     sample_names = Parser.first(samples)
     datasets_names = []
     if os.path.exists(datasets):
         datasets_names = Parser.first(datasets)
-    compute_statistics(sample_names, datasets_names, bam_suffix, filtered_suffix, fragment_suffix, fragments, output)
+    compute_statistics(sample_names, datasets_names, bam_suffix, filtered_suffix, fragment_suffix, fragments, output, threads, jobs)
 
 
-def compute_statistics(samples, datasets, bam_suffix='', filtered_suffix='-filtered', fragment_suffix='', fragments=False, output='statistics.txt'):
+def compute_statistics(samples, datasets, bam_suffix='', filtered_suffix='-filtered', fragment_suffix='', fragments=False, output='statistics.txt', threads=None, jobs=None):
     all_headers = headers(samples, datasets, fragments)
     splits = all_headers[1]
-    samples_stats = []
-    for sample in samples:
-        sample_stats = sample_statistics(sample, splits, bam_suffix, filtered_suffix, fragment_suffix, fragments)
-        samples_stats.append(sample_stats)
-    if datasets:
-        for dataset in datasets:
-            sample_stats = sample_statistics(dataset, splits, bam_suffix, filtered_suffix, fragment_suffix, fragments)
-            samples_stats.append(sample_stats)
+    names = list(samples) + (list(datasets) if datasets else [])
+    samples_stats = Jobs.run(sample_statistics,
+                             [(name, splits, bam_suffix, filtered_suffix, fragment_suffix, fragments, threads) for name in names], jobs)
     with open(output, 'w') as out:
         out.write('\t'.join(all_headers[0]))
         out.write('\n')
@@ -74,17 +76,19 @@ def headers(samples, datasets, fragments):
     splits_headers = [header for header in splits_headers]
     splits_headers.sort(key=Split.splitkey)
     headers.extend(splits_headers)
+    headers.extend(['Aligned reads', 'Duplicate reads'])
     return (headers, splits_headers)
     
     
-def sample_statistics(sample, splits, bam_suffix='', filtered_suffix='-filtered', fragment_suffix='', fragments=False):
+def sample_statistics(sample, splits, bam_suffix='', filtered_suffix='-filtered', fragment_suffix='', fragments=False, threads=None):
     '''Statistics of a single sample.'''
     print ('Computing statistics for sample {}'.format(sample))
     sample_stats = [sample]
     bam = sample + bam_suffix + '.bam'
-    sample_stats.append(flagstat_total(bam) if os.path.isfile(bam) else '')
+    bam_stats = flagstat(bam, threads) if os.path.isfile(bam) else {}
+    sample_stats.append(bam_stats.get('total', ''))
     bam_filtered = sample + filtered_suffix + '.bam'
-    sample_stats.append(flagstat_total(bam_filtered) if os.path.isfile(bam_filtered) else '')
+    sample_stats.append(flagstat(bam_filtered, threads)['total'] if os.path.isfile(bam_filtered) else '')
     bed = sample + fragment_suffix + '.bed'
     sample_stats.extend([Bed.count_bed(bed) * 2 if os.path.isfile(bed) else ''])
     if fragments:
@@ -95,26 +99,35 @@ def sample_statistics(sample, splits, bam_suffix='', filtered_suffix='-filtered'
         beds = [sample + fragment_suffix + '-' + split + '.bed' for split in splits]
         counts = [Bed.count_bed(sbed) if os.path.isfile(sbed) else '' for sbed in beds]
         sample_stats.extend(counts)
+    sample_stats.append(bam_stats.get('mapped', ''))
+    sample_stats.append(bam_stats.get('duplicates', ''))
     return sample_stats
 
 
-def flagstat_total(bam):
-    cmd = ['samtools', 'flagstat', bam]
+def flagstat(bam, threads=None):
+    '''Returns total, mapped and duplicates counts of BAM computed by a single samtools flagstat.
+
+    Counts only include reads that passed quality checks.'''
+    cmd = ['samtools', 'flagstat']
+    if threads is not None and threads > 1:
+        cmd.extend(['-@', str(threads - 1)])
+    cmd.append(bam)
     logging.debug('Running {}'.format(cmd))
     output = subprocess.run(cmd, capture_output=True, check=True)
-    return re.search('^\\d+', output.stdout.decode('utf-8')).group()
+    counts = {}
+    for line in output.stdout.decode('utf-8').splitlines():
+        match = re.match('^(\\d+) \\+ (\\d+) (in total|mapped \\(|duplicates)', line)
+        if match:
+            counts[FLAGSTAT_COUNTS[match.group(3)]] = int(match.group(1))
+    return counts
 
 
 def fragment_sizes(bed):
-    sizes = []
-    with open(bed, 'r') as infile:
-        for line in infile:
-            if line.startswith('track') or line.startswith('browser') or line.startswith('#'):
-                continue
-            columns = line.rstrip('\r\n').split('\t')
-            size = abs(int(columns[2]) - int(columns[1]))
-            sizes.append(size)
-    return sizes
+    cache = Bed.read_cache(bed)
+    if cache is not None:
+        return np.abs(cache['ends'] - cache['starts']).tolist()
+    sizes = [np.abs(chunk['ends'] - chunk['starts']) for chunk in Bed.chunks(bed) if not isinstance(chunk, bytes)]
+    return np.concatenate(sizes).tolist() if sizes else []
 
 
 if __name__ == '__main__':
@@ -1,15 +1,36 @@
 import logging
+import os
 import subprocess
+import sys
+import tempfile
 
 
 def sort(bam_input, bam_output, threads=None):
     """Sorts BAM file by location."""
+    cmd = sort_command(bam_input, bam_output, threads)
+    logging.debug('Running {}'.format(cmd))
+    subprocess.run(cmd, check=True)
+
+
+def sort_command(bam_input, bam_output, threads=None, memory=None):
+    """Returns samtools command that sorts BAM file by location, use '-' as bam_input to sort standard input."""
     cmd = ['samtools', 'sort']
     if not threads is None and threads > 1:
         cmd.extend(['--threads', str(threads - 1)])
+    if memory:
+        cmd.extend(['-m', str(memory)])
     cmd.extend(['-o', bam_output, bam_input])
-    logging.debug('Running {}'.format(cmd))
-    subprocess.run(cmd, check=True)
+    return cmd
+
+
+def sort_stream(cmd, bam_output, threads=None, memory=None):
+    """Sorts BAM file by location as it is written to standard output by command, removes BAM file if any command fails."""
+    try:
+        run_pipeline([cmd, sort_command('-', bam_output, threads, memory)])
+    except subprocess.CalledProcessError:
+        if os.path.exists(bam_output):
+            os.remove(bam_output)
+        raise
 
 
 def sort_by_readname(bam_input, bam_output, threads=None):
@@ -20,3 +41,45 @@ def sort_by_readname(bam_input, bam_output, threads=None):
     cmd.extend(['-o', bam_output, bam_input])
     logging.debug('Running {}'.format(cmd))
     subprocess.run(cmd, check=True)
+
+
+def run_pipeline(cmds, stdout=None):
+    """Runs commands with output of each command piped to the next command.
+
+    Standard error of each command is written to standard error once the pipeline completes.
+    If some commands fail, raises CalledProcessError for the last failing command, with standard error of all failing commands."""
+    logging.debug('Running {}'.format(' | '.join([str(cmd) for cmd in cmds])))
+    processes = []
+    stderrs = []
+    previous_stdout = None
+    try:
+        for i, cmd in enumerate(cmds):
+            last = i == len(cmds) - 1
+            stderr = tempfile.TemporaryFile()
+            stderrs.append(stderr)
+            process = subprocess.Popen(cmd, stdin=previous_stdout, stdout=stdout if last else subprocess.PIPE, stderr=stderr)
+            if previous_stdout is not None:
+                previous_stdout.close()
+            previous_stdout = process.stdout
+            processes.append(process)
+        returncodes = [process.wait() for process in processes]
+        errors = []
+        for stderr in stderrs:
+            stderr.seek(0)
+            errors.append(stderr.read())
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+        for stderr in stderrs:
+            stderr.close()
+    for error in errors:
+        sys.stderr.write(error.decode(errors='replace'))
+    failures = [(cmd, returncode, error) for cmd, returncode, error in zip(cmds, returncodes, errors) if returncode != 0]
+    for cmd, returncode, error in failures:
+        logging.error('Command {} returned {}: {}'.format(cmd, returncode, error.decode(errors='replace').strip()))
+    if failures:
+        stderr = b''.join('{}:\n'.format(' '.join(str(arg) for arg in cmd)).encode() + error for cmd, returncode, error in failures)
+        cmd, returncode, error = failures[-1]
+        raise subprocess.CalledProcessError(returncode, cmd, stderr=stderr)
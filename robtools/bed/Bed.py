@@ -1,24 +1,450 @@
+import json
 import logging
 import os
+import struct
 import subprocess
+import tempfile
+import zipfile
+
+import numpy as np
+
+CHUNK_SIZE = 16777216
+HEADERS = (b'track', b'browser', b'#')
+NEWLINE = ord('\n')
+CARRIAGE_RETURN = ord('\r')
+TAB = ord('\t')
+CACHE_SUFFIX = 'z'
+COUNTS_SUFFIX = '.count'
+INDEX_SUFFIX = '.chromosomes'
+INDEX_MAX_RANGES = 10000
+SIDECAR_MIN_SIZE = CHUNK_SIZE
+counts_memo = {}
 
 
 def count_bed(bed, *, strand=None):
-    '''Counts number of entry in BED, can be limited to a specific strand.'''
+    '''Counts number of entry in BED, can be limited to a specific strand.
+
+    Counts are read from the binary cache of BED when it is valid, see read_cache.
+    Otherwise, counts are memoized using path, size and modification time of BED, in memory and in a sidecar file
+    for large BED.'''
+    cache = read_cache(bed)
+    if cache is not None:
+        return int(cache['lines'][0]) if strand is None else int(np.count_nonzero(cache['strands'] == strand.encode()))
+    stat = os.stat(bed)
+    key = (os.path.abspath(bed), stat.st_size, stat.st_mtime_ns)
+    counts = counts_memo.get(key)
+    if counts is None:
+        counts = read_counts(bed, stat)
+    if strand is None and 'lines' not in counts:
+        counts['lines'] = count_lines(bed)
+        write_counts(bed, stat, counts)
+    elif strand is not None and 'strands' not in counts:
+        counts['strands'] = count_strands(bed)
+        write_counts(bed, stat, counts)
+    counts_memo[key] = counts
+    return counts['lines'] if strand is None else counts['strands'].get(strand, 0)
+
+
+def count_lines(bed, chunk_size=CHUNK_SIZE):
+    '''Counts lines of BED that are not header lines by counting line feeds in blocks of chunk_size bytes.'''
     count = 0
-    with open(bed, 'r') as infile:
-        for line in infile:
-            if line.startswith('track') or line.startswith('browser') or line.startswith('#'):
+    remaining = b''
+    with open(bed, 'rb') as infile:
+        while True:
+            block = infile.read(chunk_size)
+            if not block:
+                break
+            last = block.rfind(b'\n')
+            if last == -1:
+                remaining += block
                 continue
-            if strand is None:
-                count += 1
-            else:
-                columns = line.rstrip('\r\n').split('\t')
-                if len(columns) >= 6 and columns[5] == strand:
-                    count += 1
+            lines = remaining + block[:last + 1] if remaining else block[:last + 1]
+            remaining = block[last + 1:]
+            count += lines.count(b'\n') - count_headers(lines)
+    if remaining:
+        count += 1 - count_headers(remaining)
     return count
 
 
+def count_headers(lines):
+    '''Counts header lines (track, browser and comments) in complete BED lines.'''
+    data = np.frombuffer(lines, dtype=np.uint8)
+    starts = np.flatnonzero(data[:-1] == NEWLINE) + 1
+    first = data[starts]
+    candidates = starts[(first == ord('t')) | (first == ord('b')) | (first == ord('#'))]
+    return sum(lines.startswith(HEADERS, start) for start in candidates) + lines.startswith(HEADERS)
+
+
+def count_strands(bed):
+    '''Returns number of entry in BED for each strand.'''
+    counts = {}
+    for chunk in chunks(bed, 6):
+        if isinstance(chunk, bytes):
+            continue
+        values, value_counts = np.unique(strands(chunk), return_counts=True)
+        for value, count in zip(values, value_counts):
+            counts[value.decode()] = counts.get(value.decode(), 0) + int(count)
+    return counts
+
+
+def counts_path(bed):
+    '''Returns path of the sidecar file containing counts of BED file.'''
+    return str(bed) + COUNTS_SUFFIX
+
+
+def read_counts(bed, stat):
+    '''Returns counts of BED read from sidecar file, or an empty dictionary if sidecar file is missing or stale.'''
+    try:
+        with open(counts_path(bed), 'r') as infile:
+            counts = json.load(infile)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(counts, dict) or counts.pop('source', None) != [stat.st_size, stat.st_mtime_ns]:
+        return {}
+    return counts
+
+
+def write_counts(bed, stat, counts):
+    '''Writes counts of BED to sidecar file, if BED is large enough for counting to be slow.'''
+    if stat.st_size < SIDECAR_MIN_SIZE:
+        return
+    try:
+        with open(counts_path(bed), 'w') as outfile:
+            json.dump(dict(counts, source=[stat.st_size, stat.st_mtime_ns]), outfile)
+    except OSError as e:
+        logging.debug('Could not write counts of BED {}: {}'.format(bed, e))
+
+
+def chunks(bed, min_columns=3, chunk_size=CHUNK_SIZE):
+    '''Reads BED file by blocks of about chunk_size bytes.
+
+    Yields header lines (track, browser and comments) as bytes, untouched, and annotations as chunks.
+    A chunk is a dictionary of columns as NumPy arrays:
+      names: names of chromosomes present in chunk
+      chromosomes: index of chromosome name of annotations in names
+      starts, ends: start and end of annotations
+      columns: list of other columns, as bytes
+      byte_starts, byte_ends: position of the first byte of annotation lines in BED and of the byte following them
+    Annotations that have less than min_columns columns are skipped, min_columns is at least 3.'''
+    min_columns = max(min_columns, 3)
+    with open(bed, 'rb') as infile:
+        while True:
+            offset = infile.tell()
+            block = infile.read(chunk_size)
+            if not block:
+                break
+            if not block.endswith(b'\n'):
+                block += infile.readline()
+            yield from parse_block(block, min_columns, offset)
+
+
+def range_chunks(bed, ranges, min_columns=3, chunk_size=CHUNK_SIZE):
+    '''Reads byte ranges [start, end[ of BED by blocks of about chunk_size bytes, ranges must contain complete lines.
+
+    Yields header lines and chunks of annotations like chunks.'''
+    min_columns = max(min_columns, 3)
+    with open(bed, 'rb') as infile:
+        for start, end in ranges:
+            infile.seek(start)
+            offset = start
+            while offset < end:
+                block = infile.read(min(chunk_size, end - offset))
+                if not block:
+                    break
+                if not block.endswith(b'\n') and offset + len(block) < end:
+                    block += infile.readline()
+                yield from parse_block(block, min_columns, offset)
+                offset += len(block)
+
+
+def parse_block(block, min_columns=3, offset=0):
+    '''Yields header lines and chunks of annotations of a block of complete BED lines located at offset in BED.'''
+    data = np.frombuffer(block, dtype=np.uint8)
+    ends = np.flatnonzero(data == NEWLINE) + 1
+    if len(ends) == 0 or ends[-1] != len(block):
+        ends = np.append(ends, len(block))
+    starts = np.concatenate(([0], ends[:-1]))
+    first = data[starts]
+    candidates = np.flatnonzero((first == ord('t')) | (first == ord('b')) | (first == ord('#')))
+    headers = [i for i in candidates if block.startswith(HEADERS, starts[i])]
+    previous = 0
+    for i in headers + [len(starts)]:
+        if i > previous:
+            yield from parse_annotations(data, starts[previous:i], ends[previous:i], min_columns, offset)
+        if i < len(starts):
+            yield block[starts[i]:ends[i]]
+        previous = i + 1
+
+
+def parse_annotations(data, starts, ends, min_columns=3, offset=0):
+    '''Yields chunks of annotations of BED lines located between starts and ends in data, data is located at offset.
+
+    Consecutive lines that have the same number of columns are parsed in the same chunk.'''
+    stops = ends - (data[ends - 1] == NEWLINE)
+    stops -= (stops > starts) & (data[np.maximum(stops - 1, 0)] == CARRIAGE_RETURN)
+    tabs = np.flatnonzero(data[starts[0]:ends[-1]] == TAB) + starts[0]
+    first_tabs = np.searchsorted(tabs, starts)
+    counts = np.searchsorted(tabs, stops) - first_tabs + 1
+    keep = counts >= min_columns
+    starts, ends, stops, first_tabs, counts = starts[keep], ends[keep], stops[keep], first_tabs[keep], counts[keep]
+    runs = np.flatnonzero(np.diff(counts)) + 1
+    for run in np.split(np.arange(len(starts)), runs):
+        if len(run) > 0:
+            line_tabs = tabs[first_tabs[run, None] + np.arange(counts[run[0]] - 1)]
+            field_starts = np.column_stack((starts[run], line_tabs + 1))
+            field_stops = np.column_stack((line_tabs, stops[run]))
+            fields = [field_bytes(data, field_starts[:, i], field_stops[:, i]) for i in range(counts[run[0]])]
+            names, chromosomes = np.unique(fields[0], return_inverse=True)
+            yield {'names': np.array([name.decode() for name in names], dtype=object), 'chromosomes': chromosomes,
+                   'starts': parse_integers(fields[1]), 'ends': parse_integers(fields[2]), 'columns': fields[3:],
+                   'byte_starts': starts[run] + offset, 'byte_ends': ends[run] + offset}
+
+
+def field_bytes(data, starts, stops):
+    '''Returns values of fields located between starts and stops in data as a bytes array.'''
+    lengths = stops - starts
+    width = max(lengths.max(), 1)
+    positions = np.arange(width)
+    matrix = data[np.minimum(starts[:, None] + positions, len(data) - 1)]
+    matrix = np.where(positions < lengths[:, None], matrix, 0).astype(np.uint8)
+    return matrix.view('S' + str(width)).ravel()
+
+
+def parse_integers(values):
+    '''Returns integers parsed from a bytes array.'''
+    matrix = as_matrix(values)
+    digits = matrix.astype(np.int64) - ord('0')
+    present = matrix != 0
+    if not ((digits >= 0) & (digits <= 9) | ~present).all() or not present[:, 0].all():
+        return values.astype(np.int64)
+    integers = np.zeros(len(values), dtype=np.int64)
+    for column in range(matrix.shape[1]):
+        integers = np.where(present[:, column], integers * 10 + digits[:, column], integers)
+    return integers
+
+
+def integers_matrix(integers):
+    '''Returns integers formatted as a matrix of characters, one row per integer, padded with null characters.'''
+    if len(integers) == 0 or integers.min() < 0:
+        return as_matrix(integers.astype(bytes))
+    width = len(str(integers.max()))
+    matrix = np.zeros((len(integers), width), dtype=np.uint8)
+    remaining = integers.copy()
+    for position in range(width - 1, -1, -1):
+        matrix[:, position] = np.where(remaining > 0, remaining % 10 + ord('0'), 0)
+        remaining //= 10
+    matrix[integers == 0, width - 1] = ord('0')
+    return matrix
+
+
+def as_matrix(values):
+    '''Returns bytes array as a matrix of characters, one row per value, padded with null characters.'''
+    return values.view(np.uint8).reshape(len(values), -1)
+
+
+def strands(chunk):
+    '''Returns strands of annotations in chunk, or None if annotations don't have a strand.'''
+    return chunk['columns'][2] if len(chunk['columns']) >= 3 else None
+
+
+def select(chunk, rows):
+    '''Returns chunk containing only selected rows, rows can be a boolean mask or indexes.'''
+    selected = dict(chunk, chromosomes=chunk['chromosomes'][rows], starts=chunk['starts'][rows],
+                    ends=chunk['ends'][rows], columns=[column[rows] for column in chunk['columns']])
+    for key in ['byte_starts', 'byte_ends']:
+        if key in chunk:
+            selected[key] = chunk[key][rows]
+    return selected
+
+
+def format_chunk(chunk):
+    '''Returns annotations of chunk formatted as BED lines.
+
+    Columns are converted to matrices of characters padded with null characters that are removed once
+    all columns are concatenated.'''
+    count = len(chunk['starts'])
+    if count == 0:
+        return b''
+    names = np.array([name.encode() for name in chunk['names']])
+    matrices = [as_matrix(names[chunk['chromosomes']]), integers_matrix(chunk['starts']), integers_matrix(chunk['ends'])]
+    matrices.extend([as_matrix(column) for column in chunk['columns']])
+    tabs = np.full((count, 1), TAB, dtype=np.uint8)
+    parts = []
+    for matrix in matrices:
+        parts.extend([matrix, tabs])
+    parts[-1] = np.full((count, 1), NEWLINE, dtype=np.uint8)
+    lines = np.hstack(parts)
+    return lines[lines != 0].tobytes()
+
+
+def write_chunks(output, items):
+    '''Writes header lines and chunks of annotations to BED file.'''
+    with open(output, 'wb') as outfile:
+        for item in items:
+            outfile.write(item if isinstance(item, bytes) else format_chunk(item))
+
+
+def cache_path(bed):
+    '''Returns path of the binary cache of BED file.'''
+    return str(bed) + CACHE_SUFFIX
+
+
+def write_cache(bed):
+    '''Writes binary cache of BED file, an uncompressed NPZ file next to BED.
+
+    The cache contains chromosome, start, end and strand of annotations as arrays that can be memory-mapped:
+      names: names of chromosomes, in order of first appearance
+      chromosomes: index of chromosome name of annotations in names
+      starts, ends: start and end of annotations
+      strands: strand of annotations, empty if annotation does not have a strand
+      counts: number of annotations on each chromosome
+      offsets: index of first annotation of each chromosome followed by the number of annotations,
+               empty if annotations of a chromosome are not consecutive
+      lines: number of lines of BED that are not header lines, see count_lines
+      source: size and modification time of BED in nanoseconds, used to detect a stale cache
+    Lines that have less than 3 columns are counted in lines but are not part of the other arrays.'''
+    print('Writing binary cache of BED {}'.format(bed))
+    stat = os.stat(bed)
+    indexes = {}
+    chromosomes, starts, ends, signs = [], [], [], []
+    for chunk in chunks(bed):
+        if isinstance(chunk, bytes):
+            continue
+        codes = np.array([indexes.setdefault(name, len(indexes)) for name in chunk['names']], dtype=np.int32)
+        chromosomes.append(codes[chunk['chromosomes']])
+        starts.append(chunk['starts'])
+        ends.append(chunk['ends'])
+        chunk_strands = strands(chunk)
+        signs.append(chunk_strands.astype('S1') if chunk_strands is not None
+                     else np.zeros(len(chunk['starts']), dtype='S1'))
+    chromosomes = np.concatenate(chromosomes) if chromosomes else np.zeros(0, dtype=np.int32)
+    changes = np.flatnonzero(np.diff(chromosomes)) + 1
+    offsets = np.concatenate(([0], changes, [len(chromosomes)])) if len(chromosomes) > 0 else np.zeros(1, dtype=np.int64)
+    if len(offsets) - 1 != len(indexes):
+        offsets = np.zeros(0, dtype=np.int64)
+    output = cache_path(bed)
+    temp_o, temp = tempfile.mkstemp(prefix=os.path.basename(output) + '.', dir=os.path.dirname(os.path.abspath(output)))
+    try:
+        with open(temp_o, 'wb') as outfile:
+            np.savez(outfile, names=np.array(list(indexes), dtype=str), chromosomes=chromosomes,
+                     starts=np.concatenate(starts) if starts else np.zeros(0, dtype=np.int64),
+                     ends=np.concatenate(ends) if ends else np.zeros(0, dtype=np.int64),
+                     strands=np.concatenate(signs) if signs else np.zeros(0, dtype='S1'),
+                     counts=np.bincount(chromosomes, minlength=len(indexes)), offsets=offsets,
+                     lines=np.array([count_lines(bed)], dtype=np.int64),
+                     source=np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64))
+        os.replace(temp, output)
+    except BaseException:
+        os.remove(temp)
+        raise
+
+
+def read_cache(bed):
+    '''Returns arrays of binary cache of BED file, memory-mapped, or None if cache is missing or stale.
+
+    See write_cache for the content of the cache.'''
+    cache = cache_path(bed)
+    if not os.path.isfile(cache) or not os.path.isfile(bed):
+        return None
+    try:
+        arrays = memmap_arrays(cache)
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+        logging.warning('Could not read binary cache {} of BED {}: {}'.format(cache, bed, e))
+        return None
+    stat = os.stat(bed)
+    if 'source' not in arrays or 'lines' not in arrays or list(arrays['source']) != [stat.st_size, stat.st_mtime_ns]:
+        logging.debug('Binary cache {} of BED {} is stale'.format(cache, bed))
+        return None
+    return arrays
+
+
+def memmap_arrays(npz):
+    '''Returns arrays of an uncompressed NPZ file, memory-mapped when possible.'''
+    arrays = {}
+    with zipfile.ZipFile(npz) as archive, open(npz, 'rb') as infile:
+        for info in archive.infolist():
+            name = info.filename[:-4] if info.filename.endswith('.npy') else info.filename
+            if info.compress_type != zipfile.ZIP_STORED:
+                with archive.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member)
+                continue
+            infile.seek(info.header_offset + 26)
+            name_length, extra_length = struct.unpack('<HH', infile.read(4))
+            infile.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(infile)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(infile)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(infile)
+            if dtype.hasobject:
+                raise ValueError('array {} contains objects'.format(name))
+            if np.prod(shape) == 0:
+                arrays[name] = np.zeros(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(npz, dtype=dtype, mode='r', offset=infile.tell(), shape=shape,
+                                         order='F' if fortran_order else 'C')
+    return arrays
+
+
+def index_chunk(index, chunk):
+    '''Adds annotations of chunk to index of chromosomes.
+
+    The index contains, for each chromosome name, a dictionary with:
+      count: number of annotations on chromosome
+      ranges: list of byte ranges [start, end[ of BED containing only the annotations of chromosome,
+              None if annotations of chromosome are split in more than INDEX_MAX_RANGES ranges'''
+    chromosomes = chunk['chromosomes']
+    if len(chromosomes) == 0:
+        return
+    for name, count in zip(chunk['names'], np.bincount(chromosomes, minlength=len(chunk['names']))):
+        if count > 0:
+            index.setdefault(name, {'count': 0, 'ranges': []})['count'] += int(count)
+    byte_starts, byte_ends = chunk['byte_starts'], chunk['byte_ends']
+    breaks = np.flatnonzero((np.diff(chromosomes) != 0) | (byte_starts[1:] != byte_ends[:-1])) + 1
+    for first, last in zip(np.concatenate(([0], breaks)), np.concatenate((breaks, [len(chromosomes)])) - 1):
+        entry = index[chunk['names'][chromosomes[first]]]
+        if entry['ranges'] is None:
+            continue
+        start, end = int(byte_starts[first]), int(byte_ends[last])
+        if entry['ranges'] and entry['ranges'][-1][1] == start:
+            entry['ranges'][-1][1] = end
+        elif len(entry['ranges']) < INDEX_MAX_RANGES:
+            entry['ranges'].append([start, end])
+        else:
+            entry['ranges'] = None
+
+
+def index_path(bed):
+    '''Returns path of the sidecar file containing index of chromosomes of BED file.'''
+    return str(bed) + INDEX_SUFFIX
+
+
+def read_chromosome_index(bed):
+    '''Returns index of chromosomes of BED read from sidecar file, or None if sidecar file is missing or stale.
+
+    See index_chunk for the content of the index.'''
+    try:
+        with open(index_path(bed), 'r') as infile:
+            index = json.load(infile)
+        stat = os.stat(bed)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(index, dict) or index.get('source') != [stat.st_size, stat.st_mtime_ns]:
+        return None
+    return index.get('chromosomes')
+
+
+def write_chromosome_index(bed, index):
+    '''Writes index of chromosomes of BED to sidecar file next to BED.'''
+    print('Writing index of chromosomes of BED {}'.format(bed))
+    stat = os.stat(bed)
+    try:
+        with open(index_path(bed), 'w') as outfile:
+            json.dump({'source': [stat.st_size, stat.st_mtime_ns], 'chromosomes': index}, outfile)
+    except OSError as e:
+        logging.warning('Could not write index of chromosomes of BED {}: {}'.format(bed, e))
+
+
 def empty_bed(bed_output, sample, *, strand=None):
     '''Create an empty BED file.'''
     track = 'track type=bedGraph name="' + sample
@@ -44,14 +470,6 @@ def sort(input, output):
             subprocess.run(cmd, stdout=outfile, check=True)
 
 
-def sort_bysize(input, output):
-    '''Sort BED file by size'''
-    cmd = ['bedtools', 'sort', '-sizeA', '-i', input]
-    logging.debug('Running {}'.format(cmd))
-    with open(output, 'w') as outfile:
-        subprocess.run(cmd, stdout=outfile, check=True)
-
-
 def bedgraph_to_bigwig(bed, bigwig, sizes):
     '''Converts bedgraph file to bigwig.'''
     cmd = ['bedGraphToBigWig', bed, sizes, bigwig]
@@ -0,0 +1,58 @@
+import ast
+import importlib
+import importlib.util
+
+import click
+
+
+class LazyGroup(click.Group):
+    '''Group of commands that imports the module of a command only when the command is used.
+
+    lazy_commands maps command names to the path of command functions, like 'robtools.PrintSample.printsample'.'''
+
+    def __init__(self, *args, lazy_commands=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = dict(lazy_commands) if lazy_commands else {}
+
+    def list_commands(self, ctx):
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_commands))
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name not in self.commands and cmd_name in self.lazy_commands:
+            self.add_command(load_command(self.lazy_commands[cmd_name]), cmd_name)
+        return super().get_command(ctx, cmd_name)
+
+    def format_commands(self, ctx, formatter):
+        '''Writes commands and their short help without importing modules of commands not already loaded.'''
+        commands = []
+        for name in self.list_commands(ctx):
+            command = self.commands.get(name)
+            if command is None:
+                command = click.Command(name, help=command_docstring(self.lazy_commands[name]))
+            if command.hidden:
+                continue
+            commands.append((name, command))
+        if commands:
+            limit = formatter.width - 6 - max(len(name) for name, command in commands)
+            rows = [(name, command.get_short_help_str(limit)) for name, command in commands]
+            with formatter.section('Commands'):
+                formatter.write_dl(rows)
+
+
+def load_command(path):
+    '''Imports module and returns command from path like 'robtools.PrintSample.printsample'.'''
+    module_name, attribute = path.rsplit('.', 1)
+    module = importlib.import_module(module_name)
+    return getattr(module, attribute)
+
+
+def command_docstring(path):
+    '''Returns docstring of command function from the source of its module, without importing the module.'''
+    module_name, attribute = path.rsplit('.', 1)
+    spec = importlib.util.find_spec(module_name)
+    with open(spec.origin, 'r') as infile:
+        tree = ast.parse(infile.read(), spec.origin)
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name == attribute:
+            return ast.get_docstring(node)
+    return None
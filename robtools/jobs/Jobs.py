@@ -0,0 +1,87 @@
+import io
+import logging
+import multiprocessing
+import pickle
+from contextlib import redirect_stdout
+
+import click
+
+from robtools import Split
+
+jobs_option = click.option('--jobs', '-j', type=int, default=1, show_default=True,
+                           help='Number of processes used to process samples and splits in parallel.')
+
+
+def with_splits(sample_names):
+    '''Returns sample names each followed by the names of its splits.'''
+    names = []
+    for sample in sample_names:
+        names.append(sample)
+        names.extend(Split.splits(sample))
+    return names
+
+
+def run(function, arguments, jobs=None):
+    '''Calls function once for each tuple of arguments, using jobs processes when jobs is greater than 1.
+
+    Returns the values returned by function in the order of arguments.
+    Output and log messages of each call are replayed in the order of arguments.
+    The error of the first call that fails, in the order of arguments, is raised once the previous calls completed.'''
+    arguments = list(arguments)
+    if jobs is None or jobs <= 1 or len(arguments) <= 1:
+        return [function(*args) for args in arguments]
+    results = []
+    with multiprocessing.Pool(processes=min(jobs, len(arguments))) as pool:
+        for result, output, records, error in pool.imap(captured_call, [(function, args) for args in arguments]):
+            print(output, end='')
+            for record in records:
+                logger = logging.getLogger(record.name)
+                if logger.isEnabledFor(record.levelno):
+                    logger.handle(record)
+            if error is not None:
+                raise error
+            results.append(result)
+    return results
+
+
+def captured_call(function_args):
+    '''Calls function with arguments and returns its result, its output, its log records and the error raised, if any.'''
+    function, args = function_args
+    root = logging.getLogger()
+    handlers = root.handlers
+    level = root.level
+    handler = RecordsHandler()
+    root.handlers = [handler]
+    root.setLevel(logging.DEBUG)
+    output = io.StringIO()
+    result = None
+    error = None
+    try:
+        with redirect_stdout(output):
+            result = function(*args)
+    except Exception as e:
+        error = e
+        try:
+            pickle.dumps(error)
+        except Exception:
+            error = RuntimeError(repr(e))
+    finally:
+        root.handlers = handlers
+        root.setLevel(level)
+    return result, output.getvalue(), handler.records, error
+
+
+class RecordsHandler(logging.Handler):
+    '''Keeps log records so they can be sent to another process.'''
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        self.records.append(record)
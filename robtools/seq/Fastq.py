@@ -1,5 +1,9 @@
+import gzip
 import os
 import re
+import shutil
+import subprocess
+from contextlib import contextmanager
 
 
 def fastq(sample, read=1):
@@ -9,3 +13,33 @@ def fastq(sample, read=1):
         return None
     else:
         return files[0]
+
+
+@contextmanager
+def gzip_open(filename, mode='rb', threads=None):
+    '''Opens gzip file in binary mode, using pigz in a separate process when available.
+
+    Output is compressed using threads number of threads.'''
+    write = mode.startswith('w')
+    pigz = shutil.which('pigz')
+    if pigz is None or (write and (threads is None or threads < 2)):
+        with gzip.open(filename, 'wb' if write else 'rb') as file:
+            yield file
+        return
+    if write:
+        with open(filename, 'wb') as output:
+            process = subprocess.Popen([pigz, '-c', '-p', str(threads)], stdin=subprocess.PIPE, stdout=output)
+            try:
+                yield process.stdin
+            finally:
+                process.stdin.close()
+                returncode = process.wait()
+    else:
+        process = subprocess.Popen([pigz, '-dc', filename], stdout=subprocess.PIPE)
+        try:
+            yield process.stdout
+        finally:
+            process.stdout.close()
+            returncode = process.wait()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, [pigz, filename])
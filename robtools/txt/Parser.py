@@ -1,8 +1,3 @@
-import logging
-
-import pandas as pd
-
-
 def columns(file):
     '''Parses file.'''
     all_columns = [];
@@ -15,6 +15,7 @@ setup(
     ],
     install_requires=[
         'click>=7.0',
+        'numpy>=1.17.0',
         'pandas>=0.25.0',
         'pyBigWig>=0.3.17',
         'matplotlib>=3.1.1',
@@ -0,0 +1,8 @@
+# mnasetools imports lmfit and matplotlib lazily, import them before testdir saves sys.modules
+# otherwise they are imported again by the next test and their extension modules fail to load
+import lmfit.models
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.backends.backend_agg
+import matplotlib.backends.backend_svg
+import matplotlib.figure
@@ -0,0 +1,106 @@
+from unittest.mock import MagicMock, ANY
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from mnasetools.fit import Fit
+from robtools import Split as sb
+from robtools.jobs import Jobs
+
+
+@pytest.fixture
+def mock_testclass():
+    splits = sb.splits
+    run = Jobs.run
+    yield
+    sb.splits = splits
+    Jobs.run = run
+
+
+def create_dyads(sample, suffix=None):
+    x = np.arange(-2, 3)
+    frequency = np.array([1.0, 2.0, 4.0, 2.0, 1.0])
+    dyads = pd.DataFrame({'Frequency': frequency, 'Relative Frequency': frequency / frequency.sum()}, index=pd.Index(x, name='Position'))
+    dyads.to_csv(sample + (suffix if suffix else '') + '-dyad.txt', sep='\t')
+
+
+def fit(value):
+    return {'values': {'c_c': value}, 'redchi': value / 10, 'report': 'report ' + str(value)}
+
+
+def test_read_dyads(testdir, mock_testclass):
+    create_dyads('POLR2A', '-test')
+    x, y = Fit.read_dyads('POLR2A', suffix='-test')
+    assert list(x) == [-2, -1, 0, 1, 2]
+    assert np.allclose(y, [0.1, 0.2, 0.4, 0.2, 0.1])
+    x, y = Fit.read_dyads('POLR2A', True, '-test')
+    assert list(y) == [1, 2, 4, 2, 1]
+
+
+def test_fit_row(mock_testclass):
+    assert Fit.fit_row('POLR2A', fit(1.0)) == {'Sample': 'POLR2A', 'c_c': 1.0, 'Reduced chi-square': 0.1}
+    assert Fit.fit_row('POLR2A', None) == {'Sample': 'POLR2A'}
+
+
+def test_fit_batch(testdir, mock_testclass):
+    splits = ['POLR2A-100-110', 'POLR2A-120-130']
+    for name in ['POLR2A'] + splits:
+        create_dyads(name)
+    sb.splits = MagicMock(return_value=splits)
+    fit_dyads = MagicMock(side_effect=[fit(1.0), None, fit(3.0)])
+    initial = MagicMock(return_value={'c_c': 0.0})
+    plot = MagicMock()
+    Fit.fit_batch('POLR2A', 'double gaussian', fit_dyads, initial, {'g_center': (None, None)}, plot)
+    assert [call.args[3] for call in fit_dyads.call_args_list] == [{'c_c': 0.0}, {'c_c': 1.0}, {'c_c': 1.0}]
+    assert plot.call_count == 3
+    plot.assert_any_call('POLR2A-100-110', ANY, ANY, None)
+    table = pd.read_csv('POLR2A-dyad-double-gaussian.txt', sep='\t')
+    assert list(table['Sample']) == ['POLR2A'] + splits
+    assert table['c_c'].isna().tolist() == [False, True, False]
+
+
+def test_fit_batch_jobs(testdir, mock_testclass):
+    splits = ['POLR2A-100-110', 'POLR2A-120-130']
+    for name in ['POLR2A'] + splits:
+        create_dyads(name)
+    sb.splits = MagicMock(return_value=splits)
+    fit_dyads = MagicMock(return_value=fit(1.0))
+    Jobs.run = MagicMock(return_value=[fit(2.0), fit(3.0)])
+    Fit.fit_batch('POLR2A', 'gaussian', fit_dyads, MagicMock(return_value={'c_c': 0.0}), {}, MagicMock(), jobs=2)
+    Jobs.run.assert_called_once_with(fit_dyads, ANY, 2)
+    assert [args[3] for args in Jobs.run.call_args.args[1]] == [{'c_c': 1.0}, {'c_c': 1.0}]
+    table = pd.read_csv('POLR2A-dyad-gaussian.txt', sep='\t')
+    assert list(table['c_c']) == [1.0, 2.0, 3.0]
+
+
+def test_fit_batch_explicit(testdir, mock_testclass):
+    splits = ['POLR2A-100-110', 'POLR2A-120-130']
+    for name in ['POLR2A'] + splits:
+        create_dyads(name)
+    sb.splits = MagicMock(return_value=splits)
+    values = {'c_c': 1.0, 'g_center': 5.0, 'g_sigma': 3.0, 'g_amplitude': 2.0, 'g_fwhm': 7.0}
+    fit_dyads = MagicMock(return_value={'values': values, 'redchi': 0.1, 'report': 'report'})
+    initial = MagicMock(return_value={'c_c': 0.0, 'g_center': 10.0, 'g_sigma': 1.0, 'g_amplitude': 4.0})
+    Fit.fit_batch('POLR2A', 'gaussian', fit_dyads, initial, {}, MagicMock(),
+                  explicit={'g_center': 10.0, 'g_sigma': None, 'g_amplitude': None})
+    assert [call.args[3] for call in fit_dyads.call_args_list] == [
+        {'c_c': 0.0, 'g_center': 10.0, 'g_sigma': 1.0, 'g_amplitude': 4.0},
+        {'c_c': 1.0, 'g_center': 10.0, 'g_sigma': 3.0, 'g_amplitude': 2.0},
+        {'c_c': 1.0, 'g_center': 10.0, 'g_sigma': 3.0, 'g_amplitude': 2.0}]
+    assert initial.return_value == {'c_c': 0.0, 'g_center': 10.0, 'g_sigma': 1.0, 'g_amplitude': 4.0}
+
+
+def test_warm_start_absolute(mock_testclass):
+    x = np.arange(-2, 3)
+    y = np.array([1.0, 2.0, 4.0, 2.0, 1.0])
+    previous = {'values': {'c_c': 2.0, 'g_center': 5.0, 'g_amplitude': 40.0}}
+    initial = MagicMock(return_value={'c_c': 0.0, 'g_center': 0.0, 'g_amplitude': 4.0})
+    values = Fit.warm_start(x, y, previous, y * 4, initial, {}, True)
+    assert values == {'c_c': 0.5, 'g_center': 5.0, 'g_amplitude': 10.0}
+    values = Fit.warm_start(x, y, previous, y * 4, initial, {'g_amplitude': 3.0}, True)
+    assert values == {'c_c': 0.5, 'g_center': 5.0, 'g_amplitude': 4.0}
+    values = Fit.warm_start(x, y, previous, y * 4, initial, {}, False)
+    assert values == {'c_c': 2.0, 'g_center': 5.0, 'g_amplitude': 40.0}
+    values = Fit.warm_start(x, y, None, None, initial, {}, True)
+    assert values == {'c_c': 0.0, 'g_center': 0.0, 'g_amplitude': 4.0}
@@ -0,0 +1,102 @@
+import os
+import subprocess
+import sys
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+
+from mnasetools.plot import Plot
+
+
+@pytest.fixture
+def mock_testclass():
+    draw = Plot.draw
+    yield
+    Plot.draw = draw
+    Plot.finish()
+
+
+def create_figure(output):
+    x = np.arange(-75, 76)
+    spec = Plot.figure('POLR2A', 'Position relative to dyad (bp)', 'Frequency', x)
+    Plot.plot(spec, x, x ** 2, color='red')
+    Plot.plot(spec, x, x ** 2 + 10, 'b--', label='Best fit')
+    Plot.plot(spec, x, x ** 2 + 20, cmap=('hsv', 3, 1), linestyle='dashed', label='Gaussian 1')
+    Plot.legend(spec, 'lower right')
+    Plot.savefig(spec, output)
+    return spec
+
+
+def test_figure(mock_testclass):
+    x = np.arange(-75, 76)
+    spec = create_figure('POLR2A-dyad.png')
+    assert spec['title'] == 'POLR2A'
+    assert spec['xlim'] == (-75, 75)
+    assert spec['xticks'] == [-75, -50, -25, 0, 25, 50, 75]
+    assert len(spec['lines']) == 3
+    assert spec['lines'][1][2] == 'b--'
+    assert spec['lines'][2][3] == ('hsv', 3, 1)
+    assert spec['legend'] == 'lower right'
+    assert spec['outputs'] == [('POLR2A-dyad.png', {})]
+
+
+def test_render(testdir, mock_testclass):
+    spec = create_figure('POLR2A-dyad.png')
+    Plot.savefig(spec, 'POLR2A-dyad.svg', transparent=True)
+    Plot.render(spec)
+    assert os.path.getsize('POLR2A-dyad.png') > 0
+    assert os.path.getsize('POLR2A-dyad.svg') > 0
+    figure = Plot.canvas()
+    Plot.render(create_figure('POLR1C-dyad.png'))
+    assert os.path.getsize('POLR1C-dyad.png') > 0
+    assert Plot.canvas() is figure
+    assert len(figure.axes) == 1
+
+
+def test_render_none(testdir, mock_testclass):
+    Plot.draw = MagicMock()
+    Plot.render(create_figure('POLR2A-dyad.png'), Plot.NONE)
+    Plot.draw.assert_not_called()
+    assert not os.path.exists('POLR2A-dyad.png')
+
+
+def test_render_deferred(testdir, mock_testclass):
+    Plot.render(create_figure('POLR2A-dyad.png'), Plot.DEFERRED)
+    Plot.render(create_figure('POLR1C-dyad.png'), Plot.DEFERRED)
+    assert Plot.pool is not None
+    Plot.finish()
+    assert Plot.pool is None
+    assert Plot.pending == []
+    assert os.path.getsize('POLR2A-dyad.png') > 0
+    assert os.path.getsize('POLR1C-dyad.png') > 0
+
+
+def test_render_deferred_error(testdir, mock_testclass):
+    Plot.render(create_figure('missing/POLR2A-dyad.png'), Plot.DEFERRED)
+    with pytest.raises(FileNotFoundError):
+        Plot.finish()
+    assert Plot.pool is None
+
+
+def test_rendering(testdir, mock_testclass):
+    with Plot.rendering():
+        Plot.render(create_figure('POLR2A-dyad.png'), Plot.DEFERRED)
+    assert Plot.pool is None
+    assert os.path.getsize('POLR2A-dyad.png') > 0
+
+
+def test_rendering_error(testdir, mock_testclass):
+    with pytest.raises(ValueError):
+        with Plot.rendering():
+            Plot.render(create_figure('POLR2A-dyad.png'), Plot.DEFERRED)
+            raise ValueError('could not fit')
+    assert Plot.pool is None
+    assert Plot.pending == []
+
+
+def test_lazy_import(testdir):
+    code = 'import sys; import mnasetools.mnasetools; print("matplotlib" in sys.modules)'
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))).stdout
+    assert output.strip() == 'False'
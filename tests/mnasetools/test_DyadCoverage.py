@@ -0,0 +1,130 @@
+from pathlib import Path
+from unittest.mock import MagicMock, ANY
+
+import numpy as np
+import pandas as pd
+import pyBigWig as pbw
+import pytest
+
+from mnasetools import DyadCoverage as d
+from robtools import Split as sb
+from robtools.jobs import Jobs
+
+
+@pytest.fixture
+def mock_testclass():
+    dyad_coverage_sample = d.dyad_coverage_sample
+    plot_dyad_coverage = d.plot_dyad_coverage
+    splits = sb.splits
+    run = Jobs.run
+    signal = d.signal
+    cluster_gap = d.CLUSTER_GAP
+    cluster_max_length = d.CLUSTER_MAX_LENGTH
+    yield
+    d.dyad_coverage_sample = dyad_coverage_sample
+    d.plot_dyad_coverage = plot_dyad_coverage
+    sb.splits = splits
+    Jobs.run = run
+    d.signal = signal
+    d.CLUSTER_GAP = cluster_gap
+    d.CLUSTER_MAX_LENGTH = cluster_max_length
+
+
+def create_bigwig(bigwig):
+    bw = pbw.open(bigwig, 'w')
+    bw.addHeader([('chrI', 100), ('chrII', 50)])
+    bw.addEntries('chrI', 0, values=[float(i) for i in range(0, 100)], span=1, step=1)
+    bw.addEntries('chrII', 10, values=[float(i) for i in range(0, 20)], span=1, step=1)
+    bw.close()
+
+
+def create_genes():
+    return pd.DataFrame([['a', 'chrI', 'YAL001C', 1, '+', 10, 50],
+                         ['a', 'chrI', 'YAL002W', 1, '-', 10, 50],
+                         ['a', 'chrI', 'YAL003W', 1, '+', 10, 2],
+                         ['a', 'chrI', 'YAL004W', 1, '-', 10, 98],
+                         ['a', 'chrII', 'YBL001C', 1, '+', 10, 5],
+                         ['a', 'chrM', 'Q0010', 1, '+', 10, 5]],
+                        columns=['Spacer', 'Chromosome', 'Gene', 'TSS', 'Strand', 'TES', 'Dyad'])
+
+
+def test_dyad_matrix(testdir, mock_testclass):
+    create_bigwig('POLR2A-cov.bw')
+    bw = pbw.open('POLR2A-cov.bw')
+    matrix = d.dyad_matrix(bw, create_genes(), -3, 3)
+    bw.close()
+    assert matrix.shape == (6, 7)
+    assert list(matrix[0]) == [47, 48, 49, 50, 51, 52, 53]
+    assert list(matrix[1]) == [53, 52, 51, 50, 49, 48, 47]
+    assert list(matrix[2]) == [0, 0, 1, 2, 3, 4, 5]
+    assert list(matrix[3]) == [0, 0, 99, 98, 97, 96, 95]
+    assert list(matrix[4]) == [0, 0, 0, 0, 0, 0, 0]
+    assert list(matrix[5]) == [0, 0, 0, 0, 0, 0, 0]
+
+
+def test_dyad_matrix_clusters(testdir, mock_testclass):
+    create_bigwig('POLR2A-cov.bw')
+    bw = pbw.open('POLR2A-cov.bw')
+    expected = d.dyad_matrix(bw, create_genes(), -3, 3)
+    d.signal = MagicMock(side_effect=signal)
+    matrix = d.dyad_matrix(bw, create_genes(), -3, 3)
+    assert (matrix == expected).all()
+    assert d.signal.call_count == 2
+    d.signal.assert_any_call(bw, 'chrI', 0, 100)
+    d.signal.assert_any_call(bw, 'chrII', 2, 9)
+    d.CLUSTER_GAP = 10
+    d.signal.reset_mock()
+    matrix = d.dyad_matrix(bw, create_genes(), -3, 3)
+    bw.close()
+    assert (matrix == expected).all()
+    assert d.signal.call_count == 4
+
+
+def test_window_clusters(mock_testclass):
+    d.CLUSTER_GAP = 10
+    d.CLUSTER_MAX_LENGTH = 100
+    starts = np.array([0, 5, 30, 35, 38, 60, 130])
+    ends = np.array([10, 15, 40, 50, 45, 70, 140])
+    assert d.window_clusters(starts, ends) == [slice(0, 2), slice(2, 6), slice(6, 7)]
+    d.CLUSTER_MAX_LENGTH = 35
+    assert d.window_clusters(starts, ends) == [slice(0, 2), slice(2, 5), slice(5, 6), slice(6, 7)]
+    assert d.window_clusters(np.array([]), np.array([])) == []
+
+
+def signal(bw, chromosome, start, end):
+    return bw.values(chromosome, start, end, numpy=True)
+
+
+def test_dyad_coverage_sample(testdir, mock_testclass):
+    sample = 'POLR2A'
+    create_bigwig(sample + '-cov.bw')
+    genes = create_genes()
+    d.plot_dyad_coverage = MagicMock()
+    d.dyad_coverage_sample(sample, genes, False, -2, 2, smoothing=2)
+    assert list(genes.columns) == ['Spacer', 'Chromosome', 'Gene', 'TSS', 'Strand', 'TES', 'Dyad']
+    genes_output = pd.read_csv(sample + '-genes.txt', sep='\t')
+    assert list(genes_output.columns)[7:] == ['dyad position ' + str(i) for i in range(-3, 4)]
+    assert list(genes_output['dyad position -3']) == [47, 53, 0, 0, 0, 0]
+    dyads = pd.read_csv(sample + '-dyad.txt', sep='\t', index_col=0)
+    sums = np.array([47, 48, 49, 50, 51, 52, 53]) + np.array([53, 52, 51, 50, 49, 48, 47]) + \
+           np.array([0, 0, 1, 2, 3, 4, 5]) + np.array([0, 0, 99, 98, 97, 96, 95])
+    frequencies = [sums[i - 1:i + 2].mean() for i in range(1, 6)]
+    assert list(dyads.index) == [-2, -1, 0, 1, 2]
+    assert np.allclose(dyads['Frequency'], frequencies)
+    assert np.allclose(dyads['Relative Frequency'], np.array(frequencies) / sum(frequencies))
+    d.plot_dyad_coverage.assert_called_once()
+
+
+def test_dyad_coverage_jobs(testdir, mock_testclass):
+    samples = Path(__file__).parent.joinpath('samples.txt')
+    create_genes().to_csv('genes.txt', sep='\t', index=False)
+    sb.splits = MagicMock(return_value=[])
+    d.dyad_coverage_sample = MagicMock()
+    Jobs.run = MagicMock()
+    d.dyad_coverage(samples, 'genes.txt', jobs=4)
+    d.dyad_coverage_sample.assert_not_called()
+    Jobs.run.assert_called_once_with(d.dyad_coverage_sample, ANY, 4)
+    arguments = Jobs.run.call_args.args[1]
+    assert [args[0] for args in arguments] == ['POLR2A', 'ASDURF', 'POLR1C']
+    assert [args[2:] for args in arguments] == [(False, -75, 75, None, None, 'inline')] * 3
+    assert list(arguments[0][1]['Gene']) == ['YAL001C', 'YAL002W', 'YAL003W', 'YAL004W', 'YBL001C', 'Q0010']
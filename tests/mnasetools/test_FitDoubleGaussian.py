@@ -7,10 +7,13 @@ from unittest.mock import MagicMock, ANY
 
 import click
 from click.testing import CliRunner
+import numpy as np
+import pandas as pd
 import pytest
 
 from mnasetools import FitDoubleGaussian as f
 from robtools import Split as sb
+from robtools.jobs import Jobs
 from robtools.txt import Parser
 
 
@@ -20,20 +23,33 @@ def mock_testclass():
     fit_double_gaussian_sample = f.fit_double_gaussian_sample
     splits = sb.splits
     first = Parser.first
+    run = Jobs.run
+    fit_double_gaussian_batch = f.fit_double_gaussian_batch
+    fit_dyads = f.fit_dyads
     yield
     f.fit_double_gaussian = fit_double_gaussian
     f.fit_double_gaussian_sample = fit_double_gaussian_sample
     sb.splits = splits
     Parser.first = first
-    
-    
+    Jobs.run = run
+    f.fit_double_gaussian_batch = fit_double_gaussian_batch
+    f.fit_dyads = fit_dyads
+
+
+def create_dyads(sample, center1, center2, sigma, suffix=None):
+    x = np.arange(-75, 76)
+    frequency = 10 + 1000 * np.exp(-(x - center1) ** 2 / (2 * sigma ** 2)) + 800 * np.exp(-(x - center2) ** 2 / (2 * sigma ** 2))
+    dyads = pd.DataFrame({'Frequency': frequency, 'Relative Frequency': frequency / frequency.sum()}, index=pd.Index(x, name='Position'))
+    dyads.to_csv(sample + (suffix if suffix else '') + '-dyad.txt', sep='\t')
+
+
 def test_fitdoublegaussian(testdir, mock_testclass):
     samples = Path(__file__).parent.joinpath('samples.txt')
     f.fit_double_gaussian = MagicMock()
     runner = CliRunner()
     result = runner.invoke(f.fitdoublegaussian, ['-s', samples])
     assert result.exit_code == 0
-    f.fit_double_gaussian.assert_called_once_with(samples, False, False, False, False, False, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None)
+    f.fit_double_gaussian.assert_called_once_with(samples, False, False, False, False, False, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, 1, False, 'inline')
 
 
 def test_fitdoublegaussian_parameters(testdir, mock_testclass):
@@ -57,7 +73,7 @@ def test_fitdoublegaussian_parameters(testdir, mock_testclass):
     runner = CliRunner()
     result = runner.invoke(f.fitdoublegaussian, ['-s', samples, '--absolute', '--components', '--gaussian', '--svg', '--verbose', '--center1', center1, '--cmin1', cmin1, '--cmax1', cmax1, '--amp1', amp1, '--amin1', amin1, '--sigma1', sigma1, '--smin1', smin1, '--center2', center2, '--cmin2', cmin2, '--cmax2', cmax2, '--amp2', amp2, '--amin2', amin2, '--sigma2', sigma2, '--smin2', smin2, '--suffix', suffix])
     assert result.exit_code == 0
-    f.fit_double_gaussian.assert_called_once_with(samples, True, True, True, True, True, center1, cmin1, cmax1, amp1, amin1, sigma1, smin1, center2, cmin2, cmax2, amp2, amin2, sigma2, smin2, suffix, None)
+    f.fit_double_gaussian.assert_called_once_with(samples, True, True, True, True, True, center1, cmin1, cmax1, amp1, amin1, sigma1, smin1, center2, cmin2, cmax2, amp2, amin2, sigma2, smin2, suffix, None, 1, False, 'inline')
 
 
 def test_fitdoublegaussian_second(testdir, mock_testclass):
@@ -67,7 +83,7 @@ def test_fitdoublegaussian_second(testdir, mock_testclass):
     runner = CliRunner()
     result = runner.invoke(f.fitdoublegaussian, ['-s', samples, '-i', index])
     assert result.exit_code == 0
-    f.fit_double_gaussian.assert_called_once_with(samples, False, False, False, False, False, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, index)
+    f.fit_double_gaussian.assert_called_once_with(samples, False, False, False, False, False, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, index, 1, False, 'inline')
 
 
 def test_fitdoublegaussian_samplesnotexists(testdir, mock_testclass):
@@ -92,13 +108,13 @@ def test_fit_double_gaussian(testdir, mock_testclass):
     Parser.first.assert_called_once_with(samples_file)
     for sample in samples:
         sb.splits.assert_any_call(sample)
-        f.fit_double_gaussian_sample.assert_any_call(sample, False, False, False, False, False, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None)
+        f.fit_double_gaussian_sample.assert_any_call(sample, False, False, False, False, False, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, 'inline')
     for split in splits1:
-        f.fit_double_gaussian_sample.assert_any_call(split, False, False, False, False, False, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None)
+        f.fit_double_gaussian_sample.assert_any_call(split, False, False, False, False, False, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, 'inline')
     for split in splits2:
-        f.fit_double_gaussian_sample.assert_any_call(split, False, False, False, False, False, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None)
+        f.fit_double_gaussian_sample.assert_any_call(split, False, False, False, False, False, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, 'inline')
     for split in splits3:
-        f.fit_double_gaussian_sample.assert_any_call(split, False, False, False, False, False, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None)
+        f.fit_double_gaussian_sample.assert_any_call(split, False, False, False, False, False, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, 'inline')
 
 
 def test_fit_double_gaussian_parameters(testdir, mock_testclass):
@@ -129,13 +145,13 @@ def test_fit_double_gaussian_parameters(testdir, mock_testclass):
     Parser.first.assert_called_once_with(samples_file)
     for sample in samples:
         sb.splits.assert_any_call(sample)
-        f.fit_double_gaussian_sample.assert_any_call(sample, True, True, True, True, True, center1, cmin1, cmax1, amp1, amin1, sigma1, smin1, center2, cmin2, cmax2, amp2, amin2, sigma2, smin2, suffix)
+        f.fit_double_gaussian_sample.assert_any_call(sample, True, True, True, True, True, center1, cmin1, cmax1, amp1, amin1, sigma1, smin1, center2, cmin2, cmax2, amp2, amin2, sigma2, smin2, suffix, 'inline')
     for split in splits1:
-        f.fit_double_gaussian_sample.assert_any_call(split, True, True, True, True, True, center1, cmin1, cmax1, amp1, amin1, sigma1, smin1, center2, cmin2, cmax2, amp2, amin2, sigma2, smin2, suffix)
+        f.fit_double_gaussian_sample.assert_any_call(split, True, True, True, True, True, center1, cmin1, cmax1, amp1, amin1, sigma1, smin1, center2, cmin2, cmax2, amp2, amin2, sigma2, smin2, suffix, 'inline')
     for split in splits2:
-        f.fit_double_gaussian_sample.assert_any_call(split, True, True, True, True, True, center1, cmin1, cmax1, amp1, amin1, sigma1, smin1, center2, cmin2, cmax2, amp2, amin2, sigma2, smin2, suffix)
+        f.fit_double_gaussian_sample.assert_any_call(split, True, True, True, True, True, center1, cmin1, cmax1, amp1, amin1, sigma1, smin1, center2, cmin2, cmax2, amp2, amin2, sigma2, smin2, suffix, 'inline')
     for split in splits3:
-        f.fit_double_gaussian_sample.assert_any_call(split, True, True, True, True, True, center1, cmin1, cmax1, amp1, amin1, sigma1, smin1, center2, cmin2, cmax2, amp2, amin2, sigma2, smin2, suffix)
+        f.fit_double_gaussian_sample.assert_any_call(split, True, True, True, True, True, center1, cmin1, cmax1, amp1, amin1, sigma1, smin1, center2, cmin2, cmax2, amp2, amin2, sigma2, smin2, suffix, 'inline')
 
 
 def test_fit_double_gaussian_second(testdir, mock_testclass):
@@ -148,6 +164,59 @@ def test_fit_double_gaussian_second(testdir, mock_testclass):
     f.fit_double_gaussian(samples_file, index=1)
     Parser.first.assert_called_once_with(samples_file)
     sb.splits.assert_called_once_with(samples[1])
-    f.fit_double_gaussian_sample.assert_any_call(samples[1], False, False, False, False, False, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None)
+    f.fit_double_gaussian_sample.assert_any_call(samples[1], False, False, False, False, False, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, 'inline')
     for split in splits:
-        f.fit_double_gaussian_sample.assert_any_call(split, False, False, False, False, False, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None)
+        f.fit_double_gaussian_sample.assert_any_call(split, False, False, False, False, False, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, 'inline')
+
+
+def test_fitdoublegaussian_jobs(testdir, mock_testclass):
+    samples = Path(__file__).parent.joinpath('samples.txt')
+    f.fit_double_gaussian = MagicMock()
+    runner = CliRunner()
+    result = runner.invoke(f.fitdoublegaussian, ['-s', samples, '--jobs', 4, '--batch', '--plots', 'none'])
+    assert result.exit_code == 0
+    f.fit_double_gaussian.assert_called_once_with(samples, False, False, False, False, False, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, 4, True, 'none')
+
+
+def test_fit_double_gaussian_jobs(testdir, mock_testclass):
+    samples_file = Path(__file__).parent.joinpath('samples.txt')
+    samples = ['POLR2A', 'ASDURF']
+    Parser.first = MagicMock(return_value=samples)
+    sb.splits = MagicMock(side_effect=[['POLR2A-100-110'], []])
+    f.fit_double_gaussian_sample = MagicMock()
+    Jobs.run = MagicMock()
+    f.fit_double_gaussian(samples_file, suffix='-test', jobs=2)
+    f.fit_double_gaussian_sample.assert_not_called()
+    Jobs.run.assert_called_once_with(f.fit_double_gaussian_sample, [
+        ('POLR2A', False, False, False, False, False, None, None, None, None, None, None, None, None, None, None, None, None, None, None, '-test', 'inline'),
+        ('POLR2A-100-110', False, False, False, False, False, None, None, None, None, None, None, None, None, None, None, None, None, None, None, '-test', 'inline'),
+        ('ASDURF', False, False, False, False, False, None, None, None, None, None, None, None, None, None, None, None, None, None, None, '-test', 'inline')], 2)
+
+
+def test_fit_double_gaussian_batch(testdir, mock_testclass):
+    samples_file = Path(__file__).parent.joinpath('samples.txt')
+    samples = ['POLR2A', 'ASDURF']
+    Parser.first = MagicMock(return_value=samples)
+    f.fit_double_gaussian_batch = MagicMock()
+    f.fit_double_gaussian_sample = MagicMock()
+    f.fit_double_gaussian(samples_file, suffix='-test', batch=True, plots='none')
+    f.fit_double_gaussian_sample.assert_not_called()
+    for sample in samples:
+        f.fit_double_gaussian_batch.assert_any_call(sample, False, False, False, False, False, None, None, None, None, None, None, None, None, None, None, None, None, None, None, '-test', None, 'none')
+
+
+def test_fit_double_gaussian_batch_table(testdir, mock_testclass):
+    sample = 'POLR2A'
+    splits = ['POLR2A-100-110', 'POLR2A-120-130']
+    create_dyads(sample, -30, 30, 10)
+    create_dyads(splits[0], -25, 35, 10)
+    create_dyads(splits[1], -20, 40, 10)
+    sb.splits = MagicMock(return_value=splits)
+    f.fit_dyads = MagicMock(side_effect=f.fit_dyads)
+    f.fit_double_gaussian_batch(sample, absolute=True, plots='none')
+    table = pd.read_csv(sample + '-dyad-double-gaussian.txt', sep='\t')
+    assert list(table['Sample']) == [sample] + splits
+    assert np.allclose(table['g1_center'], [-30, -25, -20], atol=0.01)
+    assert np.allclose(table['g2_center'], [30, 35, 40], atol=0.01)
+    assert f.fit_dyads.call_args_list[2].args[3]['g1_center'] == pytest.approx(-25, abs=0.01)
+    assert not os.path.exists(sample + '-dyad-double-gaussian.png')
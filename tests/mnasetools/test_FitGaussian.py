@@ -7,10 +7,13 @@ from unittest.mock import MagicMock, ANY
 
 import click
 from click.testing import CliRunner
+import numpy as np
+import pandas as pd
 import pytest
 
 from mnasetools import FitGaussian as f
 from robtools import Split as sb
+from robtools.jobs import Jobs
 from robtools.txt import Parser
 
 
@@ -20,20 +23,35 @@ def mock_testclass():
     fit_gaussian_sample = f.fit_gaussian_sample
     splits = sb.splits
     first = Parser.first
+    run = Jobs.run
+    fit_gaussian_batch = f.fit_gaussian_batch
+    fit_dyads = f.fit_dyads
+    plot_gaussian = f.plot_gaussian
     yield
     f.fit_gaussian = fit_gaussian
     f.fit_gaussian_sample = fit_gaussian_sample
     sb.splits = splits
     Parser.first = first
-    
-    
+    Jobs.run = run
+    f.fit_gaussian_batch = fit_gaussian_batch
+    f.fit_dyads = fit_dyads
+    f.plot_gaussian = plot_gaussian
+
+
+def create_dyads(sample, center, sigma, suffix=None):
+    x = np.arange(-75, 76)
+    frequency = 10 + 1000 * np.exp(-(x - center) ** 2 / (2 * sigma ** 2))
+    dyads = pd.DataFrame({'Frequency': frequency, 'Relative Frequency': frequency / frequency.sum()}, index=pd.Index(x, name='Position'))
+    dyads.to_csv(sample + (suffix if suffix else '') + '-dyad.txt', sep='\t')
+
+
 def test_fitgaussian(testdir, mock_testclass):
     samples = Path(__file__).parent.joinpath('samples.txt')
     f.fit_gaussian = MagicMock()
     runner = CliRunner()
     result = runner.invoke(f.fitgaussian, ['-s', samples])
     assert result.exit_code == 0
-    f.fit_gaussian.assert_called_once_with(samples, False, False, False, False, None, None, None, None, None, None, None, None, None)
+    f.fit_gaussian.assert_called_once_with(samples, False, False, False, False, None, None, None, None, None, None, None, None, None, 1, False, 'inline')
 
 
 def test_fitgaussian_parameters(testdir, mock_testclass):
@@ -50,7 +68,7 @@ def test_fitgaussian_parameters(testdir, mock_testclass):
     runner = CliRunner()
     result = runner.invoke(f.fitgaussian, ['-s', samples, '--absolute', '--components', '--svg', '--verbose', '--center', center, '--cmin', cmin, '--cmax', cmax, '--amp', amp, '--amin', amin, '--sigma', sigma, '--smin', smin, '--suffix', suffix])
     assert result.exit_code == 0
-    f.fit_gaussian.assert_called_once_with(samples, True, True, True, True, center, cmin, cmax, amp, amin, sigma, smin, suffix, None)
+    f.fit_gaussian.assert_called_once_with(samples, True, True, True, True, center, cmin, cmax, amp, amin, sigma, smin, suffix, None, 1, False, 'inline')
 
 
 def test_fitgaussian_second(testdir, mock_testclass):
@@ -60,7 +78,32 @@ def test_fitgaussian_second(testdir, mock_testclass):
     runner = CliRunner()
     result = runner.invoke(f.fitgaussian, ['-s', samples, '-i', index])
     assert result.exit_code == 0
-    f.fit_gaussian.assert_called_once_with(samples, False, False, False, False, None, None, None, None, None, None, None, None, index)
+    f.fit_gaussian.assert_called_once_with(samples, False, False, False, False, None, None, None, None, None, None, None, None, index, 1, False, 'inline')
+
+
+def test_fitgaussian_jobs(testdir, mock_testclass):
+    samples = Path(__file__).parent.joinpath('samples.txt')
+    jobs = 8
+    f.fit_gaussian = MagicMock()
+    runner = CliRunner()
+    result = runner.invoke(f.fitgaussian, ['-s', samples, '--jobs', jobs])
+    assert result.exit_code == 0
+    f.fit_gaussian.assert_called_once_with(samples, False, False, False, False, None, None, None, None, None, None, None, None, None, jobs, False, 'inline')
+
+
+def test_fit_gaussian_jobs(testdir, mock_testclass):
+    samples_file = Path(__file__).parent.joinpath('samples.txt')
+    samples = ['POLR2A', 'ASDURF']
+    Parser.first = MagicMock(return_value=samples)
+    sb.splits = MagicMock(side_effect=[['POLR2A-100-110'], []])
+    f.fit_gaussian_sample = MagicMock()
+    Jobs.run = MagicMock()
+    f.fit_gaussian(samples_file, suffix='-test', jobs=2)
+    f.fit_gaussian_sample.assert_not_called()
+    Jobs.run.assert_called_once_with(f.fit_gaussian_sample, [
+        ('POLR2A', False, False, False, False, None, None, None, None, None, None, None, '-test', 'inline'),
+        ('POLR2A-100-110', False, False, False, False, None, None, None, None, None, None, None, '-test', 'inline'),
+        ('ASDURF', False, False, False, False, None, None, None, None, None, None, None, '-test', 'inline')], 2)
 
 
 def test_fitgaussian_samplesnotexists(testdir, mock_testclass):
@@ -85,13 +128,13 @@ def test_fit_gaussian(testdir, mock_testclass):
     Parser.first.assert_called_once_with(samples_file)
     for sample in samples:
         sb.splits.assert_any_call(sample)
-        f.fit_gaussian_sample.assert_any_call(sample, False, False, False, False, None, None, None, None, None, None, None, None)
+        f.fit_gaussian_sample.assert_any_call(sample, False, False, False, False, None, None, None, None, None, None, None, None, 'inline')
     for split in splits1:
-        f.fit_gaussian_sample.assert_any_call(split, False, False, False, False, None, None, None, None, None, None, None, None)
+        f.fit_gaussian_sample.assert_any_call(split, False, False, False, False, None, None, None, None, None, None, None, None, 'inline')
     for split in splits2:
-        f.fit_gaussian_sample.assert_any_call(split, False, False, False, False, None, None, None, None, None, None, None, None)
+        f.fit_gaussian_sample.assert_any_call(split, False, False, False, False, None, None, None, None, None, None, None, None, 'inline')
     for split in splits3:
-        f.fit_gaussian_sample.assert_any_call(split, False, False, False, False, None, None, None, None, None, None, None, None)
+        f.fit_gaussian_sample.assert_any_call(split, False, False, False, False, None, None, None, None, None, None, None, None, 'inline')
 
 
 def test_fit_gaussian_parameters(testdir, mock_testclass):
@@ -115,13 +158,13 @@ def test_fit_gaussian_parameters(testdir, mock_testclass):
     Parser.first.assert_called_once_with(samples_file)
     for sample in samples:
         sb.splits.assert_any_call(sample)
-        f.fit_gaussian_sample.assert_any_call(sample, True, True, True, True, center, cmin, cmax, amp, amin, sigma, smin, suffix)
+        f.fit_gaussian_sample.assert_any_call(sample, True, True, True, True, center, cmin, cmax, amp, amin, sigma, smin, suffix, 'inline')
     for split in splits1:
-        f.fit_gaussian_sample.assert_any_call(split, True, True, True, True, center, cmin, cmax, amp, amin, sigma, smin, suffix)
+        f.fit_gaussian_sample.assert_any_call(split, True, True, True, True, center, cmin, cmax, amp, amin, sigma, smin, suffix, 'inline')
     for split in splits2:
-        f.fit_gaussian_sample.assert_any_call(split, True, True, True, True, center, cmin, cmax, amp, amin, sigma, smin, suffix)
+        f.fit_gaussian_sample.assert_any_call(split, True, True, True, True, center, cmin, cmax, amp, amin, sigma, smin, suffix, 'inline')
     for split in splits3:
-        f.fit_gaussian_sample.assert_any_call(split, True, True, True, True, center, cmin, cmax, amp, amin, sigma, smin, suffix)
+        f.fit_gaussian_sample.assert_any_call(split, True, True, True, True, center, cmin, cmax, amp, amin, sigma, smin, suffix, 'inline')
 
 
 def test_fit_gaussian_second(testdir, mock_testclass):
@@ -134,6 +177,82 @@ def test_fit_gaussian_second(testdir, mock_testclass):
     f.fit_gaussian(samples_file, index=1)
     Parser.first.assert_called_once_with(samples_file)
     sb.splits.assert_called_once_with(samples[1])
-    f.fit_gaussian_sample.assert_any_call(samples[1], False, False, False, False, None, None, None, None, None, None, None, None)
+    f.fit_gaussian_sample.assert_any_call(samples[1], False, False, False, False, None, None, None, None, None, None, None, None, 'inline')
     for split in splits:
-        f.fit_gaussian_sample.assert_any_call(split, False, False, False, False, None, None, None, None, None, None, None, None)
+        f.fit_gaussian_sample.assert_any_call(split, False, False, False, False, None, None, None, None, None, None, None, None, 'inline')
+
+
+def test_fit_gaussian_batch(testdir, mock_testclass):
+    samples_file = Path(__file__).parent.joinpath('samples.txt')
+    samples = ['POLR2A', 'ASDURF']
+    Parser.first = MagicMock(return_value=samples)
+    f.fit_gaussian_batch = MagicMock()
+    f.fit_gaussian_sample = MagicMock()
+    f.fit_gaussian(samples_file, suffix='-test', jobs=2, batch=True, plots='none')
+    f.fit_gaussian_sample.assert_not_called()
+    f.fit_gaussian_batch.assert_any_call('POLR2A', False, False, False, False, None, None, None, None, None, None, None, '-test', 2, 'none')
+    f.fit_gaussian_batch.assert_any_call('ASDURF', False, False, False, False, None, None, None, None, None, None, None, '-test', 2, 'none')
+
+
+def test_fit_gaussian_batch_table(testdir, mock_testclass):
+    sample = 'POLR2A'
+    splits = ['POLR2A-100-110', 'POLR2A-120-130']
+    create_dyads(sample, 0, 20)
+    create_dyads(splits[0], 5, 15)
+    create_dyads(splits[1], 10, 25)
+    sb.splits = MagicMock(return_value=splits)
+    f.fit_dyads = MagicMock(side_effect=f.fit_dyads)
+    f.fit_gaussian_batch(sample, absolute=True, plots='none')
+    table = pd.read_csv(sample + '-dyad-gaussian.txt', sep='\t')
+    assert list(table['Sample']) == [sample] + splits
+    assert np.allclose(table['g_center'], [0, 5, 10], atol=0.01)
+    assert np.allclose(table['g_sigma'], [20, 15, 25], atol=0.01)
+    assert np.allclose(table['c_c'], [10, 10, 10], atol=0.01)
+    assert 'Reduced chi-square' in table.columns
+    assert f.fit_dyads.call_args_list[1].args[3]['g_center'] == pytest.approx(0, abs=0.01)
+    assert f.fit_dyads.call_args_list[2].args[3]['g_center'] == pytest.approx(5, abs=0.01)
+    assert not os.path.exists(sample + '-dyad-gaussian.png')
+
+
+def test_fit_gaussian_batch_plot(testdir, mock_testclass):
+    sample = 'POLR2A'
+    create_dyads(sample, 0, 20, '-test')
+    sb.splits = MagicMock(return_value=[])
+    f.fit_gaussian_batch(sample, suffix='-test')
+    assert os.path.exists(sample + '-test-dyad-gaussian.txt')
+    assert os.path.exists(sample + '-test-dyad-gaussian.png')
+
+
+def test_fit_gaussian_batch_jobs(testdir, mock_testclass):
+    sample = 'POLR2A'
+    splits = ['POLR2A-100-110', 'POLR2A-120-130']
+    create_dyads(sample, 0, 20)
+    create_dyads(splits[0], 5, 15)
+    create_dyads(splits[1], 10, 25)
+    sb.splits = MagicMock(return_value=splits)
+    Jobs.run = MagicMock(return_value=[None, None])
+    f.fit_gaussian_batch(sample, jobs=2, plots='none')
+    Jobs.run.assert_called_once_with(f.fit_dyads, ANY, 2)
+    arguments = Jobs.run.call_args.args[1]
+    assert [args[0] for args in arguments] == splits
+    assert [args[3]['g_center'] for args in arguments] == [pytest.approx(0, abs=0.01)] * 2
+    table = pd.read_csv(sample + '-dyad-gaussian.txt', sep='\t')
+    assert list(table['Sample']) == [sample] + splits
+    assert table['g_center'].isna().tolist() == [False, True, True]
+
+
+
+def test_fit_gaussian_sample(testdir, mock_testclass):
+    sample = 'POLR2A'
+    create_dyads(sample, 0, 20)
+    f.fit_gaussian_sample(sample, components=True, svg=True)
+    assert os.path.getsize(sample + '-dyad-gaussian.png') > 0
+    assert os.path.getsize(sample + '-dyad-gaussian.svg') > 0
+
+
+def test_fit_gaussian_sample_noplots(testdir, mock_testclass):
+    sample = 'POLR2A'
+    create_dyads(sample, 0, 20)
+    f.fit_gaussian_sample(sample, svg=True, plots='none')
+    assert not os.path.exists(sample + '-dyad-gaussian.png')
+    assert not os.path.exists(sample + '-dyad-gaussian.svg')
@@ -25,7 +25,7 @@ def test_fitgaussians(testdir, mock_testclass):
     runner = CliRunner()
     result = runner.invoke(f.fitgaussians, ['-s', samples])
     assert result.exit_code == 0
-    f.fit_gaussians.assert_called_once_with(samples, False, False, False, False, False, 1, None, None, None, None, None, None)
+    f.fit_gaussians.assert_called_once_with(samples, False, False, False, False, False, 1, None, None, None, None, None, None, 'inline')
 
 
 def test_fitgaussians_parameters(testdir, mock_testclass):
@@ -40,7 +40,7 @@ def test_fitgaussians_parameters(testdir, mock_testclass):
     runner = CliRunner()
     result = runner.invoke(f.fitgaussians, ['-s', samples, '--components', '--gaussian', '--svg', '--verbose', '--curves', '--count', count, '--amin', amin, '--amax', amax, '--smin', smin, '--smax', smax, '--suffix', suffix])
     assert result.exit_code == 0
-    f.fit_gaussians.assert_called_once_with(samples, True, True, True, True, True, count, amin, amax, smin, smax, suffix, None)
+    f.fit_gaussians.assert_called_once_with(samples, True, True, True, True, True, count, amin, amax, smin, smax, suffix, None, 'inline')
 
 
 def test_fitgaussians_second(testdir, mock_testclass):
@@ -50,7 +50,7 @@ def test_fitgaussians_second(testdir, mock_testclass):
     runner = CliRunner()
     result = runner.invoke(f.fitgaussians, ['-s', samples, '-i', index])
     assert result.exit_code == 0
-    f.fit_gaussians.assert_called_once_with(samples, False, False, False, False, False, 1, None, None, None, None, None, index)
+    f.fit_gaussians.assert_called_once_with(samples, False, False, False, False, False, 1, None, None, None, None, None, index, 'inline')
 
 
 def test_fitgaussians_samplesnotexists(testdir, mock_testclass):
@@ -70,7 +70,7 @@ def test_fit_gaussians(testdir, mock_testclass):
     f.fit_gaussians(samples_file)
     Parser.first.assert_called_once_with(samples_file)
     for sample in samples:
-        f.fit_gaussians_sample.assert_any_call(sample, False, False, False, False, False, 1, None, None, None, None, None)
+        f.fit_gaussians_sample.assert_any_call(sample, False, False, False, False, False, 1, None, None, None, None, None, 'inline')
 
 
 def test_fit_gaussians_parameters(testdir, mock_testclass):
@@ -87,7 +87,7 @@ def test_fit_gaussians_parameters(testdir, mock_testclass):
     f.fit_gaussians(samples_file, True, True, True, True, True, count, amin, amax, smin, smax, suffix)
     Parser.first.assert_called_once_with(samples_file)
     for sample in samples:
-        f.fit_gaussians_sample.assert_any_call(sample, True, True, True, True, True, count, amin, amax, smin, smax, suffix)
+        f.fit_gaussians_sample.assert_any_call(sample, True, True, True, True, True, count, amin, amax, smin, smax, suffix, 'inline')
 
 
 def test_fit_gaussians_second(testdir, mock_testclass):
@@ -97,4 +97,4 @@ def test_fit_gaussians_second(testdir, mock_testclass):
     f.fit_gaussians_sample = MagicMock()
     f.fit_gaussians(samples_file, index=1)
     Parser.first.assert_called_once_with(samples_file)
-    f.fit_gaussians_sample.assert_any_call(samples[1], False, False, False, False, False, 1, None, None, None, None, None)
+    f.fit_gaussians_sample.assert_any_call(samples[1], False, False, False, False, False, 1, None, None, None, None, None, 'inline')
@@ -37,7 +37,7 @@ def test_dyadcov(testdir, mock_testclass):
     runner = CliRunner()
     result = runner.invoke(mnasetools.mnasetools, ['dyadcov', '--samples', samples, '--genes', genes, '--minp', minp, '--maxp', maxp])
     assert result.exit_code == 0
-    DyadCoverage.dyad_coverage.assert_called_once_with(samples, genes, None, False, minp, maxp, None, None, None)
+    DyadCoverage.dyad_coverage.assert_called_once_with(samples, genes, None, False, minp, maxp, None, None, None, 1, 'inline')
 
 
 def test_dyadstatistics(testdir, mock_testclass):
@@ -67,7 +67,7 @@ def test_fitdoublegaussian(testdir, mock_testclass):
     runner = CliRunner()
     result = runner.invoke(mnasetools.mnasetools, ['fitdoublegaussian', '--samples', samples])
     assert result.exit_code == 0
-    FitDoubleGaussian.fit_double_gaussian.assert_called_once_with(samples, False, False, False, False, False, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None)
+    FitDoubleGaussian.fit_double_gaussian.assert_called_once_with(samples, False, False, False, False, False, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, 1, False, 'inline')
 
 
 def test_fitgaussian(testdir, mock_testclass):
@@ -76,7 +76,7 @@ def test_fitgaussian(testdir, mock_testclass):
     runner = CliRunner()
     result = runner.invoke(mnasetools.mnasetools, ['fitgaussian', '--samples', samples])
     assert result.exit_code == 0
-    FitGaussian.fit_gaussian.assert_called_once_with(samples, False, False, False, False, None, None, None, None, None, None, None, None, None)
+    FitGaussian.fit_gaussian.assert_called_once_with(samples, False, False, False, False, None, None, None, None, None, None, None, None, None, 1, False, 'inline')
 
 
 def test_fitgaussians(testdir, mock_testclass):
@@ -85,4 +85,4 @@ def test_fitgaussians(testdir, mock_testclass):
     runner = CliRunner()
     result = runner.invoke(mnasetools.mnasetools, ['fitgaussians', '--samples', samples])
     assert result.exit_code == 0
-    FitGaussians.fit_gaussians.assert_called_once_with(samples, False, False, False, False, False, 1, None, None, None, None, None, None)
+    FitGaussians.fit_gaussians.assert_called_once_with(samples, False, False, False, False, False, 1, None, None, None, None, None, None, 'inline')
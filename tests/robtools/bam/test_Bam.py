@@ -1,3 +1,4 @@
+import os
 import subprocess
 from unittest.mock import MagicMock
 
@@ -9,8 +10,10 @@ from robtools.bam import Bam
 @pytest.fixture
 def mock_testclass():
     run = subprocess.run
+    run_pipeline = Bam.run_pipeline
     yield
     subprocess.run = run
+    Bam.run_pipeline = run_pipeline
 
 
 def test_sort(mock_testclass):
@@ -21,9 +24,63 @@ def test_sort(mock_testclass):
     subprocess.run.assert_called_with(['samtools', 'sort', '-o', output, bam], check=True)
 
 
+def test_sort_command(mock_testclass):
+    output = 'sample-out.bam'
+    cmd = Bam.sort_command('-', output, 3, '2G')
+    assert cmd == ['samtools', 'sort', '--threads', '2', '-m', '2G', '-o', output, '-']
+
+
+def test_sort_stream(mock_testclass):
+    output = 'sample-out.bam'
+    Bam.run_pipeline = MagicMock()
+    Bam.sort_stream(['bowtie2', '-U', 'sample.fastq'], output, 3, '2G')
+    Bam.run_pipeline.assert_called_once_with(
+        [['bowtie2', '-U', 'sample.fastq'], ['samtools', 'sort', '--threads', '2', '-m', '2G', '-o', output, '-']])
+
+
+def test_sort_stream_failure(testdir, mock_testclass):
+    output = 'sample-out.bam'
+
+    def fail(*args, **kwargs):
+        with open(output, 'w') as outfile:
+            outfile.write('test')
+        raise subprocess.CalledProcessError(1, ['samtools', 'sort'])
+
+    Bam.run_pipeline = MagicMock(side_effect=fail)
+    with pytest.raises(subprocess.CalledProcessError):
+        Bam.sort_stream(['bowtie2', '-U', 'sample.fastq'], output)
+    assert not os.path.exists(output)
+
 def test_sort_by_readname(mock_testclass):
     bam = 'sample.bam'
     output = 'sample-out.bam'
     subprocess.run = MagicMock()
     Bam.sort_by_readname(bam, output)
     subprocess.run.assert_called_with(['samtools', 'sort', '-n', '-o', output, bam], check=True)
+
+
+def test_run_pipeline(testdir, mock_testclass):
+    with open('output.txt', 'w') as outfile:
+        Bam.run_pipeline([['echo', 'test'], ['cat'], ['tr', 'a-z', 'A-Z']], stdout=outfile)
+    with open('output.txt', 'r') as infile:
+        assert infile.readline() == 'TEST\n'
+
+
+def test_run_pipeline_failure(testdir, mock_testclass):
+    with pytest.raises(subprocess.CalledProcessError) as error:
+        Bam.run_pipeline([['echo', 'test'], ['false'], ['cat']], stdout=subprocess.DEVNULL)
+    assert error.value.cmd == ['false']
+
+
+def test_run_pipeline_lastfailure(testdir, mock_testclass):
+    failing = ['sh', '-c', 'head -c 1 > /dev/null; echo cannot sort >&2; exit 3']
+    with pytest.raises(subprocess.CalledProcessError) as error:
+        Bam.run_pipeline([['yes'], failing], stdout=subprocess.DEVNULL)
+    assert error.value.cmd == failing
+    assert error.value.returncode == 3
+    assert b'cannot sort' in error.value.stderr
+
+
+def test_run_pipeline_stderr(testdir, mock_testclass, capfd):
+    Bam.run_pipeline([['sh', '-c', 'echo test; echo aligned >&2'], ['cat']], stdout=subprocess.DEVNULL)
+    assert capfd.readouterr().err == 'aligned\n'
@@ -3,6 +3,7 @@ import subprocess
 from pathlib import Path
 from unittest.mock import MagicMock, ANY
 
+import numpy as np
 import pytest
 
 from robtools.bed import Bed
@@ -12,9 +13,19 @@ from robtools.bed import Bed
 def mock_testclass():
     os_name = os.name
     run = subprocess.run
+    count_lines = Bed.count_lines
+    count_strands = Bed.count_strands
+    sidecar_min_size = Bed.SIDECAR_MIN_SIZE
+    index_max_ranges = Bed.INDEX_MAX_RANGES
+    Bed.counts_memo.clear()
     yield
     os.name = os_name
     subprocess.run = run
+    Bed.count_lines = count_lines
+    Bed.count_strands = count_strands
+    Bed.SIDECAR_MIN_SIZE = sidecar_min_size
+    Bed.INDEX_MAX_RANGES = index_max_ranges
+    Bed.counts_memo.clear()
 
 
 def create_file(*args, **kwargs):
@@ -37,6 +48,317 @@ def test_count_bed_strand(testdir, mock_testclass):
     assert 4 == Bed.count_bed(bed, strand='+')
 
 
+def test_count_bed_smallbed(testdir, mock_testclass):
+    with open('input.bed', 'w') as outfile:
+        outfile.write('chr1\t10\t20\ta\t1\t+\n')
+        outfile.write('chr1\t30\t40\tb\t1\t-\n')
+    assert 2 == Bed.count_bed('input.bed')
+    assert 1 == Bed.count_bed('input.bed', strand='+')
+    assert 0 == Bed.count_bed('input.bed', strand='.')
+    assert not os.path.exists('input.bedz')
+
+
+def test_count_bed_memoized(testdir, mock_testclass):
+    bed = Path(__file__).parent.parent.joinpath('sample.bed')
+    assert 8 == Bed.count_bed(bed)
+    assert 4 == Bed.count_bed(bed, strand='-')
+    Bed.count_lines = MagicMock()
+    Bed.count_strands = MagicMock()
+    assert 8 == Bed.count_bed(bed)
+    assert 4 == Bed.count_bed(bed, strand='+')
+    assert 0 == Bed.count_bed(bed, strand='.')
+    Bed.count_lines.assert_not_called()
+    Bed.count_strands.assert_not_called()
+    assert not os.path.exists(str(bed) + '.count')
+
+
+def test_count_bed_sidecar(testdir, mock_testclass):
+    Bed.SIDECAR_MIN_SIZE = 0
+    with open('input.bed', 'w') as outfile:
+        outfile.write('chr1\t10\t20\ta\t1\t+\n')
+        outfile.write('chr1\t30\t40\tb\t1\t-\n')
+    assert 2 == Bed.count_bed('input.bed')
+    assert 1 == Bed.count_bed('input.bed', strand='+')
+    assert os.path.isfile('input.bed.count')
+    assert not os.path.exists('input.bedz')
+    Bed.counts_memo.clear()
+    Bed.count_lines = MagicMock()
+    Bed.count_strands = MagicMock()
+    assert 2 == Bed.count_bed('input.bed')
+    assert 1 == Bed.count_bed('input.bed', strand='-')
+    Bed.count_lines.assert_not_called()
+    Bed.count_strands.assert_not_called()
+    with open('input.bed', 'a') as outfile:
+        outfile.write('chr1\t50\t60\tc\t1\t-\n')
+    Bed.count_lines = MagicMock(return_value=3)
+    assert 3 == Bed.count_bed('input.bed')
+    Bed.count_lines.assert_called_once_with('input.bed')
+
+
+def test_count_bed_cache(testdir, mock_testclass):
+    with open('input.bed', 'w') as outfile:
+        outfile.write('chr1\t10\t20\ta\t1\t+\n')
+        outfile.write('chr1\t30\t40\tb\t1\t-\n')
+    Bed.write_cache('input.bed')
+    Bed.count_lines = MagicMock()
+    Bed.count_strands = MagicMock()
+    assert 2 == Bed.count_bed('input.bed')
+    assert 1 == Bed.count_bed('input.bed', strand='-')
+    Bed.count_lines.assert_not_called()
+    Bed.count_strands.assert_not_called()
+    assert not os.path.exists('input.bed.count')
+
+
+def test_count_lines(testdir, mock_testclass):
+    with open('input.bed', 'w') as outfile:
+        outfile.write('track name=test\n')
+        outfile.write('chr1\t10\t20\n')
+        outfile.write('browser position chr1\n')
+        outfile.write('chr1\t30\t40\n')
+        outfile.write('#chr1\t50\t60\n')
+        outfile.write('chr1\t70\t80')
+    assert 3 == Bed.count_lines('input.bed')
+    for chunk_size in [1, 5, 12, 13, 100]:
+        assert 3 == Bed.count_lines('input.bed', chunk_size)
+    with open('empty.bed', 'w') as outfile:
+        outfile.write('')
+    assert 0 == Bed.count_lines('empty.bed')
+
+
+def test_count_strands(testdir, mock_testclass):
+    with open('input.bed', 'w') as outfile:
+        outfile.write('track name=test\n')
+        outfile.write('chr1\t10\t20\ta\t1\t+\n')
+        outfile.write('chr1\t30\t40\n')
+        outfile.write('chr1\t50\t60\tb\t1\t-\r\n')
+        outfile.write('chr1\t70\t80\tc\t1\t-\n')
+    assert Bed.count_strands('input.bed') == {'+': 1, '-': 2}
+
+
+def test_chunks(testdir, mock_testclass):
+    bed = Path(__file__).parent.parent.joinpath('sample.bed')
+    items = list(Bed.chunks(bed))
+    assert items[0] == b'track name=test\n'
+    chunk = items[1]
+    assert list(chunk['names'][chunk['chromosomes']]) == ['chr1', 'chr2', 'chr3', 'chr4', 'chr5', 'chr6', 'chr7', 'chr8']
+    assert list(chunk['starts']) == [100, 400, 500, 800, 100, 400, 500, 800]
+    assert list(chunk['ends']) == [150, 450, 650, 750, 150, 450, 650, 750]
+    assert len(chunk['columns']) == 3
+    assert list(chunk['columns'][0]) == [b'test1', b'test2', b'test3', b'test4', b'test5', b'test6', b'test7', b'test8']
+    assert list(Bed.strands(chunk)) == [b'+', b'+', b'+', b'+', b'-', b'-', b'-', b'-']
+    assert len(items) == 2
+
+
+def test_chunks_headers_columns(testdir, mock_testclass):
+    with open('input.bed', 'w') as outfile:
+        outfile.write('track name=test\n')
+        outfile.write('chr1\t10\t20\ta\t1\t+\r\n')
+        outfile.write('#comment\n')
+        outfile.write('browser position chr1\n')
+        outfile.write('chr1\t30\t45\n')
+        outfile.write('invalid\n')
+        outfile.write('chr2\t5\t9\tb\t0\t-\textra')
+    items = list(Bed.chunks('input.bed'))
+    assert items[0] == b'track name=test\n'
+    assert list(items[1]['starts']) == [10]
+    assert list(Bed.strands(items[1])) == [b'+']
+    assert items[2] == b'#comment\n'
+    assert items[3] == b'browser position chr1\n'
+    assert list(items[4]['ends']) == [45]
+    assert items[4]['columns'] == []
+    assert list(items[5]['names']) == ['chr2']
+    assert list(items[5]['columns'][3]) == [b'extra']
+    assert len(items) == 6
+    items = list(Bed.chunks('input.bed', 6))
+    assert [len(item['starts']) for item in items if not isinstance(item, bytes)] == [1, 1]
+
+
+def test_chunks_size(testdir, mock_testclass):
+    bed = Path(__file__).parent.parent.joinpath('sample.bed')
+    items = list(Bed.chunks(bed, chunk_size=30))
+    chunks = [item for item in items if not isinstance(item, bytes)]
+    assert len(chunks) > 1
+    assert np.concatenate([chunk['starts'] for chunk in chunks]).tolist() == [100, 400, 500, 800, 100, 400, 500, 800]
+
+
+def test_write_chunks(testdir, mock_testclass):
+    bed = Path(__file__).parent.parent.joinpath('sample.bed')
+    Bed.write_chunks('output.bed', Bed.chunks(bed, chunk_size=30))
+    with open(bed, 'r') as expected, open('output.bed', 'r') as output:
+        assert output.read() == expected.read()
+
+
+def test_write_chunks_select(testdir, mock_testclass):
+    bed = Path(__file__).parent.parent.joinpath('sample.bed')
+    chunks = [item if isinstance(item, bytes) else Bed.select(item, item['starts'] == 0) for item in Bed.chunks(bed)]
+    Bed.write_chunks('output.bed', chunks)
+    with open('output.bed', 'r') as output:
+        assert output.read() == 'track name=test\n'
+
+
+def test_integers(mock_testclass):
+    integers = np.array([0, 7, 10, 99, 100, 123456789012])
+    matrix = Bed.integers_matrix(integers)
+    assert [bytes(row[row != 0]) for row in matrix] == [b'0', b'7', b'10', b'99', b'100', b'123456789012']
+    assert list(Bed.parse_integers(np.array([b'0', b'7', b'10', b'123456789012']))) == [0, 7, 10, 123456789012]
+    assert list(Bed.parse_integers(np.array([b'-5', b'7']))) == [-5, 7]
+    with pytest.raises(ValueError):
+        Bed.parse_integers(np.array([b'1a', b'7']))
+    matrix = Bed.integers_matrix(np.array([-5, 10]))
+    assert [bytes(row[row != 0]) for row in matrix] == [b'-5', b'10']
+
+
+def test_chunks_roundtrip(testdir, mock_testclass):
+    count = 200000
+    starts = np.random.default_rng(1).integers(0, 100000000, count)
+    with open('input.bed', 'w') as outfile:
+        outfile.write('track name=test\n')
+        outfile.writelines(['chr{}\t{}\t{}\tread{}\t60\t{}\n'.format(i % 16, start, start + 150, i, '+-'[i % 2])
+                            for i, start in enumerate(starts)])
+    Bed.write_chunks('output.bed', Bed.chunks('input.bed'))
+    with open('input.bed', 'rb') as expected, open('output.bed', 'rb') as output:
+        assert output.read() == expected.read()
+
+
+def test_write_cache(testdir, mock_testclass):
+    with open('input.bed', 'w') as outfile:
+        outfile.write('track name=test\n')
+        outfile.write('chr2\t10\t20\ta\t1\t+\n')
+        outfile.write('chr2\t30\t45\tb\t1\t-\n')
+        outfile.write('chr1\t5\t8\n')
+    Bed.write_cache('input.bed')
+    assert os.path.isfile('input.bedz')
+    cache = Bed.read_cache('input.bed')
+    assert isinstance(cache['starts'], np.memmap)
+    assert list(cache['names']) == ['chr2', 'chr1']
+    assert list(cache['chromosomes']) == [0, 0, 1]
+    assert list(cache['starts']) == [10, 30, 5]
+    assert list(cache['ends']) == [20, 45, 8]
+    assert list(cache['strands']) == [b'+', b'-', b'']
+    assert list(cache['counts']) == [2, 1]
+    assert list(cache['offsets']) == [0, 2, 3]
+    assert Bed.count_bed('input.bed') == 3
+    assert Bed.count_bed('input.bed', strand='-') == 1
+
+
+def test_write_cache_shortlines(testdir, mock_testclass):
+    with open('input.bed', 'w') as outfile:
+        outfile.write('track name=test\n')
+        outfile.write('chr1\t10\t20\ta\t1\t+\n')
+        outfile.write('\n')
+        outfile.write('chr1\t30\n')
+        outfile.write('chr1\t50\t60\tb\t1\t+\n')
+    expected = Bed.count_lines('input.bed')
+    Bed.write_cache('input.bed')
+    assert sorted(os.listdir()) == ['input.bed', 'input.bedz']
+    Bed.count_lines = MagicMock()
+    assert Bed.count_bed('input.bed') == expected == 4
+    assert Bed.count_bed('input.bed', strand='+') == 2
+    assert len(Bed.read_cache('input.bed')['starts']) == 2
+
+
+def test_write_cache_fails(testdir, mock_testclass):
+    with open('input.bed', 'w') as outfile:
+        outfile.write('chr1\t10\t20\n')
+    Bed.count_lines = MagicMock(side_effect=OSError('failed'))
+    with pytest.raises(OSError):
+        Bed.write_cache('input.bed')
+    assert os.listdir() == ['input.bed']
+
+
+def test_write_cache_not_grouped(testdir, mock_testclass):
+    with open('input.bed', 'w') as outfile:
+        outfile.write('chr1\t10\t20\n')
+        outfile.write('chr2\t30\t45\n')
+        outfile.write('chr1\t5\t8\n')
+    Bed.write_cache('input.bed')
+    cache = Bed.read_cache('input.bed')
+    assert list(cache['counts']) == [2, 1]
+    assert list(cache['offsets']) == []
+
+
+def test_write_cache_empty(testdir, mock_testclass):
+    with open('input.bed', 'w') as outfile:
+        outfile.write('track name=test\n')
+    Bed.write_cache('input.bed')
+    cache = Bed.read_cache('input.bed')
+    assert len(cache['names']) == 0
+    assert len(cache['starts']) == 0
+    assert Bed.count_bed('input.bed') == 0
+
+
+def test_read_cache_stale(testdir, mock_testclass):
+    with open('input.bed', 'w') as outfile:
+        outfile.write('chr1\t10\t20\n')
+    assert Bed.read_cache('input.bed') is None
+    Bed.write_cache('input.bed')
+    assert Bed.read_cache('input.bed') is not None
+    with open('input.bed', 'a') as outfile:
+        outfile.write('chr1\t30\t40\n')
+    assert Bed.read_cache('input.bed') is None
+    assert Bed.count_bed('input.bed') == 2
+
+
+def test_read_cache_invalid(testdir, mock_testclass):
+    with open('input.bed', 'w') as outfile:
+        outfile.write('chr1\t10\t20\n')
+    with open('input.bedz', 'w') as outfile:
+        outfile.write('test')
+    assert Bed.read_cache('input.bed') is None
+    assert Bed.count_bed('input.bed') == 1
+
+
+def test_index_chunk(testdir, mock_testclass):
+    with open('input.bed', 'w') as outfile:
+        outfile.write('track name=test\n')
+        outfile.write('chr2\t10\t20\n')
+        outfile.write('chr2\t30\t45\n')
+        outfile.write('# comment\n')
+        outfile.write('chr2\t50\t60\n')
+        outfile.write('chr1\t5\t8\n')
+        outfile.write('chr1\t9\n')
+        outfile.write('chr1\t15\t18\tname\n')
+    index = {}
+    for chunk in Bed.chunks('input.bed'):
+        if not isinstance(chunk, bytes):
+            Bed.index_chunk(index, chunk)
+    assert index == {'chr2': {'count': 3, 'ranges': [[16, 38], [48, 59]]},
+                     'chr1': {'count': 2, 'ranges': [[59, 68], [75, 91]]}}
+    items = list(Bed.range_chunks('input.bed', index['chr2']['ranges']))
+    assert [list(chunk['starts']) for chunk in items] == [[10, 30], [50]]
+    assert list(items[0]['byte_starts']) == [16, 27]
+    assert list(items[1]['byte_ends']) == [59]
+    Bed.write_chunks('chr1.bed', Bed.range_chunks('input.bed', index['chr1']['ranges'], chunk_size=4))
+    with open('chr1.bed', 'r') as infile:
+        assert infile.read() == 'chr1\t5\t8\nchr1\t15\t18\tname\n'
+
+
+def test_index_chunk_maxranges(testdir, mock_testclass):
+    Bed.INDEX_MAX_RANGES = 2
+    with open('input.bed', 'w') as outfile:
+        for i in range(3):
+            outfile.write('chr1\t10\t20\n')
+            outfile.write('chr2\t10\t20\n')
+    index = {}
+    for chunk in Bed.chunks('input.bed', chunk_size=1):
+        Bed.index_chunk(index, chunk)
+    assert index == {'chr1': {'count': 3, 'ranges': None}, 'chr2': {'count': 3, 'ranges': None}}
+
+
+def test_chromosome_index_sidecar(testdir, mock_testclass):
+    with open('input.bed', 'w') as outfile:
+        outfile.write('chr2\t10\t20\n')
+        outfile.write('chr1\t5\t8\n')
+    assert Bed.read_chromosome_index('input.bed') is None
+    index = {'chr2': {'count': 1, 'ranges': [[0, 11]]}, 'chr1': {'count': 1, 'ranges': [[11, 21]]}}
+    Bed.write_chromosome_index('input.bed', index)
+    assert os.path.isfile('input.bed.chromosomes')
+    assert Bed.read_chromosome_index('input.bed') == index
+    with open('input.bed', 'a') as outfile:
+        outfile.write('chr1\t15\t18\n')
+    assert Bed.read_chromosome_index('input.bed') is None
+
+
 def test_empty_bed(testdir, mock_testclass):
     bed = 'sample.bed'
     sample = 'POLR2A'
@@ -97,15 +419,6 @@ def test_sort_linux(testdir, mock_testclass):
         assert subprocess.run.call_args_list[0].kwargs["env"][env] == os.environ[env]
 
 
-def test_sort_bysize(testdir, mock_testclass):
-    bed = Path(__file__).parent.parent.joinpath('sample.bed')
-    output = 'test.bed'
-    subprocess.run = MagicMock(side_effect=create_file)
-    Bed.sort_bysize(bed, output)
-    subprocess.run.assert_called_with(['bedtools', 'sort', '-sizeA', '-i', bed], stdout=ANY, check=True)
-    assert os.path.exists(output)
-
-
 def test_bedgraph_to_bigwig(testdir, mock_testclass):
     bed = Path(__file__).parent.parent.joinpath('sample.bed')
     sizes = Path(__file__).parent.parent.joinpath('sizes.txt')
@@ -0,0 +1,57 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import click
+from click.testing import CliRunner
+import pytest
+
+from robtools.cli import LazyGroup as lg
+
+COMMANDS = {'printsample': 'robtools.PrintSample.printsample', 'mergebw': 'robtools.MergeBigwigs.mergebw'}
+
+
+@click.group(cls=lg.LazyGroup, lazy_commands=COMMANDS)
+def group():
+    pass
+
+
+@group.command()
+def eager():
+    '''Eager command.'''
+    pass
+
+
+def test_list_commands():
+    ctx = click.Context(group)
+    assert group.list_commands(ctx) == ['eager', 'mergebw', 'printsample']
+
+
+def test_get_command():
+    from robtools import PrintSample
+    ctx = click.Context(group)
+    assert group.get_command(ctx, 'printsample') is PrintSample.printsample
+    assert group.get_command(ctx, 'eager') is eager
+    assert group.get_command(ctx, 'missing') is None
+
+
+def test_help():
+    runner = CliRunner()
+    result = runner.invoke(group, ['--help'])
+    assert result.exit_code == 0
+    assert 'eager        Eager command.' in result.output
+    assert 'mergebw      Merge bigWig files related to samples.' in result.output
+    assert "printsample  Print's sample's name at index of samples file." in result.output
+
+
+def test_command_docstring():
+    assert lg.command_docstring('robtools.PrintSample.printsample') == "Print's sample's name at index of samples file."
+    assert lg.command_docstring('robtools.PrintSample.missing') is None
+
+
+def test_help_does_not_import_commands():
+    code = 'import sys; from robtools import robtools; robtools.robtools(["--help"], standalone_mode=False); ' \
+           'print(" ".join(sorted(name for name in sys.modules if name.startswith("robtools."))))'
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                            cwd=Path(__file__).parent.parent.parent.parent).stdout
+    assert output.splitlines()[-1].split() == ['robtools.cli', 'robtools.cli.LazyGroup', 'robtools.robtools']
@@ -0,0 +1,89 @@
+import logging
+import os
+from unittest.mock import MagicMock
+
+import pytest
+
+from robtools import Split
+from robtools.jobs import Jobs
+
+
+@pytest.fixture
+def mock_testclass():
+    splits = Split.splits
+    yield
+    Split.splits = splits
+
+
+def write_name(name, output):
+    print('Processing {}'.format(name))
+    logging.debug('Debug {}'.format(name))
+    with open(output, 'w') as outfile:
+        outfile.write(name + '\n')
+        outfile.write(str(os.getpid()))
+
+
+def square(value):
+    return value * value
+
+
+def fail_name(name):
+    print('Processing {}'.format(name))
+    if name == 'fail':
+        raise ValueError('failed ' + name)
+
+
+def test_with_splits(mock_testclass):
+    Split.splits = MagicMock(side_effect=[['POLR2A-100-110', 'POLR2A-110-120'], [], ['POLR1C-100-110']])
+    assert Jobs.with_splits(['POLR2A', 'ASDURF', 'POLR1C']) == ['POLR2A', 'POLR2A-100-110', 'POLR2A-110-120', 'ASDURF',
+                                                                'POLR1C', 'POLR1C-100-110']
+    Split.splits.assert_any_call('POLR2A')
+    Split.splits.assert_any_call('ASDURF')
+    Split.splits.assert_any_call('POLR1C')
+
+
+def test_run(testdir, mock_testclass, capsys):
+    names = ['POLR2A', 'ASDURF', 'POLR1C']
+    Jobs.run(write_name, [(name, name + '.txt') for name in names])
+    for name in names:
+        with open(name + '.txt', 'r') as infile:
+            assert infile.readline() == name + '\n'
+            assert infile.readline() == str(os.getpid())
+    assert capsys.readouterr().out == 'Processing POLR2A\nProcessing ASDURF\nProcessing POLR1C\n'
+
+
+def test_run_jobs(testdir, mock_testclass, capsys, caplog):
+    names = ['sample' + str(i) for i in range(0, 20)]
+    with caplog.at_level(logging.DEBUG):
+        Jobs.run(write_name, [(name, name + '.txt') for name in names], 4)
+    pids = set()
+    for name in names:
+        with open(name + '.txt', 'r') as infile:
+            assert infile.readline() == name + '\n'
+            pids.add(infile.readline())
+    assert str(os.getpid()) not in pids
+    assert capsys.readouterr().out == ''.join(['Processing {}\n'.format(name) for name in names])
+    assert [record.getMessage() for record in caplog.records] == ['Debug {}'.format(name) for name in names]
+
+
+def test_run_jobs_failure(testdir, mock_testclass, capsys):
+    names = ['POLR2A', 'fail', 'ASDURF', 'fail', 'POLR1C']
+    with pytest.raises(ValueError) as error:
+        Jobs.run(fail_name, [(name,) for name in names], 3)
+    assert str(error.value) == 'failed fail'
+    assert capsys.readouterr().out == 'Processing POLR2A\nProcessing fail\n'
+
+
+def test_run_failure(testdir, mock_testclass, capsys):
+    names = ['POLR2A', 'fail', 'ASDURF']
+    with pytest.raises(ValueError):
+        Jobs.run(fail_name, [(name,) for name in names])
+    assert capsys.readouterr().out == 'Processing POLR2A\nProcessing fail\n'
+
+
+def test_run_results(testdir, mock_testclass):
+    assert Jobs.run(square, [(i,) for i in range(0, 5)]) == [0, 1, 4, 9, 16]
+
+
+def test_run_jobs_results(testdir, mock_testclass):
+    assert Jobs.run(square, [(i,) for i in range(0, 20)], 4) == [i * i for i in range(0, 20)]
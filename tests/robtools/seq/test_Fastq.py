@@ -1,3 +1,4 @@
+import gzip
 import logging
 
 from robtools.seq import Fastq
@@ -79,3 +80,21 @@ def test_fastq_R2_gz(testdir):
 def test_fastq_2_notexists(testdir):
     sample = 'PORL2A'
     assert Fastq.fastq(sample, 2) == None
+
+
+def test_gzip_open(testdir):
+    output = 'PORL2A_1.fastq.gz'
+    with Fastq.gzip_open(output, 'wb') as outfile:
+        outfile.write(b'@read\nACGT\n+\nIIII\n')
+    with gzip.open(output, 'rt') as infile:
+        assert infile.readlines() == ['@read\n', 'ACGT\n', '+\n', 'IIII\n']
+    with Fastq.gzip_open(output) as infile:
+        assert infile.readline() == b'@read\n'
+
+
+def test_gzip_open_threads(testdir):
+    output = 'PORL2A_1.fastq.gz'
+    with Fastq.gzip_open(output, 'wb', 4) as outfile:
+        outfile.write(b'@read\nACGT\n+\nIIII\n')
+    with gzip.open(output, 'rt') as infile:
+        assert infile.readlines() == ['@read\n', 'ACGT\n', '+\n', 'IIII\n']
@@ -1,9 +1,11 @@
+import logging
 import os
 import subprocess
 from pathlib import Path
 from shutil import copyfile
 from unittest.mock import MagicMock, ANY
 
+import pysam
 import pytest
 from click.testing import CliRunner
 
@@ -17,19 +19,19 @@ def mock_testclass():
     bam2bed_samples = bb.bam2bed_samples
     bam2bed_sample = bb.bam2bed_sample
     bam2bed_unpaired = bb.bam2bed_unpaired
-    bam2bedpe = bb.bam2bedpe
-    bedpe2bed = bb.bedpe2bed
+    bam2fragments = bb.bam2fragments
     bam_sort_by_readname = Bam.sort_by_readname
     bed_sort = Bed.sort
+    write_cache = Bed.write_cache
     run = subprocess.run
     yield
     bb.bam2bed_samples = bam2bed_samples
     bb.bam2bed_sample = bam2bed_sample
     bb.bam2bed_unpaired = bam2bed_unpaired
-    bb.bam2bedpe = bam2bedpe
-    bb.bedpe2bed = bedpe2bed
+    bb.bam2fragments = bam2fragments
     Bam.sort_by_readname = bam_sort_by_readname
     Bed.sort = bed_sort
+    Bed.write_cache = write_cache
     subprocess.run = run
 
 
@@ -43,12 +45,6 @@ def create_file(*args, **kwargs):
             outfile.write('test')
 
 
-def create_file_bam2bedpe(*args, **kwargs):
-    output = args[1]
-    with open(output, 'w') as outfile:
-        outfile.write('test')
-
-
 def create_file_bedsort(*args, **kwargs):
     output = args[1]
     with open(output, 'w') as outfile:
@@ -62,7 +58,7 @@ def test_bam2bed(testdir, mock_testclass):
     runner = CliRunner()
     result = runner.invoke(bb.bam2bed, ['-s', samples])
     assert result.exit_code == 0
-    bb.bam2bed_samples.assert_called_once_with(samples, True, threads, '-dedup', '', None)
+    bb.bam2bed_samples.assert_called_once_with(samples, True, threads, '-dedup', '', None, False)
 
 
 def test_bam2bed_parameters(testdir, mock_testclass):
@@ -74,18 +70,18 @@ def test_bam2bed_parameters(testdir, mock_testclass):
     bb.bam2bed_samples = MagicMock()
     runner = CliRunner()
     result = runner.invoke(bb.bam2bed, ['-s', samples, '--unpaired', '--threads', threads, '-is', input_suffix, '-os',
-                                        output_suffix, '--index', index])
+                                        output_suffix, '--index', index, '--cache'])
     assert result.exit_code == 0
-    bb.bam2bed_samples.assert_called_once_with(samples, False, threads, input_suffix, output_suffix, index)
+    bb.bam2bed_samples.assert_called_once_with(samples, False, threads, input_suffix, output_suffix, index, True)
 
 
 def test_bam2bed_samples(testdir, mock_testclass):
     samples = Path(__file__).parent.joinpath('samples.txt')
     bb.bam2bed_sample = MagicMock()
     bb.bam2bed_samples(samples)
-    bb.bam2bed_sample.assert_any_call('POLR2A', True, None, '', '')
-    bb.bam2bed_sample.assert_any_call('ASDURF', True, None, '', '')
-    bb.bam2bed_sample.assert_any_call('POLR1C', True, None, '', '')
+    bb.bam2bed_sample.assert_any_call('POLR2A', True, None, '', '', False)
+    bb.bam2bed_sample.assert_any_call('ASDURF', True, None, '', '', False)
+    bb.bam2bed_sample.assert_any_call('POLR1C', True, None, '', '', False)
 
 
 def test_bam2bed_samples_all_threads(testdir, mock_testclass):
@@ -95,9 +91,9 @@ def test_bam2bed_samples_all_threads(testdir, mock_testclass):
     output_suffix = '-out'
     bb.bam2bed_sample = MagicMock()
     bb.bam2bed_samples(samples, threads=threads, input_suffix=input_suffix, output_suffix=output_suffix)
-    bb.bam2bed_sample.assert_any_call('POLR2A', True, threads, input_suffix, output_suffix)
-    bb.bam2bed_sample.assert_any_call('ASDURF', True, threads, input_suffix, output_suffix)
-    bb.bam2bed_sample.assert_any_call('POLR1C', True, threads, input_suffix, output_suffix)
+    bb.bam2bed_sample.assert_any_call('POLR2A', True, threads, input_suffix, output_suffix, False)
+    bb.bam2bed_sample.assert_any_call('ASDURF', True, threads, input_suffix, output_suffix, False)
+    bb.bam2bed_sample.assert_any_call('POLR1C', True, threads, input_suffix, output_suffix, False)
 
 
 def test_bam2bed_samples_all_notpaired(testdir, mock_testclass):
@@ -107,9 +103,9 @@ def test_bam2bed_samples_all_notpaired(testdir, mock_testclass):
     output_suffix = '-out'
     bb.bam2bed_sample = MagicMock()
     bb.bam2bed_samples(samples, False, threads, input_suffix=input_suffix, output_suffix=output_suffix)
-    bb.bam2bed_sample.assert_any_call('POLR2A', False, threads, input_suffix, output_suffix)
-    bb.bam2bed_sample.assert_any_call('ASDURF', False, threads, input_suffix, output_suffix)
-    bb.bam2bed_sample.assert_any_call('POLR1C', False, threads, input_suffix, output_suffix)
+    bb.bam2bed_sample.assert_any_call('POLR2A', False, threads, input_suffix, output_suffix, False)
+    bb.bam2bed_sample.assert_any_call('ASDURF', False, threads, input_suffix, output_suffix, False)
+    bb.bam2bed_sample.assert_any_call('POLR1C', False, threads, input_suffix, output_suffix, False)
 
 
 def test_bam2bed_samples_second_threads(testdir, mock_testclass):
@@ -119,7 +115,7 @@ def test_bam2bed_samples_second_threads(testdir, mock_testclass):
     output_suffix = '-out'
     bb.bam2bed_sample = MagicMock()
     bb.bam2bed_samples(samples, True, threads, input_suffix=input_suffix, output_suffix=output_suffix, index=1)
-    bb.bam2bed_sample.assert_called_once_with('ASDURF', True, threads, input_suffix, output_suffix)
+    bb.bam2bed_sample.assert_called_once_with('ASDURF', True, threads, input_suffix, output_suffix, False)
 
 
 def test_bam2bed_sample_paired(testdir, mock_testclass):
@@ -127,12 +123,11 @@ def test_bam2bed_sample_paired(testdir, mock_testclass):
     bam = sample + '.bam'
     bed = sample + '.bed'
     threads = 2
-    bb.bam2bedpe = MagicMock(side_effect=create_file_bam2bedpe)
-    bb.bedpe2bed = MagicMock()
+    bb.bam2fragments = MagicMock()
+    Bed.write_cache = MagicMock()
     bb.bam2bed_sample(sample, True, threads)
-    bb.bam2bedpe.assert_called_with(bam, ANY, threads)
-    bb.bedpe2bed.assert_called_with(ANY, bed)
-    assert bb.bam2bedpe.call_args.args[1] == bb.bedpe2bed.call_args.args[0]
+    bb.bam2fragments.assert_called_once_with(bam, bed, threads)
+    Bed.write_cache.assert_not_called()
 
 
 def test_bam2bed_sample_paired_suffixes(testdir, mock_testclass):
@@ -142,12 +137,22 @@ def test_bam2bed_sample_paired_suffixes(testdir, mock_testclass):
     bam = sample + input_suffix + '.bam'
     bed = sample + output_suffix + '.bed'
     threads = 2
-    bb.bam2bedpe = MagicMock(side_effect=create_file_bam2bedpe)
-    bb.bedpe2bed = MagicMock()
+    bb.bam2fragments = MagicMock()
+    Bed.write_cache = MagicMock()
     bb.bam2bed_sample(sample, True, threads=threads, input_suffix=input_suffix, output_suffix=output_suffix)
-    bb.bam2bedpe.assert_called_with(bam, ANY, threads)
-    bb.bedpe2bed.assert_called_with(ANY, bed)
-    assert bb.bam2bedpe.call_args.args[1] == bb.bedpe2bed.call_args.args[0]
+    bb.bam2fragments.assert_called_once_with(bam, bed, threads)
+    Bed.write_cache.assert_not_called()
+
+
+def test_bam2bed_sample_cache(testdir, mock_testclass):
+    sample = 'POLR2A'
+    bam = sample + '.bam'
+    bed = sample + '.bed'
+    bb.bam2fragments = MagicMock()
+    Bed.write_cache = MagicMock()
+    bb.bam2bed_sample(sample, True, cache=True)
+    bb.bam2fragments.assert_called_once_with(bam, bed, None)
+    Bed.write_cache.assert_called_once_with(bed)
 
 
 def test_bam2bed_sample_notpaired(testdir, mock_testclass):
@@ -155,6 +160,7 @@ def test_bam2bed_sample_notpaired(testdir, mock_testclass):
     bam = sample + '.bam'
     bed = sample + '.bed'
     bb.bam2bed_unpaired = MagicMock()
+    Bed.write_cache = MagicMock()
     bb.bam2bed_sample(sample, False)
     bb.bam2bed_unpaired.assert_called_with(bam, bed)
 
@@ -166,6 +172,7 @@ def test_bam2bed_sample_notpaired_suffixes(testdir, mock_testclass):
     bam = sample + input_suffix + '.bam'
     bed = sample + output_suffix + '.bed'
     bb.bam2bed_unpaired = MagicMock()
+    Bed.write_cache = MagicMock()
     bb.bam2bed_sample(sample, False, input_suffix=input_suffix, output_suffix=output_suffix)
     bb.bam2bed_unpaired.assert_called_with(bam, bed)
 
@@ -184,47 +191,76 @@ def test_bam2bed_sample_unpaired(testdir, mock_testclass):
         assert infile.readline() == 'test bed sort'
 
 
-def test_bam2bedpe(testdir, mock_testclass):
+def test_bam2fragments(testdir, mock_testclass):
     bam = 'POLR2A.bam'
-    bedpe = 'POLR2A.bedpe'
-    threads = 2
+    bed = 'POLR2A.bed'
+    pysam.sort('-o', bam, str(Path(__file__).parent.joinpath('sample-big.sam')))
+    Bed.sort = MagicMock()
     Bam.sort_by_readname = MagicMock()
-    subprocess.run = MagicMock(side_effect=create_file)
-    bb.bam2bedpe(bam, bedpe, threads)
-    Bam.sort_by_readname.assert_any_call(bam, ANY, threads)
-    subprocess.run.assert_any_call(['bedtools', 'bamtobed', '-bedpe', '-mate1', '-i', ANY], stdout=ANY, check=True)
-    assert Bam.sort_by_readname.call_args_list[0].args[1] == subprocess.run.call_args_list[0].args[0][5]
-    assert os.path.exists(bedpe)
+    bb.bam2fragments(bam, bed)
+    Bed.sort.assert_not_called()
+    Bam.sort_by_readname.assert_not_called()
+    assert os.path.exists(bam + '.bai')
+    with open(bed, 'r') as infile:
+        assert infile.readline() == 'chrI\t21351\t21404\tA00977:325:HGCGKDSX2:4:1101:1389:15013\t42\t+\n'
+        assert infile.readline() == 'chrI\t21351\t21404\tA00977:325:HGCGKDSX2:4:1101:1615:14090\t42\t+\n'
+        assert infile.readline() == 'chrI\t27715\t27767\tA00977:325:HGCGKDSX2:4:1101:1533:29105\t32\t-\n'
+        infile.seek(0)
+        lines = infile.readlines()
+    assert len(lines) == 462
+    keys = [(line.split('\t')[0], int(line.split('\t')[1]), int(line.split('\t')[2]), line) for line in lines]
+    assert keys == sorted(keys)
 
 
-def test_bam2bedpe_singlethread(testdir, mock_testclass):
+def test_bam2fragments_threads(testdir, mock_testclass):
     bam = 'POLR2A.bam'
-    bedpe = 'POLR2A.bedpe'
-    Bam.sort_by_readname = MagicMock()
-    subprocess.run = MagicMock(side_effect=create_file)
-    bb.bam2bedpe(bam, bedpe)
-    Bam.sort_by_readname.assert_any_call(bam, ANY, None)
-    subprocess.run.assert_any_call(['bedtools', 'bamtobed', '-bedpe', '-mate1', '-i', ANY], stdout=ANY, check=True)
-    assert Bam.sort_by_readname.call_args_list[0].args[1] == subprocess.run.call_args_list[0].args[0][5]
-    assert os.path.exists(bedpe)
+    bed = 'POLR2A.bed'
+    single_bed = 'POLR2A-single.bed'
+    pysam.sort('-o', bam, str(Path(__file__).parent.joinpath('sample-big.sam')))
+    bb.bam2fragments(bam, single_bed)
+    bb.bam2fragments(bam, bed, 2)
+    with open(bed, 'r') as infile, open(single_bed, 'r') as single_infile:
+        assert infile.read() == single_infile.read()
 
 
-def test_bedpe2bed(testdir, mock_testclass):
-    bedpe = 'POLR2A.bedpe'
-    sample_bedpe = Path(__file__).parent.joinpath('sample.bedpe')
-    copyfile(sample_bedpe, bedpe)
-    bed = 'POLR2A.bed'
-    Bed.sort = MagicMock(side_effect=copyfile)
-    bb.bedpe2bed(bedpe, bed)
-    Bed.sort.assert_called_with(ANY, bed)
-    assert os.path.exists(bed)
-    with open(bed, 'r') as infile:
-        assert infile.readline() == 'chr1\t100\t250\ttest1\t1\t+\t0\ttest0\n'
-        assert infile.readline() == 'chr2\t300\t450\ttest2\t2\t+\t1\ttest1\n'
-        assert infile.readline() == 'chr3\t500\t650\ttest3\t3\t+\t2\ttest2\n'
-        assert infile.readline() == 'chr4\t700\t850\ttest4\t4\t+\t3\ttest3\n'
-        assert infile.readline() == 'chr5\t100\t250\ttest5\t1\t-\t4\ttest4\n'
-        assert infile.readline() == 'chr6\t300\t450\ttest6\t2\t-\t5\ttest5\n'
-        assert infile.readline() == 'chr7\t500\t650\ttest7\t3\t-\t6\ttest6\n'
-        assert infile.readline() == 'chr8\t700\t850\ttest8\t4\t-\t7\ttest7\n'
-        assert infile.readline() == ''
+def test_reference_fragments_missingmate(testdir, mock_testclass):
+    sam = 'POLR2A.sam'
+    bam = 'POLR2A.bam'
+    with open(sam, 'w') as outfile:
+        outfile.write('@HD\tVN:1.0\tSO:coordinate\n')
+        outfile.write('@SQ\tSN:chrI\tLN:1000\n')
+        outfile.write('read1\t99\tchrI\t101\t40\t10M\t=\t191\t100\t*\t*\n')
+        outfile.write('read2\t99\tchrI\t111\t30\t10M\t=\t121\t30\t*\t*\n')
+        outfile.write('read2\t147\tchrI\t121\t20\t10M\t=\t111\t-30\t*\t*\n')
+        outfile.write('read3\t163\tchrI\t301\t40\t10M\t=\t311\t30\t*\t*\n')
+        outfile.write('read3\t83\tchrI\t311\t40\t20M\t=\t301\t-30\t*\t*\n')
+    pysam.sort('-o', bam, sam)
+    pysam.index(bam)
+    fragments = list(bb.reference_fragments(bam, 'chrI'))
+    assert fragments == ['chrI\t110\t130\tread2\t20\t+\n', 'chrI\t300\t330\tread3\t40\t-\n']
+
+
+def test_reference_fragments_interchromosomal(testdir, mock_testclass, caplog):
+    sam = 'POLR2A.sam'
+    bam = 'POLR2A.bam'
+    with open(sam, 'w') as outfile:
+        outfile.write('@HD\tVN:1.0\tSO:coordinate\n')
+        outfile.write('@SQ\tSN:chrI\tLN:1000\n')
+        outfile.write('@SQ\tSN:chrII\tLN:1000\n')
+        outfile.write('read1\t99\tchrI\t101\t40\t10M\t=\t121\t30\t*\t*\n')
+        outfile.write('read2\t97\tchrI\t111\t30\t10M\tchrII\t201\t0\t*\t*\n')
+        outfile.write('read1\t147\tchrI\t121\t40\t10M\t=\t101\t-30\t*\t*\n')
+        outfile.write('read3\t145\tchrI\t301\t40\t10M\tchrII\t401\t0\t*\t*\n')
+        outfile.write('read2\t145\tchrII\t201\t30\t10M\tchrI\t111\t0\t*\t*\n')
+        outfile.write('read3\t97\tchrII\t401\t40\t10M\tchrI\t301\t0\t*\t*\n')
+    pysam.sort('-o', bam, sam)
+    pysam.index(bam)
+    with caplog.at_level(logging.WARNING):
+        fragments = list(bb.reference_fragments(bam, 'chrI'))
+    assert fragments == ['chrI\t100\t130\tread1\t40\t+\n']
+    assert 'Dropped 1 inter-chromosomal pairs with read 1 on chrI' in caplog.text
+    caplog.clear()
+    with caplog.at_level(logging.WARNING):
+        fragments = list(bb.reference_fragments(bam, 'chrII'))
+    assert fragments == []
+    assert 'Dropped 1 inter-chromosomal pairs with read 1 on chrII' in caplog.text
@@ -1,3 +1,4 @@
+import os
 import subprocess
 from pathlib import Path
 from shutil import copyfile
@@ -19,6 +20,7 @@ def mock_testclass():
     fastq = Fastq.fastq
     run = subprocess.run
     sort = Bam.sort
+    run_pipeline = Bam.run_pipeline
     yield
     b.bowtie_samples = bowtie_samples
     b.bowtie_sample = bowtie_sample
@@ -26,6 +28,7 @@ def mock_testclass():
     Fastq.fastq = fastq
     subprocess.run = run
     Bam.sort = sort
+    Bam.run_pipeline = run_pipeline
 
 
 def create_file(*args, **kwargs):
@@ -48,7 +51,7 @@ def test_bowtie2(testdir, mock_testclass):
     runner = CliRunner()
     result = runner.invoke(b.bowtie2, ['--samples', samples])
     assert result.exit_code == 0
-    b.bowtie_samples.assert_called_once_with(samples, 1, '', '', None, ())
+    b.bowtie_samples.assert_called_once_with(samples, 1, '', '', None, (), False, None, None)
 
 
 def test_bowtie2_parameters(testdir, mock_testclass):
@@ -63,7 +66,20 @@ def test_bowtie2_parameters(testdir, mock_testclass):
                                        input_suffix, '--output-suffix', output_suffix, '--index', index])
     assert result.exit_code == 0
     b.bowtie_samples.assert_called_once_with(samples, threads, input_suffix, output_suffix, index,
-                                             ('-x', 'sacCer3.fa',))
+                                             ('-x', 'sacCer3.fa',), False, None, None)
+
+
+def test_bowtie2_stream(testdir, mock_testclass):
+    samples = Path(__file__).parent.joinpath('samples.txt')
+    sort_memory = '2G'
+    sort_threads = 4
+    b.bowtie_samples = MagicMock()
+    runner = CliRunner()
+    result = runner.invoke(b.bowtie2, ['--samples', samples, '--stream', '--sort-memory', sort_memory,
+                                       '--sort-threads', sort_threads, '-x', 'sacCer3.fa'])
+    assert result.exit_code == 0
+    b.bowtie_samples.assert_called_once_with(samples, 1, '', '', None, ('-x', 'sacCer3.fa',), True, sort_memory,
+                                             sort_threads)
 
 
 def test_bowtie2_filenotexists(testdir, mock_testclass):
@@ -79,16 +95,16 @@ def test_bowtie_samples(testdir, mock_testclass):
     samples = Path(__file__).parent.joinpath('samples.txt')
     b.bowtie_sample = MagicMock()
     b.bowtie_samples(samples)
-    b.bowtie_sample.assert_any_call('POLR2A', None, '', '', ())
-    b.bowtie_sample.assert_any_call('ASDURF', None, '', '', ())
-    b.bowtie_sample.assert_any_call('POLR1C', None, '', '', ())
+    b.bowtie_sample.assert_any_call('POLR2A', None, '', '', (), False, None, None)
+    b.bowtie_sample.assert_any_call('ASDURF', None, '', '', (), False, None, None)
+    b.bowtie_sample.assert_any_call('POLR1C', None, '', '', (), False, None, None)
 
 
 def test_bowtie_samples_second(testdir, mock_testclass):
     samples = Path(__file__).parent.joinpath('samples.txt')
     b.bowtie_sample = MagicMock()
     b.bowtie_samples(samples, index=1)
-    b.bowtie_sample.assert_called_once_with('ASDURF', None, '', '', ())
+    b.bowtie_sample.assert_called_once_with('ASDURF', None, '', '', (), False, None, None)
 
 
 def test_bowtie_samples_parameters(testdir, mock_testclass):
@@ -99,9 +115,9 @@ def test_bowtie_samples_parameters(testdir, mock_testclass):
     bowtie_args = ('-x', 'sacCer3.fa',)
     b.bowtie_sample = MagicMock()
     b.bowtie_samples(samples, threads, input_suffix, output_suffix, bowtie_args=bowtie_args)
-    b.bowtie_sample.assert_any_call('POLR2A', threads, input_suffix, output_suffix, bowtie_args)
-    b.bowtie_sample.assert_any_call('ASDURF', threads, input_suffix, output_suffix, bowtie_args)
-    b.bowtie_sample.assert_any_call('POLR1C', threads, input_suffix, output_suffix, bowtie_args)
+    b.bowtie_sample.assert_any_call('POLR2A', threads, input_suffix, output_suffix, bowtie_args, False, None, None)
+    b.bowtie_sample.assert_any_call('ASDURF', threads, input_suffix, output_suffix, bowtie_args, False, None, None)
+    b.bowtie_sample.assert_any_call('POLR1C', threads, input_suffix, output_suffix, bowtie_args, False, None, None)
 
 
 def test_bowtie_sample(testdir, mock_testclass):
@@ -114,7 +130,7 @@ def test_bowtie_sample(testdir, mock_testclass):
     b.bowtie_sample(sample)
     Fastq.fastq.assert_any_call(sample, 1)
     Fastq.fastq.assert_any_call(sample, 2)
-    b.run_bowtie.assert_called_once_with(fastq, fastq2, bam, None, ())
+    b.run_bowtie.assert_called_once_with(fastq, fastq2, bam, None, (), False, None, None)
 
 
 def test_bowtie_sample_parameters(testdir, mock_testclass):
@@ -131,7 +147,7 @@ def test_bowtie_sample_parameters(testdir, mock_testclass):
     b.bowtie_sample(sample, threads, input_suffix, output_suffix, bowtie_args=bowtie_args)
     Fastq.fastq.assert_any_call(sample + input_suffix, 1)
     Fastq.fastq.assert_any_call(sample + input_suffix, 2)
-    b.run_bowtie.assert_called_once_with(fastq, fastq2, bam, threads, bowtie_args)
+    b.run_bowtie.assert_called_once_with(fastq, fastq2, bam, threads, bowtie_args, False, None, None)
 
 
 def test_bowtie_sample_single(testdir, mock_testclass):
@@ -143,7 +159,7 @@ def test_bowtie_sample_single(testdir, mock_testclass):
     b.bowtie_sample(sample)
     Fastq.fastq.assert_any_call(sample, 1)
     Fastq.fastq.assert_any_call(sample, 2)
-    b.run_bowtie.assert_called_once_with(fastq, None, bam, None, ())
+    b.run_bowtie.assert_called_once_with(fastq, None, bam, None, (), False, None, None)
 
 
 def test_run_bowtie(testdir, mock_testclass):
@@ -164,6 +180,7 @@ def test_run_bowtie(testdir, mock_testclass):
     Bam.sort.assert_any_call(ANY, bam, None)
     assert subprocess.run.call_args_list[0].args[0][2] == subprocess.run.call_args_list[1].args[0][5]
     assert subprocess.run.call_args_list[1].args[0][4] == Bam.sort.call_args_list[0].args[0]
+    assert not os.path.exists(Bam.sort.call_args_list[0].args[0])
 
 
 def test_run_bowtie_parameters(testdir, mock_testclass):
@@ -244,3 +261,55 @@ def test_run_bowtie_fastq2notexists(testdir, mock_testclass):
     Bam.sort.assert_any_call(ANY, bam, None)
     assert subprocess.run.call_args_list[0].args[0][2] == subprocess.run.call_args_list[1].args[0][5]
     assert subprocess.run.call_args_list[1].args[0][4] == Bam.sort.call_args_list[0].args[0]
+
+
+def test_run_bowtie_stream(testdir, mock_testclass):
+    sample = 'PORL2A'
+    bam = sample + '.bam'
+    fastq = sample + '_1.fastq'
+    copyfile(Path(__file__).parent.joinpath('samples.txt'), fastq)
+    fastq2 = sample + '_2.fastq'
+    copyfile(Path(__file__).parent.joinpath('samples.txt'), fastq2)
+    threads = 2
+    bowtie_args = ('-x', 'sacCer3.fa',)
+    subprocess.run = MagicMock()
+    Bam.sort = MagicMock()
+    Bam.run_pipeline = MagicMock()
+    b.run_bowtie(fastq, fastq2, bam, threads, bowtie_args, True)
+    Bam.run_pipeline.assert_called_once_with(
+        [['bowtie2', '-x', 'sacCer3.fa', '-p', str(threads), '-1', fastq, '-2', fastq2],
+         ['samtools', 'sort', '--threads', str(threads - 1), '-o', bam, '-']])
+    subprocess.run.assert_not_called()
+    Bam.sort.assert_not_called()
+
+
+def test_run_bowtie_stream_sortparameters(testdir, mock_testclass):
+    sample = 'PORL2A'
+    bam = sample + '.bam'
+    fastq = sample + '_1.fastq'
+    copyfile(Path(__file__).parent.joinpath('samples.txt'), fastq)
+    threads = 2
+    sort_memory = '2G'
+    sort_threads = 4
+    Bam.run_pipeline = MagicMock()
+    b.run_bowtie(fastq, None, bam, threads, (), True, sort_memory, sort_threads)
+    Bam.run_pipeline.assert_called_once_with(
+        [['bowtie2', '-p', str(threads), '-U', fastq],
+         ['samtools', 'sort', '--threads', str(sort_threads - 1), '-m', sort_memory, '-o', bam, '-']])
+
+
+def test_run_bowtie_stream_failure(testdir, mock_testclass):
+    sample = 'PORL2A'
+    bam = sample + '.bam'
+    fastq = sample + '_1.fastq'
+    copyfile(Path(__file__).parent.joinpath('samples.txt'), fastq)
+
+    def fail(*args, **kwargs):
+        with open(bam, 'w') as outfile:
+            outfile.write('test')
+        raise subprocess.CalledProcessError(1, ['bowtie2'])
+
+    Bam.run_pipeline = MagicMock(side_effect=fail)
+    with pytest.raises(subprocess.CalledProcessError):
+        b.run_bowtie(fastq, None, bam, None, (), True)
+    assert not os.path.exists(bam)
@@ -1,3 +1,4 @@
+import os
 import subprocess
 from pathlib import Path
 from shutil import copyfile
@@ -19,6 +20,7 @@ def mock_testclass():
     fastq = Fastq.fastq
     run = subprocess.run
     sort = Bam.sort
+    run_pipeline = Bam.run_pipeline
     yield
     b.bwa_samples = bwa_samples
     b.bwa_sample = bwa_sample
@@ -26,6 +28,7 @@ def mock_testclass():
     Fastq.fastq = fastq
     subprocess.run = run
     Bam.sort = sort
+    Bam.run_pipeline = run_pipeline
 
 
 def create_file(*args, **kwargs):
@@ -45,7 +48,7 @@ def test_bwa(testdir, mock_testclass):
     runner = CliRunner()
     result = runner.invoke(b.bwa, ['--samples', samples, '--fasta', fasta])
     assert result.exit_code == 0
-    b.bwa_samples.assert_called_once_with(samples, fasta, 1, '', '', None, ())
+    b.bwa_samples.assert_called_once_with(samples, fasta, 1, '', '', None, (), False, None, None)
 
 
 def test_bwa_parameters(testdir, mock_testclass):
@@ -61,7 +64,20 @@ def test_bwa_parameters(testdir, mock_testclass):
                                    '--input-suffix', input_suffix, '--output-suffix', output_suffix, '--index', index])
     assert result.exit_code == 0
     b.bwa_samples.assert_called_once_with(samples, fasta, threads, input_suffix, output_suffix, index,
-                                          ('-x', 'sacCer3.fa',))
+                                          ('-x', 'sacCer3.fa',), False, None, None)
+
+
+def test_bwa_stream(testdir, mock_testclass):
+    samples = Path(__file__).parent.joinpath('samples.txt')
+    fasta = Path(__file__).parent.joinpath('sacCer3.fa')
+    sort_memory = '2G'
+    sort_threads = 4
+    b.bwa_samples = MagicMock()
+    runner = CliRunner()
+    result = runner.invoke(b.bwa, ['--samples', samples, '--fasta', fasta, '--stream', '--sort-memory', sort_memory,
+                                   '--sort-threads', sort_threads])
+    assert result.exit_code == 0
+    b.bwa_samples.assert_called_once_with(samples, fasta, 1, '', '', None, (), True, sort_memory, sort_threads)
 
 
 def test_bwa_samplesnotexists(testdir, mock_testclass):
@@ -89,9 +105,9 @@ def test_bwa_samples(testdir, mock_testclass):
     fasta = Path(__file__).parent.joinpath('sacCer3.fa')
     b.bwa_sample = MagicMock()
     b.bwa_samples(samples, fasta)
-    b.bwa_sample.assert_any_call('POLR2A', fasta, None, '', '', ())
-    b.bwa_sample.assert_any_call('ASDURF', fasta, None, '', '', ())
-    b.bwa_sample.assert_any_call('POLR1C', fasta, None, '', '', ())
+    b.bwa_sample.assert_any_call('POLR2A', fasta, None, '', '', (), False, None, None)
+    b.bwa_sample.assert_any_call('ASDURF', fasta, None, '', '', (), False, None, None)
+    b.bwa_sample.assert_any_call('POLR1C', fasta, None, '', '', (), False, None, None)
 
 
 def test_bwa_samples_second(testdir, mock_testclass):
@@ -99,7 +115,7 @@ def test_bwa_samples_second(testdir, mock_testclass):
     fasta = Path(__file__).parent.joinpath('sacCer3.fa')
     b.bwa_sample = MagicMock()
     b.bwa_samples(samples, fasta, index=1)
-    b.bwa_sample.assert_called_once_with('ASDURF', fasta, None, '', '', ())
+    b.bwa_sample.assert_called_once_with('ASDURF', fasta, None, '', '', (), False, None, None)
 
 
 def test_bwa_samples_parameters(testdir, mock_testclass):
@@ -111,9 +127,9 @@ def test_bwa_samples_parameters(testdir, mock_testclass):
     bwa_args = ('-x', 'sacCer3.fa',)
     b.bwa_sample = MagicMock()
     b.bwa_samples(samples, fasta, threads, input_suffix, output_suffix, bwa_args=bwa_args)
-    b.bwa_sample.assert_any_call('POLR2A', fasta, threads, input_suffix, output_suffix, bwa_args)
-    b.bwa_sample.assert_any_call('ASDURF', fasta, threads, input_suffix, output_suffix, bwa_args)
-    b.bwa_sample.assert_any_call('POLR1C', fasta, threads, input_suffix, output_suffix, bwa_args)
+    b.bwa_sample.assert_any_call('POLR2A', fasta, threads, input_suffix, output_suffix, bwa_args, False, None, None)
+    b.bwa_sample.assert_any_call('ASDURF', fasta, threads, input_suffix, output_suffix, bwa_args, False, None, None)
+    b.bwa_sample.assert_any_call('POLR1C', fasta, threads, input_suffix, output_suffix, bwa_args, False, None, None)
 
 
 def test_bwa_sample(testdir, mock_testclass):
@@ -127,7 +143,7 @@ def test_bwa_sample(testdir, mock_testclass):
     b.bwa_sample(sample, fasta)
     Fastq.fastq.assert_any_call(sample, 1)
     Fastq.fastq.assert_any_call(sample, 2)
-    b.run_bwa.assert_called_once_with(fastq, fastq2, fasta, bam, None, ())
+    b.run_bwa.assert_called_once_with(fastq, fastq2, fasta, bam, None, (), False, None, None)
 
 
 def test_bwa_sample_parameters(testdir, mock_testclass):
@@ -145,7 +161,7 @@ def test_bwa_sample_parameters(testdir, mock_testclass):
     b.bwa_sample(sample, fasta, threads, input_suffix, output_suffix, bwa_args=bwa_args)
     Fastq.fastq.assert_any_call(sample + input_suffix, 1)
     Fastq.fastq.assert_any_call(sample + input_suffix, 2)
-    b.run_bwa.assert_called_once_with(fastq, fastq2, fasta, bam, threads, bwa_args)
+    b.run_bwa.assert_called_once_with(fastq, fastq2, fasta, bam, threads, bwa_args, False, None, None)
 
 
 def test_bwa_sample_single(testdir, mock_testclass):
@@ -158,7 +174,7 @@ def test_bwa_sample_single(testdir, mock_testclass):
     b.bwa_sample(sample, fasta)
     Fastq.fastq.assert_any_call(sample, 1)
     Fastq.fastq.assert_any_call(sample, 2)
-    b.run_bwa.assert_called_once_with(fastq, None, fasta, bam, None, ())
+    b.run_bwa.assert_called_once_with(fastq, None, fasta, bam, None, (), False, None, None)
 
 
 def test_bwa_index(testdir, mock_testclass):
@@ -271,3 +287,57 @@ def test_run_bwa_fastq2notexists(testdir, mock_testclass):
     Bam.sort(ANY, bam, None)
     assert subprocess.run.call_args_list[0].args[0][3] == subprocess.run.call_args_list[1].args[0][5]
     assert subprocess.run.call_args_list[1].args[0][4] == Bam.sort.call_args_list[0].args[0]
+
+
+def test_run_bwa_stream(testdir, mock_testclass):
+    sample = 'PORL2A'
+    fasta = 'sacCer3.fa'
+    bam = sample + '.bam'
+    fastq = sample + '_1.fastq'
+    copyfile(Path(__file__).parent.joinpath('samples.txt'), fastq)
+    fastq2 = sample + '_2.fastq'
+    copyfile(Path(__file__).parent.joinpath('samples.txt'), fastq2)
+    threads = 2
+    bwa_args = ('-x', 'ont2d',)
+    subprocess.run = MagicMock()
+    Bam.sort = MagicMock()
+    Bam.run_pipeline = MagicMock()
+    b.run_bwa(fastq, fastq2, fasta, bam, threads, bwa_args, True)
+    Bam.run_pipeline.assert_called_once_with(
+        [['bwa', 'mem', '-x', 'ont2d', '-t', str(threads), fasta, fastq, fastq2],
+         ['samtools', 'sort', '--threads', str(threads - 1), '-o', bam, '-']])
+    subprocess.run.assert_not_called()
+    Bam.sort.assert_not_called()
+
+
+def test_run_bwa_stream_sortparameters(testdir, mock_testclass):
+    sample = 'PORL2A'
+    fasta = 'sacCer3.fa'
+    bam = sample + '.bam'
+    fastq = sample + '_1.fastq'
+    copyfile(Path(__file__).parent.joinpath('samples.txt'), fastq)
+    sort_memory = '2G'
+    sort_threads = 4
+    Bam.run_pipeline = MagicMock()
+    b.run_bwa(fastq, None, fasta, bam, None, (), True, sort_memory, sort_threads)
+    Bam.run_pipeline.assert_called_once_with(
+        [['bwa', 'mem', fasta, fastq],
+         ['samtools', 'sort', '--threads', str(sort_threads - 1), '-m', sort_memory, '-o', bam, '-']])
+
+
+def test_run_bwa_stream_failure(testdir, mock_testclass):
+    sample = 'PORL2A'
+    fasta = 'sacCer3.fa'
+    bam = sample + '.bam'
+    fastq = sample + '_1.fastq'
+    copyfile(Path(__file__).parent.joinpath('samples.txt'), fastq)
+
+    def fail(*args, **kwargs):
+        with open(bam, 'w') as outfile:
+            outfile.write('test')
+        raise subprocess.CalledProcessError(1, ['bwa', 'mem'])
+
+    Bam.run_pipeline = MagicMock(side_effect=fail)
+    with pytest.raises(subprocess.CalledProcessError):
+        b.run_bwa(fastq, None, fasta, bam, None, (), True)
+    assert not os.path.exists(bam)
@@ -8,6 +8,7 @@ import pytest
 
 from robtools import CenterAnnotations as ca
 from robtools import Split as sb
+from robtools.jobs import Jobs
 from robtools.txt import Parser
 
 
@@ -19,6 +20,7 @@ def mock_testclass():
     center_annotations = ca.center_annotations
     splits = sb.splits
     first = Parser.first
+    run = Jobs.run
     yield
     ca.center_annotations_samples = center_annotations_samples
     ca.center_annotations_sample_splits = center_annotations_sample_splits
@@ -26,6 +28,7 @@ def mock_testclass():
     ca.center_annotations = center_annotations
     sb.splits = splits
     Parser.first = first
+    Jobs.run = run
     
     
 def test_centerannotations(testdir, mock_testclass):
@@ -34,7 +37,7 @@ def test_centerannotations(testdir, mock_testclass):
     runner = CliRunner()
     result = runner.invoke(ca.centerannotations, ['-s', samples])
     assert result.exit_code == 0
-    ca.center_annotations_samples.assert_called_once_with(samples, '', '-forcov', None)
+    ca.center_annotations_samples.assert_called_once_with(samples, '', '-forcov', None, 1)
 
 
 def test_centerannotations_parameters(testdir, mock_testclass):
@@ -45,7 +48,7 @@ def test_centerannotations_parameters(testdir, mock_testclass):
     runner = CliRunner()
     result = runner.invoke(ca.centerannotations, ['-s', samples, '-is', input_suffix, '-os', output_suffix])
     assert result.exit_code == 0
-    ca.center_annotations_samples.assert_called_once_with(samples, input_suffix, output_suffix, None)
+    ca.center_annotations_samples.assert_called_once_with(samples, input_suffix, output_suffix, None, 1)
 
 
 def test_centerannotations_samesuffix(testdir, mock_testclass):
@@ -66,7 +69,7 @@ def test_centerannotations_onlyoutputsuffix(testdir, mock_testclass):
     runner = CliRunner()
     result = runner.invoke(ca.centerannotations, ['-s', samples, '-os', output_suffix])
     assert result.exit_code == 0
-    ca.center_annotations_samples.assert_called_once_with(samples, '', output_suffix, None)
+    ca.center_annotations_samples.assert_called_once_with(samples, '', output_suffix, None, 1)
 
 
 def test_centerannotations_second(testdir, mock_testclass):
@@ -76,7 +79,7 @@ def test_centerannotations_second(testdir, mock_testclass):
     runner = CliRunner()
     result = runner.invoke(ca.centerannotations, ['-s', samples, '-i', index])
     assert result.exit_code == 0
-    ca.center_annotations_samples.assert_called_once_with(samples, '', '-forcov', index)
+    ca.center_annotations_samples.assert_called_once_with(samples, '', '-forcov', index, 1)
 
 
 def test_centerannotations_samplesnotexists(testdir, mock_testclass):
@@ -122,6 +125,21 @@ def test_center_annotations_samples_second(testdir, mock_testclass):
     ca.center_annotations_sample_splits.assert_called_once_with(samples[1], '', '-forcov')
 
     
+def test_center_annotations_samples_jobs(testdir, mock_testclass):
+    samples_file = Path(__file__).parent.joinpath('samples.txt')
+    samples = ['POLR2A', 'ASDURF']
+    Parser.first = MagicMock(return_value=samples)
+    sb.splits = MagicMock(side_effect=[['POLR2A-100-110'], ['ASDURF-100-110', 'ASDURF-110-120']])
+    ca.center_annotations_sample_splits = MagicMock()
+    Jobs.run = MagicMock()
+    ca.center_annotations_samples(samples_file, jobs=4)
+    ca.center_annotations_sample_splits.assert_not_called()
+    Jobs.run.assert_called_once_with(ca.center_annotations_sample,
+                                     [('POLR2A', '', '-forcov'), ('POLR2A-100-110', '', '-forcov'),
+                                      ('ASDURF', '', '-forcov'), ('ASDURF-100-110', '', '-forcov'),
+                                      ('ASDURF-110-120', '', '-forcov')], 4)
+
+
 def test_center_annotations_sample_splits(testdir, mock_testclass):
     sample = 'POLR2A'
     splits = ['POLR2A-100-110', 'POLR2A-120-130']
@@ -16,7 +16,9 @@ def mock_testclass():
     filter_bam_sample = fb.filter_bam_sample
     filter_mapped = fb.filter_mapped
     remove_duplicates = fb.remove_duplicates
+    filter_fused = fb.filter_fused
     run = subprocess.run
+    run_pipeline = Bam.run_pipeline
     sort = Bam.sort
     sort_by_readname = Bam.sort_by_readname
     yield
@@ -24,7 +26,9 @@ def mock_testclass():
     fb.filter_bam_sample = filter_bam_sample
     fb.filter_mapped = filter_mapped
     fb.remove_duplicates = remove_duplicates
+    fb.filter_fused = filter_fused
     subprocess.run = run
+    Bam.run_pipeline = run_pipeline
     Bam.sort = sort
     Bam.sort_by_readname = sort_by_readname
 
@@ -64,7 +68,7 @@ def test_filterbam(testdir, mock_testclass):
     runner = CliRunner()
     result = runner.invoke(fb.filterbam, ['-s', samples])
     assert result.exit_code == 0
-    fb.filter_bam.assert_called_once_with(samples, True, True, None, threads, '', '', None)
+    fb.filter_bam.assert_called_once_with(samples, True, True, None, threads, '', '', None, False)
 
 
 def test_filterbam_parameters(testdir, mock_testclass):
@@ -80,16 +84,26 @@ def test_filterbam_parameters(testdir, mock_testclass):
                            ['-s', samples, '--unpaired', '--no-dedup', '-q', quality, '--threads', threads,
                             '--input-suffix', input_suffix, '--output-suffix', output_suffix, '--index', index])
     assert result.exit_code == 0
-    fb.filter_bam.assert_called_once_with(samples, False, False, quality, threads, input_suffix, output_suffix, index)
+    fb.filter_bam.assert_called_once_with(samples, False, False, quality, threads, input_suffix, output_suffix, index, False)
 
 
+
+def test_filterbam_fused(testdir, mock_testclass):
+    samples = Path(__file__).parent.joinpath('samples.txt')
+    threads = 1
+    fb.filter_bam = MagicMock()
+    runner = CliRunner()
+    result = runner.invoke(fb.filterbam, ['-s', samples, '--fused'])
+    assert result.exit_code == 0
+    fb.filter_bam.assert_called_once_with(samples, True, True, None, threads, '', '', None, True)
+
 def test_filter_bam(testdir, mock_testclass):
     samples = Path(__file__).parent.joinpath('samples.txt')
     fb.filter_bam_sample = MagicMock()
     fb.filter_bam(samples)
-    fb.filter_bam_sample.assert_any_call('POLR2A', True, True, None, None, '', '')
-    fb.filter_bam_sample.assert_any_call('ASDURF', True, True, None, None, '', '')
-    fb.filter_bam_sample.assert_any_call('POLR1C', True, True, None, None, '', '')
+    fb.filter_bam_sample.assert_any_call('POLR2A', True, True, None, None, '', '', False)
+    fb.filter_bam_sample.assert_any_call('ASDURF', True, True, None, None, '', '', False)
+    fb.filter_bam_sample.assert_any_call('POLR1C', True, True, None, None, '', '', False)
 
 
 def test_filter_bam_parameters(testdir, mock_testclass):
@@ -100,9 +114,9 @@ def test_filter_bam_parameters(testdir, mock_testclass):
     output_suffix = '-sacCer'
     fb.filter_bam_sample = MagicMock()
     fb.filter_bam(samples, False, False, quality, threads, input_suffix, output_suffix)
-    fb.filter_bam_sample.assert_any_call('POLR2A', False, False, quality, threads, input_suffix, output_suffix)
-    fb.filter_bam_sample.assert_any_call('ASDURF', False, False, quality, threads, input_suffix, output_suffix)
-    fb.filter_bam_sample.assert_any_call('POLR1C', False, False, quality, threads, input_suffix, output_suffix)
+    fb.filter_bam_sample.assert_any_call('POLR2A', False, False, quality, threads, input_suffix, output_suffix, False)
+    fb.filter_bam_sample.assert_any_call('ASDURF', False, False, quality, threads, input_suffix, output_suffix, False)
+    fb.filter_bam_sample.assert_any_call('POLR1C', False, False, quality, threads, input_suffix, output_suffix, False)
 
 
 def test_filter_bam_second(testdir, mock_testclass):
@@ -110,7 +124,7 @@ def test_filter_bam_second(testdir, mock_testclass):
     threads = 2
     fb.filter_bam_sample = MagicMock()
     fb.filter_bam(samples, False, True, threads=threads, index=1)
-    fb.filter_bam_sample.assert_called_once_with('ASDURF', False, True, None, threads, '', '')
+    fb.filter_bam_sample.assert_called_once_with('ASDURF', False, True, None, threads, '', '', False)
 
 
 def test_filter_bam_sample_single(testdir, mock_testclass):
@@ -350,13 +364,11 @@ def test_remove_duplicates(testdir, mock_testclass):
     fb.remove_duplicates(bam, output)
     Bam.sort_by_readname.assert_any_call(bam, ANY, None)
     subprocess.run.assert_any_call(['samtools', 'fixmate', '-m', ANY, ANY], check=True)
-    Bam.sort.assert_any_call(ANY, ANY, None)
-    subprocess.run.assert_any_call(['samtools', 'markdup', '-r', ANY, ANY], check=True)
-    Bam.sort.assert_any_call(ANY, output, None)
+    Bam.sort.assert_called_once_with(ANY, ANY, None)
+    subprocess.run.assert_any_call(['samtools', 'markdup', '-r', ANY, output], check=True)
     assert Bam.sort_by_readname.call_args_list[0].args[1] == subprocess.run.call_args_list[0].args[0][3]
     assert subprocess.run.call_args_list[0].args[0][4] == Bam.sort.call_args_list[0].args[0]
     assert Bam.sort.call_args_list[0].args[1] == subprocess.run.call_args_list[1].args[0][3]
-    assert subprocess.run.call_args_list[1].args[0][4] == Bam.sort.call_args_list[1].args[0]
 
 
 def test_remove_duplicates_threads(testdir, mock_testclass):
@@ -369,13 +381,11 @@ def test_remove_duplicates_threads(testdir, mock_testclass):
     fb.remove_duplicates(bam, output, threads)
     Bam.sort_by_readname.assert_any_call(bam, ANY, threads)
     subprocess.run.assert_any_call(['samtools', 'fixmate', '-m', '--threads', str(threads - 1), ANY, ANY], check=True)
-    Bam.sort.assert_any_call(ANY, ANY, threads)
-    subprocess.run.assert_any_call(['samtools', 'markdup', '-r', '--threads', str(threads - 1), ANY, ANY], check=True)
-    Bam.sort.assert_any_call(ANY, output, threads)
+    Bam.sort.assert_called_once_with(ANY, ANY, threads)
+    subprocess.run.assert_any_call(['samtools', 'markdup', '-r', '--threads', str(threads - 1), ANY, output], check=True)
     assert Bam.sort_by_readname.call_args_list[0].args[1] == subprocess.run.call_args_list[0].args[0][5]
     assert subprocess.run.call_args_list[0].args[0][6] == Bam.sort.call_args_list[0].args[0]
     assert Bam.sort.call_args_list[0].args[1] == subprocess.run.call_args_list[1].args[0][5]
-    assert subprocess.run.call_args_list[1].args[0][6] == Bam.sort.call_args_list[1].args[0]
 
 
 def test_remove_duplicates_singlethread(testdir, mock_testclass):
@@ -388,10 +398,117 @@ def test_remove_duplicates_singlethread(testdir, mock_testclass):
     fb.remove_duplicates(bam, output, threads)
     Bam.sort_by_readname.assert_any_call(bam, ANY, threads)
     subprocess.run.assert_any_call(['samtools', 'fixmate', '-m', ANY, ANY], check=True)
-    Bam.sort.assert_any_call(ANY, ANY, threads)
-    subprocess.run.assert_any_call(['samtools', 'markdup', '-r', ANY, ANY], check=True)
-    Bam.sort.assert_any_call(ANY, output, threads)
+    Bam.sort.assert_called_once_with(ANY, ANY, threads)
+    subprocess.run.assert_any_call(['samtools', 'markdup', '-r', ANY, output], check=True)
     assert Bam.sort_by_readname.call_args_list[0].args[1] == subprocess.run.call_args_list[0].args[0][3]
     assert subprocess.run.call_args_list[0].args[0][4] == Bam.sort.call_args_list[0].args[0]
     assert Bam.sort.call_args_list[0].args[1] == subprocess.run.call_args_list[1].args[0][3]
-    assert subprocess.run.call_args_list[1].args[0][4] == Bam.sort.call_args_list[1].args[0]
+
+
+def test_filter_bam_sample_fused(testdir, mock_testclass):
+    sample = 'POLR2A'
+    bam = sample + '.bam'
+    bam_filtered = sample + '-filtered.bam'
+    bam_dedup = sample + '-dedup.bam'
+    fb.filter_fused = MagicMock()
+    fb.filter_mapped = MagicMock()
+    fb.remove_duplicates = MagicMock()
+    fb.filter_bam_sample(sample, True, True, fused=True)
+    fb.filter_fused.assert_called_once_with(bam, bam_filtered, bam_dedup, True, None, None)
+    fb.filter_mapped.assert_not_called()
+    fb.remove_duplicates.assert_not_called()
+
+
+def test_filter_bam_sample_fused_nodedup(testdir, mock_testclass):
+    sample = 'POLR2A'
+    bam = sample + '.bam'
+    bam_filtered = sample + '-filtered.bam'
+    quality = 20
+    threads = 3
+    fb.filter_fused = MagicMock()
+    fb.filter_bam_sample(sample, False, False, quality, threads, fused=True)
+    fb.filter_fused.assert_called_once_with(bam, bam_filtered, None, False, quality, threads)
+
+
+def test_filter_fused(testdir, mock_testclass):
+    bam = 'POLR2A.bam'
+    filtered = 'POLR2A-filtered.bam'
+    dedup = 'POLR2A-dedup.bam'
+    Bam.run_pipeline = MagicMock()
+    subprocess.run = MagicMock()
+    Bam.sort = MagicMock()
+    fb.filter_fused(bam, filtered, dedup)
+    Bam.run_pipeline.assert_called_once_with([
+        ['samtools', 'view', '-u', '-F', '2048', '-F', '256', '-f', '2', bam],
+        ['samtools', 'sort', '-n', '-u', '-'],
+        ['samtools', 'fixmate', '-m', '-u', '-', '-'],
+        ['samtools', 'sort', '-o', filtered, '-']])
+    subprocess.run.assert_called_once_with(['samtools', 'markdup', '-r', filtered, dedup], check=True)
+    Bam.sort.assert_not_called()
+
+
+def test_filter_fused_qualitythreads(testdir, mock_testclass):
+    bam = 'POLR2A.bam'
+    filtered = 'POLR2A-filtered.bam'
+    dedup = 'POLR2A-dedup.bam'
+    quality = 20
+    threads = 3
+    Bam.run_pipeline = MagicMock()
+    subprocess.run = MagicMock()
+    fb.filter_fused(bam, filtered, dedup, True, quality, threads)
+    Bam.run_pipeline.assert_called_once_with([
+        ['samtools', 'view', '-u', '-F', '2048', '-F', '256', '-f', '2', '-q', str(quality), '--threads', '2', bam],
+        ['samtools', 'sort', '-n', '-u', '--threads', '2', '-'],
+        ['samtools', 'fixmate', '-m', '-u', '--threads', '2', '-', '-'],
+        ['samtools', 'sort', '--threads', '2', '-o', filtered, '-']])
+    subprocess.run.assert_called_once_with(['samtools', 'markdup', '-r', '--threads', '2', filtered, dedup], check=True)
+
+
+def test_filter_fused_pipelinefails(testdir, mock_testclass):
+    bam = 'POLR2A.bam'
+    filtered = 'POLR2A-filtered.bam'
+    dedup = 'POLR2A-dedup.bam'
+
+    def partial_outputs(*args, **kwargs):
+        for output in [filtered, filtered + '.bai']:
+            with open(output, 'w') as outfile:
+                outfile.write('partial')
+        raise subprocess.CalledProcessError(1, args[0][-1])
+
+    Bam.run_pipeline = MagicMock(side_effect=partial_outputs)
+    subprocess.run = MagicMock()
+    with pytest.raises(subprocess.CalledProcessError):
+        fb.filter_fused(bam, filtered, dedup)
+    subprocess.run.assert_not_called()
+    assert not os.path.exists(filtered)
+    assert not os.path.exists(filtered + '.bai')
+
+
+def test_filter_fused_markdupfails(testdir, mock_testclass):
+    bam = 'POLR2A.bam'
+    filtered = 'POLR2A-filtered.bam'
+    dedup = 'POLR2A-dedup.bam'
+    Bam.run_pipeline = MagicMock(side_effect=lambda *args, **kwargs: open(filtered, 'w').close())
+
+    def partial_output(*args, **kwargs):
+        with open(dedup, 'w') as outfile:
+            outfile.write('partial')
+        raise subprocess.CalledProcessError(1, args[0])
+
+    subprocess.run = MagicMock(side_effect=partial_output)
+    with pytest.raises(subprocess.CalledProcessError):
+        fb.filter_fused(bam, filtered, dedup)
+    assert os.path.exists(filtered)
+    assert not os.path.exists(dedup)
+
+
+def test_filter_fused_nodedup(testdir, mock_testclass):
+    bam = 'POLR2A.bam'
+    filtered = 'POLR2A-filtered.bam'
+    Bam.run_pipeline = MagicMock()
+    subprocess.run = MagicMock()
+    fb.filter_fused(bam, filtered, None, False)
+    Bam.run_pipeline.assert_called_once_with([
+        ['samtools', 'view', '-u', '-F', '2048', '-F', '256', '-F', '4', bam],
+        ['samtools', 'sort', '-o', filtered, '-']])
+    subprocess.run.assert_not_called()
@@ -1,4 +1,5 @@
 import logging
+import math
 import os
 from pathlib import Path
 import pytest
@@ -9,10 +10,13 @@ from unittest.mock import MagicMock, ANY
 import click
 from click.testing import CliRunner
 from more_itertools.more import side_effect
+import numpy as np
+import pyBigWig as pbw
 
 from robtools import GenomeCoverage as gc
 from robtools import Split as sb
 from robtools.bed import Bed
+from robtools.jobs import Jobs
 
 BASE_SCALE = 1000000
 
@@ -23,21 +27,27 @@ def mock_testclass():
     sample_splits_genome_coverage = gc.sample_splits_genome_coverage
     genome_coverage = gc.genome_coverage
     coverage = gc.coverage
+    native_coverage = gc.native_coverage
+    splits_genome_coverage = gc.splits_genome_coverage
     splits = sb.splits
     sort = Bed.sort
     count_bed = Bed.count_bed
     bedgraph_to_bigwig = Bed.bedgraph_to_bigwig
     run = subprocess.run
+    jobs_run = Jobs.run
     yield
     gc.genome_coverage_samples = genome_coverage_samples
     gc.sample_splits_genome_coverage = sample_splits_genome_coverage
     gc.genome_coverage = genome_coverage
     gc.coverage = coverage
+    gc.native_coverage = native_coverage
+    gc.splits_genome_coverage = splits_genome_coverage
     sb.splits = splits
     Bed.sort = sort
     Bed.count_bed = count_bed
     Bed.bedgraph_to_bigwig = bedgraph_to_bigwig
     subprocess.run = run
+    Jobs.run = jobs_run
     
     
 def create_file(*args, **kwargs):
@@ -64,7 +74,7 @@ def test_genomecov(testdir, mock_testclass):
     runner = CliRunner()
     result = runner.invoke(gc.genomecov, ['-s', samples])
     assert result.exit_code == 0
-    gc.genome_coverage_samples.assert_called_once_with(samples, genome, None, None, '', '-cov', None, None, None, None, ())
+    gc.genome_coverage_samples.assert_called_once_with(samples, genome, None, None, '', '-cov', None, None, None, None, (), False, 1)
 
 
 def test_genomecov_five(testdir, mock_testclass):
@@ -75,7 +85,7 @@ def test_genomecov_five(testdir, mock_testclass):
     runner = CliRunner()
     result = runner.invoke(gc.genomecov, ['-s', samples, '-5'])
     assert result.exit_code == 0
-    gc.genome_coverage_samples.assert_called_once_with(samples, genome, None, None, '', '-cov', None, None, None, None, ('-5',))
+    gc.genome_coverage_samples.assert_called_once_with(samples, genome, None, None, '', '-cov', None, None, None, None, ('-5',), False, 1)
 
 
 def test_genomecov_three(testdir, mock_testclass):
@@ -86,7 +96,7 @@ def test_genomecov_three(testdir, mock_testclass):
     runner = CliRunner()
     result = runner.invoke(gc.genomecov, ['-s', samples, '-3'])
     assert result.exit_code == 0
-    gc.genome_coverage_samples.assert_called_once_with(samples, genome, None, None, '', '-cov', None, None, None, None, ('-3',))
+    gc.genome_coverage_samples.assert_called_once_with(samples, genome, None, None, '', '-cov', None, None, None, None, ('-3',), False, 1)
 
 
 def test_genomecov_parameters(testdir, mock_testclass):
@@ -101,7 +111,7 @@ def test_genomecov_parameters(testdir, mock_testclass):
     runner = CliRunner()
     result = runner.invoke(gc.genomecov, ['-s', samples, '-g', genome, '-scale', scale, '-strand', strand, '--input-suffix', input_suffix, '--output-suffix', output_suffix, '--index', index])
     assert result.exit_code == 0
-    gc.genome_coverage_samples.assert_called_once_with(samples, genome, scale, strand, input_suffix, output_suffix, None, None, None, index, ())
+    gc.genome_coverage_samples.assert_called_once_with(samples, genome, scale, strand, input_suffix, output_suffix, None, None, None, index, (), False, 1)
 
 
 def test_genomecov_parameters_scalesuffixes(testdir, mock_testclass):
@@ -118,7 +128,17 @@ def test_genomecov_parameters_scalesuffixes(testdir, mock_testclass):
     runner = CliRunner()
     result = runner.invoke(gc.genomecov, ['-s', samples, '-g', genome, '-strand', strand, '--input-suffix', input_suffix, '--output-suffix', output_suffix, '--spike-suffix', spike_suffix, '--control-suffix', control_suffix, '--spike-control-suffix', spike_control_suffix, '--index', index])
     assert result.exit_code == 0
-    gc.genome_coverage_samples.assert_called_once_with(samples, genome, None, strand, input_suffix, output_suffix, spike_suffix, control_suffix, spike_control_suffix, index, ())
+    gc.genome_coverage_samples.assert_called_once_with(samples, genome, None, strand, input_suffix, output_suffix, spike_suffix, control_suffix, spike_control_suffix, index, (), False, 1)
+
+
+def test_genomecov_singlepass(testdir, mock_testclass):
+    samples = Path(__file__).parent.joinpath('samples.txt')
+    genome = Path(__file__).parent.joinpath('sizes.txt')
+    gc.genome_coverage_samples = MagicMock()
+    runner = CliRunner()
+    result = runner.invoke(gc.genomecov, ['-s', samples, '-g', genome, '--single-pass'])
+    assert result.exit_code == 0
+    gc.genome_coverage_samples.assert_called_once_with(samples, genome, None, None, '', '-cov', None, None, None, None, (), True, 1)
 
 
 def test_genomecov_scale_and_spikesuffix(testdir, mock_testclass):
@@ -188,7 +208,7 @@ def test_genomecov_onlyoutputsuffix(testdir, mock_testclass):
     runner = CliRunner()
     result = runner.invoke(gc.genomecov, ['-s', samples, '-g', genome, '--output-suffix', output_suffix])
     assert result.exit_code == 0
-    gc.genome_coverage_samples.assert_called_once_with(samples, genome, None, None, '', output_suffix, None, None, None, None, ())
+    gc.genome_coverage_samples.assert_called_once_with(samples, genome, None, None, '', output_suffix, None, None, None, None, (), False, 1)
 
 
 def test_genomecov_samplesnotexists(testdir, mock_testclass):
@@ -218,9 +238,38 @@ def test_genome_coverage_samples(testdir, mock_testclass):
     copyfile(Path(__file__).parent.joinpath('sizes.txt'), genome)
     gc.sample_splits_genome_coverage = MagicMock()
     gc.genome_coverage_samples(samples)
-    gc.sample_splits_genome_coverage.assert_any_call('POLR2A', genome, None, None, '', '-cov', None, None, None, ())
-    gc.sample_splits_genome_coverage.assert_any_call('ASDURF', genome, None, None, '', '-cov', None, None, None, ())
-    gc.sample_splits_genome_coverage.assert_any_call('POLR1C', genome, None, None, '', '-cov', None, None, None, ())
+    gc.sample_splits_genome_coverage.assert_any_call('POLR2A', genome, None, None, '', '-cov', None, None, None, (), False)
+    gc.sample_splits_genome_coverage.assert_any_call('ASDURF', genome, None, None, '', '-cov', None, None, None, (), False)
+    gc.sample_splits_genome_coverage.assert_any_call('POLR1C', genome, None, None, '', '-cov', None, None, None, (), False)
+
+
+def test_genome_coverage_samples_jobs(testdir, mock_testclass):
+    samples = Path(__file__).parent.joinpath('samples.txt')
+    genome = 'sacCer3.chrom.sizes'
+    copyfile(Path(__file__).parent.joinpath('sizes.txt'), genome)
+    sb.splits = MagicMock(side_effect=[['POLR2A-100-110'], [], []])
+    gc.sample_splits_genome_coverage = MagicMock()
+    Jobs.run = MagicMock()
+    gc.genome_coverage_samples(samples, jobs=3)
+    gc.sample_splits_genome_coverage.assert_not_called()
+    Jobs.run.assert_called_once_with(gc.genome_coverage, [
+        ('POLR2A', genome, None, None, '', '-cov', None, None, None, ()),
+        ('POLR2A-100-110', genome, None, None, '', '-cov', None, None, None, ()),
+        ('ASDURF', genome, None, None, '', '-cov', None, None, None, ()),
+        ('POLR1C', genome, None, None, '', '-cov', None, None, None, ())], 3)
+
+
+def test_genome_coverage_samples_jobs_singlepass(testdir, mock_testclass):
+    samples = Path(__file__).parent.joinpath('samples.txt')
+    genome = 'sacCer3.chrom.sizes'
+    copyfile(Path(__file__).parent.joinpath('sizes.txt'), genome)
+    gc.sample_splits_genome_coverage = MagicMock()
+    Jobs.run = MagicMock()
+    gc.genome_coverage_samples(samples, genomecov_args=('-5',), single_pass=True, jobs=3)
+    Jobs.run.assert_called_once_with(gc.sample_splits_genome_coverage, [
+        ('POLR2A', genome, None, None, '', '-cov', None, None, None, ('-5',), True),
+        ('ASDURF', genome, None, None, '', '-cov', None, None, None, ('-5',), True),
+        ('POLR1C', genome, None, None, '', '-cov', None, None, None, ('-5',), True)], 3)
 
 
 def test_genome_coverage_samples_parameters(testdir, mock_testclass):
@@ -236,9 +285,9 @@ def test_genome_coverage_samples_parameters(testdir, mock_testclass):
     spike_control_suffix = '-input-pombe'
     gc.sample_splits_genome_coverage = MagicMock()
     gc.genome_coverage_samples(samples, genome, scale, strand, input_suffix, output_suffix, spike_suffix, control_suffix, spike_control_suffix, genomecov_args=('-5',))
-    gc.sample_splits_genome_coverage.assert_any_call('POLR2A', genome, scale, strand, input_suffix, output_suffix, spike_suffix, control_suffix, spike_control_suffix, ('-5',))
-    gc.sample_splits_genome_coverage.assert_any_call('ASDURF', genome, scale, strand, input_suffix, output_suffix, spike_suffix, control_suffix, spike_control_suffix, ('-5',))
-    gc.sample_splits_genome_coverage.assert_any_call('POLR1C', genome, scale, strand, input_suffix, output_suffix, spike_suffix, control_suffix, spike_control_suffix, ('-5',))
+    gc.sample_splits_genome_coverage.assert_any_call('POLR2A', genome, scale, strand, input_suffix, output_suffix, spike_suffix, control_suffix, spike_control_suffix, ('-5',), False)
+    gc.sample_splits_genome_coverage.assert_any_call('ASDURF', genome, scale, strand, input_suffix, output_suffix, spike_suffix, control_suffix, spike_control_suffix, ('-5',), False)
+    gc.sample_splits_genome_coverage.assert_any_call('POLR1C', genome, scale, strand, input_suffix, output_suffix, spike_suffix, control_suffix, spike_control_suffix, ('-5',), False)
 
 
 def test_genome_coverage_samples_all_five(testdir, mock_testclass):
@@ -246,9 +295,9 @@ def test_genome_coverage_samples_all_five(testdir, mock_testclass):
     genome = Path(__file__).parent.joinpath('sizes.txt')
     gc.sample_splits_genome_coverage = MagicMock()
     gc.genome_coverage_samples(samples, genome, genomecov_args=('-5',))
-    gc.sample_splits_genome_coverage.assert_any_call('POLR2A', genome, None, None, '', '-cov', None, None, None, ('-5',))
-    gc.sample_splits_genome_coverage.assert_any_call('ASDURF', genome, None, None, '', '-cov', None, None, None, ('-5',))
-    gc.sample_splits_genome_coverage.assert_any_call('POLR1C', genome, None, None, '', '-cov', None, None, None, ('-5',))
+    gc.sample_splits_genome_coverage.assert_any_call('POLR2A', genome, None, None, '', '-cov', None, None, None, ('-5',), False)
+    gc.sample_splits_genome_coverage.assert_any_call('ASDURF', genome, None, None, '', '-cov', None, None, None, ('-5',), False)
+    gc.sample_splits_genome_coverage.assert_any_call('POLR1C', genome, None, None, '', '-cov', None, None, None, ('-5',), False)
 
 
 def test_genome_coverage_samples_second_five(testdir, mock_testclass):
@@ -256,7 +305,7 @@ def test_genome_coverage_samples_second_five(testdir, mock_testclass):
     genome = Path(__file__).parent.joinpath('sizes.txt')
     gc.sample_splits_genome_coverage = MagicMock()
     gc.genome_coverage_samples(samples, genome, index=1, genomecov_args=('-5',))
-    gc.sample_splits_genome_coverage.assert_called_once_with('ASDURF', genome, None, None, '', '-cov', None, None, None, ('-5',))
+    gc.sample_splits_genome_coverage.assert_called_once_with('ASDURF', genome, None, None, '', '-cov', None, None, None, ('-5',), False)
 
 
 def test_genome_coverage_samples_all_three(testdir, mock_testclass):
@@ -264,9 +313,9 @@ def test_genome_coverage_samples_all_three(testdir, mock_testclass):
     genome = Path(__file__).parent.joinpath('sizes.txt')
     gc.sample_splits_genome_coverage = MagicMock()
     gc.genome_coverage_samples(samples, genome, genomecov_args=('-3',))
-    gc.sample_splits_genome_coverage.assert_any_call('POLR2A', genome, None, None, '', '-cov', None, None, None, ('-3',))
-    gc.sample_splits_genome_coverage.assert_any_call('ASDURF', genome, None, None, '', '-cov', None, None, None, ('-3',))
-    gc.sample_splits_genome_coverage.assert_any_call('POLR1C', genome, None, None, '', '-cov', None, None, None, ('-3',))
+    gc.sample_splits_genome_coverage.assert_any_call('POLR2A', genome, None, None, '', '-cov', None, None, None, ('-3',), False)
+    gc.sample_splits_genome_coverage.assert_any_call('ASDURF', genome, None, None, '', '-cov', None, None, None, ('-3',), False)
+    gc.sample_splits_genome_coverage.assert_any_call('POLR1C', genome, None, None, '', '-cov', None, None, None, ('-3',), False)
 
 
 def test_genome_coverage_samples_second_three(testdir, mock_testclass):
@@ -274,7 +323,7 @@ def test_genome_coverage_samples_second_three(testdir, mock_testclass):
     genome = Path(__file__).parent.joinpath('sizes.txt')
     gc.sample_splits_genome_coverage = MagicMock()
     gc.genome_coverage_samples(samples, genome, genomecov_args=('-3',), index=1)
-    gc.sample_splits_genome_coverage.assert_called_once_with('ASDURF', genome, None, None, '', '-cov', None, None, None, ('-3',))
+    gc.sample_splits_genome_coverage.assert_called_once_with('ASDURF', genome, None, None, '', '-cov', None, None, None, ('-3',), False)
 
 
 def test_genome_coverage_samples_all_scale(testdir, mock_testclass):
@@ -283,9 +332,9 @@ def test_genome_coverage_samples_all_scale(testdir, mock_testclass):
     scale = 1.5
     gc.sample_splits_genome_coverage = MagicMock()
     gc.genome_coverage_samples(samples, genome, scale=scale)
-    gc.sample_splits_genome_coverage.assert_any_call('POLR2A', genome, scale, None, '', '-cov', None, None, None, ())
-    gc.sample_splits_genome_coverage.assert_any_call('ASDURF', genome, scale, None, '', '-cov', None, None, None, ())
-    gc.sample_splits_genome_coverage.assert_any_call('POLR1C', genome, scale, None, '', '-cov', None, None, None, ())
+    gc.sample_splits_genome_coverage.assert_any_call('POLR2A', genome, scale, None, '', '-cov', None, None, None, (), False)
+    gc.sample_splits_genome_coverage.assert_any_call('ASDURF', genome, scale, None, '', '-cov', None, None, None, (), False)
+    gc.sample_splits_genome_coverage.assert_any_call('POLR1C', genome, scale, None, '', '-cov', None, None, None, (), False)
 
 
 def test_genome_coverage_samples_second_scale(testdir, mock_testclass):
@@ -294,7 +343,7 @@ def test_genome_coverage_samples_second_scale(testdir, mock_testclass):
     scale = 1.5
     gc.sample_splits_genome_coverage = MagicMock()
     gc.genome_coverage_samples(samples, genome, scale=scale, index=1)
-    gc.sample_splits_genome_coverage.assert_called_once_with('ASDURF', genome, scale, None, '', '-cov', None, None, None, ())
+    gc.sample_splits_genome_coverage.assert_called_once_with('ASDURF', genome, scale, None, '', '-cov', None, None, None, (), False)
 
 
 def test_genome_coverage_samples_all_scale_negativestrand(testdir, mock_testclass):
@@ -304,9 +353,9 @@ def test_genome_coverage_samples_all_scale_negativestrand(testdir, mock_testclas
     strand = '-'
     gc.sample_splits_genome_coverage = MagicMock()
     gc.genome_coverage_samples(samples, genome, scale=scale, strand=strand)
-    gc.sample_splits_genome_coverage.assert_any_call('POLR2A', genome, scale, strand, '', '-cov', None, None, None, ())
-    gc.sample_splits_genome_coverage.assert_any_call('ASDURF', genome, scale, strand, '', '-cov', None, None, None, ())
-    gc.sample_splits_genome_coverage.assert_any_call('POLR1C', genome, scale, strand, '', '-cov', None, None, None, ())
+    gc.sample_splits_genome_coverage.assert_any_call('POLR2A', genome, scale, strand, '', '-cov', None, None, None, (), False)
+    gc.sample_splits_genome_coverage.assert_any_call('ASDURF', genome, scale, strand, '', '-cov', None, None, None, (), False)
+    gc.sample_splits_genome_coverage.assert_any_call('POLR1C', genome, scale, strand, '', '-cov', None, None, None, (), False)
 
 
 def test_genome_coverage_samples_second_scale_negativestrand(testdir, mock_testclass):
@@ -316,7 +365,7 @@ def test_genome_coverage_samples_second_scale_negativestrand(testdir, mock_testc
     strand = '-'
     gc.sample_splits_genome_coverage = MagicMock()
     gc.genome_coverage_samples(samples, genome, scale=scale, strand=strand, index=1)
-    gc.sample_splits_genome_coverage.assert_called_once_with('ASDURF', genome, scale, strand, '', '-cov', None, None, None, ())
+    gc.sample_splits_genome_coverage.assert_called_once_with('ASDURF', genome, scale, strand, '', '-cov', None, None, None, (), False)
 
 
 def test_genome_coverage_samples_all_scale_positivestrand(testdir, mock_testclass):
@@ -326,9 +375,9 @@ def test_genome_coverage_samples_all_scale_positivestrand(testdir, mock_testclas
     strand = '+'
     gc.sample_splits_genome_coverage = MagicMock()
     gc.genome_coverage_samples(samples, genome, scale=scale, strand=strand)
-    gc.sample_splits_genome_coverage.assert_any_call('POLR2A', genome, scale, strand, '', '-cov', None, None, None, ())
-    gc.sample_splits_genome_coverage.assert_any_call('ASDURF', genome, scale, strand, '', '-cov', None, None, None, ())
-    gc.sample_splits_genome_coverage.assert_any_call('POLR1C', genome, scale, strand, '', '-cov', None, None, None, ())
+    gc.sample_splits_genome_coverage.assert_any_call('POLR2A', genome, scale, strand, '', '-cov', None, None, None, (), False)
+    gc.sample_splits_genome_coverage.assert_any_call('ASDURF', genome, scale, strand, '', '-cov', None, None, None, (), False)
+    gc.sample_splits_genome_coverage.assert_any_call('POLR1C', genome, scale, strand, '', '-cov', None, None, None, (), False)
 
 
 def test_genome_coverage_samples_second_scale_positivestrand(testdir, mock_testclass):
@@ -338,7 +387,7 @@ def test_genome_coverage_samples_second_scale_positivestrand(testdir, mock_testc
     strand = '+'
     gc.sample_splits_genome_coverage = MagicMock()
     gc.genome_coverage_samples(samples, genome, scale=scale, strand=strand, index=1)
-    gc.sample_splits_genome_coverage.assert_called_once_with('ASDURF', genome, scale, strand, '', '-cov', None, None, None, ())
+    gc.sample_splits_genome_coverage.assert_called_once_with('ASDURF', genome, scale, strand, '', '-cov', None, None, None, (), False)
 
     
 def test_sample_splits_genome_coverage(testdir, mock_testclass):
@@ -481,6 +530,62 @@ def test_sample_splits_genome_coverage_scale_positivestrand(testdir, mock_testcl
     gc.genome_coverage.assert_any_call(split2, genome, scale, strand, '', '-cov', None, None, None, ())
 
 
+def test_sample_splits_genome_coverage_singlepass(testdir, mock_testclass):
+    sample = 'POLR2A'
+    genome = 'human.sizes'
+    split1 = sample + '-100-110'
+    split2 = sample + '-110-120'
+    sb.splits = MagicMock(return_value=[split1, split2])
+    gc.genome_coverage = MagicMock()
+    gc.splits_genome_coverage = MagicMock()
+    gc.sample_splits_genome_coverage(sample, genome, single_pass=True)
+    sb.splits.assert_called_once_with(sample)
+    gc.splits_genome_coverage.assert_called_once_with(sample, [split1, split2], genome, None, None, '', '-cov', None, None, None, ())
+    gc.genome_coverage.assert_not_called()
+
+
+def test_sample_splits_genome_coverage_singlepass_bedtoolsargs(testdir, mock_testclass):
+    sample = 'POLR2A'
+    genome = 'human.sizes'
+    split1 = sample + '-100-110'
+    sb.splits = MagicMock(return_value=[split1])
+    gc.genome_coverage = MagicMock()
+    gc.splits_genome_coverage = MagicMock()
+    gc.sample_splits_genome_coverage(sample, genome, genomecov_args=('-pc',), single_pass=True)
+    gc.splits_genome_coverage.assert_not_called()
+    gc.genome_coverage.assert_any_call(sample, genome, None, None, '', '-cov', None, None, None, ('-pc',))
+    gc.genome_coverage.assert_any_call(split1, genome, None, None, '', '-cov', None, None, None, ('-pc',))
+
+
+
+def test_sample_splits_genome_coverage_singlepass_inputsuffix(testdir, mock_testclass):
+    sample = 'POLR2A'
+    genome = 'human.sizes'
+    with open(genome, 'w') as outfile:
+        outfile.write('chrI\t1000\n')
+    split = sample + '-100-110'
+    with open(sample + '.bed', 'w') as outfile:
+        outfile.write('chrI\t100\t205\n')
+    with open(split + '.bed', 'w') as outfile:
+        outfile.write('chrI\t100\t205\n')
+    with open(sample + '-forcov.bed', 'w') as outfile:
+        outfile.write('chrI\t152\t153\n')
+    with open(split + '-forcov.bed', 'w') as outfile:
+        outfile.write('chrI\t152\t153\n')
+    gc.sample_splits_genome_coverage(sample, genome, input_suffix='-forcov', single_pass=True)
+    for name in [sample, split]:
+        with open(name + '-cov.bed', 'r') as infile:
+            assert infile.readlines()[1:] == ['chrI\t152\t153\t1e+06\n']
+
+
+def test_genome_coverage_samples_jobs_singlepass_inputsuffix(testdir, mock_testclass):
+    samples = Path(__file__).parent.joinpath('samples.txt')
+    genome = 'sacCer3.chrom.sizes'
+    sb.splits = MagicMock(return_value=[])
+    Jobs.run = MagicMock()
+    gc.genome_coverage_samples(samples, genome, input_suffix='-forcov', single_pass=True, jobs=3)
+    Jobs.run.assert_called_once_with(gc.genome_coverage, ANY, 3)
+
 def test_genome_coverage(testdir, mock_testclass):
     sample = 'POLR2A'
     bed = sample + '.bed'
@@ -489,12 +594,12 @@ def test_genome_coverage(testdir, mock_testclass):
     genome = 'human.sizes'
     count = 2000000
     Bed.count_bed = MagicMock(return_value=count)
-    gc.coverage = MagicMock()
+    gc.native_coverage = MagicMock()
     Bed.bedgraph_to_bigwig = MagicMock()
     gc.genome_coverage(sample, genome)
     Bed.count_bed.assert_called_once_with(bed)
-    gc.coverage.assert_called_once_with(bed, cov, genome, sample, BASE_SCALE / count, None, ())
-    Bed.bedgraph_to_bigwig.assert_called_once_with(cov, bw, genome)
+    gc.native_coverage.assert_called_once_with(bed, cov, bw, genome, sample, BASE_SCALE / count, None, ())
+    Bed.bedgraph_to_bigwig.assert_not_called()
 
 
 def test_genome_coverage_suffix(testdir, mock_testclass):
@@ -507,12 +612,12 @@ def test_genome_coverage_suffix(testdir, mock_testclass):
     genome = 'human.sizes'
     count = 2000000
     Bed.count_bed = MagicMock(return_value=count)
-    gc.coverage = MagicMock()
+    gc.native_coverage = MagicMock()
     Bed.bedgraph_to_bigwig = MagicMock()
     gc.genome_coverage(sample, genome, input_suffix=input_suffix, output_suffix=output_suffix)
     Bed.count_bed.assert_called_once_with(bed)
-    gc.coverage.assert_called_once_with(bed, cov, genome, sample, BASE_SCALE / count, None, ())
-    Bed.bedgraph_to_bigwig.assert_called_once_with(cov, bw, genome)
+    gc.native_coverage.assert_called_once_with(bed, cov, bw, genome, sample, BASE_SCALE / count, None, ())
+    Bed.bedgraph_to_bigwig.assert_not_called()
 
 
 def test_genome_coverage_five(testdir, mock_testclass):
@@ -555,12 +660,12 @@ def test_genome_coverage_scale(testdir, mock_testclass):
     genome = 'human.sizes'
     scale = 1.5
     Bed.count_bed = MagicMock()
-    gc.coverage = MagicMock()
+    gc.native_coverage = MagicMock()
     Bed.bedgraph_to_bigwig = MagicMock()
     gc.genome_coverage(sample, genome, scale=scale)
     Bed.count_bed.assert_not_called()
-    gc.coverage.assert_called_once_with(bed, cov, genome, sample, scale, None, ())
-    Bed.bedgraph_to_bigwig.assert_called_once_with(cov, bw, genome)
+    gc.native_coverage.assert_called_once_with(bed, cov, bw, genome, sample, scale, None, ())
+    Bed.bedgraph_to_bigwig.assert_not_called()
 
 
 def test_genome_coverage_spikesuffix(testdir, mock_testclass):
@@ -574,12 +679,12 @@ def test_genome_coverage_spikesuffix(testdir, mock_testclass):
     spiked_count = 400000
     scale = BASE_SCALE / spiked_count
     Bed.count_bed = MagicMock(return_value=spiked_count)
-    gc.coverage = MagicMock()
+    gc.native_coverage = MagicMock()
     Bed.bedgraph_to_bigwig = MagicMock()
     gc.genome_coverage(sample, genome, spike_suffix=spike_suffix)
     Bed.count_bed.assert_called_once_with(spiked)
-    gc.coverage.assert_called_once_with(bed, cov, genome, sample, scale, None, ())
-    Bed.bedgraph_to_bigwig.assert_called_once_with(cov, bw, genome)
+    gc.native_coverage.assert_called_once_with(bed, cov, bw, genome, sample, scale, None, ())
+    Bed.bedgraph_to_bigwig.assert_not_called()
 
 
 def test_genome_coverage_controlsuffix(testdir, mock_testclass):
@@ -599,14 +704,14 @@ def test_genome_coverage_controlsuffix(testdir, mock_testclass):
     spiked_control_count = 150000
     scale = BASE_SCALE * spiked_control_count / (spiked_count * control_count)
     Bed.count_bed = MagicMock(side_effect=[spiked_count, control_count, spiked_control_count])
-    gc.coverage = MagicMock()
+    gc.native_coverage = MagicMock()
     Bed.bedgraph_to_bigwig = MagicMock()
     gc.genome_coverage(sample, genome, spike_suffix=spike_suffix, control_suffix=control_suffix, spike_control_suffix=spike_control_suffix)
     Bed.count_bed.assert_any_call(spiked)
     Bed.count_bed.assert_any_call(control)
     Bed.count_bed.assert_any_call(spike_control)
-    gc.coverage.assert_called_once_with(bed, cov, genome, sample, scale, None, ())
-    Bed.bedgraph_to_bigwig.assert_called_once_with(cov, bw, genome)
+    gc.native_coverage.assert_called_once_with(bed, cov, bw, genome, sample, scale, None, ())
+    Bed.bedgraph_to_bigwig.assert_not_called()
 
 
 def test_genome_coverage_controlsuffix_withoutspike(testdir, mock_testclass):
@@ -624,12 +729,12 @@ def test_genome_coverage_controlsuffix_withoutspike(testdir, mock_testclass):
     spike_control_count = 100000
     scale = BASE_SCALE / count
     Bed.count_bed = MagicMock(side_effect=[count, control_count, spike_control_count])
-    gc.coverage = MagicMock()
+    gc.native_coverage = MagicMock()
     Bed.bedgraph_to_bigwig = MagicMock()
     gc.genome_coverage(sample, genome, control_suffix=control_suffix)
     Bed.count_bed.assert_called_once_with(bed)
-    gc.coverage.assert_called_once_with(bed, cov, genome, sample, scale, None, ())
-    Bed.bedgraph_to_bigwig.assert_called_once_with(cov, bw, genome)
+    gc.native_coverage.assert_called_once_with(bed, cov, bw, genome, sample, scale, None, ())
+    Bed.bedgraph_to_bigwig.assert_not_called()
 
 
 def test_genome_coverage_scale_and_spikesuffix(testdir, mock_testclass):
@@ -642,12 +747,12 @@ def test_genome_coverage_scale_and_spikesuffix(testdir, mock_testclass):
     spiked_count = 400000
     scale = 1.5
     Bed.count_bed = MagicMock(return_value=spiked_count)
-    gc.coverage = MagicMock()
+    gc.native_coverage = MagicMock()
     Bed.bedgraph_to_bigwig = MagicMock()
     gc.genome_coverage(sample, genome, scale=scale, spike_suffix=spike_suffix)
     Bed.count_bed.assert_not_called()
-    gc.coverage.assert_called_once_with(bed, cov, genome, sample, scale, None, ())
-    Bed.bedgraph_to_bigwig.assert_called_once_with(cov, bw, genome)
+    gc.native_coverage.assert_called_once_with(bed, cov, bw, genome, sample, scale, None, ())
+    Bed.bedgraph_to_bigwig.assert_not_called()
 
 
 def test_genome_coverage_scale_and_controlsuffix(testdir, mock_testclass):
@@ -660,12 +765,12 @@ def test_genome_coverage_scale_and_controlsuffix(testdir, mock_testclass):
     control_count = 300000
     scale = 1.5
     Bed.count_bed = MagicMock(return_value=control_count)
-    gc.coverage = MagicMock()
+    gc.native_coverage = MagicMock()
     Bed.bedgraph_to_bigwig = MagicMock()
     gc.genome_coverage(sample, genome, scale=scale, control_suffix=control_suffix)
     Bed.count_bed.assert_not_called()
-    gc.coverage.assert_called_once_with(bed, cov, genome, sample, scale, None, ())
-    Bed.bedgraph_to_bigwig.assert_called_once_with(cov, bw, genome)
+    gc.native_coverage.assert_called_once_with(bed, cov, bw, genome, sample, scale, None, ())
+    Bed.bedgraph_to_bigwig.assert_not_called()
 
 
 def test_genome_coverage_negativestrand(testdir, mock_testclass):
@@ -677,12 +782,12 @@ def test_genome_coverage_negativestrand(testdir, mock_testclass):
     strand = '-'
     count = 2000000
     Bed.count_bed = MagicMock(return_value=count)
-    gc.coverage = MagicMock()
+    gc.native_coverage = MagicMock()
     Bed.bedgraph_to_bigwig = MagicMock()
     gc.genome_coverage(sample, genome, scale=None, strand=strand)
     Bed.count_bed.assert_called_once_with(bed)
-    gc.coverage.assert_called_once_with(bed, cov, genome, sample, BASE_SCALE / count, strand, ())
-    Bed.bedgraph_to_bigwig.assert_called_once_with(cov, bw, genome)
+    gc.native_coverage.assert_called_once_with(bed, cov, bw, genome, sample, BASE_SCALE / count, strand, ())
+    Bed.bedgraph_to_bigwig.assert_not_called()
 
 
 def test_genome_coverage_negativestrand_suffix(testdir, mock_testclass):
@@ -696,12 +801,12 @@ def test_genome_coverage_negativestrand_suffix(testdir, mock_testclass):
     strand = '-'
     count = 2000000
     Bed.count_bed = MagicMock(return_value=count)
-    gc.coverage = MagicMock()
+    gc.native_coverage = MagicMock()
     Bed.bedgraph_to_bigwig = MagicMock()
     gc.genome_coverage(sample, genome, scale=None, strand=strand, input_suffix=input_suffix, output_suffix=output_suffix)
     Bed.count_bed.assert_called_once_with(bed)
-    gc.coverage.assert_called_once_with(bed, cov, genome, sample, BASE_SCALE / count, strand, ())
-    Bed.bedgraph_to_bigwig.assert_called_once_with(cov, bw, genome)
+    gc.native_coverage.assert_called_once_with(bed, cov, bw, genome, sample, BASE_SCALE / count, strand, ())
+    Bed.bedgraph_to_bigwig.assert_not_called()
 
 
 def test_genome_coverage_scale_negativestrand(testdir, mock_testclass):
@@ -713,12 +818,12 @@ def test_genome_coverage_scale_negativestrand(testdir, mock_testclass):
     scale = 1.5
     strand = '-'
     Bed.count_bed = MagicMock()
-    gc.coverage = MagicMock()
+    gc.native_coverage = MagicMock()
     Bed.bedgraph_to_bigwig = MagicMock()
     gc.genome_coverage(sample, genome, scale=scale, strand=strand)
     Bed.count_bed.assert_not_called()
-    gc.coverage.assert_called_once_with(bed, cov, genome, sample, scale, strand, ())
-    Bed.bedgraph_to_bigwig.assert_called_once_with(cov, bw, genome)
+    gc.native_coverage.assert_called_once_with(bed, cov, bw, genome, sample, scale, strand, ())
+    Bed.bedgraph_to_bigwig.assert_not_called()
 
 
 def test_genome_coverage_positivestrand(testdir, mock_testclass):
@@ -730,12 +835,12 @@ def test_genome_coverage_positivestrand(testdir, mock_testclass):
     strand = '+'
     count = 2000000
     Bed.count_bed = MagicMock(return_value=count)
-    gc.coverage = MagicMock()
+    gc.native_coverage = MagicMock()
     Bed.bedgraph_to_bigwig = MagicMock()
     gc.genome_coverage(sample, genome, scale=None, strand=strand)
     Bed.count_bed.assert_called_once_with(bed)
-    gc.coverage.assert_called_once_with(bed, cov, genome, sample, BASE_SCALE / count, strand, ())
-    Bed.bedgraph_to_bigwig.assert_called_once_with(cov, bw, genome)
+    gc.native_coverage.assert_called_once_with(bed, cov, bw, genome, sample, BASE_SCALE / count, strand, ())
+    Bed.bedgraph_to_bigwig.assert_not_called()
 
 
 def test_genome_coverage_positivestrand_suffix(testdir, mock_testclass):
@@ -749,12 +854,12 @@ def test_genome_coverage_positivestrand_suffix(testdir, mock_testclass):
     strand = '+'
     count = 2000000
     Bed.count_bed = MagicMock(return_value=count)
-    gc.coverage = MagicMock()
+    gc.native_coverage = MagicMock()
     Bed.bedgraph_to_bigwig = MagicMock()
     gc.genome_coverage(sample, genome, scale=None, strand=strand, input_suffix=input_suffix, output_suffix=output_suffix)
     Bed.count_bed.assert_called_once_with(bed)
-    gc.coverage.assert_called_once_with(bed, cov, genome, sample, BASE_SCALE / count, strand, ())
-    Bed.bedgraph_to_bigwig.assert_called_once_with(cov, bw, genome)
+    gc.native_coverage.assert_called_once_with(bed, cov, bw, genome, sample, BASE_SCALE / count, strand, ())
+    Bed.bedgraph_to_bigwig.assert_not_called()
 
 
 def test_genome_coverage_scale_positivestrand(testdir, mock_testclass):
@@ -766,12 +871,12 @@ def test_genome_coverage_scale_positivestrand(testdir, mock_testclass):
     scale = 1.5
     strand = '+'
     Bed.count_bed = MagicMock()
-    gc.coverage = MagicMock()
+    gc.native_coverage = MagicMock()
     Bed.bedgraph_to_bigwig = MagicMock()
     gc.genome_coverage(sample, genome, scale=scale, strand=strand)
     Bed.count_bed.assert_not_called()
-    gc.coverage.assert_called_once_with(bed, cov, genome, sample, scale, strand, ())
-    Bed.bedgraph_to_bigwig.assert_called_once_with(cov, bw, genome)
+    gc.native_coverage.assert_called_once_with(bed, cov, bw, genome, sample, scale, strand, ())
+    Bed.bedgraph_to_bigwig.assert_not_called()
 
 
 def test_coverage(testdir, mock_testclass):
@@ -899,3 +1004,224 @@ def test_coverage_scale_positivestrand(testdir, mock_testclass):
     with open(output, 'r') as infile:
         assert infile.readline() == 'track type=bedGraph name="' + sample + ' Plus"\n'
         assert infile.readline() == 'test'
+
+
+def test_genome_coverage_bedtoolsargs(testdir, mock_testclass):
+    sample = 'POLR2A'
+    bed = sample + '.bed'
+    cov = sample + '-cov.bed'
+    bw = sample + '-cov.bw'
+    genome = 'human.sizes'
+    count = 2000000
+    Bed.count_bed = MagicMock(return_value=count)
+    gc.coverage = MagicMock()
+    gc.native_coverage = MagicMock()
+    Bed.bedgraph_to_bigwig = MagicMock()
+    gc.genome_coverage(sample, genome, genomecov_args=('-pc',))
+    Bed.count_bed.assert_called_once_with(bed)
+    gc.native_coverage.assert_not_called()
+    gc.coverage.assert_called_once_with(bed, cov, genome, sample, BASE_SCALE / count, None, ('-pc',))
+    Bed.bedgraph_to_bigwig.assert_called_once_with(cov, bw, genome)
+
+
+def create_coverage_bed(bed, genome):
+    with open(genome, 'w') as outfile:
+        outfile.write('chrI\t15\n')
+        outfile.write('chrII\t20\n')
+    with open(bed, 'w') as outfile:
+        outfile.write('track name=test\n')
+        outfile.write('chrII\t2\t6\ttest1\t1\t+\n')
+        outfile.write('chrI\t2\t5\ttest2\t1\t-\n')
+        outfile.write('chrI\t3\t8\ttest3\t1\t+\n')
+        outfile.write('chrI\t5\t8\ttest4\t1\t+\n')
+        outfile.write('chrI\t10\t30\ttest5\t1\t-\n')
+        outfile.write('chrX\t1\t3\ttest6\t1\t+\n')
+
+
+def test_native_coverage(testdir, mock_testclass):
+    sample = 'POLR2A'
+    bed = sample + '.bed'
+    output = sample + '-out.bed'
+    bigwig = sample + '-out.bw'
+    genome = 'human.sizes'
+    create_coverage_bed(bed, genome)
+    gc.native_coverage(bed, output, bigwig, genome, sample)
+    with open(output, 'r') as infile:
+        assert infile.readline() == 'track type=bedGraph name="' + sample + '"\n'
+        assert infile.readline() == 'chrI\t2\t3\t1\n'
+        assert infile.readline() == 'chrI\t3\t8\t2\n'
+        assert infile.readline() == 'chrI\t10\t15\t1\n'
+        assert infile.readline() == 'chrII\t2\t6\t1\n'
+        assert infile.readline() == ''
+    bw = pbw.open(bigwig)
+    assert bw.chroms() == {'chrI': 15, 'chrII': 20}
+    assert bw.intervals('chrI') == ((2, 3, 1.0), (3, 8, 2.0), (10, 15, 1.0))
+    assert bw.intervals('chrII') == ((2, 6, 1.0),)
+    bw.close()
+
+
+def test_native_coverage_scale_negativestrand(testdir, mock_testclass):
+    sample = 'POLR2A'
+    bed = sample + '.bed'
+    output = sample + '-out.bed'
+    bigwig = sample + '-out.bw'
+    genome = 'human.sizes'
+    scale = 0.3
+    strand = '-'
+    create_coverage_bed(bed, genome)
+    gc.native_coverage(bed, output, bigwig, genome, sample, scale, strand)
+    with open(output, 'r') as infile:
+        assert infile.readline() == 'track type=bedGraph name="' + sample + ' Minus"\n'
+        assert infile.readline() == 'chrI\t2\t5\t0.3\n'
+        assert infile.readline() == 'chrI\t10\t15\t0.3\n'
+        assert infile.readline() == ''
+    bw = pbw.open(bigwig)
+    intervals = bw.intervals('chrI')
+    assert [interval[:2] for interval in intervals] == [(2, 5), (10, 15)]
+    assert math.isclose(intervals[0][2], scale, rel_tol=1e-6)
+    assert bw.intervals('chrII') is None
+    bw.close()
+
+
+def test_native_coverage_five(testdir, mock_testclass):
+    sample = 'POLR2A'
+    bed = sample + '.bed'
+    output = sample + '-out.bed'
+    bigwig = sample + '-out.bw'
+    genome = 'human.sizes'
+    create_coverage_bed(bed, genome)
+    gc.native_coverage(bed, output, bigwig, genome, sample, genomecov_args=('-5',))
+    with open(output, 'r') as infile:
+        assert infile.readline() == 'track type=bedGraph name="' + sample + '"\n'
+        assert infile.readline() == 'chrI\t3\t6\t1\n'
+        assert infile.readline() == 'chrII\t2\t3\t1\n'
+        assert infile.readline() == ''
+
+
+def test_native_coverage_three(testdir, mock_testclass):
+    sample = 'POLR2A'
+    bed = sample + '.bed'
+    output = sample + '-out.bed'
+    bigwig = sample + '-out.bw'
+    genome = 'human.sizes'
+    create_coverage_bed(bed, genome)
+    gc.native_coverage(bed, output, bigwig, genome, sample, genomecov_args=('-3',))
+    with open(output, 'r') as infile:
+        assert infile.readline() == 'track type=bedGraph name="' + sample + '"\n'
+        assert infile.readline() == 'chrI\t2\t3\t1\n'
+        assert infile.readline() == 'chrI\t7\t8\t2\n'
+        assert infile.readline() == 'chrI\t10\t11\t1\n'
+        assert infile.readline() == 'chrII\t5\t6\t1\n'
+        assert infile.readline() == ''
+
+
+
+def test_native_coverage_unknownstrand(testdir, mock_testclass):
+    sample = 'POLR2A'
+    bed = sample + '.bed'
+    output = sample + '-out.bed'
+    bigwig = sample + '-out.bw'
+    genome = 'human.sizes'
+    with open(genome, 'w') as outfile:
+        outfile.write('chrI\t15\n')
+    with open(bed, 'w') as outfile:
+        outfile.write('chrI\t2\t5\ttest1\t1\t.\n')
+        outfile.write('chrI\t8\t12\ttest2\t1\t-\n')
+    gc.native_coverage(bed, output, bigwig, genome, sample, genomecov_args=('-5',))
+    with open(output, 'r') as infile:
+        assert infile.readlines()[1:] == ['chrI\t2\t3\t1\n', 'chrI\t11\t12\t1\n']
+    gc.native_coverage(bed, output, bigwig, genome, sample, genomecov_args=('-3',))
+    with open(output, 'r') as infile:
+        assert infile.readlines()[1:] == ['chrI\t4\t5\t1\n', 'chrI\t8\t9\t1\n']
+
+
+def test_native_coverage_unstranded(testdir, mock_testclass):
+    sample = 'POLR2A'
+    bed = sample + '.bed'
+    output = sample + '-out.bed'
+    bigwig = sample + '-out.bw'
+    genome = 'human.sizes'
+    with open(genome, 'w') as outfile:
+        outfile.write('chrI\t15\n')
+    with open(bed, 'w') as outfile:
+        outfile.write('chrI\t2\t5\n')
+    gc.native_coverage(bed, output, bigwig, genome, sample, genomecov_args=('-5',))
+    with open(output, 'r') as infile:
+        assert infile.readlines()[1:] == ['chrI\t2\t3\t1\n']
+    gc.native_coverage(bed, output, bigwig, genome, sample, genomecov_args=('-3',))
+    with open(output, 'r') as infile:
+        assert infile.readlines()[1:] == ['chrI\t4\t5\t1\n']
+
+
+def test_native_coverage_rounding(testdir, mock_testclass):
+    sample = 'POLR2A'
+    bed = sample + '.bed'
+    output = sample + '-out.bed'
+    bigwig = sample + '-out.bw'
+    genome = 'human.sizes'
+    create_coverage_bed(bed, genome)
+    gc.native_coverage(bed, output, bigwig, genome, sample, 1000000 / 6)
+    with open(output, 'r') as infile:
+        assert infile.readlines()[1:3] == ['chrI\t2\t3\t166667\n', 'chrI\t3\t8\t333333\n']
+    bw = pbw.open(bigwig)
+    assert bw.intervals('chrI')[:2] == ((2, 3, 166667.0), (3, 8, 333333.0))
+    bw.close()
+
+def test_coverage_intervals(testdir, mock_testclass):
+    starts = np.array([0, 2, 4, 10])
+    ends = np.array([4, 4, 6, 12])
+    interval_starts, interval_ends, depths = gc.coverage_intervals(starts, ends)
+    assert interval_starts.tolist() == [0, 2, 4, 10]
+    assert interval_ends.tolist() == [2, 4, 6, 12]
+    assert depths.tolist() == [1, 2, 1, 1]
+
+
+
+def test_splits_genome_coverage(testdir, mock_testclass):
+    sample = 'POLR2A'
+    bed = sample + '.bed'
+    genome = 'human.sizes'
+    create_coverage_bed(bed, genome)
+    split1 = sample + '-3-4'
+    split2 = sample + '-4-6'
+    gc.splits_genome_coverage(sample, [split1, split2], genome)
+    with open(sample + '-cov.bed', 'r') as infile:
+        assert infile.readline() == 'track type=bedGraph name="' + sample + '"\n'
+        assert infile.readline() == 'chrI\t2\t3\t166667\n'
+        assert infile.readline() == 'chrI\t3\t8\t333333\n'
+        assert infile.readline() == 'chrI\t10\t15\t166667\n'
+        assert infile.readline() == 'chrII\t2\t6\t166667\n'
+        assert infile.readline() == ''
+    with open(split1 + '-cov.bed', 'r') as infile:
+        assert infile.readline() == 'track type=bedGraph name="' + split1 + '"\n'
+        assert infile.readline() == 'chrI\t2\t8\t500000\n'
+        assert infile.readline() == ''
+    with open(split2 + '-cov.bed', 'r') as infile:
+        assert infile.readline() == 'track type=bedGraph name="' + split2 + '"\n'
+        assert infile.readline() == 'chrI\t3\t8\t500000\n'
+        assert infile.readline() == 'chrII\t2\t6\t500000\n'
+        assert infile.readline() == ''
+    bw = pbw.open(split2 + '-cov.bw')
+    assert bw.intervals('chrI') == ((3, 8, 500000.0),)
+    bw.close()
+
+
+def test_splits_genome_coverage_scale_positivestrand(testdir, mock_testclass):
+    sample = 'POLR2A'
+    bed = sample + '.bed'
+    genome = 'human.sizes'
+    create_coverage_bed(bed, genome)
+    split1 = sample + '-3-4'
+    Bed.count_bed = MagicMock()
+    gc.splits_genome_coverage(sample, [split1], genome, scale=2.0, strand='+')
+    Bed.count_bed.assert_not_called()
+    with open(sample + '-cov-pos.bed', 'r') as infile:
+        assert infile.readline() == 'track type=bedGraph name="' + sample + ' Plus"\n'
+        assert infile.readline() == 'chrI\t3\t5\t2\n'
+        assert infile.readline() == 'chrI\t5\t8\t4\n'
+        assert infile.readline() == 'chrII\t2\t6\t2\n'
+        assert infile.readline() == ''
+    with open(split1 + '-cov-pos.bed', 'r') as infile:
+        assert infile.readline() == 'track type=bedGraph name="' + split1 + ' Plus"\n'
+        assert infile.readline() == 'chrI\t5\t8\t2\n'
+        assert infile.readline() == ''
@@ -8,6 +8,7 @@ import pytest
 
 from robtools import IgnoreStrand as igs
 from robtools import Split as sb
+from robtools.jobs import Jobs
 from robtools.txt import Parser
 
 
@@ -19,6 +20,7 @@ def mock_testclass():
     ignore_strand = igs.ignore_strand
     splits = sb.splits
     first = Parser.first
+    run = Jobs.run
     yield
     igs.ignore_strand_samples = ignore_strand_samples
     igs.ignore_strand_sample_splits = ignore_strand_sample_splits
@@ -26,6 +28,7 @@ def mock_testclass():
     igs.ignore_strand = ignore_strand
     sb.splits = splits
     Parser.first = first
+    Jobs.run = run
     
     
 def test_ignorestrand(testdir, mock_testclass):
@@ -34,7 +37,7 @@ def test_ignorestrand(testdir, mock_testclass):
     runner = CliRunner()
     result = runner.invoke(igs.ignorestrand, ['-s', samples])
     assert result.exit_code == 0
-    igs.ignore_strand_samples.assert_called_once_with(samples, '', '-forcov', None)
+    igs.ignore_strand_samples.assert_called_once_with(samples, '', '-forcov', None, 1)
 
 
 def test_ignorestrand_parameters(testdir, mock_testclass):
@@ -45,7 +48,7 @@ def test_ignorestrand_parameters(testdir, mock_testclass):
     runner = CliRunner()
     result = runner.invoke(igs.ignorestrand, ['-s', samples, '-is', input_suffix, '-os', output_suffix])
     assert result.exit_code == 0
-    igs.ignore_strand_samples.assert_called_once_with(samples, input_suffix, output_suffix, None)
+    igs.ignore_strand_samples.assert_called_once_with(samples, input_suffix, output_suffix, None, 1)
 
 
 def test_ignorestrand_samesuffix(testdir, mock_testclass):
@@ -65,7 +68,7 @@ def test_ignorestrand_onlyoutputsuffix(testdir, mock_testclass):
     runner = CliRunner()
     result = runner.invoke(igs.ignorestrand, ['-s', samples, '-os', output_suffix])
     assert result.exit_code == 0
-    igs.ignore_strand_samples.assert_called_once_with(samples, '', output_suffix, None)
+    igs.ignore_strand_samples.assert_called_once_with(samples, '', output_suffix, None, 1)
 
 
 def test_ignorestrand_second(testdir, mock_testclass):
@@ -75,7 +78,7 @@ def test_ignorestrand_second(testdir, mock_testclass):
     runner = CliRunner()
     result = runner.invoke(igs.ignorestrand, ['-s', samples, '-i', index])
     assert result.exit_code == 0
-    igs.ignore_strand_samples.assert_called_once_with(samples, '', '-forcov', index)
+    igs.ignore_strand_samples.assert_called_once_with(samples, '', '-forcov', index, 1)
 
 
 def test_ignorestrand_samplesnotexists(testdir, mock_testclass):
@@ -121,6 +124,20 @@ def test_ignore_strand_samples_second(testdir, mock_testclass):
     igs.ignore_strand_sample_splits.assert_called_once_with(samples[1], '', '-forcov')
 
     
+def test_ignore_strand_samples_jobs(testdir, mock_testclass):
+    samples_file = Path(__file__).parent.joinpath('samples.txt')
+    samples = ['POLR2A', 'ASDURF']
+    Parser.first = MagicMock(return_value=samples)
+    sb.splits = MagicMock(side_effect=[['POLR2A-100-110'], []])
+    igs.ignore_strand_sample_splits = MagicMock()
+    Jobs.run = MagicMock()
+    igs.ignore_strand_samples(samples_file, '-in', '-out', jobs=2)
+    igs.ignore_strand_sample_splits.assert_not_called()
+    Jobs.run.assert_called_once_with(igs.ignore_strand_sample,
+                                     [('POLR2A', '-in', '-out'), ('POLR2A-100-110', '-in', '-out'),
+                                      ('ASDURF', '-in', '-out')], 2)
+
+
 def test_ignore_strand_sample_splits(testdir, mock_testclass):
     sample = 'POLR2A'
     splits = ['POLR2A-100-110', 'POLR2A-120-130']
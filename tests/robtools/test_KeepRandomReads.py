@@ -1,5 +1,6 @@
 import gzip
 import os.path
+import random
 import re
 from pathlib import Path
 from unittest.mock import MagicMock
@@ -25,7 +26,7 @@ def test_keeprandomreads(mock_testclass):
     runner = CliRunner()
     result = runner.invoke(KeepRandomReads.keeprandomreads, ['--samples', samples])
     assert result.exit_code == 0
-    KeepRandomReads.keeprandomreads_samples.assert_called_once_with(samples, 10000000, True, '', '-random', None)
+    KeepRandomReads.keeprandomreads_samples.assert_called_once_with(samples, 10000000, True, '', '-random', None, False, None, 1)
 
 
 def test_keeprandomreads_parameters(mock_testclass):
@@ -41,7 +42,20 @@ def test_keeprandomreads_parameters(mock_testclass):
                             '--output-suffix', output_suffix, '--index', index])
     assert result.exit_code == 0
     KeepRandomReads.keeprandomreads_samples.assert_called_once_with(samples, count, False, input_suffix, output_suffix,
-                                                                    index)
+                                                                    index, False, None, 1)
+
+
+def test_keeprandomreads_singlepass(mock_testclass):
+    samples = Path(__file__).parent.joinpath('samples.txt')
+    seed = 42
+    threads = 4
+    KeepRandomReads.keeprandomreads_samples = MagicMock()
+    runner = CliRunner()
+    result = runner.invoke(KeepRandomReads.keeprandomreads,
+                           ['--samples', samples, '--single-pass', '--seed', seed, '--threads', threads])
+    assert result.exit_code == 0
+    KeepRandomReads.keeprandomreads_samples.assert_called_once_with(samples, 10000000, True, '', '-random', None, True,
+                                                                    seed, threads)
 
 
 def test_keeprandomreads_samplesnotexists(mock_testclass):
@@ -57,9 +71,9 @@ def test_keeprandomreads_samples(mock_testclass):
     samples = Path(__file__).parent.joinpath('samples.txt')
     KeepRandomReads.keeprandomreads_sample = MagicMock()
     KeepRandomReads.keeprandomreads_samples(samples)
-    KeepRandomReads.keeprandomreads_sample.assert_any_call('POLR2A', 10000000, True, '', '-random')
-    KeepRandomReads.keeprandomreads_sample.assert_any_call('ASDURF', 10000000, True, '', '-random')
-    KeepRandomReads.keeprandomreads_sample.assert_any_call('POLR1C', 10000000, True, '', '-random')
+    KeepRandomReads.keeprandomreads_sample.assert_any_call('POLR2A', 10000000, True, '', '-random', False, None, None)
+    KeepRandomReads.keeprandomreads_sample.assert_any_call('ASDURF', 10000000, True, '', '-random', False, None, None)
+    KeepRandomReads.keeprandomreads_sample.assert_any_call('POLR1C', 10000000, True, '', '-random', False, None, None)
 
 
 def test_keeprandomreads_samples_parameters(mock_testclass):
@@ -72,7 +86,7 @@ def test_keeprandomreads_samples_parameters(mock_testclass):
     index = 0
     KeepRandomReads.keeprandomreads_sample = MagicMock()
     KeepRandomReads.keeprandomreads_samples(samples, count, paired, input_suffix, output_suffix, index)
-    KeepRandomReads.keeprandomreads_sample.assert_called_once_with('POLR2A', count, paired, input_suffix, output_suffix)
+    KeepRandomReads.keeprandomreads_sample.assert_called_once_with('POLR2A', count, paired, input_suffix, output_suffix, False, None, None)
 
 
 def test_keeprandomreads_sample_paired(testdir, mock_testclass):
@@ -237,3 +251,172 @@ def test_keeprandomreads_sample_unpaired_parameters(testdir, mock_testclass):
         for j in range(0, 4):
             line = output1_lines[i * 4 + j]
             assert line == fastq1_lines[index + j]
+
+
+def write_gzip(source, output):
+    with open(Path(__file__).parent.joinpath(source)) as fastq_in:
+        lines = fastq_in.readlines()
+    with gzip.open(output, 'wt') as zip_out:
+        for line in lines:
+            zip_out.write(line)
+    return lines
+
+
+def test_keeprandomreads_sample_singlepass_paired(testdir, mock_testclass):
+    sample = 'sample'
+    count = 10
+    fastq1_lines = write_gzip('sample_R1.fastq', sample + '_R1.fastq.gz')
+    fastq2_lines = write_gzip('sample_R2.fastq', sample + '_R2.fastq.gz')
+    output1 = sample + '-random_R1.fastq.gz'
+    output2 = sample + '-random_R2.fastq.gz'
+    KeepRandomReads.keeprandomreads_sample(sample, count, single_pass=True, seed=1)
+    with gzip.open(output1, 'rt') as output1_out:
+        output1_lines = output1_out.readlines()
+    with gzip.open(output2, 'rt') as output2_out:
+        output2_lines = output2_out.readlines()
+    assert count * 4 == len(output1_lines)
+    assert count * 4 == len(output2_lines)
+    indexes = []
+    for i in range(0, count):
+        index = fastq1_lines.index(output1_lines[i * 4])
+        assert output1_lines[i * 4:i * 4 + 4] == fastq1_lines[index:index + 4]
+        assert output2_lines[i * 4:i * 4 + 4] == fastq2_lines[index:index + 4]
+        indexes.append(index)
+    assert indexes == sorted(indexes)
+    output1_first = output1_lines
+    KeepRandomReads.keeprandomreads_sample(sample, count, single_pass=True, seed=1)
+    with gzip.open(output1, 'rt') as output1_out:
+        assert output1_out.readlines() == output1_first
+
+
+def test_keeprandomreads_sample_singlepass_all(testdir, mock_testclass):
+    sample = 'sample'
+    fastq1_lines = write_gzip('sample_R1.fastq', sample + '_R1.fastq.gz')
+    fastq2_lines = write_gzip('sample_R2.fastq', sample + '_R2.fastq.gz')
+    output1 = sample + '-random_R1.fastq.gz'
+    output2 = sample + '-random_R2.fastq.gz'
+    KeepRandomReads.keeprandomreads_sample(sample, single_pass=True)
+    with gzip.open(output1, 'rt') as output1_out:
+        assert output1_out.readlines() == fastq1_lines
+    with gzip.open(output2, 'rt') as output2_out:
+        assert output2_out.readlines() == fastq2_lines
+
+
+def test_keeprandomreads_sample_singlepass_wrong_second(testdir, mock_testclass):
+    sample = 'sample'
+    write_gzip('sample_R1.fastq', sample + '_R1.fastq.gz')
+    with open(Path(__file__).parent.joinpath('sample_R2.fastq')) as fastq_in:
+        fastq2_lines = fastq_in.readlines()
+    fastq2_lines[4] = '@B' + fastq2_lines[4][2:]
+    with gzip.open(sample + '_R2.fastq.gz', 'wt') as zip_out:
+        for line in fastq2_lines:
+            zip_out.write(line)
+    with pytest.raises(AssertionError):
+        KeepRandomReads.keeprandomreads_sample(sample, single_pass=True)
+
+
+def test_keeprandomreads_sample_singlepass_unpaired(testdir, mock_testclass):
+    sample = 'sample'
+    count = 10
+    fastq1_lines = write_gzip('sample_R1.fastq', sample + '_R1.fastq.gz')
+    output1 = sample + '-random_R1.fastq.gz'
+    output2 = sample + '-random_R2.fastq.gz'
+    KeepRandomReads.keeprandomreads_sample(sample, count, False, single_pass=True, seed=3)
+    assert not os.path.exists(output2)
+    with gzip.open(output1, 'rt') as output1_out:
+        output1_lines = output1_out.readlines()
+    assert count * 4 == len(output1_lines)
+    for i in range(0, count):
+        index = fastq1_lines.index(output1_lines[i * 4])
+        assert output1_lines[i * 4:i * 4 + 4] == fastq1_lines[index:index + 4]
+
+
+def test_keeprandomreads_sample_seed(testdir, mock_testclass):
+    sample = 'sample'
+    count = 10
+    write_gzip('sample_R1.fastq', sample + '_R1.fastq.gz')
+    output1 = sample + '-random_R1.fastq.gz'
+    KeepRandomReads.keeprandomreads_sample(sample, count, False, seed=5)
+    with gzip.open(output1, 'rt') as output1_out:
+        output1_first = output1_out.readlines()
+    KeepRandomReads.keeprandomreads_sample(sample, count, False, seed=5)
+    with gzip.open(output1, 'rt') as output1_out:
+        assert output1_out.readlines() == output1_first
+
+
+def test_reservoir_sample():
+    rng = random.Random(7)
+    selected = KeepRandomReads.reservoir_sample(range(1000), 50, rng)
+    assert len(selected) == 50
+    assert len(set(selected)) == 50
+    assert selected == sorted(selected)
+    assert selected[-1] >= 50
+
+
+def test_reservoir_sample_uniform():
+    rng = random.Random(11)
+    counts = [0] * 20
+    for i in range(2000):
+        for item in KeepRandomReads.reservoir_sample(range(20), 5, rng):
+            counts[item] += 1
+    for count in counts:
+        assert 350 < count < 650
+
+
+def test_fastq_records(testdir):
+    with open(Path(__file__).parent.joinpath('sample_R1.fastq'), 'rb') as fastq_in:
+        lines = fastq_in.readlines()
+    with open(Path(__file__).parent.joinpath('sample_R1.fastq'), 'rb') as fastq_in:
+        records = list(KeepRandomReads.fastq_records(fastq_in))
+    assert len(records) == 25
+    assert [line for record in records for line in record] == lines
+
+
+def test_check_paired_records():
+    KeepRandomReads.check_paired_records((b'@A1 1\n', b'AC\n', b'+\n', b'II\n'), (b'@A1 2\n', b'GT\n', b'+\n', b'II\n'))
+    with pytest.raises(AssertionError):
+        KeepRandomReads.check_paired_records((b'@A1 1\n', b'AC\n', b'+\n', b'II\n'), (b'@A2 2\n', b'GT\n', b'+\n', b'II\n'))
+    with pytest.raises(AssertionError):
+        KeepRandomReads.check_paired_records((b'@A1 1\n', b'AC\n', b'+\n', b'II\n'), (b'A1 2\n', b'GT\n', b'+\n', b'II\n'))
+    with pytest.raises(AssertionError):
+        KeepRandomReads.check_paired_records((b'@A1 1\n', b'AC\n', b'+\n', b'II\n'), None)
+
+
+def test_reservoir_sample_small():
+    assert KeepRandomReads.reservoir_sample(range(5), 10) == [0, 1, 2, 3, 4]
+    assert KeepRandomReads.reservoir_sample(range(5), 0) == []
+
+
+def test_keeprandomreads_sample_singlepass_wrong_notselected(testdir, mock_testclass):
+    sample = 'sample'
+    write_gzip('sample_R1.fastq', sample + '_R1.fastq.gz')
+    with open(Path(__file__).parent.joinpath('sample_R2.fastq')) as fastq_in:
+        fastq2_lines = fastq_in.readlines()
+    fastq2_lines[-4] = '@B' + fastq2_lines[-4][2:]
+    with gzip.open(sample + '_R2.fastq.gz', 'wt') as zip_out:
+        for line in fastq2_lines:
+            zip_out.write(line)
+    with pytest.raises(AssertionError):
+        KeepRandomReads.keeprandomreads_sample(sample, 1, single_pass=True, seed=1)
+
+
+def test_keeprandomreads_sample_singlepass_different_lengths(testdir, mock_testclass):
+    sample = 'sample'
+    write_gzip('sample_R1.fastq', sample + '_R1.fastq.gz')
+    with open(Path(__file__).parent.joinpath('sample_R2.fastq')) as fastq_in:
+        fastq2_lines = fastq_in.readlines()
+    with gzip.open(sample + '_R2.fastq.gz', 'wt') as zip_out:
+        for line in fastq2_lines[:-4]:
+            zip_out.write(line)
+    with pytest.raises(AssertionError):
+        KeepRandomReads.keeprandomreads_sample(sample, 5, single_pass=True, seed=1)
+
+
+def test_copy_records(testdir):
+    fastq_lines = write_gzip('sample_R1.fastq', 'sample_R1.fastq.gz')
+    KeepRandomReads.copy_records('sample_R1.fastq.gz', 'output.fastq.gz', [0, 3, 24])
+    with gzip.open('output.fastq.gz', 'rt') as output_in:
+        assert output_in.readlines() == fastq_lines[0:4] + fastq_lines[12:16] + fastq_lines[96:100]
+    KeepRandomReads.copy_records('sample_R1.fastq.gz', 'output.fastq.gz', [])
+    with gzip.open('output.fastq.gz', 'rt') as output_in:
+        assert output_in.readlines() == []
@@ -1,4 +1,5 @@
 import os.path
+import random
 import shutil
 import subprocess
 from pathlib import Path
@@ -53,7 +54,18 @@ def test_keeprandomreads(mock_testclass):
     runner = CliRunner()
     result = runner.invoke(KeepRandomReadsBam.keeprandomreadsbam, ['--samples', samples])
     assert result.exit_code == 0
-    KeepRandomReadsBam.keeprandomreads_samples.assert_called_once_with(samples, 10000000, True, 1, '', '-random', None)
+    KeepRandomReadsBam.keeprandomreads_samples.assert_called_once_with(samples, 10000000, True, 1, '', '-random', None, False, None)
+
+
+def test_keeprandomreads_hash(mock_testclass):
+    samples = Path(__file__).parent.joinpath('samples.txt')
+    seed = 3
+    KeepRandomReadsBam.keeprandomreads_samples = MagicMock()
+    runner = CliRunner()
+    result = runner.invoke(KeepRandomReadsBam.keeprandomreadsbam, ['--samples', samples, '--hash', '--seed', seed])
+    assert result.exit_code == 0
+    KeepRandomReadsBam.keeprandomreads_samples.assert_called_once_with(samples, 10000000, True, 1, '', '-random', None,
+                                                                       True, seed)
 
 
 def test_keeprandomreads_parameters(mock_testclass):
@@ -70,7 +82,7 @@ def test_keeprandomreads_parameters(mock_testclass):
                             '--input-suffix', input_suffix, '--output-suffix', output_suffix, '--index', index])
     assert result.exit_code == 0
     KeepRandomReadsBam.keeprandomreads_samples.assert_called_once_with(samples, count, False, threads, input_suffix,
-                                                                       output_suffix, index)
+                                                                       output_suffix, index, False, None)
 
 
 def test_keeprandomreads_samplesnotexists(mock_testclass):
@@ -86,9 +98,9 @@ def test_keeprandomreads_samples(mock_testclass):
     samples = Path(__file__).parent.joinpath('samples.txt')
     KeepRandomReadsBam.keeprandomreads_sample = MagicMock()
     KeepRandomReadsBam.keeprandomreads_samples(samples)
-    KeepRandomReadsBam.keeprandomreads_sample.assert_any_call('POLR2A', 10000000, True, None, '', '-random')
-    KeepRandomReadsBam.keeprandomreads_sample.assert_any_call('ASDURF', 10000000, True, None, '', '-random')
-    KeepRandomReadsBam.keeprandomreads_sample.assert_any_call('POLR1C', 10000000, True, None, '', '-random')
+    KeepRandomReadsBam.keeprandomreads_sample.assert_any_call('POLR2A', 10000000, True, None, '', '-random', False, None)
+    KeepRandomReadsBam.keeprandomreads_sample.assert_any_call('ASDURF', 10000000, True, None, '', '-random', False, None)
+    KeepRandomReadsBam.keeprandomreads_sample.assert_any_call('POLR1C', 10000000, True, None, '', '-random', False, None)
 
 
 def test_keeprandomreads_samples_parameters(mock_testclass):
@@ -102,7 +114,7 @@ def test_keeprandomreads_samples_parameters(mock_testclass):
     KeepRandomReadsBam.keeprandomreads_sample = MagicMock()
     KeepRandomReadsBam.keeprandomreads_samples(samples, count, paired, threads, input_suffix, output_suffix, index)
     KeepRandomReadsBam.keeprandomreads_sample.assert_called_once_with('POLR2A', count, paired, threads, input_suffix,
-                                                                      output_suffix)
+                                                                      output_suffix, False, None)
 
 
 def test_keeprandomreads_sample_paired(testdir, mock_testclass):
@@ -221,3 +233,110 @@ def test_keeprandomreads_sample_unpaired_parameters(testdir, mock_testclass):
         expected_lines = source.readlines()
         for out_line in outsam:
             assert out_line in expected_lines
+
+
+def primary_alignments(bam):
+    with pysam.AlignmentFile(bam, 'rb') as inbam:
+        return [aln.to_string() for aln in inbam.fetch(until_eof=True) if
+                not aln.is_secondary and not aln.is_supplementary]
+
+
+def test_keeprandomreads_sample_hash(testdir, mock_testclass):
+    sample = 'POLR2A'
+    bam = sample + '.bam'
+    output = sample + '-random.bam'
+    count = 100
+    pysam.sort('-o', bam, str(Path(__file__).parent.joinpath('sample-big.sam')))
+    Bam.sort = MagicMock()
+    Bam.sort_by_readname = MagicMock()
+    KeepRandomReadsBam.keeprandomreads_sample(sample, count, hash_names=True)
+    Bam.sort.assert_not_called()
+    Bam.sort_by_readname.assert_not_called()
+    alignments = primary_alignments(bam)
+    output_alignments = primary_alignments(output)
+    with pysam.AlignmentFile(output, 'rb') as inbam:
+        reads = [aln for aln in inbam.fetch(until_eof=True)]
+    assert len([aln for aln in reads if aln.is_read1]) == count
+    assert len([aln for aln in reads if aln.is_read2]) == count
+    names = set([aln.query_name for aln in reads])
+    assert len(names) == count
+    assert output_alignments == [aln for aln in alignments if aln.split('\t')[0] in names]
+
+
+def test_keeprandomreads_sample_hash_seed(testdir, mock_testclass):
+    sample = 'POLR2A'
+    bam = sample + '.bam'
+    output = sample + '-random.bam'
+    count = 50
+    pysam.sort('-o', bam, str(Path(__file__).parent.joinpath('sample-big.sam')))
+    KeepRandomReadsBam.keeprandomreads_sample(sample, count, hash_names=True, seed=1)
+    first = primary_alignments(output)
+    KeepRandomReadsBam.keeprandomreads_sample(sample, count, hash_names=True, seed=1)
+    assert primary_alignments(output) == first
+    KeepRandomReadsBam.keeprandomreads_sample(sample, count, hash_names=True, seed=2)
+    assert primary_alignments(output) != first
+
+
+def test_keeprandomreads_sample_seed(testdir, mock_testclass):
+    sample = 'POLR2A'
+    bam = sample + '.bam'
+    output = sample + '-random.bam'
+    count = 50
+    pysam.sort('-o', bam, str(Path(__file__).parent.joinpath('sample-big-unpaired.sam')))
+    Bam.sort_by_readname = MagicMock(side_effect=sort_copy)
+    Bam.sort = MagicMock(side_effect=sort_copy)
+    random.seed(10)
+    state = random.getstate()
+    KeepRandomReadsBam.keeprandomreads_sample(sample, count, paired=False, seed=1)
+    assert random.getstate() == state
+    first = primary_alignments(output)
+    assert len(first) == count
+    KeepRandomReadsBam.keeprandomreads_sample(sample, count, paired=False, seed=1)
+    assert primary_alignments(output) == first
+    KeepRandomReadsBam.keeprandomreads_sample(sample, count, paired=False, seed=2)
+    assert primary_alignments(output) != first
+
+
+def test_keeprandomreads_sample_hash_threads(testdir, mock_testclass):
+    sample = 'POLR2A'
+    bam = sample + '.bam'
+    output = sample + '-random.bam'
+    count = 100
+    pysam.sort('-o', bam, str(Path(__file__).parent.joinpath('sample-big.sam')))
+    KeepRandomReadsBam.keeprandomreads_sample(sample, count, hash_names=True)
+    single = primary_alignments(output)
+    KeepRandomReadsBam.keeprandomreads_sample(sample, count, threads=3, hash_names=True)
+    assert primary_alignments(output) == single
+
+
+def test_keeprandomreads_sample_hash_all(testdir, mock_testclass):
+    sample = 'POLR2A'
+    bam = sample + '.bam'
+    output = sample + '-random.bam'
+    pysam.sort('-o', bam, str(Path(__file__).parent.joinpath('sample-big.sam')))
+    KeepRandomReadsBam.keeprandomreads_sample(sample, hash_names=True)
+    assert primary_alignments(output) == primary_alignments(bam)
+
+
+def test_keeprandomreads_sample_hash_unpaired(testdir, mock_testclass):
+    sample = 'POLR2A'
+    bam = sample + '.bam'
+    output = sample + '-random.bam'
+    count = 100
+    pysam.sort('-o', bam, str(Path(__file__).parent.joinpath('sample-big-unpaired.sam')))
+    KeepRandomReadsBam.keeprandomreads_sample(sample, count, False, hash_names=True)
+    assert len(primary_alignments(output)) == count
+
+
+def test_keeprandomreads_hash_topup(testdir, mock_testclass):
+    bam = 'POLR2A.bam'
+    output = 'POLR2A-random.bam'
+    count = 100
+    pysam.sort('-o', bam, str(Path(__file__).parent.joinpath('sample-big.sam')))
+    KeepRandomReadsBam.OVERSAMPLING = 0.2
+    try:
+        KeepRandomReadsBam.keeprandomreads_hash(bam, output, count)
+    finally:
+        KeepRandomReadsBam.OVERSAMPLING = 1.05
+    with pysam.AlignmentFile(output, 'rb') as inbam:
+        assert len([aln for aln in inbam.fetch(until_eof=True) if aln.is_read1]) == count
@@ -81,7 +81,6 @@ def test_merge_datasets_second(testdir, mock_testclass):
 
 def test_merge_dataset(testdir, mock_testclass):
     dataset = 'POLR2A'
-    dataset_bed_tmp = dataset + '-tmp.bed'
     dataset_bed = dataset + '.bed'
     sample1 = dataset + '_1'
     sample1_bed = sample1 + '.bed'
@@ -89,6 +88,67 @@ def test_merge_dataset(testdir, mock_testclass):
     sample2_bed = sample2 + '.bed'
     copyfile(Path(__file__).parent.joinpath('sample.bed'), sample1_bed)
     copyfile(Path(__file__).parent.joinpath('sample2.bed'), sample2_bed)
+    Bed.sort = MagicMock()
+    mb.merge_dataset(dataset, [sample1, sample2])
+    Bed.sort.assert_not_called()
+    with open(dataset_bed, 'r') as infile:
+        assert infile.readline() == 'chr1\t100\t150\ttest1\t1\t+\n'
+        assert infile.readline() == 'chr1\t200\t250\ttest1\t1\t+\n'
+        assert infile.readline() == 'chr2\t300\t350\ttest2\t2\t+\n'
+        assert infile.readline() == 'chr2\t400\t450\ttest2\t2\t+\n'
+        assert infile.readline() == 'chr3\t500\t650\ttest3\t3\t+\n'
+        assert infile.readline() == 'chr3\t600\t550\ttest3\t3\t+\n'
+        assert infile.readline() == 'chr4\t700\t850\ttest4\t4\t+\n'
+        assert infile.readline() == 'chr4\t800\t750\ttest4\t4\t+\n'
+        assert infile.readline() == 'chr5\t100\t150\ttest5\t1\t-\n'
+        assert infile.readline() == 'chr5\t200\t250\ttest5\t1\t-\n'
+        assert infile.readline() == 'chr6\t300\t350\ttest6\t2\t-\n'
+        assert infile.readline() == 'chr6\t400\t450\ttest6\t2\t-\n'
+        assert infile.readline() == 'chr7\t500\t650\ttest7\t3\t-\n'
+        assert infile.readline() == 'chr7\t600\t550\ttest7\t3\t-\n'
+        assert infile.readline() == 'chr8\t700\t850\ttest8\t4\t-\n'
+        assert infile.readline() == 'chr8\t800\t750\ttest8\t4\t-\n'
+        assert infile.readline() == ''
+
+
+def test_merge_dataset_trailingemptyline(testdir, mock_testclass):
+    dataset = 'POLR2A'
+    sample1 = dataset + '_1'
+    sample2 = dataset + '_2'
+    with open(sample1 + '.bed', 'w') as outfile:
+        outfile.write('chr1\t100\t150\ttest1\t1\t+\nchr2\t300\t350\ttest2\t2\t+\n\n')
+    with open(sample2 + '.bed', 'w') as outfile:
+        outfile.write('chr1\t200\t250\ttest1\t1\t+\n\n')
+    Bed.sort = MagicMock()
+    mb.merge_dataset(dataset, [sample1, sample2])
+    Bed.sort.assert_not_called()
+    with open(dataset + '.bed', 'r') as infile:
+        assert infile.readlines() == ['chr1\t100\t150\ttest1\t1\t+\n', 'chr1\t200\t250\ttest1\t1\t+\n',
+                                      'chr2\t300\t350\ttest2\t2\t+\n']
+
+
+def test_merge_dataset_shortline(testdir, mock_testclass):
+    dataset = 'POLR2A'
+    sample1 = dataset + '_1'
+    sample2 = dataset + '_2'
+    with open(sample1 + '.bed', 'w') as outfile:
+        outfile.write('chr1\t100\t150\ttest1\t1\t+\nchr2\n')
+    with open(sample2 + '.bed', 'w') as outfile:
+        outfile.write('chr1\t200\t250\ttest1\t1\t+\n')
+    Bed.sort = MagicMock(side_effect=create_file(['-o', dataset + '.bed']))
+    mb.merge_dataset(dataset, [sample1, sample2])
+    Bed.sort.assert_called_once_with(ANY, dataset + '.bed')
+
+
+def test_merge_dataset_unsorted(testdir, mock_testclass):
+    dataset = 'POLR2A'
+    dataset_bed = dataset + '.bed'
+    sample1 = dataset + '_1'
+    sample1_bed = sample1 + '.bed'
+    sample2 = dataset + '_2'
+    sample2_bed = sample2 + '.bed'
+    copyfile(Path(__file__).parent.joinpath('sample.bed'), sample1_bed)
+    copyfile(Path(__file__).parent.joinpath('sample-split.bed'), sample2_bed)
     Bed.sort = MagicMock(side_effect=create_file(['-o', dataset_bed]))
     os_remove = os.remove
     os.remove = MagicMock()
@@ -104,14 +164,23 @@ def test_merge_dataset(testdir, mock_testclass):
         assert infile.readline() == 'chr6\t400\t450\ttest6\t2\t-\n'
         assert infile.readline() == 'chr7\t500\t650\ttest7\t3\t-\n'
         assert infile.readline() == 'chr8\t800\t750\ttest8\t4\t-\n'
-        assert infile.readline() == 'chr1\t200\t250\ttest1\t1\t+\n'
-        assert infile.readline() == 'chr2\t300\t350\ttest2\t2\t+\n'
-        assert infile.readline() == 'chr3\t600\t550\ttest3\t3\t+\n'
-        assert infile.readline() == 'chr4\t700\t850\ttest4\t4\t+\n'
-        assert infile.readline() == 'chr5\t200\t250\ttest5\t1\t-\n'
-        assert infile.readline() == 'chr6\t300\t350\ttest6\t2\t-\n'
-        assert infile.readline() == 'chr7\t600\t550\ttest7\t3\t-\n'
-        assert infile.readline() == 'chr8\t700\t850\ttest8\t4\t-\n'
+        assert infile.readline() == 'chr2\t400\t450\ttest2\t2\t+\n'
+        assert infile.readline() == 'chr6\t400\t450\ttest6\t2\t-\n'
+        assert infile.readline() == 'chr4\t800\t900\ttest4\t4\t+\n'
+        assert infile.readline() == 'chr8\t800\t910\ttest8\t4\t-\n'
+        assert infile.readline() == 'chr5\t100\t220\ttest5\t1\t-\n'
+        assert infile.readline() == 'chr1\t100\t229\ttest1\t1\t+\n'
+        assert infile.readline() == 'chr3\t500\t650\ttest3\t3\t+\n'
+        assert infile.readline() == 'chr7\t500\t650\ttest7\t3\t-\n'
         assert infile.readline() == ''
     for remove_args in os.remove.call_args_list:
         os_remove(remove_args.args[0])
+
+
+def test_merge_sorted_unsorted(testdir, mock_testclass):
+    bed = 'in.bed'
+    with open(bed, 'w') as outfile:
+        outfile.write('chr1\t200\t250\n')
+        outfile.write('chr1\t100\t150\n')
+    with pytest.raises(ValueError):
+        mb.merge_sorted([bed], 'out.bed')
@@ -7,6 +7,8 @@ from unittest.mock import MagicMock, ANY
 
 import click
 from click.testing import CliRunner
+import numpy as np
+import pyBigWig as pbw
 import pytest
 
 from robtools import MergeBigwigs as mb
@@ -108,61 +110,32 @@ def test_merge_dataset(testdir, mock_testclass):
     copyfile(Path(__file__).parent.joinpath('sample.bw'), sample1_bw)
     copyfile(Path(__file__).parent.joinpath('sample2.bw'), sample2_bw)
     Bed.sort = MagicMock()
-    Bed.bedgraph_to_bigwig = MagicMock(side_effect=create_file(['-o', dataset_bw]))
-    os_remove = os.remove
-    os.remove = MagicMock()
+    Bed.bedgraph_to_bigwig = MagicMock()
     mb.merge_dataset(dataset, [sample1, sample2], sizes)
-    Bed.sort.assert_called_once_with(ANY, ANY)
-    Bed.bedgraph_to_bigwig.assert_called_once_with(ANY, dataset_bw, sizes)
-    assert Bed.sort.call_args.args[1] == Bed.bedgraph_to_bigwig.call_args.args[0]
+    Bed.sort.assert_not_called()
+    Bed.bedgraph_to_bigwig.assert_not_called()
     assert os.path.exists(dataset_bw)
-    with open(Bed.sort.call_args.args[0], 'r') as infile:
-        assert infile.readline() == 'track type=bedGraph name="POLR2A"\n'
-        assert infile.readline() == 'chrI\t0\t1\t0\n'
-        assert infile.readline() == 'chrI\t1\t2\t0\n'
-        line = infile.readline()
-        assert len(line.split('\t')) == 4
-        assert line.startswith('chrI\t2\t3\t'), line
-        assert math.isclose(float(line.split('\t')[3]), 0.1, abs_tol=0.001), line.split('\t')[3]
-        line = infile.readline()
-        assert len(line.split('\t')) == 4
-        assert line.startswith('chrI\t3\t4\t'), line
-        assert math.isclose(float(line.split('\t')[3]), 0.7, abs_tol=0.001), line.split('\t')[3]
-        assert infile.readline() == 'chrI\t4\t5\t0\n'
-        line = infile.readline()
-        assert len(line.split('\t')) == 4
-        assert line.startswith('chrI\t5\t6\t'), line
-        assert math.isclose(float(line.split('\t')[3]), 0.7, abs_tol=0.001), line.split('\t')[3]
-        line = infile.readline()
-        assert len(line.split('\t')) == 4
-        assert line.startswith('chrI\t6\t7\t'), line
-        assert math.isclose(float(line.split('\t')[3]), 0.5, abs_tol=0.001), line.split('\t')[3]
-        line = infile.readline()
-        assert len(line.split('\t')) == 4
-        assert line.startswith('chrI\t7\t8\t'), line
-        assert math.isclose(float(line.split('\t')[3]), 0.5, abs_tol=0.001), line.split('\t')[3]
-        assert infile.readline() == 'chrI\t8\t9\t0\n'
-        line = infile.readline()
-        assert len(line.split('\t')) == 4
-        assert line.startswith('chrI\t9\t10\t'), line
-        assert math.isclose(float(line.split('\t')[3]), 0.6, abs_tol=0.001), line.split('\t')[3]
-        line = infile.readline()
-        assert len(line.split('\t')) == 4
-        assert line.startswith('chrI\t10\t11\t'), line
-        assert math.isclose(float(line.split('\t')[3]), 0.8, abs_tol=0.001), line.split('\t')[3]
-        line = infile.readline()
-        assert len(line.split('\t')) == 4
-        assert line.startswith('chrI\t11\t12\t'), line
-        assert math.isclose(float(line.split('\t')[3]), 0.7, abs_tol=0.001), line.split('\t')[3]
-        line = infile.readline()
-        assert len(line.split('\t')) == 4
-        assert line.startswith('chrI\t12\t13\t'), line
-        assert math.isclose(float(line.split('\t')[3]), 0.6, abs_tol=0.001), line.split('\t')[3]
-        line = infile.readline()
-        assert len(line.split('\t')) == 4
-        assert line.startswith('chrI\t13\t14\t'), line
-        assert math.isclose(float(line.split('\t')[3]), 0.6, abs_tol=0.001), line.split('\t')[3]
-        assert infile.readline() == 'chrI\t14\t15\t0\n'
-        assert infile.readline() == ''
-    for remove_args in os.remove.call_args_list:
-        os_remove(remove_args.args[0])
+    bw = pbw.open(dataset_bw)
+    assert bw.chroms() == {'chrI': 15}
+    intervals = bw.intervals('chrI')
+    bw.close()
+    expected = [(0, 2, 0), (2, 3, 0.1), (3, 4, 0.7), (4, 5, 0), (5, 6, 0.7), (6, 8, 0.5), (8, 9, 0), (9, 10, 0.6),
+                (10, 11, 0.8), (11, 12, 0.7), (12, 14, 0.6), (14, 15, 0)]
+    assert len(intervals) == len(expected), intervals
+    for interval, expected_interval in zip(intervals, expected):
+        assert interval[:2] == expected_interval[:2], intervals
+        assert math.isclose(interval[2], expected_interval[2], abs_tol=0.001), intervals
+
+
+def test_run_lengths(testdir, mock_testclass):
+    starts, ends, values = mb.run_lengths(np.array([0.0, 0.0, 1.5, 1.5, 1.5, 0.0, 2.0]))
+    assert starts.tolist() == [0, 2, 5, 6]
+    assert ends.tolist() == [2, 5, 6, 7]
+    assert values.tolist() == [0.0, 1.5, 0.0, 2.0]
+
+
+def test_run_lengths_empty(testdir, mock_testclass):
+    starts, ends, values = mb.run_lengths(np.array([]))
+    assert len(starts) == 0
+    assert len(ends) == 0
+    assert len(values) == 0
@@ -1,7 +1,9 @@
 import gzip
 import os
 import shutil
+import signal
 import subprocess
+import time
 from pathlib import Path
 from unittest.mock import MagicMock, ANY
 
@@ -18,16 +20,27 @@ def mock_testclass():
     pairs2hic_ = Pairs2Hic.pairs2hic_
     pairs_to_hic = Pairs2Hic.pairs_to_hic
     pairs_to_medium = Pairs2Hic.pairs_to_medium
+    medium_to_hic = Pairs2Hic.medium_to_hic
+    convert_all = Pairs2Hic.convert_all
     resolve = Pairs2Hic.resolve
     merge_pairs = Pairs2Hic.merge_pairs
     sbatch_memory = Pairs2Hic.sbatch_memory
     run = subprocess.run
+    popen = subprocess.Popen
     os_remove = os.remove
+    write_medium = Pairs2Hic.write_medium
+    blocks = Pairs2Hic.blocks
     yield
+    Pairs2Hic.JUICERS.clear()
     Pairs2Hic.pairs2hic_ = pairs2hic_
     Pairs2Hic.pairs_to_hic = pairs_to_hic
     subprocess.run = run
+    subprocess.Popen = popen
     Pairs2Hic.pairs_to_medium = pairs_to_medium
+    Pairs2Hic.medium_to_hic = medium_to_hic
+    Pairs2Hic.convert_all = convert_all
+    Pairs2Hic.write_medium = write_medium
+    Pairs2Hic.blocks = blocks
     Pairs2Hic.resolve = resolve
     Pairs2Hic.merge_pairs = merge_pairs
     Pairs2Hic.sbatch_memory = sbatch_memory
@@ -36,13 +49,17 @@ def mock_testclass():
         del os.environ[SBATCH_JAVA_MEM_ENV]
 
 
-def copy_sort(*args, **kwargs):
-    to_sort = args[0][len(args[0]) - 1]
-    output = args[0][args[0].index('-o') + 1]
-    with open(to_sort) as to_sort_in, open(output, 'w') as output_out:
-        lines = to_sort_in.readlines()
-        for i in range(0, len(lines)):
-            output_out.write(lines[len(lines) - i - 1])
+def create_pairs(pairs, source="CJ1_MicroC_WT.pairs"):
+    with open(Path(__file__).parent.joinpath(source)) as pairs_in, gzip.open(pairs, 'wt') as pairs_out:
+        for line in pairs_in:
+            pairs_out.write(line)
+
+
+def juicer_pre(popen):
+    def run_juicer(cmd, *args, **kwargs):
+        return popen(['sh', '-c', 'cat "$0" > juicer-input.tsv', cmd[-3]])
+
+    return run_juicer
 
 
 def test_pairs2hic(testdir, mock_testclass):
@@ -54,7 +71,7 @@ def test_pairs2hic(testdir, mock_testclass):
     result = runner.invoke(Pairs2Hic.pairs2hic, ["--project", project])
     print(result.output)
     assert result.exit_code == 0
-    Pairs2Hic.pairs2hic_.assert_called_once_with(project, "juicer_tools.jar", "*.nodups", None, None, ())
+    Pairs2Hic.pairs2hic_.assert_called_once_with(project, "juicer_tools.jar", "*.nodups", None, None, (), False, 1, 1, None, False)
 
 
 def test_pairs2hic_parameters(testdir, mock_testclass):
@@ -69,11 +86,12 @@ def test_pairs2hic_parameters(testdir, mock_testclass):
     runner = CliRunner()
     result = runner.invoke(Pairs2Hic.pairs2hic,
                            ["--project", project, "--juicer", juicer, "--input-suffix", input_suffix, "--output-suffix",
-                            output_suffix, "--output-folder", output_folder, "-m", "30"])
+                            output_suffix, "--output-folder", output_folder, "--merged-pairs", "--threads", "4",
+                            "--jobs", "3", "--temp-folder", output_folder, "--stream", "-m", "30"])
     print(result.output)
     assert result.exit_code == 0
     Pairs2Hic.pairs2hic_.assert_called_once_with(project, juicer, input_suffix, output_suffix, output_folder,
-                                                 ("-m", "30"))
+                                                 ("-m", "30"), True, 4, 3, output_folder, True)
 
 
 def test_pairs2hic_projectnotexists(testdir, mock_testclass):
@@ -127,21 +145,15 @@ def test_pairs2hic_(testdir, mock_testclass):
     chromosome_sizes = "sacCer3.chrom.sizes"
     Path(chromosome_sizes).touch()
     output_folder = "."
-    Pairs2Hic.pairs_to_hic = MagicMock()
+    Pairs2Hic.convert_all = MagicMock()
     Pairs2Hic.resolve = MagicMock(side_effect=[chromosome_sizes, pairs1, pairs2, pairs1, pairs2])
-    Pairs2Hic.merge_pairs = MagicMock()
     Pairs2Hic.pairs2hic_(project, juicer)
     Pairs2Hic.resolve.assert_any_call(chromosome_sizes, [''])
     Pairs2Hic.resolve.assert_any_call("CJ1_MicroC_WT*.nodups.pairs.gz", [''])
     Pairs2Hic.resolve.assert_any_call("CJ2_MicroC_FACT*.nodups.pairs.gz", [''])
-    Pairs2Hic.merge_pairs.assert_called_once_with([pairs1, pairs2], ANY)
-    Pairs2Hic.pairs_to_hic.assert_any_call(pairs1, os.path.join(output_folder, hic1), resolutions, chromosome_sizes,
-                                           juicer, ())
-    Pairs2Hic.pairs_to_hic.assert_any_call(pairs2, os.path.join(output_folder, hic2), resolutions, chromosome_sizes,
-                                           juicer, ())
-    Pairs2Hic.pairs_to_hic.assert_any_call(ANY, os.path.join(output_folder, hic3), resolutions, chromosome_sizes,
-                                           juicer, ())
-    assert Pairs2Hic.pairs_to_hic.call_args_list[2].args[0] == Pairs2Hic.merge_pairs.call_args_list[0].args[1]
+    Pairs2Hic.convert_all.assert_called_once_with(
+        {os.path.join(output_folder, hic1): pairs1, os.path.join(output_folder, hic2): pairs2},
+        {os.path.join(output_folder, hic3): [pairs1, pairs2]}, {}, ANY, resolutions, chromosome_sizes, juicer, (), 1, 1, False)
 
 
 def test_pairs2hic__projectinsiblingdir(testdir, mock_testclass):
@@ -164,21 +176,15 @@ def test_pairs2hic__projectinsiblingdir(testdir, mock_testclass):
     chromosome_sizes = "sacCer3.chrom.sizes"
     Path(chromosome_sizes).touch()
     output_folder = "."
-    Pairs2Hic.pairs_to_hic = MagicMock()
+    Pairs2Hic.convert_all = MagicMock()
     Pairs2Hic.resolve = MagicMock(side_effect=[chromosome_sizes, pairs1, pairs2, pairs1, pairs2])
-    Pairs2Hic.merge_pairs = MagicMock()
     Pairs2Hic.pairs2hic_(project, juicer)
     Pairs2Hic.resolve.assert_any_call(chromosome_sizes, ['../project', ''])
     Pairs2Hic.resolve.assert_any_call("CJ1_MicroC_WT*.nodups.pairs.gz", ['../project', ''])
     Pairs2Hic.resolve.assert_any_call("CJ2_MicroC_FACT*.nodups.pairs.gz", ['../project', ''])
-    Pairs2Hic.merge_pairs.assert_called_once_with([pairs1, pairs2], ANY)
-    Pairs2Hic.pairs_to_hic.assert_any_call(pairs1, os.path.join(output_folder, hic1), resolutions, chromosome_sizes,
-                                           juicer, ())
-    Pairs2Hic.pairs_to_hic.assert_any_call(pairs2, os.path.join(output_folder, hic2), resolutions, chromosome_sizes,
-                                           juicer, ())
-    Pairs2Hic.pairs_to_hic.assert_any_call(ANY, os.path.join(output_folder, hic3), resolutions, chromosome_sizes,
-                                           juicer, ())
-    assert Pairs2Hic.pairs_to_hic.call_args_list[2].args[0] == Pairs2Hic.merge_pairs.call_args_list[0].args[1]
+    Pairs2Hic.convert_all.assert_called_once_with(
+        {os.path.join(output_folder, hic1): pairs1, os.path.join(output_folder, hic2): pairs2},
+        {os.path.join(output_folder, hic3): [pairs1, pairs2]}, {}, ANY, resolutions, chromosome_sizes, juicer, (), 1, 1, False)
 
 
 def test_pairs2hic__relativegenome(testdir, mock_testclass):
@@ -202,21 +208,15 @@ def test_pairs2hic__relativegenome(testdir, mock_testclass):
     os.mkdir("../project/sacCer3")
     Path("../project/sacCer3/" + chromosome_sizes).touch()
     output_folder = "."
-    Pairs2Hic.pairs_to_hic = MagicMock()
+    Pairs2Hic.convert_all = MagicMock()
     Pairs2Hic.resolve = MagicMock(side_effect=[chromosome_sizes, pairs1, pairs2, pairs1, pairs2])
-    Pairs2Hic.merge_pairs = MagicMock()
     Pairs2Hic.pairs2hic_(project, juicer)
     Pairs2Hic.resolve.assert_any_call(chromosome_sizes, ['../project/sacCer3', '../project', ''])
     Pairs2Hic.resolve.assert_any_call("CJ1_MicroC_WT*.nodups.pairs.gz", ['../project', ''])
     Pairs2Hic.resolve.assert_any_call("CJ2_MicroC_FACT*.nodups.pairs.gz", ['../project', ''])
-    Pairs2Hic.merge_pairs.assert_called_once_with([pairs1, pairs2], ANY)
-    Pairs2Hic.pairs_to_hic.assert_any_call(pairs1, os.path.join(output_folder, hic1), resolutions, chromosome_sizes,
-                                           juicer, ())
-    Pairs2Hic.pairs_to_hic.assert_any_call(pairs2, os.path.join(output_folder, hic2), resolutions, chromosome_sizes,
-                                           juicer, ())
-    Pairs2Hic.pairs_to_hic.assert_any_call(ANY, os.path.join(output_folder, hic3), resolutions, chromosome_sizes,
-                                           juicer, ())
-    assert Pairs2Hic.pairs_to_hic.call_args_list[2].args[0] == Pairs2Hic.merge_pairs.call_args_list[0].args[1]
+    Pairs2Hic.convert_all.assert_called_once_with(
+        {os.path.join(output_folder, hic1): pairs1, os.path.join(output_folder, hic2): pairs2},
+        {os.path.join(output_folder, hic3): [pairs1, pairs2]}, {}, ANY, resolutions, chromosome_sizes, juicer, (), 1, 1, False)
 
 
 def test_pairs2hic__parameters(testdir, mock_testclass):
@@ -238,21 +238,42 @@ def test_pairs2hic__parameters(testdir, mock_testclass):
     Path(chromosome_sizes).touch()
     output_folder = "output-folder"
     os.mkdir(output_folder)
-    Pairs2Hic.pairs_to_hic = MagicMock()
+    Pairs2Hic.convert_all = MagicMock()
     Pairs2Hic.resolve = MagicMock(side_effect=[chromosome_sizes, pairs1, pairs2, pairs1, pairs2])
-    Pairs2Hic.merge_pairs = MagicMock()
     Pairs2Hic.pairs2hic_(project, juicer, input_suffix, output_suffix, output_folder, ("-m", "30"))
     Pairs2Hic.resolve.assert_any_call(chromosome_sizes, [str(project_folder), ''])
     Pairs2Hic.resolve.assert_any_call("CJ1_MicroC_WT*.dups.pairs.gz", [str(project_folder), ''])
     Pairs2Hic.resolve.assert_any_call("CJ2_MicroC_FACT*.dups.pairs.gz", [str(project_folder), ''])
-    Pairs2Hic.merge_pairs.assert_called_once_with([pairs1, pairs2], ANY)
-    Pairs2Hic.pairs_to_hic.assert_any_call(pairs1, os.path.join(output_folder, hic1), resolutions, chromosome_sizes,
-                                           juicer, ("-m", "30"))
-    Pairs2Hic.pairs_to_hic.assert_any_call(pairs2, os.path.join(output_folder, hic2), resolutions, chromosome_sizes,
-                                           juicer, ("-m", "30"))
-    Pairs2Hic.pairs_to_hic.assert_any_call(ANY, os.path.join(output_folder, hic3), resolutions, chromosome_sizes,
-                                           juicer, ("-m", "30"))
-    assert Pairs2Hic.pairs_to_hic.call_args_list[2].args[0] == Pairs2Hic.merge_pairs.call_args_list[0].args[1]
+    Pairs2Hic.convert_all.assert_called_once_with(
+        {os.path.join(output_folder, hic1): pairs1, os.path.join(output_folder, hic2): pairs2},
+        {os.path.join(output_folder, hic3): [pairs1, pairs2]}, {}, ANY, resolutions, chromosome_sizes, juicer, ("-m", "30"), 1, 1, False)
+
+
+def test_pairs2hic__mergedpairs(testdir, mock_testclass):
+    project = "project.yml"
+    shutil.copy(Path(__file__).parent.joinpath("project.yml"), project)
+    juicer = "juicer_tools.jar"
+    Path(juicer).touch()
+    pairs1 = "CJ1_MicroC_WT.nodups.pairs.gz"
+    Path(pairs1).touch()
+    pairs2 = "CJ2_MicroC_FACT.nodups.pairs.gz"
+    Path(pairs2).touch()
+    merged = "all_libraries-mapq30.pairs.gz"
+    hic3 = "all_libraries-mapq30.hic"
+    resolutions = [10000, 5000, 2000, 1000, 500, 200, 100, 50, 20, 10]
+    chromosome_sizes = "sacCer3.chrom.sizes"
+    Path(chromosome_sizes).touch()
+    output_folder = "output-folder"
+    os.mkdir(output_folder)
+    Pairs2Hic.convert_all = MagicMock()
+    Pairs2Hic.resolve = MagicMock(side_effect=[chromosome_sizes, pairs1, pairs2, pairs1, pairs2])
+    Pairs2Hic.pairs2hic_(project, juicer, output_suffix="-mapq30", output_folder=output_folder, merged_pairs=True,
+                         threads=4, jobs=3, stream=True)
+    Pairs2Hic.convert_all.assert_called_once_with(
+        {os.path.join(output_folder, "CJ1_MicroC_WT-mapq30.hic"): pairs1,
+         os.path.join(output_folder, "CJ2_MicroC_FACT-mapq30.hic"): pairs2},
+        {os.path.join(output_folder, hic3): [pairs1, pairs2]}, {os.path.join(output_folder, merged): [pairs1, pairs2]},
+        ANY, resolutions, chromosome_sizes, juicer, (), 4, 3, True)
 
 
 def test_pairs2hic__projecterror(testdir, mock_testclass):
@@ -266,9 +287,8 @@ def test_pairs2hic__projecterror(testdir, mock_testclass):
     Path(pairs2).touch()
     chromosome_sizes = "sacCer3.chrom.sizes"
     Path(chromosome_sizes).touch()
-    Pairs2Hic.pairs_to_hic = MagicMock()
+    Pairs2Hic.convert_all = MagicMock()
     Pairs2Hic.resolve = MagicMock(side_effect=[chromosome_sizes, pairs1, pairs2, pairs1, pairs2])
-    Pairs2Hic.merge_pairs = MagicMock()
     with pytest.raises(ScannerError):
         Pairs2Hic.pairs2hic_(project, juicer)
 
@@ -284,9 +304,8 @@ def test_pairs2hic__chromosomesizesnotexists(testdir, mock_testclass):
     Path(pairs2).touch()
     chromosome_sizes = "sacCer3.chrom.sizes"
     Path(chromosome_sizes).touch()
-    Pairs2Hic.pairs_to_hic = MagicMock()
+    Pairs2Hic.convert_all = MagicMock()
     Pairs2Hic.resolve = MagicMock(side_effect=[None, pairs1, pairs2, pairs1, pairs2])
-    Pairs2Hic.merge_pairs = MagicMock()
     with pytest.raises(SystemExit) as sys_exit:
         Pairs2Hic.pairs2hic_(project, juicer)
     assert sys_exit.type == SystemExit
@@ -303,39 +322,152 @@ def test_pairs2hic__pairs2notexists(testdir, mock_testclass):
     hic1 = "CJ1_MicroC_WT.hic"
     pairs2 = "CJ2_MicroC_FACT.pairs.gz"
     Path(pairs2).touch()
-    hic2 = "CJ2_MicroC_FACT.hic"
     resolutions = [10000, 5000, 2000, 1000, 500, 200, 100, 50, 20, 10]
     chromosome_sizes = "sacCer3.chrom.sizes"
     Path(chromosome_sizes).touch()
     output_folder = "."
-    Pairs2Hic.pairs_to_hic = MagicMock()
+    Pairs2Hic.convert_all = MagicMock()
     Pairs2Hic.resolve = MagicMock(side_effect=[chromosome_sizes, pairs1, None, pairs1, None])
-    Pairs2Hic.merge_pairs = MagicMock()
     Pairs2Hic.pairs2hic_(project, juicer)
     Pairs2Hic.resolve.assert_any_call(chromosome_sizes, [''])
     Pairs2Hic.resolve.assert_any_call("CJ1_MicroC_WT*.nodups.pairs.gz", [''])
     Pairs2Hic.resolve.assert_any_call("CJ2_MicroC_FACT*.nodups.pairs.gz", [''])
-    Pairs2Hic.pairs_to_hic.assert_called_once_with(pairs1, os.path.join(output_folder, hic1), resolutions,
-                                                   chromosome_sizes, juicer, ())
+    Pairs2Hic.convert_all.assert_called_once_with({os.path.join(output_folder, hic1): pairs1}, {}, {}, ANY,
+                                                  resolutions, chromosome_sizes, juicer, (), 1, 1, False)
+
+
+def touch_medium(pairs, medium):
+    Path(medium).touch()
+
+
+def test_convert_all(testdir, mock_testclass):
+    folder = "medium"
+    os.mkdir(folder)
+    resolutions = [10000, 5000]
+    chromosome_sizes = "sacCer3.chrom.sizes"
+    juicer = "juicer_tools.jar"
+    mediums = []
+    Pairs2Hic.pairs_to_medium = MagicMock(side_effect=lambda pairs, medium: mediums.append(
+        sorted(os.listdir(folder))) or Path(medium).touch())
+    Pairs2Hic.medium_to_hic = MagicMock()
+    Pairs2Hic.pairs_to_hic = MagicMock()
+    Pairs2Hic.merge_pairs = MagicMock()
+    Pairs2Hic.convert_all({"s1.hic": "s1.pairs.gz", "s2.hic": "s2.pairs.gz", "s3.hic": "s3.pairs.gz"},
+                          {"g1.hic": ["s1.pairs.gz", "s2.pairs.gz"], "g2.hic": ["s2.pairs.gz", "s4.pairs.gz"]},
+                          {"g1.pairs.gz": ["s1.pairs.gz", "s2.pairs.gz"]}, folder, resolutions, chromosome_sizes,
+                          juicer, ("-m", "30"), 4, 2, True)
+    medium1 = os.path.join(folder, "0.medium.tsv")
+    medium2 = os.path.join(folder, "1.medium.tsv")
+    assert Pairs2Hic.pairs_to_medium.call_count == 4
+    assert Pairs2Hic.pairs_to_medium.call_args_list[0].args == ("s1.pairs.gz", medium1)
+    assert Pairs2Hic.pairs_to_medium.call_args_list[1].args == ("s2.pairs.gz", medium2)
+    assert sorted([call.args for call in Pairs2Hic.pairs_to_medium.call_args_list[2:]]) == [
+        ("s2.pairs.gz", medium1), ("s4.pairs.gz", medium2)]
+    assert all(len(files) <= 1 for files in mediums)
+    Pairs2Hic.pairs_to_hic.assert_called_once_with("s3.pairs.gz", "s3.hic", resolutions, chromosome_sizes, juicer,
+                                                   ("-m", "30"), 2, True, folder)
+    Pairs2Hic.merge_pairs.assert_called_once_with(["s1.pairs.gz", "s2.pairs.gz"], "g1.pairs.gz", 4)
+    assert Pairs2Hic.medium_to_hic.call_count == 4
+    Pairs2Hic.medium_to_hic.assert_any_call(medium1, "s1.hic", resolutions, chromosome_sizes, juicer, ("-m", "30"), 2)
+    Pairs2Hic.medium_to_hic.assert_any_call(medium2, "s2.hic", resolutions, chromosome_sizes, juicer, ("-m", "30"), 2)
+    Pairs2Hic.medium_to_hic.assert_any_call([medium1, medium2], "g1.hic", resolutions, chromosome_sizes, juicer,
+                                            ("-m", "30"), 2, True, folder)
+    Pairs2Hic.medium_to_hic.assert_any_call([medium1, medium2], "g2.hic", resolutions, chromosome_sizes, juicer,
+                                            ("-m", "30"), 2, True, folder)
+    assert os.listdir(folder) == []
+
+
+def test_convert_all_onejob(testdir, mock_testclass):
+    folder = "medium"
+    os.mkdir(folder)
+    resolutions = [10000, 5000]
+    chromosome_sizes = "sacCer3.chrom.sizes"
+    juicer = "juicer_tools.jar"
+    Pairs2Hic.pairs_to_medium = MagicMock()
+    Pairs2Hic.medium_to_hic = MagicMock()
+    Pairs2Hic.pairs_to_hic = MagicMock()
+    Pairs2Hic.merge_pairs = MagicMock()
+    Pairs2Hic.convert_all({"s1.hic": "s1.pairs.gz", "s2.hic": "s2.pairs.gz"},
+                          {"g1.hic": ["s1.pairs.gz", "s2.pairs.gz"]}, {"g1.pairs.gz": ["s1.pairs.gz", "s2.pairs.gz"]},
+                          folder, resolutions, chromosome_sizes, juicer, (), 4, 1)
+    Pairs2Hic.pairs_to_medium.assert_not_called()
+    Pairs2Hic.medium_to_hic.assert_not_called()
+    assert Pairs2Hic.pairs_to_hic.call_count == 3
+    Pairs2Hic.pairs_to_hic.assert_any_call("s1.pairs.gz", "s1.hic", resolutions, chromosome_sizes, juicer, (), 1,
+                                           False, folder)
+    Pairs2Hic.pairs_to_hic.assert_any_call("s2.pairs.gz", "s2.hic", resolutions, chromosome_sizes, juicer, (), 1,
+                                           False, folder)
+    Pairs2Hic.pairs_to_hic.assert_any_call(["s1.pairs.gz", "s2.pairs.gz"], "g1.hic", resolutions, chromosome_sizes,
+                                           juicer, (), 1, False, folder)
+    Pairs2Hic.merge_pairs.assert_called_once_with(["s1.pairs.gz", "s2.pairs.gz"], "g1.pairs.gz", 4)
+
+
+def test_convert_all_groupwaitsmedium(testdir, mock_testclass):
+    folder = "medium"
+    os.mkdir(folder)
+    order = []
+    Pairs2Hic.pairs_to_medium = MagicMock(side_effect=lambda pairs, medium: order.append(pairs) or Path(medium).touch())
+    Pairs2Hic.medium_to_hic = MagicMock(side_effect=lambda medium, hic, *args: order.append(hic))
+    Pairs2Hic.convert_all({"s1.hic": "s1.pairs.gz"}, {"g1.hic": ["s1.pairs.gz", "s2.pairs.gz"]}, {}, folder,
+                          [10000], "sacCer3.chrom.sizes", jobs=2)
+    assert order.index("g1.hic") > order.index("s1.pairs.gz")
+    assert order.index("g1.hic") > order.index("s2.pairs.gz")
+    assert order.index("s1.hic") > order.index("s1.pairs.gz")
+    assert os.listdir(folder) == []
+
+
+def test_convert_all_error(testdir, mock_testclass):
+    folder = "medium"
+    os.mkdir(folder)
+    Pairs2Hic.pairs_to_medium = MagicMock(side_effect=subprocess.CalledProcessError(1, "pigz"))
+    Pairs2Hic.medium_to_hic = MagicMock()
+    with pytest.raises(subprocess.CalledProcessError):
+        Pairs2Hic.convert_all({"s1.hic": "s1.pairs.gz"}, {"g1.hic": ["s1.pairs.gz", "s2.pairs.gz"]}, {}, folder,
+                              [10000], "sacCer3.chrom.sizes", jobs=2)
+    Pairs2Hic.medium_to_hic.assert_not_called()
+
+
+def test_convert_all_errorterminatesjuicers(testdir, mock_testclass):
+    folder = "medium"
+    os.mkdir(folder)
+    returncodes = []
+
+    def run_juicer(*args):
+        returncodes.append(Pairs2Hic.wait_juicer(Pairs2Hic.start_juicer(["sleep", "60"])))
+
+    def fail_when_juicer_runs(*args):
+        while not Pairs2Hic.JUICERS:
+            time.sleep(0.01)
+        raise ValueError("Pairs lines must have at least 10 columns")
+
+    Pairs2Hic.pairs_to_hic = MagicMock(side_effect=run_juicer)
+    Pairs2Hic.pairs_to_medium = MagicMock(side_effect=fail_when_juicer_runs)
+    with pytest.raises(ValueError):
+        Pairs2Hic.convert_all({"s1.hic": "s1.pairs.gz"}, {"g1.hic": ["s2.pairs.gz"]}, {}, folder, [10000],
+                              "sacCer3.chrom.sizes", jobs=2)
+    assert returncodes == [-signal.SIGTERM]
+    assert not Pairs2Hic.JUICERS
 
 
 def test_pairs_to_hic(testdir, mock_testclass):
     juicer = "juicer_tools.jar"
     Path(juicer).touch()
     pairs = "CJ1_MicroC_WT.pairs.gz"
-    Path(pairs).touch()
+    create_pairs(pairs)
     hic = "CJ1_MicroC_WT.hic"
     resolutions = [10000, 5000, 2000, 1000, 500, 200, 100, 50, 20, 10]
     chromosome_sizes = "sacCer3.chrom.sizes"
     Path(chromosome_sizes).touch()
-    Pairs2Hic.pairs_to_medium = MagicMock()
-    subprocess.run = MagicMock()
+    Pairs2Hic.pairs_to_medium(pairs, "expected.tsv")
+    subprocess.Popen = MagicMock(side_effect=juicer_pre(subprocess.Popen))
     Pairs2Hic.pairs_to_hic(pairs, hic, resolutions, chromosome_sizes)
-    Pairs2Hic.pairs_to_medium.assert_called_once_with(pairs, ANY)
-    subprocess.run.assert_called_once_with(
+    subprocess.Popen.assert_called_once_with(
         ["java", "-jar", juicer, "pre", "-r", ','.join([str(resolution) for resolution in resolutions]), ANY, hic,
-         chromosome_sizes], check=True)
-    assert subprocess.run.call_args_list[0].args[0][6] == Pairs2Hic.pairs_to_medium.call_args_list[0].args[1]
+         chromosome_sizes])
+    medium = subprocess.Popen.call_args_list[0].args[0][6]
+    assert not os.path.exists(medium)
+    with open("juicer-input.tsv") as juicer_in, open("expected.tsv") as expected_in:
+        assert juicer_in.read() == expected_in.read()
 
 
 def test_pairs_to_hic_parameters(testdir, mock_testclass):
@@ -343,42 +475,183 @@ def test_pairs_to_hic_parameters(testdir, mock_testclass):
     Path(juicer).touch()
     juicer_args = ("-m", "30")
     pairs = "CJ1_MicroC_WT.pairs.gz"
-    Path(pairs).touch()
+    create_pairs(pairs)
     hic = "CJ1_MicroC_WT.hic"
     resolutions = [10000, 5000, 2000, 1000, 500, 200, 100, 50, 20, 10]
     chromosome_sizes = "sacCer3.chrom.sizes"
     Path(chromosome_sizes).touch()
-    Pairs2Hic.pairs_to_medium = MagicMock()
-    subprocess.run = MagicMock()
+    subprocess.Popen = MagicMock(side_effect=juicer_pre(subprocess.Popen))
     Pairs2Hic.pairs_to_hic(pairs, hic, resolutions, chromosome_sizes, juicer, juicer_args)
-    Pairs2Hic.pairs_to_medium.assert_called_once_with(pairs, ANY)
-    subprocess.run.assert_called_once_with(
+    subprocess.Popen.assert_called_once_with(
         ["java", "-jar", juicer, "pre", "-m", "30", "-r", ','.join([str(resolution) for resolution in resolutions]),
-         ANY, hic, chromosome_sizes], check=True)
-    assert subprocess.run.call_args_list[0].args[0][8] == Pairs2Hic.pairs_to_medium.call_args_list[0].args[1]
+         ANY, hic, chromosome_sizes])
+    with open("juicer-input.tsv") as juicer_in:
+        assert juicer_in.readline() == ".\t0\tchrI\t1\t0\t1\tchrI\t62\t1\t41\t41\n"
 
 
 def test_pairs_to_hic_sbatchmemenv(testdir, mock_testclass):
     juicer = "juicer_tools.jar"
     Path(juicer).touch()
     pairs = "CJ1_MicroC_WT.pairs.gz"
-    Path(pairs).touch()
+    create_pairs(pairs)
     hic = "CJ1_MicroC_WT.hic"
     resolutions = [10000, 5000, 2000, 1000, 500, 200, 100, 50, 20, 10]
     chromosome_sizes = "sacCer3.chrom.sizes"
     Path(chromosome_sizes).touch()
     mem = '48G'
     os.environ[SBATCH_JAVA_MEM_ENV] = mem
-    Pairs2Hic.pairs_to_medium = MagicMock()
-    subprocess.run = MagicMock()
+    subprocess.Popen = MagicMock(side_effect=juicer_pre(subprocess.Popen))
     Pairs2Hic.sbatch_memory = MagicMock(return_value=100)
     Pairs2Hic.pairs_to_hic(pairs, hic, resolutions, chromosome_sizes)
-    Pairs2Hic.pairs_to_medium.assert_called_once_with(pairs, ANY)
     Pairs2Hic.sbatch_memory.assert_called_once_with('48G')
-    subprocess.run.assert_called_once_with(
+    subprocess.Popen.assert_called_once_with(
         ["java", '-Xmx100M', "-jar", juicer, "pre", "-r", ','.join([str(resolution) for resolution in resolutions]),
-         ANY, hic, chromosome_sizes], check=True)
-    assert subprocess.run.call_args_list[0].args[0][7] == Pairs2Hic.pairs_to_medium.call_args_list[0].args[1]
+         ANY, hic, chromosome_sizes])
+
+
+def test_pairs_to_hic_juicerfails(testdir, mock_testclass):
+    pairs = "CJ1_MicroC_WT.pairs.gz"
+    create_pairs(pairs)
+    popen = subprocess.Popen
+    subprocess.Popen = MagicMock(side_effect=lambda cmd: popen(['sh', '-c', 'exit 3']))
+    with pytest.raises(subprocess.CalledProcessError) as error:
+        Pairs2Hic.pairs_to_hic(pairs, "CJ1_MicroC_WT.hic", [10000], "sacCer3.chrom.sizes")
+    assert error.value.returncode == 3
+
+
+def test_pairs_to_hic_juicerstopsreading(testdir, mock_testclass):
+    pairs = "CJ1_MicroC_WT.pairs.gz"
+    create_pairs(pairs)
+    popen = subprocess.Popen
+    subprocess.Popen = MagicMock(side_effect=lambda cmd: popen(['sh', '-c', 'head -c 1 "$0" > /dev/null; exit 2',
+                                                                cmd[-3]]))
+    Pairs2Hic.write_medium = MagicMock(side_effect=lambda pairs, medium_out: [medium_out.write(b'.' * 1048576)
+                                                                               for i in range(16)])
+    with pytest.raises(subprocess.CalledProcessError) as error:
+        Pairs2Hic.pairs_to_hic(pairs, "CJ1_MicroC_WT.hic", [10000], "sacCer3.chrom.sizes")
+    assert error.value.returncode == 2
+
+
+def test_pairs_to_hic_stream(testdir, mock_testclass):
+    pairs = "CJ1_MicroC_WT.pairs.gz"
+    create_pairs(pairs)
+    Pairs2Hic.pairs_to_medium(pairs, "expected.tsv")
+    subprocess.Popen = MagicMock(side_effect=juicer_pre(subprocess.Popen))
+    Pairs2Hic.pairs_to_hic(pairs, "CJ1_MicroC_WT.hic", [10000], "sacCer3.chrom.sizes", stream=True)
+    with open("juicer-input.tsv") as juicer_in, open("expected.tsv") as expected_in:
+        assert juicer_in.read() == expected_in.read()
+
+
+def test_pairs_to_hic_stream_juicerstopsreading(testdir, mock_testclass):
+    pairs = "CJ1_MicroC_WT.pairs.gz"
+    create_pairs(pairs)
+    hic = "CJ1_MicroC_WT.hic"
+    Path(hic).touch()
+    popen = subprocess.Popen
+    subprocess.Popen = MagicMock(side_effect=lambda cmd: popen(['sh', '-c', 'head -c 1 "$0" > /dev/null', cmd[-3]]))
+    Pairs2Hic.write_medium = MagicMock(side_effect=lambda pairs, medium_out: [medium_out.write(b'.' * 1048576)
+                                                                               for i in range(16)])
+    with pytest.raises(BrokenPipeError):
+        Pairs2Hic.pairs_to_hic(pairs, hic, [10000], "sacCer3.chrom.sizes", stream=True)
+    assert not os.path.exists(hic)
+    assert not Pairs2Hic.JUICERS
+
+
+def test_pairs_to_hic_folder(testdir, mock_testclass):
+    folder = "medium"
+    os.mkdir(folder)
+    pairs = "CJ1_MicroC_WT.pairs.gz"
+    create_pairs(pairs)
+    subprocess.Popen = MagicMock(side_effect=juicer_pre(subprocess.Popen))
+    Pairs2Hic.pairs_to_hic(pairs, "CJ1_MicroC_WT.hic", [10000], "sacCer3.chrom.sizes", folder=folder)
+    medium = subprocess.Popen.call_args_list[0].args[0][-3]
+    assert os.path.dirname(os.path.dirname(medium)) == folder
+    assert os.listdir(folder) == []
+
+
+def test_medium_to_hic(testdir, mock_testclass):
+    process = MagicMock()
+    process.wait = MagicMock(return_value=0)
+    subprocess.Popen = MagicMock(return_value=process)
+    Pairs2Hic.medium_to_hic("medium.tsv", "CJ1_MicroC_WT.hic", [10000, 5000], "sacCer3.chrom.sizes")
+    subprocess.Popen.assert_called_once_with(
+        ["java", "-jar", "juicer_tools.jar", "pre", "-r", "10000,5000", "medium.tsv", "CJ1_MicroC_WT.hic",
+         "sacCer3.chrom.sizes"])
+    process.wait.assert_called_once_with()
+    assert not Pairs2Hic.JUICERS
+
+
+def test_medium_to_hic_juicerfails(testdir, mock_testclass):
+    process = MagicMock()
+    process.wait = MagicMock(return_value=1)
+    subprocess.Popen = MagicMock(return_value=process)
+    with pytest.raises(subprocess.CalledProcessError):
+        Pairs2Hic.medium_to_hic("medium.tsv", "CJ1_MicroC_WT.hic", [10000, 5000], "sacCer3.chrom.sizes")
+    assert not Pairs2Hic.JUICERS
+
+
+def test_medium_to_hic_merge(testdir, mock_testclass):
+    pairs1 = "CJ1_MicroC_WT.pairs.gz"
+    create_pairs(pairs1)
+    pairs2 = "CJ2_MicroC_FACT.pairs.gz"
+    create_pairs(pairs2, "CJ2_MicroC_FACT.pairs")
+    Pairs2Hic.pairs_to_medium(pairs1, "medium1.tsv")
+    Pairs2Hic.pairs_to_medium(pairs2, "medium2.tsv")
+    Pairs2Hic.pairs_to_medium([pairs1, pairs2], "expected.tsv")
+    os.environ[SBATCH_JAVA_MEM_ENV] = '48G'
+    subprocess.Popen = MagicMock(side_effect=juicer_pre(subprocess.Popen))
+    Pairs2Hic.medium_to_hic(["medium1.tsv", "medium2.tsv"], "all_libraries.hic", [10000], "sacCer3.chrom.sizes",
+                            "juicer_tools.jar", (), 4)
+    subprocess.Popen.assert_called_once_with(
+        ["java", "-Xmx12288M", "-jar", "juicer_tools.jar", "pre", "-r", "10000", ANY, "all_libraries.hic",
+         "sacCer3.chrom.sizes"])
+    with open("juicer-input.tsv") as juicer_in, open("expected.tsv") as expected_in:
+        assert juicer_in.read() == expected_in.read()
+
+
+def test_juicer_command_jobs(mock_testclass):
+    os.environ[SBATCH_JAVA_MEM_ENV] = '1000M'
+    assert Pairs2Hic.juicer_command("medium.tsv", "out.hic", [10000], "sacCer3.chrom.sizes", "juicer_tools.jar",
+                                    ("-m", "30"), 3) == ["java", "-Xmx333M", "-jar", "juicer_tools.jar", "pre", "-m",
+                                                         "30", "-r", "10000", "medium.tsv", "out.hic",
+                                                         "sacCer3.chrom.sizes"]
+    del os.environ[SBATCH_JAVA_MEM_ENV]
+    assert Pairs2Hic.juicer_command("medium.tsv", "out.hic", [10000], "sacCer3.chrom.sizes")[:2] == ["java", "-jar"]
+
+
+def test_pairs_to_hic_malformedpairs(testdir, mock_testclass):
+    pairs = "CJ1_MicroC_WT.pairs.gz"
+    create_pairs(pairs)
+    with gzip.open(pairs, 'at') as pairs_out:
+        pairs_out.write(".\tchrXVI\t946231\tchrXVI\n")
+    subprocess.Popen = MagicMock()
+    with pytest.raises(ValueError):
+        Pairs2Hic.pairs_to_hic(pairs, "CJ1_MicroC_WT.hic", [10000], "sacCer3.chrom.sizes")
+    subprocess.Popen.assert_not_called()
+
+
+def test_pairs_to_hic_stream_malformedpairs(testdir, mock_testclass):
+    pairs = "CJ1_MicroC_WT.pairs.gz"
+    with open(Path(__file__).parent.joinpath("CJ1_MicroC_WT.pairs")) as pairs_in, gzip.open(pairs, 'wt') as pairs_out:
+        for line in pairs_in:
+            pairs_out.write(line)
+        pairs_out.write(".\tchrXVI\t946231\tchrXVI\n")
+    hic = "CJ1_MicroC_WT.hic"
+    Path(hic).touch()
+    popen = subprocess.Popen
+    processes = []
+
+    def run_juicer(cmd, *args, **kwargs):
+        processes.append(popen(['sh', '-c', 'cat "$0" > /dev/null; exec sleep 60', cmd[-3]]))
+        return processes[-1]
+
+    subprocess.Popen = MagicMock(side_effect=run_juicer)
+    blocks = Pairs2Hic.blocks
+    Pairs2Hic.blocks = MagicMock(side_effect=lambda pairs_in: blocks(pairs_in, 200))
+    with pytest.raises(ValueError):
+        Pairs2Hic.pairs_to_hic(pairs, hic, [10000], "sacCer3.chrom.sizes", stream=True)
+    assert processes[0].returncode == -signal.SIGKILL
+    assert not os.path.exists(hic)
 
 
 def test_pairs_to_medium(testdir, mock_testclass):
@@ -403,6 +676,35 @@ def test_pairs_to_medium(testdir, mock_testclass):
     assert medium_lines[10] == ".\t0\tchrXVI\t946231\t0\t1\tchrXVI\t946324\t1\t10\t9\n"
 
 
+def test_pairs_to_medium_blocks(testdir, mock_testclass):
+    pairs = "CJ1_MicroC_WT.pairs.gz"
+    create_pairs(pairs)
+    expected = []
+    with gzip.open(pairs, 'rt') as pairs_in:
+        for line in pairs_in:
+            if line.startswith('#'):
+                continue
+            columns = line.strip('\r\n').split('\t')
+            expected.append('\t'.join([columns[0], '0' if columns[5] == '+' else '1', columns[1], columns[2], '0',
+                                        '0' if columns[6] == '+' else '1', columns[3], columns[4], '1', columns[8],
+                                        columns[9]]) + '\n')
+    with gzip.open(pairs, 'rb') as pairs_in:
+        medium = b''.join(Pairs2Hic.medium_block(block) for block in Pairs2Hic.blocks(pairs_in, 100))
+    assert medium.decode() == ''.join(expected)
+
+
+def test_medium_block(mock_testclass):
+    block = (b"#columns: readID chrom1 pos1 chrom2 pos2 strand1 strand2 pair_type mapq1 mapq2 extra\r\n"
+             b"r1\tchrI\t10\tchrII\t200\t-\t+\tUU\t60\t7\tx\r\n"
+             b"\n"
+             b"r2\tchrIII\t3\tchrIII\t4000\t+\t-\tRU\t1\t60\ty")
+    assert Pairs2Hic.medium_block(block) == (b"r1\t1\tchrI\t10\t0\t0\tchrII\t200\t1\t60\t7\n"
+                                             b"r2\t0\tchrIII\t3\t0\t1\tchrIII\t4000\t1\t1\t60\n")
+    assert Pairs2Hic.medium_block(b"#comment\n") == b""
+    with pytest.raises(ValueError):
+        Pairs2Hic.medium_block(b"r1\tchrI\t10\tchrII\t200\t-\t+\tUU\t60\n")
+
+
 def test_resolve(testdir, mock_testclass):
     pairs = "CJ1_MicroC_WT.nodups.pairs.gz"
     pattern = "CJ1_MicroC_WT.*.pairs.gz"
@@ -496,52 +798,95 @@ def test_resolve_priority(testdir, mock_testclass):
     assert actual == expected
 
 
+def sorted_pairs(*sources):
+    lines = []
+    for source in sources:
+        with open(Path(__file__).parent.joinpath(source)) as pairs_in:
+            lines.extend([line for line in pairs_in if not line.startswith('#')])
+    return sorted(lines, key=lambda line: (line.split('\t')[1], line.split('\t')[3], int(line.split('\t')[2]),
+                                           int(line.split('\t')[4])))
+
+
 def test_merge_pairs(testdir, mock_testclass):
     pairs1 = "CJ1_MicroC_WT.pairs.gz"
+    create_pairs(pairs1)
     pairs2 = "CJ2_MicroC_FACT.pairs.gz"
-    with open(Path(__file__).parent.joinpath("CJ1_MicroC_WT.pairs")) as pairs_in, gzip.open(pairs1, 'wt') as pairs1_out:
-        for line in pairs_in:
-            pairs1_out.write(line)
-    with open(Path(__file__).parent.joinpath("CJ2_MicroC_FACT.pairs")) as pairs_in, gzip.open(pairs2,
-                                                                                              'wt') as pairs2_out:
-        for line in pairs_in:
-            pairs2_out.write(line)
-    output = "CJ1_MicroC_WT.tsv"
-    subprocess.run = MagicMock(side_effect=copy_sort)
-    os.remove = MagicMock()
+    create_pairs(pairs2, "CJ2_MicroC_FACT.pairs")
+    output = "all_libraries.pairs.gz"
+    Pairs2Hic.merge_pairs([pairs1, pairs2], output, 2)
+    with gzip.open(output, 'rt') as output_in:
+        output_lines = output_in.readlines()
+    assert output_lines == sorted_pairs("CJ1_MicroC_WT.pairs", "CJ2_MicroC_FACT.pairs")
+    assert output_lines[0] == ".\tchrI\t1\tchrI\t56\t+\t-\tUU\t27\t27\n"
+    assert output_lines[1] == ".\tchrI\t1\tchrI\t58\t+\t-\tUU\t30\t30\n"
+    assert output_lines[2] == ".\tchrI\t1\tchrI\t62\t+\t-\tUU\t41\t41\n"
+    assert output_lines[3] == ".\tchrI\t1\tchrI\t62\t+\t-\tUU\t24\t41\n"
+    assert output_lines[-1] == ".\tchrXVI\t946231\tchrXVI\t946324\t+\t-\tUU\t10\t9\n"
+
+
+def test_merge_pairs_gzip(testdir, mock_testclass):
+    pairs1 = "CJ1_MicroC_WT.pairs.gz"
+    create_pairs(pairs1)
+    pairs2 = "CJ2_MicroC_FACT.pairs.gz"
+    create_pairs(pairs2, "CJ2_MicroC_FACT.pairs")
+    output = "all_libraries.pairs.gz"
+    which = shutil.which
+    shutil.which = MagicMock(return_value=None)
+    try:
+        Pairs2Hic.merge_pairs([pairs1, pairs2], output)
+    finally:
+        shutil.which = which
+    with gzip.open(output, 'rt') as output_in:
+        assert output_in.readlines() == sorted_pairs("CJ1_MicroC_WT.pairs", "CJ2_MicroC_FACT.pairs")
+
+
+def test_merge_pairs_unsorted(testdir, mock_testclass):
+    pairs1 = "CJ1_MicroC_WT.pairs.gz"
+    with open(Path(__file__).parent.joinpath("CJ1_MicroC_WT.pairs")) as pairs_in, gzip.open(pairs1, 'wt') as pairs_out:
+        pairs_out.writelines(reversed(pairs_in.readlines()))
+    pairs2 = "CJ2_MicroC_FACT.pairs.gz"
+    create_pairs(pairs2, "CJ2_MicroC_FACT.pairs")
+    output = "all_libraries.pairs.gz"
     Pairs2Hic.merge_pairs([pairs1, pairs2], output)
-    subprocess.run.assert_called_once_with(
-        ["sort", "-k", "2,2", "-k", "4,4", "-k", "3,3n", "-k", "5,5n", "-o", ANY, ANY], check=True)
-    merged_pairs = subprocess.run.call_args_list[0].args[0][len(subprocess.run.call_args_list[0].args[0]) - 1]
-    with open(merged_pairs) as merged_pairs_in:
-        merged_pairs_lines = merged_pairs_in.readlines()
     with gzip.open(output, 'rt') as output_in:
         output_lines = output_in.readlines()
-    assert merged_pairs_lines[0] == ".\tchrI\t1\tchrI\t62\t+\t-\tUU\t41\t41\n"
-    assert merged_pairs_lines[1] == ".\tchrI\t1\tchrI\t116\t+\t-\tUU\t5\t57\n"
-    assert merged_pairs_lines[2] == ".\tchrI\t1\tchrI\t196\t+\t-\tUU\t32\t60\n"
-    assert merged_pairs_lines[3] == ".\tchrI\t1\tchrI\t255\t+\t-\tRU\t5\t60\n"
-    assert merged_pairs_lines[4] == ".\tchrI\t1\tchrI\t460\t+\t+\tUU\t29\t60\n"
-    assert merged_pairs_lines[5] == ".\tchrI\t1\tchrI\t16623\t+\t-\tRU\t60\t31\n"
-    assert merged_pairs_lines[6] == ".\tchrXVI\t943105\tchrXVI\t943348\t+\t-\tUU\t23\t1\n"
-    assert merged_pairs_lines[7] == ".\tchrXVI\t943144\tchrXVI\t943243\t+\t-\tUU\t6\t6\n"
-    assert merged_pairs_lines[8] == ".\tchrXVI\t943172\tchrXVI\t943251\t-\t+\tUU\t8\t1\n"
-    assert merged_pairs_lines[9] == ".\tchrXVI\t943187\tchrXVI\t946327\t+\t-\tUU\t5\t10\n"
-    assert merged_pairs_lines[10] == ".\tchrXVI\t946231\tchrXVI\t946324\t+\t-\tUU\t10\t9\n"
-    assert merged_pairs_lines[11] == ".\tchrI\t1\tchrI\t56\t+\t-\tUU\t27\t27\n"
-    assert merged_pairs_lines[12] == ".\tchrI\t1\tchrI\t58\t+\t-\tUU\t30\t30\n"
-    assert merged_pairs_lines[13] == ".\tchrI\t1\tchrI\t62\t+\t-\tUU\t24\t41\n"
-    assert merged_pairs_lines[14] == ".\tchrI\t1\tchrI\t72\t+\t-\tUU\t42\t60\n"
-    assert merged_pairs_lines[15] == ".\tchrI\t1\tchrI\t77\t+\t-\tUU\t11\t60\n"
-    assert merged_pairs_lines[16] == ".\tchrI\t1\tchrI\t128\t+\t-\tUU\t42\t60\n"
-    assert merged_pairs_lines[17] == ".\tchrXVI\t942874\tchrXVI\t943296\t-\t-\tUU\t60\t4\n"
-    assert merged_pairs_lines[18] == ".\tchrXVI\t943115\tchrXVI\t943206\t+\t-\tUU\t7\t10\n"
-    assert merged_pairs_lines[19] == ".\tchrXVI\t943129\tchrXVI\t943200\t+\t-\tUU\t8\t9\n"
-    assert merged_pairs_lines[20] == ".\tchrXVI\t943186\tchrXVI\t943282\t+\t-\tUU\t5\t5\n"
-    assert merged_pairs_lines[21] == ".\tchrXVI\t946209\tchrXVI\t946297\t+\t-\tUU\t10\t10\n"
-    assert len(output_lines) == len(merged_pairs_lines)
-    for i in range(0, len(output_lines)):
-        assert output_lines[i] == merged_pairs_lines[len(merged_pairs_lines) - i - 1]
+    assert sorted(output_lines) == sorted(sorted_pairs("CJ1_MicroC_WT.pairs", "CJ2_MicroC_FACT.pairs"))
+    assert [Pairs2Hic.pairs_key(line.encode()) for line in output_lines] == sorted(
+        [Pairs2Hic.pairs_key(line.encode()) for line in output_lines])
+    assert sorted(os.listdir()) == sorted([pairs1, pairs2, output])
+
+
+def test_merged_lines_unsorted(testdir, mock_testclass):
+    pairs1 = "CJ1_MicroC_WT.pairs"
+    with open(pairs1, 'w') as pairs_out:
+        pairs_out.write(".\tchrI\t62\tchrI\t200\t+\t-\tUU\t41\t41\n")
+        pairs_out.write(".\tchrI\t1\tchrI\t62\t+\t-\tUU\t41\t41\n")
+    pairs2 = "CJ2_MicroC_FACT.pairs.gz"
+    create_pairs(pairs2, "CJ2_MicroC_FACT.pairs")
+    with pytest.raises(ValueError):
+        list(Pairs2Hic.merged_lines([pairs1, pairs2]))
+
+
+def test_pairs_to_medium_merge(testdir, mock_testclass):
+    pairs1 = "CJ1_MicroC_WT.pairs.gz"
+    create_pairs(pairs1)
+    pairs2 = "CJ2_MicroC_FACT.pairs.gz"
+    create_pairs(pairs2, "CJ2_MicroC_FACT.pairs")
+    Pairs2Hic.merge_pairs([pairs1, pairs2], "merged.pairs.gz")
+    Pairs2Hic.pairs_to_medium("merged.pairs.gz", "expected.tsv")
+    Pairs2Hic.pairs_to_medium([pairs1, pairs2], "medium.tsv")
+    with open("medium.tsv") as medium_in, open("expected.tsv") as expected_in:
+        assert medium_in.read() == expected_in.read()
+    Pairs2Hic.pairs_to_medium([pairs1], "medium.tsv")
+    Pairs2Hic.pairs_to_medium(pairs1, "expected.tsv")
+    with open("medium.tsv") as medium_in, open("expected.tsv") as expected_in:
+        assert medium_in.read() == expected_in.read()
+
+
+def test_line_blocks(mock_testclass):
+    lines = [b"a\n", b"bc\n", b"def\n", b"g\n"]
+    assert list(Pairs2Hic.line_blocks(lines, 5)) == [b"a\nbc\n", b"def\ng\n"]
+    assert list(Pairs2Hic.line_blocks([], 5)) == []
 
 
 def test_sbatch_memory_kilo(mock_testclass):
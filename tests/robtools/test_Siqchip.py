@@ -23,8 +23,9 @@ def mock_testclass():
     siqchip_sample = sc.siqchip_sample
     prepare_parameters = sc.prepare_parameters
     run_siqchip = sc.run_siqchip
-    read_chromosomes = sc.read_chromosomes
+    partition_bed = sc.partition_bed
     sort = Bed.sort
+    chunks = Bed.chunks
     bedgraph_to_bigwig = Bed.bedgraph_to_bigwig
     run = subprocess.run
     yield
@@ -32,8 +33,9 @@ def mock_testclass():
     sc.siqchip_sample = siqchip_sample
     sc.prepare_parameters = prepare_parameters
     sc.run_siqchip = run_siqchip
-    sc.read_chromosomes = read_chromosomes
+    sc.partition_bed = partition_bed
     Bed.sort = sort
+    Bed.chunks = chunks
     Bed.bedgraph_to_bigwig = bedgraph_to_bigwig
     subprocess.run = run
     
@@ -50,6 +52,19 @@ def siqchip_cmd_output(*args, **kwargs):
         outfile.write(' chrII   20 30   0.2 0.21\n')
 
     
+def partition(*indexes):
+    indexes = iter(indexes)
+
+    def partition_files(bed, folder, chromosomes, bed_index=False):
+        return {chromosome: chromosome + '-' + bed for chromosome in chromosomes}, next(indexes)
+
+    return partition_files
+
+
+def chromosome_index(*chromosomes, count=2):
+    return {chromosome: {'count': count, 'ranges': []} for chromosome in chromosomes}
+
+
 def temp2file(*args, **kwargs):
     input = args[0]
     output = args[1]
@@ -70,7 +85,7 @@ def test_siqchip(testdir, mock_testclass):
     runner = CliRunner()
     result = runner.invoke(sc.siqchip, [])
     assert result.exit_code == 0
-    sc.siqchip_samples.assert_called_once_with(samples, chromosomes, resi, '-input-reads', '-reads', '-params', '-siqchip', 1, None)
+    sc.siqchip_samples.assert_called_once_with(samples, chromosomes, resi, '-input-reads', '-reads', '-params', '-siqchip', 1, None, False)
 
 
 def test_siqchip_parameters(testdir, mock_testclass):
@@ -85,9 +100,9 @@ def test_siqchip_parameters(testdir, mock_testclass):
     index = 1
     sc.siqchip_samples = MagicMock()
     runner = CliRunner()
-    result = runner.invoke(sc.siqchip, ['--samples', samples, '--chromosomes', chromosomes, '--resolution', resolution, '--input-suffix', input_suffix, '--ip-suffix', ip_suffix, '--params-suffix', params_suffix, '--output-suffix', output_suffix, '--threads', threads, '--index', index])
+    result = runner.invoke(sc.siqchip, ['--samples', samples, '--chromosomes', chromosomes, '--resolution', resolution, '--input-suffix', input_suffix, '--ip-suffix', ip_suffix, '--params-suffix', params_suffix, '--output-suffix', output_suffix, '--threads', threads, '--index', index, '--bed-index'])
     assert result.exit_code == 0
-    sc.siqchip_samples.assert_called_once_with(samples, chromosomes, resolution, input_suffix, ip_suffix, params_suffix, output_suffix, threads, index)
+    sc.siqchip_samples.assert_called_once_with(samples, chromosomes, resolution, input_suffix, ip_suffix, params_suffix, output_suffix, threads, index, True)
 
 
 def test_siqchip_samplesnotexists(testdir, mock_testclass):
@@ -139,9 +154,9 @@ def test_siqchip_samples(testdir, mock_testclass):
     samples = Path(__file__).parent.joinpath('samples.txt')
     sc.siqchip_sample = MagicMock()
     sc.siqchip_samples(samples)
-    sc.siqchip_sample.assert_any_call('POLR2A', 'sacCer3.chrom.sizes', 'resi', '-input-reads', '-reads', '-params', '-siqchip', 1)
-    sc.siqchip_sample.assert_any_call('ASDURF', 'sacCer3.chrom.sizes', 'resi', '-input-reads', '-reads', '-params', '-siqchip', 1)
-    sc.siqchip_sample.assert_any_call('POLR1C', 'sacCer3.chrom.sizes', 'resi', '-input-reads', '-reads', '-params', '-siqchip', 1)
+    sc.siqchip_sample.assert_any_call('POLR2A', 'sacCer3.chrom.sizes', 'resi', '-input-reads', '-reads', '-params', '-siqchip', 1, False)
+    sc.siqchip_sample.assert_any_call('ASDURF', 'sacCer3.chrom.sizes', 'resi', '-input-reads', '-reads', '-params', '-siqchip', 1, False)
+    sc.siqchip_sample.assert_any_call('POLR1C', 'sacCer3.chrom.sizes', 'resi', '-input-reads', '-reads', '-params', '-siqchip', 1, False)
 
 
 def test_siqchip_samples_parameters(testdir, mock_testclass):
@@ -155,8 +170,8 @@ def test_siqchip_samples_parameters(testdir, mock_testclass):
     threads = 3
     index = 1
     sc.siqchip_sample = MagicMock()
-    sc.siqchip_samples(samples, chromosomes, resolution, input_suffix, ip_suffix, params_suffix, output_suffix, threads, index)
-    sc.siqchip_sample.assert_called_once_with('ASDURF', chromosomes, resolution, input_suffix, ip_suffix, params_suffix, output_suffix, threads)
+    sc.siqchip_samples(samples, chromosomes, resolution, input_suffix, ip_suffix, params_suffix, output_suffix, threads, index, True)
+    sc.siqchip_sample.assert_called_once_with('ASDURF', chromosomes, resolution, input_suffix, ip_suffix, params_suffix, output_suffix, threads, True)
 
     
 @patch('multiprocessing.Pool')
@@ -172,21 +187,19 @@ def test_siqchip_sample(mockpool, testdir, mock_testclass):
     bed_output = sample + '-siqchip.bed'
     bigwig = sample + '-siqchip.bw'
     sc.prepare_parameters = MagicMock()
-    sc.read_chromosomes = MagicMock(return_value=['chrI', 'chrII'])
+    sc.partition_bed = MagicMock(side_effect=partition(chromosome_index('chrI', 'chrII'), chromosome_index('chrI', 'chrII')))
     Bed.sort = MagicMock(side_effect=temp2file)
     Bed.bedgraph_to_bigwig = MagicMock()
     mockpool_instance = mockpool().__enter__()
     mockpool_instance.starmap.side_effect = siqchip_cmd_output
     sc.siqchip_sample(sample)
-    sc.prepare_parameters.assert_called_with(ANY, input, ip, params, 'resi')
+    sc.prepare_parameters.assert_called_with(ANY, params, 'resi')
     folder = sc.prepare_parameters.call_args[0][0]
-    sc.read_chromosomes.assert_any_call(input, 2)
-    sc.read_chromosomes.assert_any_call(ip, 2)
+    sc.partition_bed.assert_any_call(input, folder, ['chrI', 'chrII'], False)
+    sc.partition_bed.assert_any_call(ip, folder, ['chrI', 'chrII'], False)
     mockpool.assert_any_call(processes=1)
-    mockpool_instance.starmap.assert_any_call(sc.run_siqchip, [(['bash', 'Slave.sh', 'I', input, ip], folder), (['bash', 'Slave.sh', 'II', input, ip], folder)])
-    Bed.sort.assert_called_with(ANY, ANY)
-    assert isinstance(Bed.sort.call_args[0][0], str)
-    assert isinstance(Bed.sort.call_args[0][1], str)
+    mockpool_instance.starmap.assert_any_call(sc.run_siqchip, [(['bash', 'Slave.sh', 'I', 'chrI-' + input, 'chrI-' + ip], folder), (['bash', 'Slave.sh', 'II', 'chrII-' + input, 'chrII-' + ip], folder)])
+    Bed.sort.assert_not_called()
     Bed.bedgraph_to_bigwig.assert_called_with(bed_output, bigwig, chromosomes)
     os.path.isfile(ce_output)
     with open(ce_output, 'r') as outfile:
@@ -220,21 +233,19 @@ def test_siqchip_sample_parameters(mockpool, testdir, mock_testclass):
     bed_output = sample + output_suffix + '.bed'
     bigwig = sample + output_suffix + '.bw'
     sc.prepare_parameters = MagicMock()
-    sc.read_chromosomes = MagicMock(return_value=['chrI', 'chrII'])
+    sc.partition_bed = MagicMock(side_effect=partition(chromosome_index('chrI', 'chrII'), chromosome_index('chrI', 'chrII')))
     Bed.sort = MagicMock(side_effect=temp2file)
     Bed.bedgraph_to_bigwig = MagicMock()
     mockpool_instance = mockpool().__enter__()
     mockpool_instance.starmap.side_effect = siqchip_cmd_output
-    sc.siqchip_sample(sample, chromosomes, resolution, input_suffix, ip_suffix, params_suffix, output_suffix, threads)
-    sc.prepare_parameters.assert_called_with(ANY, input, ip, params, resolution)
+    sc.siqchip_sample(sample, chromosomes, resolution, input_suffix, ip_suffix, params_suffix, output_suffix, threads, True)
+    sc.prepare_parameters.assert_called_with(ANY, params, resolution)
     folder = sc.prepare_parameters.call_args[0][0]
-    sc.read_chromosomes.assert_any_call(input, 2)
-    sc.read_chromosomes.assert_any_call(ip, 2)
+    sc.partition_bed.assert_any_call(input, folder, ['chrI', 'chrII'], True)
+    sc.partition_bed.assert_any_call(ip, folder, ['chrI', 'chrII'], True)
     mockpool.assert_any_call(processes=threads)
-    mockpool_instance.starmap.assert_any_call(sc.run_siqchip, [(['bash', 'Slave.sh', 'I', input, ip], folder), (['bash', 'Slave.sh', 'II', input, ip], folder)])
-    Bed.sort.assert_called_with(ANY, ANY)
-    assert isinstance(Bed.sort.call_args[0][0], str)
-    assert isinstance(Bed.sort.call_args[0][1], str)
+    mockpool_instance.starmap.assert_any_call(sc.run_siqchip, [(['bash', 'Slave.sh', 'I', 'chrI-' + input, 'chrI-' + ip], folder), (['bash', 'Slave.sh', 'II', 'chrII-' + input, 'chrII-' + ip], folder)])
+    Bed.sort.assert_not_called()
     Bed.bedgraph_to_bigwig.assert_called_with(bed_output, bigwig, chromosomes)
     os.path.isfile(ce_output)
     with open(ce_output, 'r') as outfile:
@@ -264,20 +275,19 @@ def test_siqchip_sample_missingchromosomeinput(mockpool, testdir, mock_testclass
     bed_output = sample + '-siqchip.bed'
     bigwig = sample + '-siqchip.bw'
     sc.prepare_parameters = MagicMock()
-    sc.read_chromosomes = MagicMock(side_effect=[['chrII'], ['chrI', 'chrII']])
+    sc.partition_bed = MagicMock(side_effect=partition(chromosome_index('chrII'), chromosome_index('chrI', 'chrII')))
     Bed.sort = MagicMock(side_effect=temp2file)
     Bed.bedgraph_to_bigwig = MagicMock()
     mockpool_instance = mockpool().__enter__()
     mockpool_instance.starmap.side_effect = siqchip_cmd_output
     sc.siqchip_sample(sample)
-    sc.prepare_parameters.assert_called_with(ANY, input, ip, params, 'resi')
+    sc.prepare_parameters.assert_called_with(ANY, params, 'resi')
     folder = sc.prepare_parameters.call_args[0][0]
-    sc.read_chromosomes.assert_any_call(input, 2)
-    sc.read_chromosomes.assert_any_call(ip, 2)
+    sc.partition_bed.assert_any_call(input, folder, ['chrI', 'chrII'], False)
+    sc.partition_bed.assert_any_call(ip, folder, ['chrI', 'chrII'], False)
     mockpool.assert_any_call(processes=1)
-    mockpool_instance.starmap.assert_any_call(sc.run_siqchip, [(['bash', 'Slave.sh', 'II', input, ip], folder)])
-    Bed.sort.assert_called_with(ANY, ANY)
-    assert isinstance(Bed.sort.call_args[0][0], str)
+    mockpool_instance.starmap.assert_any_call(sc.run_siqchip, [(['bash', 'Slave.sh', 'II', 'chrII-' + input, 'chrII-' + ip], folder)])
+    Bed.sort.assert_not_called()
     Bed.bedgraph_to_bigwig.assert_called_with(bed_output, bigwig, chromosomes)
     os.path.isfile(ce_output)
     with open(ce_output, 'r') as outfile:
@@ -303,18 +313,17 @@ def test_siqchip_sample_missingchromosomeip(mockpool, testdir, mock_testclass):
     bed_output = sample + '-siqchip.bed'
     bigwig = sample + '-siqchip.bw'
     sc.prepare_parameters = MagicMock()
-    sc.read_chromosomes = MagicMock(side_effect=[['chrI', 'chrII'], ['chrII']])
+    sc.partition_bed = MagicMock(side_effect=partition(dict(chromosome_index('chrI', 'chrII'), **chromosome_index('chrI', count=1)), chromosome_index('chrII')))
     Bed.sort = MagicMock(side_effect=temp2file)
     Bed.bedgraph_to_bigwig = MagicMock()
     mockpool_instance = mockpool().__enter__()
     mockpool_instance.starmap.side_effect = siqchip_cmd_output
     sc.siqchip_sample(sample)
-    sc.prepare_parameters.assert_called_with(ANY, input, ip, params, 'resi')
+    sc.prepare_parameters.assert_called_with(ANY, params, 'resi')
     folder = sc.prepare_parameters.call_args[0][0]
     mockpool.assert_any_call(processes=1)
-    mockpool_instance.starmap.assert_any_call(sc.run_siqchip, [(['bash', 'Slave.sh', 'II', input, ip], folder)])
-    Bed.sort.assert_called_with(ANY, ANY)
-    assert isinstance(Bed.sort.call_args[0][0], str)
+    mockpool_instance.starmap.assert_any_call(sc.run_siqchip, [(['bash', 'Slave.sh', 'II', 'chrII-' + input, 'chrII-' + ip], folder)])
+    Bed.sort.assert_not_called()
     Bed.bedgraph_to_bigwig.assert_called_with(bed_output, bigwig, chromosomes)
     os.path.isfile(ce_output)
     with open(ce_output, 'r') as outfile:
@@ -327,21 +336,87 @@ def test_siqchip_sample_missingchromosomeip(mockpool, testdir, mock_testclass):
         assert 'chrII\t20\t30\t0.2\n' == outfile.readline()
 
 
-def test_read_chromosomes(testdir, mock_testclass):
-    bed = Path(__file__).parent.joinpath('siqchip-reads.bed')
-    chromosomes = sc.read_chromosomes(bed)
-    assert 2 == len(chromosomes)
-    assert 'chr1' in chromosomes
-    assert 'chr2' in chromosomes
-
+def test_partition_bed(testdir, mock_testclass):
+    folder = 'folder'
+    os.mkdir(folder)
+    bed = 'POLR2A-reads.bed'
+    with open(bed, 'w') as outfile:
+        outfile.write('track name=test\n')
+        outfile.write('chrII\t10\t20\ta\t1\t+\n')
+        outfile.write('chrI\t30\t40\tb\t1\t-\n')
+        outfile.write('chrM\t30\t40\tc\t1\t-\n')
+        outfile.write('chrII\t5\t15\td\t1\t+\n')
+    files, index = sc.partition_bed(bed, folder, ['chrI', 'chrII', 'chrIII'])
+    assert files == {'chrI': 'chrI-' + bed, 'chrII': 'chrII-' + bed, 'chrIII': 'chrIII-' + bed}
+    assert index == {'chrII': {'count': 2, 'ranges': [[16, 34], [68, 85]]}, 'chrI': {'count': 1, 'ranges': [[34, 51]]},
+                     'chrM': {'count': 1, 'ranges': [[51, 68]]}}
+    assert sc.chromosome_count(index, 'chrII') == 2
+    assert sc.chromosome_count(index, 'chrIII') == 0
+    with open(folder + '/chrI-' + bed, 'r') as infile:
+        assert infile.read() == 'chrI\t30\t40\tb\t1\t-\n'
+    with open(folder + '/chrII-' + bed, 'r') as infile:
+        assert infile.read() == 'chrII\t10\t20\ta\t1\t+\nchrII\t5\t15\td\t1\t+\n'
+    with open(folder + '/chrIII-' + bed, 'r') as infile:
+        assert infile.read() == ''
+    assert not os.path.exists(folder + '/chrM-' + bed)
+    assert not os.path.exists(bed + '.chromosomes')
+    assert not os.path.exists(bed + 'z')
+
+
+def test_partition_bed_index(testdir, mock_testclass):
+    bed = 'POLR2A-reads.bed'
+    with open(bed, 'w', newline='') as outfile:
+        outfile.write('track name=test\n')
+        outfile.write('chrII\t010\t20\ta\t1\t+\r\n')
+        outfile.write('chrI\t30\t40\tb\t1\t-\r\n')
+        outfile.write('chrM\t30\t40\tc\t1\t-\r\n')
+        outfile.write('chrII\t5\t15\td\t1\t+\r\n')
+    for folder in ['parsed', 'indexed']:
+        os.mkdir(folder)
+        files, index = sc.partition_bed(bed, folder, ['chrI', 'chrII'], True)
+        assert os.path.isfile(bed + '.chromosomes')
+        assert sc.chromosome_count(index, 'chrII') == 2
+        assert sc.chromosome_count(index, 'chrI') == 1
+        Bed.chunks = MagicMock()
+    Bed.chunks.assert_not_called()
+    for folder in ['parsed', 'indexed']:
+        with open(folder + '/chrI-' + bed, 'r', newline='') as infile:
+            assert infile.read() == 'chrI\t30\t40\tb\t1\t-\n'
+        with open(folder + '/chrII-' + bed, 'r', newline='') as infile:
+            assert infile.read() == 'chrII\t10\t20\ta\t1\t+\nchrII\t5\t15\td\t1\t+\n'
+
+
+def test_partition_bed_staleindex(testdir, mock_testclass):
+    folder = 'folder'
+    os.mkdir(folder)
+    bed = 'POLR2A-reads.bed'
+    with open(bed, 'w') as outfile:
+        outfile.write('chrII\t10\t20\n')
+        outfile.write('chrI\t30\t40\n')
+    sc.partition_bed(bed, folder, ['chrI', 'chrII'], True)
+    with open(bed, 'a') as outfile:
+        outfile.write('chrI\t50\t60\n')
+    files, index = sc.partition_bed(bed, folder, ['chrI', 'chrII'])
+    assert sc.chromosome_count(index, 'chrI') == 2
+    with open(folder + '/chrI-' + bed, 'r') as infile:
+        assert infile.read() == 'chrI\t30\t40\nchrI\t50\t60\n'
+
+
+def test_merge_ce(testdir, mock_testclass):
+    folder = 'folder'
+    os.mkdir(folder)
+    with open(folder + '/chrII.ce', 'w') as outfile:
+        outfile.write(' chrII  100  120  0.1  0.09\n')
+        outfile.write(' chrII   20 30   0.2 0.21\n')
+    with open(folder + '/chrI.ce', 'w') as outfile:
+        outfile.write(' cI  10  20  0.1  0.11\n')
+    sc.merge_ce(folder, ['chrII', 'chrI'], 'out.ce', 'out.bed', 'track name=test')
+    with open('out.ce', 'r') as infile:
+        assert infile.read() == 'chrI\t10\t20\t0.1\t0.11\nchrII\t20\t30\t0.2\t0.21\nchrII\t100\t120\t0.1\t0.09\n'
+    with open('out.bed', 'r') as infile:
+        assert infile.read() == 'track name=test\nchrI\t10\t20\t0.1\nchrII\t20\t30\t0.2\nchrII\t100\t120\t0.1\n'
 
-def test_read_chromosomes_minimumcount(testdir, mock_testclass):
-    bed = Path(__file__).parent.joinpath('siqchip-reads.bed')
-    chromosomes = sc.read_chromosomes(bed, 2)
-    assert 1 == len(chromosomes)
-    assert 'chr1' in chromosomes
 
-    
 def test_prepare_parameters(testdir, mock_testclass):
     siqchip_folder = str(testdir) + '/siq-chip'
     os.mkdir(siqchip_folder)
@@ -360,11 +435,9 @@ def test_prepare_parameters(testdir, mock_testclass):
     params = sample + '-params.in'
     copyfile(Path(__file__).parent.joinpath('names.txt'), params)
     resolution = Path(__file__).parent.joinpath('siqchip-resi.txt')
-    sc.prepare_parameters(folder, input, ip, params, resolution)
-    assert os.path.isfile(folder + '/' + input)
-    filecmp.cmp(Path(__file__).parent.joinpath('sample2.bed'), folder + '/' + input)
-    assert os.path.isfile(folder + '/' + ip)
-    filecmp.cmp(Path(__file__).parent.joinpath('sample.bed'), folder + '/' + ip)
+    sc.prepare_parameters(folder, params, resolution)
+    assert not os.path.isfile(folder + '/' + input)
+    assert not os.path.isfile(folder + '/' + ip)
     assert os.path.isfile(folder + '/' + siqchip_source)
     filecmp.cmp(Path(__file__).parent.joinpath('selection.txt'), folder + '/' + siqchip_source)
     assert os.path.isfile(folder + '/' + siqchip_exec)
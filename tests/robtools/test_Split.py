@@ -16,13 +16,11 @@ from robtools.bed import Bed
 def mock_testclass():
     split_samples = s.split_samples
     split_sample = s.split_sample
-    sort_bysize = Bed.sort_bysize
     sort = Bed.sort
     remove = os.remove
     yield
     s.split_samples = split_samples
     s.split_sample = split_sample
-    Bed.sort_bysize = sort_bysize
     Bed.sort = sort
     os.remove = remove
    
@@ -106,48 +104,93 @@ def test_split_samples_second_parameters(testdir, mock_testclass):
 def test_split_sample(testdir, mock_testclass):
     sample = 'POLR2A'
     bed = sample + '.bed'
-    sort = sample + '-sort.bed'
-    sort_copy = Path(__file__).parent.joinpath('sample-split.bed')
-    copyfile(sort_copy, sort)
-    Bed.sort_bysize = MagicMock(side_effect=create_file_sort)
+    copyfile(Path(__file__).parent.joinpath('sample-slowsplit.bed'), bed)
     Bed.sort = MagicMock()
-    os_remove = os.remove
-    os.remove = MagicMock()
     binlength = 10
     binminlength = 100
     binmaxlength = 130
     s.split_sample(sample, binlength, binminlength, binmaxlength)
-    Bed.sort_bysize.assert_called_once_with(bed, ANY)
-    Bed.sort.assert_any_call(ANY, sample + '-100-110.bed')
-    Bed.sort.assert_any_call(ANY, sample + '-110-120.bed')
-    Bed.sort.assert_any_call(ANY, sample + '-120-130.bed')
-    with open(Bed.sort.call_args_list[0].args[0], 'r') as infile:
+    Bed.sort.assert_not_called()
+    with open(sample + '-100-110.bed', 'r') as infile:
         assert infile.readline() == 'chr4\t800\t900\ttest4\t4\t+\n'
         assert infile.readline() == ''
-    with open(Bed.sort.call_args_list[1].args[0], 'r') as infile:
+    with open(sample + '-110-120.bed', 'r') as infile:
         assert infile.readline() == 'chr8\t800\t910\ttest8\t4\t-\n'
         assert infile.readline() == ''
-    with open(Bed.sort.call_args_list[2].args[0], 'r') as infile:
-        assert infile.readline() == 'chr5\t100\t220\ttest5\t1\t-\n'
+    with open(sample + '-120-130.bed', 'r') as infile:
         assert infile.readline() == 'chr1\t100\t229\ttest1\t1\t+\n'
+        assert infile.readline() == 'chr5\t100\t220\ttest5\t1\t-\n'
         assert infile.readline() == ''
-    for remove_args in os.remove.call_args_list:
-        os_remove(remove_args.args[0])
 
 
-def test_annotation_length(testdir, mock_testclass):
-    annotation_length = s.annotation_length('chr1\t100\t250\ttest1')
-    assert annotation_length == 150
+def test_split_sample_shorterlastbin(testdir, mock_testclass):
+    sample = 'POLR2A'
+    bed = sample + '.bed'
+    copyfile(Path(__file__).parent.joinpath('sample-slowsplit.bed'), bed)
+    binlength = 100
+    binminlength = 50
+    binmaxlength = 125
+    s.split_sample(sample, binlength, binminlength, binmaxlength)
+    with open(sample + '-50-125.bed', 'r') as infile:
+        assert infile.readline() == 'chr2\t400\t450\ttest2\t2\t+\n'
+        assert infile.readline() == 'chr4\t800\t900\ttest4\t4\t+\n'
+        assert infile.readline() == 'chr5\t100\t220\ttest5\t1\t-\n'
+        assert infile.readline() == 'chr6\t400\t450\ttest6\t2\t-\n'
+        assert infile.readline() == 'chr8\t800\t910\ttest8\t4\t-\n'
+        assert infile.readline() == ''
 
 
-def test_annotation_length_2(testdir, mock_testclass):
-    annotation_length = s.annotation_length('chr1\t300\t680\ttest1')
-    assert annotation_length == 380
+def test_split_sample_unsorted(testdir, mock_testclass):
+    sample = 'POLR2A'
+    bed = sample + '.bed'
+    copyfile(Path(__file__).parent.joinpath('sample-split.bed'), bed)
+    Bed.sort = MagicMock(side_effect=create_file_sort)
+    binlength = 10
+    binminlength = 100
+    binmaxlength = 130
+    s.split_sample(sample, binlength, binminlength, binmaxlength)
+    Bed.sort.assert_called_once_with(sample + '-120-130.bed', ANY)
+    with open(sample + '-100-110.bed', 'r') as infile:
+        assert infile.readline() == 'chr4\t800\t900\ttest4\t4\t+\n'
+        assert infile.readline() == ''
+    assert not os.path.exists(Bed.sort.call_args.args[1])
+
+
+def test_split_bed_by_length(testdir, mock_testclass):
+    bed = 'in.bed'
+    with open(bed, 'w') as outfile:
+        outfile.write('track name=test\n')
+        outfile.write('chr1\t100\t229\ttest1\t1\t+\n')
+        outfile.write('chr1\t150\t250\n')
+        outfile.write('chr2\t100\t105\n')
+        outfile.write('chr2\t110\n')
+    outputs = ['out-100-150.bed', 'out-150-160.bed']
+    unsorted = s.split_bed_by_length(bed, outputs, 50, 100, 160)
+    assert unsorted == []
+    with open(outputs[0], 'r') as infile:
+        assert infile.readline() == 'chr1\t100\t229\ttest1\t1\t+\n'
+        assert infile.readline() == 'chr1\t150\t250\n'
+        assert infile.readline() == ''
+    with open(outputs[1], 'r') as infile:
+        assert infile.readline() == ''
 
 
-def test_annotation_length_invalid(testdir, mock_testclass):
-    annotation_length = s.annotation_length('chr1\t300')
-    assert annotation_length == -1
+def test_split_bed_by_length_unsorted(testdir, mock_testclass):
+    bed = 'in.bed'
+    with open(bed, 'w') as outfile:
+        outfile.write('chr2\t100\t210\n')
+        outfile.write('chr1\t100\t210\n')
+        outfile.write('chr1\t100\t260\n')
+    outputs = ['out-100-150.bed', 'out-150-200.bed']
+    unsorted = s.split_bed_by_length(bed, outputs, 50, 100, 200)
+    assert unsorted == ['out-100-150.bed']
+    with open(outputs[0], 'r') as infile:
+        assert infile.readline() == 'chr2\t100\t210\n'
+        assert infile.readline() == 'chr1\t100\t210\n'
+        assert infile.readline() == ''
+    with open(outputs[1], 'r') as infile:
+        assert infile.readline() == 'chr1\t100\t260\n'
+        assert infile.readline() == ''
 
 
 def test_splits(testdir, mock_testclass):
@@ -202,3 +245,14 @@ def test_splitkey_noend(testdir, mock_testclass):
 def test_splitkey_invalid(testdir, mock_testclass):
     with pytest.raises(AttributeError):
         s.splitkey('POLR2A')
+
+
+
+def test_splitbin(testdir, mock_testclass):
+    splitbin = s.splitbin('POLR2A-120-150')
+    assert splitbin == (120, 150)
+
+
+def test_splitbin_invalid(testdir, mock_testclass):
+    with pytest.raises(AttributeError):
+        s.splitbin('POLR2A-350')
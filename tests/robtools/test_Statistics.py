@@ -1,5 +1,6 @@
 import logging
 from pathlib import Path
+from shutil import copyfile
 import subprocess
 from unittest.mock import MagicMock, ANY
 
@@ -10,6 +11,7 @@ import pytest
 from robtools import Split
 from robtools import Statistics as s
 from robtools.bed import Bed
+from robtools.jobs import Jobs
 
 
 @pytest.fixture
@@ -18,21 +20,23 @@ def mock_testclass():
     compute_statistics = s.compute_statistics
     headers = s.headers
     sample_statistics = s.sample_statistics
-    flagstat_total = s.flagstat_total
+    flagstat = s.flagstat
     fragment_sizes = s.fragment_sizes
     splits = Split.splits
     count_bed = Bed.count_bed
     run = subprocess.run
+    jobs_run = Jobs.run
     yield
     s.statistics_samples = statistics_samples
     s.compute_statistics = compute_statistics
     s.headers = headers
     s.sample_statistics = sample_statistics
-    s.flagstat_total = flagstat_total
+    s.flagstat = flagstat
     s.fragment_sizes = fragment_sizes
     Split.splits = splits
     Bed.count_bed = count_bed
     subprocess.run = run
+    Jobs.run = jobs_run
 
 
 def splits(*args, **kwargs):
@@ -47,7 +51,7 @@ def test_statistics(testdir, mock_testclass):
     runner = CliRunner()
     result = runner.invoke(s.statistics, ['-s', samples])
     assert result.exit_code == 0
-    s.statistics_samples.assert_called_once_with(samples, 'dataset.txt', '', '-filtered', '', False, 'statistics.txt')
+    s.statistics_samples.assert_called_once_with(samples, 'dataset.txt', '', '-filtered', '', False, 'statistics.txt', 1, 1)
 
 
 def test_statistics_parameters(testdir, mock_testclass):
@@ -59,9 +63,9 @@ def test_statistics_parameters(testdir, mock_testclass):
     output = 'out.txt'
     s.statistics_samples = MagicMock()
     runner = CliRunner()
-    result = runner.invoke(s.statistics, ['-s', samples, '-d', datasets, '--bam-suffix', bam_suffix, '--filtered-suffix', filtered_suffix, '--fragment-suffix', fragment_suffix, '--fragments', '-o', output])
+    result = runner.invoke(s.statistics, ['-s', samples, '-d', datasets, '--bam-suffix', bam_suffix, '--filtered-suffix', filtered_suffix, '--fragment-suffix', fragment_suffix, '--fragments', '-o', output, '--threads', 3, '--jobs', 2])
     assert result.exit_code == 0
-    s.statistics_samples.assert_called_once_with(samples, datasets, bam_suffix, filtered_suffix, fragment_suffix, True, output)
+    s.statistics_samples.assert_called_once_with(samples, datasets, bam_suffix, filtered_suffix, fragment_suffix, True, output, 3, 2)
 
 
 def test_statistics_samplesnotexists(testdir, mock_testclass):
@@ -80,7 +84,7 @@ def test_statistics_datasetsnotexists(testdir, mock_testclass):
     runner = CliRunner()
     result = runner.invoke(s.statistics, ['-s', samples, '-d', datasets])
     assert result.exit_code == 0
-    s.statistics_samples.assert_called_once_with(samples, datasets, '', '-filtered', '', False, 'statistics.txt')
+    s.statistics_samples.assert_called_once_with(samples, datasets, '', '-filtered', '', False, 'statistics.txt', 1, 1)
 
 
 def test_statistics_samples(testdir, mock_testclass):
@@ -88,7 +92,7 @@ def test_statistics_samples(testdir, mock_testclass):
     datasets = Path(__file__).parent.joinpath('dataset.txt')
     s.compute_statistics = MagicMock()
     s.statistics_samples(samples, datasets)
-    s.compute_statistics.assert_called_once_with(['POLR2A', 'ASDURF', 'POLR1C'], ['POLR2A', 'ASDURF', 'POLR1C'], '', '-filtered', '', False, 'statistics.txt')
+    s.compute_statistics.assert_called_once_with(['POLR2A', 'ASDURF', 'POLR1C'], ['POLR2A', 'ASDURF', 'POLR1C'], '', '-filtered', '', False, 'statistics.txt', None, None)
 
 
 def test_statistics_samples_datasetsnotexists(testdir, mock_testclass):
@@ -96,7 +100,7 @@ def test_statistics_samples_datasetsnotexists(testdir, mock_testclass):
     datasets = 'dataset.txt'
     s.compute_statistics = MagicMock()
     s.statistics_samples(samples, datasets)
-    s.compute_statistics.assert_called_once_with(['POLR2A', 'ASDURF', 'POLR1C'], [], '', '-filtered', '', False, 'statistics.txt')
+    s.compute_statistics.assert_called_once_with(['POLR2A', 'ASDURF', 'POLR1C'], [], '', '-filtered', '', False, 'statistics.txt', None, None)
 
 
 def test_statistics_samples_parameters(testdir, mock_testclass):
@@ -110,8 +114,8 @@ def test_statistics_samples_parameters(testdir, mock_testclass):
     fragments = True
     output = 'out.txt'
     s.compute_statistics = MagicMock()
-    s.statistics_samples(samples, datasets, bam_suffix, filtered_suffix, fragment_suffix, fragments, output)
-    s.compute_statistics.assert_called_once_with(['POLR2A', 'ASDURF', 'POLR1C'], ['POLR2A', 'ASDURF', 'POLR1C'], bam_suffix, filtered_suffix, fragment_suffix, fragments, output)
+    s.statistics_samples(samples, datasets, bam_suffix, filtered_suffix, fragment_suffix, fragments, output, 3, 2)
+    s.compute_statistics.assert_called_once_with(['POLR2A', 'ASDURF', 'POLR1C'], ['POLR2A', 'ASDURF', 'POLR1C'], bam_suffix, filtered_suffix, fragment_suffix, fragments, output, 3, 2)
 
 
 def test_compute_statistics(testdir, mock_testclass):
@@ -123,9 +127,9 @@ def test_compute_statistics(testdir, mock_testclass):
     s.sample_statistics = MagicMock(side_effect=[['POLR2A', 500, 400, 300, 60, 40], ['ASDURF', 550, 450, 350, 70, 50], ['POLR1C', '', '', 250, 50, 30]])
     s.compute_statistics(samples, datasets, output=output)
     s.headers.assert_called_once_with(samples, datasets, False)
-    s.sample_statistics.assert_any_call(samples[0], splits, '', '-filtered', '', False)
-    s.sample_statistics.assert_any_call(samples[1], splits, '', '-filtered', '', False)
-    s.sample_statistics.assert_any_call(datasets[0], splits, '', '-filtered', '', False)
+    s.sample_statistics.assert_any_call(samples[0], splits, '', '-filtered', '', False, None)
+    s.sample_statistics.assert_any_call(samples[1], splits, '', '-filtered', '', False, None)
+    s.sample_statistics.assert_any_call(datasets[0], splits, '', '-filtered', '', False, None)
     with open(output, 'r') as infile:
         assert infile.readline() == 'Sample\tTotal reads\tMapped reads\tDeduplicated reads\t100-110\t120-130\n'
         assert infile.readline() == 'POLR2A\t500\t400\t300\t60\t40\n'
@@ -145,11 +149,11 @@ def test_compute_statistics_parameters(testdir, mock_testclass):
     splits = ['100-110', '120-130']
     s.headers = MagicMock(return_value=(['Sample', 'Total reads', 'Mapped reads', 'Deduplicated reads', 'Fragments average size', 'Fragments size std', '100-110', '120-130'], splits))
     s.sample_statistics = MagicMock(side_effect=[['POLR2A', 500, 400, 300, 75.4, 13.7, 60, 40], ['ASDURF', 550, 450, 350, 70, 15, 70, 50], ['POLR1C', '', '', 250, 80, 20, 50, 30]])
-    s.compute_statistics(samples, datasets, bam_suffix, filtered_suffix, fragment_suffix, fragments, output)
+    s.compute_statistics(samples, datasets, bam_suffix, filtered_suffix, fragment_suffix, fragments, output, 3)
     s.headers.assert_called_once_with(samples, datasets, fragments)
-    s.sample_statistics.assert_any_call(samples[0], splits, bam_suffix, filtered_suffix, fragment_suffix, fragments)
-    s.sample_statistics.assert_any_call(samples[1], splits, bam_suffix, filtered_suffix, fragment_suffix, fragments)
-    s.sample_statistics.assert_any_call(datasets[0], splits, bam_suffix, filtered_suffix, fragment_suffix, fragments)
+    s.sample_statistics.assert_any_call(samples[0], splits, bam_suffix, filtered_suffix, fragment_suffix, fragments, 3)
+    s.sample_statistics.assert_any_call(samples[1], splits, bam_suffix, filtered_suffix, fragment_suffix, fragments, 3)
+    s.sample_statistics.assert_any_call(datasets[0], splits, bam_suffix, filtered_suffix, fragment_suffix, fragments, 3)
     with open(output, 'r') as infile:
         assert infile.readline() == 'Sample\tTotal reads\tMapped reads\tDeduplicated reads\tFragments average size\tFragments size std\t100-110\t120-130\n'
         assert infile.readline() == 'POLR2A\t500\t400\t300\t75.4\t13.7\t60\t40\n'
@@ -170,7 +174,9 @@ def test_headers(testdir, mock_testclass):
     assert headers[4] == '100-110'
     assert headers[5] == '110-120'
     assert headers[6] == '120-140'
-    assert len(headers) == 7
+    assert headers[7] == 'Aligned reads'
+    assert headers[8] == 'Duplicate reads'
+    assert len(headers) == 9
     assert splits_headers[0] == '100-110'
     assert splits_headers[1] == '110-120'
     assert splits_headers[2] == '120-140'
@@ -191,7 +197,9 @@ def test_headers_fragments(testdir, mock_testclass):
     assert headers[6] == '100-110'
     assert headers[7] == '110-120'
     assert headers[8] == '120-140'
-    assert len(headers) == 9
+    assert headers[9] == 'Aligned reads'
+    assert headers[10] == 'Duplicate reads'
+    assert len(headers) == 11
     assert splits_headers[0] == '100-110'
     assert splits_headers[1] == '110-120'
     assert splits_headers[2] == '120-140'
@@ -215,7 +223,9 @@ def test_headers_splitmissmatch(testdir, mock_testclass):
     assert headers[6] == '120-130'
     assert headers[7] == '130-140'
     assert headers[8] == '140-150'
-    assert len(headers) == 9
+    assert headers[9] == 'Aligned reads'
+    assert headers[10] == 'Duplicate reads'
+    assert len(headers) == 11
     assert splits_headers[0] == '100-110'
     assert splits_headers[1] == '110-120'
     assert splits_headers[2] == '120-130'
@@ -224,6 +234,17 @@ def test_headers_splitmissmatch(testdir, mock_testclass):
     assert len(splits_headers) == 5
 
 
+FLAGSTAT = """5400 + 10 in total (QC-passed reads + QC-failed reads)
+5000 + 10 primary
+0 + 0 secondary
+400 + 0 supplementary
+300 + 2 duplicates
+250 + 2 primary duplicates
+5100 + 8 mapped (94.44% : N/A)
+4700 + 8 primary mapped (94.00% : N/A)
+"""
+
+
 def test_sample_statistics(testdir, mock_testclass):
     sample = 'POLR2A'
     Path(sample + '.bam').touch()
@@ -232,7 +253,7 @@ def test_sample_statistics(testdir, mock_testclass):
     splits = ['100-110', '120-130']
     for split in splits:
         Path(sample + '-' + split + '.bed').touch()
-    s.flagstat_total = MagicMock(side_effect=[300, 200])
+    s.flagstat = MagicMock(side_effect=[{'total': 300, 'mapped': 250, 'duplicates': 20}, {'total': 200, 'mapped': 200}])
     Bed.count_bed = MagicMock(side_effect=[150, 50, 40])
     stats = s.sample_statistics(sample, splits)
     assert stats[0] == sample
@@ -241,9 +262,11 @@ def test_sample_statistics(testdir, mock_testclass):
     assert stats[3] == 150 * 2
     assert stats[4] == 50
     assert stats[5] == 40
-    assert len(stats) == 6
-    s.flagstat_total.assert_any_call(sample + '.bam')
-    s.flagstat_total.assert_any_call(sample + '-filtered.bam')
+    assert stats[6] == 250
+    assert stats[7] == 20
+    assert len(stats) == 8
+    s.flagstat.assert_any_call(sample + '.bam', None)
+    s.flagstat.assert_any_call(sample + '-filtered.bam', None)
     Bed.count_bed.assert_any_call(sample + '.bed')
     Bed.count_bed.assert_any_call(sample + '-100-110.bed')
     Bed.count_bed.assert_any_call(sample + '-120-130.bed')
@@ -255,16 +278,17 @@ def test_sample_statistics_parameters(testdir, mock_testclass):
     filtered_suffix = '-high'
     fragment_suffix = '-fragments'
     fragments = True
+    threads = 3
     Path(sample + bam_suffix + '.bam').touch()
     Path(sample + filtered_suffix + '.bam').touch()
     Path(sample + fragment_suffix + '.bed').touch()
     splits = ['100-110', '120-130']
     for split in splits:
         Path(sample + fragment_suffix + '-' + split + '.bed').touch()
-    s.flagstat_total = MagicMock(side_effect=[300, 200])
+    s.flagstat = MagicMock(side_effect=[{'total': 300, 'mapped': 250, 'duplicates': 20}, {'total': 200, 'mapped': 200}])
     s.fragment_sizes = MagicMock(return_value=[100, 90, 110])
     Bed.count_bed = MagicMock(side_effect=[150, 50, 40])
-    stats = s.sample_statistics(sample, splits, bam_suffix, filtered_suffix, fragment_suffix, fragments)
+    stats = s.sample_statistics(sample, splits, bam_suffix, filtered_suffix, fragment_suffix, fragments, threads)
     assert stats[0] == sample
     assert stats[1] == 300
     assert stats[2] == 200
@@ -273,9 +297,11 @@ def test_sample_statistics_parameters(testdir, mock_testclass):
     assert stats[5] == 10
     assert stats[6] == 50
     assert stats[7] == 40
-    assert len(stats) == 8
-    s.flagstat_total.assert_any_call(sample + '-raw.bam')
-    s.flagstat_total.assert_any_call(sample + '-high.bam')
+    assert stats[8] == 250
+    assert stats[9] == 20
+    assert len(stats) == 10
+    s.flagstat.assert_any_call(sample + '-raw.bam', threads)
+    s.flagstat.assert_any_call(sample + '-high.bam', threads)
     s.fragment_sizes.assert_any_call(sample + '-fragments.bed')
     Bed.count_bed.assert_any_call(sample + '-fragments.bed')
     Bed.count_bed.assert_any_call(sample + '-fragments-100-110.bed')
@@ -285,40 +311,46 @@ def test_sample_statistics_parameters(testdir, mock_testclass):
 def test_sample_statistics_notexists(testdir, mock_testclass):
     sample = 'POLR2A'
     splits = ['100-110', '120-130']
-    s.flagstat_total = MagicMock(side_effect=[300, 200])
+    s.flagstat = MagicMock(return_value={'total': 300, 'mapped': 250, 'duplicates': 20})
     Bed.count_bed = MagicMock(side_effect=[150, 50, 40])
     stats = s.sample_statistics(sample, splits)
-    assert stats[0] == sample
-    assert stats[1] == ''
-    assert stats[2] == ''
-    assert stats[3] == ''
-    assert stats[4] == ''
-    assert stats[5] == ''
-    assert len(stats) == 6
-    s.flagstat_total.assert_not_called()
+    assert stats == [sample, '', '', '', '', '', '', '']
+    s.flagstat.assert_not_called()
     Bed.count_bed.assert_not_called()
 
 
-def test_flagstat_total(testdir, mock_testclass):
+def test_compute_statistics_jobs(testdir, mock_testclass):
+    samples = ['POLR2A', 'ASDURF']
+    datasets = ['POLR1C']
+    output = 'out.txt'
+    splits = ['100-110']
+    s.headers = MagicMock(return_value=(['Sample', 'Total reads', '100-110'], splits))
+    Jobs.run = MagicMock(return_value=[['POLR2A', 500, 60], ['ASDURF', 550, 70], ['POLR1C', '', 50]])
+    s.compute_statistics(samples, datasets, output=output, threads=2, jobs=3)
+    Jobs.run.assert_called_once_with(s.sample_statistics, ANY, 3)
+    assert Jobs.run.call_args.args[1] == [(name, splits, '', '-filtered', '', False, 2) for name in ['POLR2A', 'ASDURF', 'POLR1C']]
+    with open(output, 'r') as infile:
+        assert infile.read() == 'Sample\tTotal reads\t100-110\nPOLR2A\t500\t60\nASDURF\t550\t70\nPOLR1C\t\t50\n'
+
+
+def test_flagstat(testdir, mock_testclass):
     bam = 'POLR2A.bam'
     output = MagicMock()
-    output.stdout = MagicMock()
-    output.stdout.decode = MagicMock(return_value='5400')
+    output.stdout = FLAGSTAT.encode('utf-8')
     subprocess.run = MagicMock(return_value=output)
-    total = s.flagstat_total(bam)
-    subprocess.run.assert_any_call(['samtools', 'flagstat', bam], capture_output=True, check=True)
-    assert total == '5400'
+    counts = s.flagstat(bam)
+    subprocess.run.assert_called_once_with(['samtools', 'flagstat', bam], capture_output=True, check=True)
+    assert counts == {'total': 5400, 'mapped': 5100, 'duplicates': 300}
 
 
-def test_flagstat_total_2(testdir, mock_testclass):
+def test_flagstat_threads(testdir, mock_testclass):
     bam = 'POLR2A.bam'
     output = MagicMock()
-    output.stdout = MagicMock()
-    output.stdout.decode = MagicMock(return_value='200')
+    output.stdout = FLAGSTAT.encode('utf-8')
     subprocess.run = MagicMock(return_value=output)
-    total = s.flagstat_total(bam)
-    subprocess.run.assert_any_call(['samtools', 'flagstat', bam], capture_output=True, check=True)
-    assert total == '200'
+    counts = s.flagstat(bam, 4)
+    subprocess.run.assert_called_once_with(['samtools', 'flagstat', '-@', '3', bam], capture_output=True, check=True)
+    assert counts['total'] == 5400
 
 
 def test_fragment_sizes(mock_testclass):
@@ -334,6 +366,14 @@ def test_fragment_sizes(mock_testclass):
     assert 50 == sizes[7]
 
 
+def test_fragment_sizes_cache(testdir, mock_testclass):
+    bed = Path(__file__).parent.joinpath('sample2.bed')
+    copyfile(bed, 'sample2.bed')
+    Bed.write_cache('sample2.bed')
+    assert Bed.read_cache('sample2.bed') is not None
+    assert s.fragment_sizes('sample2.bed') == s.fragment_sizes(bed)
+
+
 def test_fragment_sizes_2(mock_testclass):
     bed = Path(__file__).parent.joinpath('sample2.bed')
     sizes = s.fragment_sizes(bed)
@@ -1,5 +1,7 @@
 import logging
 from pathlib import Path
+import subprocess
+import sys
 from unittest.mock import MagicMock
 
 import pytest
@@ -36,6 +38,8 @@ from robtools import Trimmomatic
 from robtools import Vap
 from robtools import robtools
 
+HEAVY_MODULES = ('lmfit', 'matplotlib', 'numpy', 'pandas', 'pyBigWig', 'pysam', 'scipy')
+
 
 @pytest.fixture
 def mock_testclass():
@@ -109,7 +113,7 @@ def test_robtools_bam2bed(testdir, mock_testclass):
     result = runner.invoke(robtools.robtools,
                            ['bam2bed', '--samples', samples, '--unpaired', '--threads', threads, '--index', index])
     assert result.exit_code == 0
-    Bam2Bed.bam2bed_samples.assert_called_once_with(samples, False, threads, '-dedup', '', index)
+    Bam2Bed.bam2bed_samples.assert_called_once_with(samples, False, threads, '-dedup', '', index, False)
 
 
 def test_robtools_bowtie2(testdir, mock_testclass):
@@ -122,7 +126,7 @@ def test_robtools_bowtie2(testdir, mock_testclass):
                            ['bowtie2', '--samples', samples, '--threads', threads, '--index', index, '-x',
                             'sacCer3.fa'])
     assert result.exit_code == 0
-    Bowtie2.bowtie_samples.assert_called_once_with(samples, threads, '', '', index, ('-x', 'sacCer3.fa'))
+    Bowtie2.bowtie_samples.assert_called_once_with(samples, threads, '', '', index, ('-x', 'sacCer3.fa'), False, None, None)
 
 
 def test_robtools_bwa(testdir, mock_testclass):
@@ -135,7 +139,7 @@ def test_robtools_bwa(testdir, mock_testclass):
     result = runner.invoke(robtools.robtools,
                            ['bwa', '--samples', samples, '--fasta', fasta, '--threads', threads, '--index', index])
     assert result.exit_code == 0
-    Bwa.bwa_sample.assert_called_once_with('POLR1C', fasta, threads, '', '', ())
+    Bwa.bwa_sample.assert_called_once_with('POLR1C', fasta, threads, '', '', (), False, None, None)
 
 
 def test_robtools_centerannotations(testdir, mock_testclass):
@@ -144,7 +148,7 @@ def test_robtools_centerannotations(testdir, mock_testclass):
     runner = CliRunner()
     result = runner.invoke(robtools.robtools, ['centerannotations', '--samples', samples])
     assert result.exit_code == 0
-    CenterAnnotations.center_annotations_samples.assert_called_once_with(samples, '', '-forcov', None)
+    CenterAnnotations.center_annotations_samples.assert_called_once_with(samples, '', '-forcov', None, 1)
 
 
 def test_robtools_chipexoqual(testdir, mock_testclass):
@@ -190,7 +194,7 @@ def test_robtools_filterbam(testdir, mock_testclass):
     result = runner.invoke(robtools.robtools,
                            ['filterbam', '--samples', samples, '--unpaired', '--threads', threads, '--index', index])
     assert result.exit_code == 0
-    FilterBam.filter_bam.assert_called_once_with(samples, False, True, None, threads, '', '', index)
+    FilterBam.filter_bam.assert_called_once_with(samples, False, True, None, threads, '', '', index, False)
 
 
 def test_robtools_fixmd5(testdir, mock_testclass):
@@ -216,7 +220,7 @@ def test_robtools_genomecov(testdir, mock_testclass):
                             '-is', input_suffix, '-os', output_suffix, '--index', index])
     assert result.exit_code == 0
     GenomeCoverage.genome_coverage_samples.assert_called_once_with(samples, sizes, scale, strand, input_suffix,
-                                                                   output_suffix, None, None, None, index, ('-5',))
+                                                                   output_suffix, None, None, None, index, ('-5',), False, 1)
 
 
 def test_robtools_ignorestrand(testdir, mock_testclass):
@@ -225,7 +229,7 @@ def test_robtools_ignorestrand(testdir, mock_testclass):
     runner = CliRunner()
     result = runner.invoke(robtools.robtools, ['ignorestrand', '--samples', samples])
     assert result.exit_code == 0
-    IgnoreStrand.ignore_strand_samples.assert_called_once_with(samples, '', '-forcov', None)
+    IgnoreStrand.ignore_strand_samples.assert_called_once_with(samples, '', '-forcov', None, 1)
 
 
 def test_robtools_intersect(testdir, mock_testclass):
@@ -247,7 +251,7 @@ def test_robtools_keeprandomreads(mock_testclass):
     result = runner.invoke(robtools.robtools, ['keeprandomreads', '--samples', samples])
     logging.warning(result.output)
     assert result.exit_code == 0
-    KeepRandomReads.keeprandomreads_samples.assert_called_once_with(samples, 10000000, True, '', '-random', None)
+    KeepRandomReads.keeprandomreads_samples.assert_called_once_with(samples, 10000000, True, '', '-random', None, False, None, 1)
 
 
 def test_robtools_keeprandomreads_bam(mock_testclass):
@@ -257,7 +261,7 @@ def test_robtools_keeprandomreads_bam(mock_testclass):
     result = runner.invoke(robtools.robtools, ['keeprandomreadsbam', '--samples', samples])
     logging.warning(result.output)
     assert result.exit_code == 0
-    KeepRandomReadsBam.keeprandomreads_samples.assert_called_once_with(samples, 10000000, True, 1, '', '-random', None)
+    KeepRandomReadsBam.keeprandomreads_samples.assert_called_once_with(samples, 10000000, True, 1, '', '-random', None, False, None)
 
 
 def test_robtools_merge(testdir, mock_testclass):
@@ -303,7 +307,7 @@ def test_robtools_pairs2hic(testdir, mock_testclass):
     result = runner.invoke(robtools.robtools, ['pairs2hic', '--project', project])
     logging.warning(result.output)
     assert result.exit_code == 0
-    Pairs2Hic.pairs2hic_.assert_called_once_with(project, juicer, "*.nodups", None, None, ())
+    Pairs2Hic.pairs2hic_.assert_called_once_with(project, juicer, "*.nodups", None, None, (), False, 1, 1, None, False)
 
 
 def test_robtools_plot2do(testdir, mock_testclass):
@@ -367,7 +371,7 @@ def test_robtools_siqchip(testdir, mock_testclass):
                            ['siqchip', '--samples', samples, '--chromosomes', sizes, '--resolution', resi])
     assert result.exit_code == 0
     Siqchip.siqchip_samples.assert_called_once_with(samples, sizes, resi, '-input-reads', '-reads', '-params',
-                                                    '-siqchip', 1, None)
+                                                    '-siqchip', 1, None, False)
 
 
 def test_robtools_siqchipbed(testdir, mock_testclass):
@@ -421,7 +425,7 @@ def test_robtools_statistics(testdir, mock_testclass):
                            ['statistics', '--samples', samples, '--datasets', datasets, '--output', output])
     logging.warning(result.output)
     assert result.exit_code == 0
-    Statistics.statistics_samples.assert_called_once_with(samples, datasets, '', '-filtered', '', False, output)
+    Statistics.statistics_samples.assert_called_once_with(samples, datasets, '', '-filtered', '', False, output, 1, 1)
 
 
 def test_robtools_trimmomatic(testdir, mock_testclass):
@@ -446,3 +450,21 @@ def test_robtools_vap(testdir, mock_testclass):
     logging.warning(result.output)
     assert result.exit_code == 0
     Vap.vap_samples.assert_called_once_with(samples, parameters, None, index)
+
+
+def loaded_heavy_modules(*args):
+    code = 'import sys; from robtools import robtools; robtools.robtools({}, standalone_mode=False); ' \
+           'print(" ".join(sorted(name for name in {} if name in sys.modules)))' \
+        .format(repr(list(args)), repr(HEAVY_MODULES))
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                            cwd=Path(__file__).parent.parent.parent).stdout
+    return output.splitlines()[-1].split()
+
+
+def test_robtools_startup_help():
+    assert loaded_heavy_modules('--help') == []
+
+
+def test_robtools_startup_printsample():
+    samples = Path(__file__).parent.joinpath('samples.txt')
+    assert loaded_heavy_modules('printsample', '--samples', str(samples), '--index', '1') == []